@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Usuario, Pedido, ItemPedido, Produto, LogAuditoria
+from .models import Usuario, Pedido, ItemPedido, Produto, LogAuditoria, CalendarioOperacional, Feriado
 
 
 class UsuarioAdmin(BaseUserAdmin):
@@ -91,9 +91,21 @@ class PedidoAdmin(admin.ModelAdmin):
             'fields': ('deletado', 'deletado_por', 'deletado_em'),
             'classes': ('collapse',)
         }),
+        ('Contadores de Itens', {
+            'fields': ('total_itens', 'itens_separados', 'itens_substituidos', 'itens_em_compra',
+                       'itens_comprados', 'itens_concluidos', 'separadores'),
+            'classes': ('collapse',)
+        }),
     )
 
-    readonly_fields = ('data_criacao', 'data_finalizacao')
+    readonly_fields = ('data_criacao', 'data_finalizacao', 'total_itens', 'itens_separados',
+                       'itens_substituidos', 'itens_em_compra', 'itens_comprados',
+                       'itens_concluidos', 'separadores')
+
+    def save_related(self, request, form, formsets, change):
+        """Recalcula os contadores após edição dos itens pelo inline"""
+        super().save_related(request, form, formsets, change)
+        Pedido.reconciliar_contadores(Pedido.objects.filter(pk=form.instance.pk))
 
     def get_status_badge(self, obj):
         """Exibe status com cores"""
@@ -152,6 +164,11 @@ class ItemPedidoAdmin(admin.ModelAdmin):
     readonly_fields = ('separado_por', 'separado_em', 'marcado_compra_por',
                        'marcado_compra_em', 'compra_realizada_por', 'compra_realizada_em')
 
+    def save_model(self, request, obj, form, change):
+        """Recalcula os contadores do pedido após edição manual do item"""
+        super().save_model(request, obj, form, change)
+        Pedido.reconciliar_contadores(Pedido.objects.filter(pk=obj.pedido_id))
+
     def get_separado_badge(self, obj):
         """Badge de separação"""
         if obj.separado:
@@ -203,6 +220,23 @@ class ProdutoAdmin(admin.ModelAdmin):
     readonly_fields = ('criado_em', 'atualizado_em')
 
 
+@admin.register(CalendarioOperacional)
+class CalendarioOperacionalAdmin(admin.ModelAdmin):
+    """Admin do expediente por dia da semana (cálculo de tempo útil)"""
+
+    list_display = ('dia_semana', 'hora_inicio', 'hora_fim')
+    ordering = ('dia_semana',)
+
+
+@admin.register(Feriado)
+class FeriadoAdmin(admin.ModelAdmin):
+    """Admin dos feriados (dias sem expediente)"""
+
+    list_display = ('data', 'descricao')
+    search_fields = ('descricao',)
+    date_hierarchy = 'data'
+
+
 @admin.register(LogAuditoria)
 class LogAuditoriaAdmin(admin.ModelAdmin):
     """Admin para o modelo LogAuditoria"""
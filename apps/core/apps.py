@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'apps.core'
+    label = 'core'
+
+    def ready(self):
+        # Registrar receivers de sinais
+        from . import signals  # noqa: F401
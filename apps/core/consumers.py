@@ -1,260 +1,372 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
+import asyncio
 import json
+import time
+from django.conf import settings
 from django.utils import timezone
 
+from apps.core.services import conexoes, retomada
+from apps.core.services.broadcast import (
+    GRUPOS_FILTRAVEIS, TIPO_LOTE, grupo_do_topico, topico_do_grupo
+)
+from apps.core.services.dashboard import FiltroDashboard
 
-class DashboardConsumer(AsyncWebsocketConsumer):
-    """
-    Consumer WebSocket para atualizações em tempo real do dashboard.
 
-    Eventos suportados:
-    - pedido_criado: Novo pedido foi criado
-    - pedido_atualizado: Pedido foi atualizado (status, itens, etc)
-    - pedido_finalizado: Pedido foi finalizado
-    """
+# Tópicos por conexão
+MAXIMO_TOPICOS = 20
 
-    async def connect(self):
-        """Aceita conexão WebSocket e adiciona ao group 'dashboard'"""
-        self.group_name = 'dashboard'
+# Decisão do filtro de uma assinatura para cada evento de uma mensagem
+ENVIAR = 'enviar'
+REMOVER = 'remover'
+IGNORAR = 'ignorar'
 
-        # IMPORTANTE: Aceitar conexão ANTES de acessar channel_layer
-        # Isso evita erro 1006 se channel_layer falhar
-        await self.accept()
-        print(f"[WebSocket] Cliente conectado ao dashboard: {self.channel_name}")
+# Códigos de fechamento (faixa 4000-4999, reservada à aplicação). As páginas
+# não reconectam após 4401, 4403 e 4409.
+FECHAMENTO_NAO_AUTENTICADO = 4401
+FECHAMENTO_SEM_PERMISSAO = 4403
+FECHAMENTO_OCIOSA = 4408
+FECHAMENTO_SUBSTITUIDA = 4409
 
-        # Adicionar ao group (com error handling)
-        try:
-            await self.channel_layer.group_add(
-                self.group_name,
-                self.channel_name
-            )
-            print(f"[WebSocket] Cliente adicionado ao group '{self.group_name}'")
-        except Exception as e:
-            print(f"[WebSocket] ERRO ao adicionar ao group: {e}")
-            # Conexão já foi aceita, continuar sem group (funciona localmente)
-
-    async def disconnect(self, close_code):
-        """Remove da group ao desconectar"""
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
-
-        print(f"[WebSocket] Cliente desconectado do dashboard: {self.channel_name}")
+# Tipos de usuário por group (ausente: qualquer usuário autenticado), os
+# mesmos das views de cada tela
+PERMISSOES_GRUPOS = {
+    'painel_compras': ('ADMINISTRADOR', 'COMPRADORA'),
+}
 
-    async def receive(self, text_data):
-        """
-        Recebe mensagens do cliente WebSocket.
-        Por enquanto, apenas loga (pode ser expandido para ping/pong, etc).
-        """
-        try:
-            data = json.loads(text_data)
-            message_type = data.get('type', 'unknown')
 
-            # Responder a ping com pong (para keep-alive)
-            if message_type == 'ping':
-                await self.send(text_data=json.dumps({
-                    'type': 'pong',
-                    'timestamp': timezone.now().isoformat()
-                }))
-        except json.JSONDecodeError:
-            print(f"[WebSocket] Mensagem inválida recebida: {text_data}")
+def ociosidade_maxima():
+    return getattr(settings, 'WEBSOCKET_OCIOSIDADE_S', 120)
 
-    # Handlers para eventos do channel layer
 
-    async def pedido_criado(self, event):
-        """
-        Handler chamado quando um novo pedido é criado.
-        Envia os dados do pedido para o cliente.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'pedido_criado',
-            'pedido': event['pedido']
-        }))
+class ControleConexaoMixin:
+    """
+    Admissão e ciclo de vida das conexões.
+
+    Só usuários autenticados e ativos permanecem conectados; cada group
+    exige os tipos de usuário da tela correspondente (PERMISSOES_GRUPOS).
+    Recusas aceitam o handshake e fecham em seguida com o código da
+    aplicação: fechar antes do accept rejeita o handshake e o navegador vê
+    apenas 1006, sem saber que não deve reconectar.
+    Cada usuário mantém até WEBSOCKET_CONEXOES_POR_USUARIO conexões: a mais
+    antiga é encerrada ao abrir outra (apps.core.services.conexoes). Conexões
+    sem mensagens do cliente (o ping é a cada 30 s) por
+    WEBSOCKET_OCIOSIDADE_S segundos são encerradas pelo servidor, liberando
+    os groups.
+    """
 
-    async def pedido_atualizado(self, event):
-        """
-        Handler chamado quando um pedido é atualizado.
-        Envia os dados atualizados do pedido.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'pedido_atualizado',
-            'pedido': event['pedido']
-        }))
+    usuario = None
+    vigia = None
 
-    async def pedido_finalizado(self, event):
-        """
-        Handler chamado quando um pedido é finalizado.
-        Envia apenas o ID do pedido finalizado.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'pedido_finalizado',
-            'pedido_id': event['pedido_id'],
-            'numero_orcamento': event.get('numero_orcamento', '')
-        }))
+    async def recusar(self, codigo):
+        """Aceita e fecha com o código, para a página receber o motivo"""
+        await self.accept()
+        await self.close(code=codigo)
+
+    async def admitir(self):
+        """Recusa anônimos e inativos (fecha com 4401)"""
+        usuario = self.scope.get('user')
+        if usuario is None or not usuario.is_authenticated or not usuario.ativo:
+            print(f"[WebSocket] Conexão recusada (não autenticado): {self.channel_name}")
+            await self.recusar(FECHAMENTO_NAO_AUTENTICADO)
+            return False
+        self.usuario = usuario
+        return True
+
+    def pode_assinar(self, grupo):
+        tipos = PERMISSOES_GRUPOS.get(grupo)
+        return tipos is None or self.usuario.tipo in tipos
+
+    async def iniciar_controle(self):
+        """Depois do accept: registra a conexão e inicia a vigia de ociosidade"""
+        self.registrar_atividade()
+        excedentes = await sync_to_async(conexoes.registrar)(self.usuario.id, self.channel_name)
+        for canal in excedentes:
+            await self.channel_layer.send(canal, {'type': 'conexao_substituida'})
+        self.vigia = asyncio.ensure_future(self.vigiar())
+
+    async def encerrar_controle(self):
+        if self.vigia is not None:
+            self.vigia.cancel()
+            self.vigia = None
+        if self.usuario is not None:
+            await sync_to_async(conexoes.remover)(self.usuario.id, self.channel_name)
+
+    def registrar_atividade(self):
+        self.ultima_atividade = time.monotonic()
+
+    async def vigiar(self):
+        limite = ociosidade_maxima()
+        while True:
+            ociosa = time.monotonic() - self.ultima_atividade
+            if ociosa >= limite:
+                print(f"[WebSocket] Conexão ociosa encerrada: {self.channel_name}")
+                await self.close(code=FECHAMENTO_OCIOSA)
+                return
+            await asyncio.sleep(limite - ociosa)
+
+    async def conexao_substituida(self, event):
+        """Limite de conexões do usuário: esta é a mais antiga"""
+        print(f"[WebSocket] Conexão substituída por uma mais nova: {self.channel_name}")
+        await self.close(code=FECHAMENTO_SUBSTITUIDA)
+
+
+class EventosMixin:
+    """
+    Handler comum a todos os tópicos. broadcast.enviar codifica o frame de
+    cada evento uma única vez, na origem, e o coloca na mensagem do channel
+    layer; os consumers o repassam como está, sem json.dumps por cliente.
+    """
 
-    async def card_status_updated(self, event):
-        """
-        Handler chamado quando o card_status de um pedido é atualizado.
-        Envia o novo status do card para o dashboard.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'card_status_updated',
-            'pedido_id': event['pedido_id'],
-            'card_status': event['card_status'],
-            'card_status_display': event['card_status_display'],
-            'separadores': event.get('separadores', [])
-        }))
+    async def evento(self, event):
+        """Evento de broadcast.enviar: frame já codificado"""
+        await self.send(text_data=event['frame'])
 
 
-class PedidoDetalheConsumer(AsyncWebsocketConsumer):
+class TopicosConsumer(ControleConexaoMixin, EventosMixin, AsyncWebsocketConsumer):
     """
-    Consumer WebSocket para atualizações em tempo real dos detalhes do pedido.
-
-    Eventos suportados:
-    - item_separado: Item foi marcado como separado
-    - item_em_compra: Item foi marcado para compra
-    - item_substituido: Item teve produto substituído
-    - pedido_atualizado: Status do pedido mudou
-    - pedido_finalizado: Pedido foi finalizado
-    - pedido_deletado: Pedido foi deletado (soft delete)
+    Consumer WebSocket único (/ws/) com assinatura de tópicos.
+
+    O cliente envia {"type": "subscribe", "topic": "..."} e
+    {"type": "unsubscribe", "topic": "..."} para os tópicos 'dashboard',
+    'painel_compras' e 'pedido:<id>'; cada frame de evento leva o campo
+    'topic' de origem e o 'seq' do group (incluídos por broadcast.enviar).
+    Uma conexão (e um ping) por aba, qualquer que seja a quantidade de telas
+    assinadas.
+
+    Ao reconectar, o cliente envia {"type": "resume", "topic": "...",
+    "seq": <último recebido>} no lugar do subscribe: recebe os eventos
+    perdidos, em ordem, ou 'snapshot_required' quando eles não estão mais no
+    histórico (apps.core.services.retomada).
+
+    subscribe e resume do tópico 'dashboard' aceitam "filters" (vendedor_id,
+    status, logistica; ver FiltroDashboard): a conexão só recebe eventos de
+    pedidos que passam pelo filtro, e um pedido que deixa de passar é
+    removido da tela com 'pedido_finalizado'. Os pedidos visíveis de cada
+    assinatura ficam em um índice (lido do banco no subscribe e mantido
+    pelos eventos), usado para os eventos que trazem só o pedido_id.
     """
 
     async def connect(self):
-        """Aceita conexão WebSocket e adiciona ao group específico do pedido"""
-        self.pedido_id = self.scope['url_route']['kwargs']['pedido_id']
-        self.group_name = f'pedido_{self.pedido_id}'
-
-        # IMPORTANTE: Aceitar conexão ANTES de acessar channel_layer
-        # Isso evita erro 1006 se channel_layer falhar
+        """Aceita conexão WebSocket; os groups vêm com as assinaturas"""
+        # group -> tópico assinado
+        self.topicos = {}
+        # group -> último seq enviado na retomada (cópias ao vivo descartadas)
+        self.retomados = {}
+        # group -> FiltroDashboard e ids dos pedidos visíveis da assinatura
+        self.filtros = {}
+        self.visiveis = {}
+        if not await self.admitir():
+            return
         await self.accept()
-        print(f"[WebSocket] Cliente conectado ao pedido {self.pedido_id}: {self.channel_name}")
-
-        # Adicionar ao group (com error handling)
-        try:
-            await self.channel_layer.group_add(
-                self.group_name,
-                self.channel_name
-            )
-            print(f"[WebSocket] Cliente adicionado ao group '{self.group_name}'")
-        except Exception as e:
-            print(f"[WebSocket] ERRO ao adicionar ao group '{self.group_name}': {e}")
-            # Conexão já foi aceita, continuar sem group (funciona localmente)
+        await self.iniciar_controle()
+        print(f"[WebSocket] Cliente conectado: {self.channel_name}")
 
     async def disconnect(self, close_code):
-        """Remove do group ao desconectar"""
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
-
-        print(f"[WebSocket] Cliente desconectado do pedido {self.pedido_id}: {self.channel_name}")
+        """Remove a conexão de todos os groups assinados"""
+        await self.encerrar_controle()
+        for grupo in list(self.topicos):
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+        self.topicos = {}
+        print(f"[WebSocket] Cliente desconectado: {self.channel_name}")
 
     async def receive(self, text_data):
         """
-        Recebe mensagens do cliente WebSocket.
-        Responde a ping com pong para keep-alive.
+        Recebe mensagens do cliente: subscribe, resume, unsubscribe e ping.
         """
+        self.registrar_atividade()
         try:
             data = json.loads(text_data)
-            message_type = data.get('type', 'unknown')
-
-            # Responder a ping com pong (para keep-alive)
-            if message_type == 'ping':
-                await self.send(text_data=json.dumps({
-                    'type': 'pong',
-                    'timestamp': timezone.now().isoformat()
-                }))
         except json.JSONDecodeError:
             print(f"[WebSocket] Mensagem inválida recebida: {text_data}")
+            return
+        if not isinstance(data, dict):
+            return
+
+        message_type = data.get('type', 'unknown')
+        if message_type == 'subscribe':
+            await self.assinar(data.get('topic'), filtros=data.get('filters'))
+        elif message_type == 'resume':
+            seq = data.get('seq')
+            if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+                await self.erro(data.get('topic'), 'Sequência inválida.')
+                return
+            await self.assinar(data.get('topic'), desde=seq, filtros=data.get('filters'))
+        elif message_type == 'unsubscribe':
+            await self.cancelar(data.get('topic'))
+        elif message_type == 'ping':
+            # Responder a ping com pong (para keep-alive)
+            await self.send(text_data=json.dumps({
+                'type': 'pong',
+                'timestamp': timezone.now().isoformat()
+            }))
 
-    # Handlers para eventos do channel layer
-
-    async def item_separado(self, event):
-        """Handler chamado quando um item é separado"""
-        await self.send(text_data=json.dumps({
-            'type': 'item_separado',
-            'item': event['item']
-        }))
-
-    async def item_em_compra(self, event):
-        """Handler chamado quando um item é marcado para compra"""
-        await self.send(text_data=json.dumps({
-            'type': 'item_em_compra',
-            'item': event['item']
-        }))
-
-    async def item_substituido(self, event):
-        """Handler chamado quando um item tem produto substituído"""
-        await self.send(text_data=json.dumps({
-            'type': 'item_substituido',
-            'item': event['item']
-        }))
-
-    async def pedido_atualizado(self, event):
-        """Handler chamado quando o pedido é atualizado"""
-        await self.send(text_data=json.dumps({
-            'type': 'pedido_atualizado',
-            'pedido': event['pedido']
-        }))
-
-    async def pedido_finalizado(self, event):
-        """Handler chamado quando o pedido é finalizado"""
-        await self.send(text_data=json.dumps({
-            'type': 'pedido_finalizado',
-            'pedido_id': event['pedido_id']
-        }))
-
-    async def pedido_deletado(self, event):
-        """Handler chamado quando o pedido é deletado"""
-        await self.send(text_data=json.dumps({
-            'type': 'pedido_deletado',
-            'pedido_id': event['pedido_id']
-        }))
-
-    async def compra_realizada(self, event):
-        """Handler chamado quando compra de um produto é realizada"""
-        await self.send(text_data=json.dumps({
-            'type': 'compra_realizada',
-            'produto_codigo': event['produto_codigo']
-        }))
-
-    async def item_unseparado(self, event):
-        """Handler chamado quando um item é desseparado"""
-        await self.send(text_data=json.dumps({
-            'type': 'item_unseparado',
-            'item': event['item']
-        }))
-
-    async def item_comprado(self, event):
-        """Handler chamado quando um item é marcado como comprado"""
-        await self.send(text_data=json.dumps({
-            'type': 'item_comprado',
-            'item': event['item']
-        }))
-
-
-# FASE 6: PainelComprasConsumer
-
-class PainelComprasConsumer(AsyncWebsocketConsumer):
-    """
-    Consumer WebSocket para atualizações em tempo real do painel de compras.
+    async def erro(self, topico, mensagem):
+        """Recusa de um subscribe"""
+        await self.send(text_data=json.dumps({'type': 'error', 'topic': topico, 'error': mensagem}))
 
-    Eventos suportados:
-    - item_marcado_compra: Novo item foi marcado para compra
-    - compra_confirmada: Compra de um produto foi confirmada
-    - item_separado_direto: Item foi separado direto do estoque (removido da lista de compras)
+    async def assinar(self, topico, desde=None, filtros=None):
+        """
+        Adiciona a conexão ao group do tópico (idempotente) e confirma com o
+        seq atual do group; com desde (resume), reenvia os eventos
+        posteriores a ele. Assinar de novo troca o filtro.
+        """
+        grupo = grupo_do_topico(topico)
+        if grupo is None:
+            await self.erro(topico, 'Tópico inválido.')
+            return
+        if not self.pode_assinar(grupo):
+            await self.erro(topico, 'Sem permissão para este tópico.')
+            return
+        filtro = None
+        if filtros is not None:
+            if grupo not in GRUPOS_FILTRAVEIS:
+                await self.erro(topico, 'Tópico não aceita filtros.')
+                return
+            try:
+                filtro = FiltroDashboard.de_dados(filtros)
+            except ValueError as e:
+                await self.erro(topico, str(e))
+                return
+        if grupo not in self.topicos:
+            if len(self.topicos) >= MAXIMO_TOPICOS:
+                await self.erro(topico, 'Limite de tópicos por conexão atingido.')
+                return
+            try:
+                await self.channel_layer.group_add(grupo, self.channel_name)
+            except Exception as e:
+                print(f"[WebSocket] ERRO ao adicionar ao group '{grupo}': {e}")
+                await self.erro(topico, 'Falha ao assinar o tópico.')
+                return
+            self.topicos[grupo] = topico_do_grupo(grupo)
+        topico = self.topicos[grupo]
+
+        if filtro is None:
+            self.filtros.pop(grupo, None)
+            self.visiveis.pop(grupo, None)
+        else:
+            self.visiveis[grupo] = await database_sync_to_async(filtro.pedidos_visiveis)()
+            self.filtros[grupo] = filtro
+
+        # Lido depois do group_add: eventos mais novos chegam ao vivo
+        if desde is None:
+            atual = await sync_to_async(retomada.sequencia_atual)(grupo)
+            await self.send(text_data=json.dumps({'type': 'subscribed', 'topic': topico, 'seq': atual}))
+            return
+
+        eventos, atual = await sync_to_async(retomada.eventos_desde)(grupo, desde)
+        self.retomados[grupo] = atual
+        if eventos is None:
+            await self.send(text_data=json.dumps({'type': 'snapshot_required', 'topic': topico, 'seq': atual}))
+            return
+        await self.send(text_data=json.dumps({'type': 'subscribed', 'topic': topico, 'seq': atual}))
+        for _, frame, indice in eventos:
+            frame = self.filtrar(grupo, frame, indice)
+            if frame is not None:
+                await self.send(text_data=frame)
+
+    async def cancelar(self, topico):
+        """Remove a conexão do group do tópico"""
+        grupo = grupo_do_topico(topico)
+        if grupo in self.topicos:
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+            topico = self.topicos.pop(grupo)
+            self.retomados.pop(grupo, None)
+            self.filtros.pop(grupo, None)
+            self.visiveis.pop(grupo, None)
+        await self.send(text_data=json.dumps({'type': 'unsubscribed', 'topic': topico}))
+
+    async def evento(self, event):
+        # Mensagens de um group já cancelado (ainda em trânsito) são
+        # descartadas, assim como as já reenviadas pela retomada
+        grupo = event['group']
+        if grupo not in self.topicos:
+            return
+        seq = event.get('seq')
+        if seq is not None and seq <= self.retomados.get(grupo, 0):
+            return
+        frame = self.filtrar(grupo, event['frame'], event.get('pedidos'))
+        if frame is not None:
+            await self.send(text_data=frame)
+
+    def filtrar(self, grupo, frame, indice):
+        """
+        Aplica o filtro da assinatura a uma mensagem.
+
+        Args:
+            grupo: group da mensagem
+            frame: frame codificado por broadcast.enviar
+            indice: broadcast.indice_pedidos da mensagem
+
+        Returns:
+            str - O frame original, um frame reduzido só para esta conexão
+            (mensagem relevante em parte) ou None se nada deve ser enviado
+        """
+        filtro = self.filtros.get(grupo)
+        if filtro is None or not indice:
+            return frame
+
+        visiveis = self.visiveis[grupo]
+        decisoes = []
+        for pedido in indice:
+            if pedido is None:
+                decisoes.append(ENVIAR)
+            elif 'status' in pedido:
+                # Card completo: reavaliado a cada evento
+                if filtro.aceita(pedido):
+                    visiveis.add(pedido['id'])
+                    decisoes.append(ENVIAR)
+                elif pedido['id'] in visiveis:
+                    visiveis.discard(pedido['id'])
+                    decisoes.append(REMOVER)
+                else:
+                    decisoes.append(IGNORAR)
+            else:
+                decisoes.append(ENVIAR if pedido['id'] in visiveis else IGNORAR)
+
+        if all(decisao == ENVIAR for decisao in decisoes):
+            return frame
+        if all(decisao == IGNORAR for decisao in decisoes):
+            return None
+
+        dados = json.loads(frame)
+        eventos = dados['eventos'] if dados['type'] == TIPO_LOTE else [dados]
+        restantes = []
+        for evento, pedido, decisao in zip(eventos, indice, decisoes):
+            if decisao == ENVIAR:
+                restantes.append(evento)
+            elif decisao == REMOVER:
+                restantes.append({'type': 'pedido_finalizado', 'pedido_id': pedido['id']})
+        if dados['type'] == TIPO_LOTE:
+            dados['eventos'] = restantes
+        else:
+            dados = dict(restantes[0], topic=dados.get('topic'), seq=dados.get('seq'))
+        return json.dumps(dados)
+
+
+class GrupoFixoConsumer(ControleConexaoMixin, EventosMixin, AsyncWebsocketConsumer):
+    """
+    Base dos consumers de um único group (URLs por tela, mantidas para
+    abas abertas antes do /ws/ multiplexado). Subclasses definem grupo().
     """
 
+    def grupo(self):
+        raise NotImplementedError
+
     async def connect(self):
-        """Aceita conexão WebSocket e adiciona ao group 'painel_compras'"""
-        self.group_name = 'painel_compras'
+        """Aceita conexão WebSocket e adiciona ao group da tela"""
+        self.group_name = self.grupo()
+        if not await self.admitir():
+            return
+        if not self.pode_assinar(self.group_name):
+            await self.recusar(FECHAMENTO_SEM_PERMISSAO)
+            return
 
         # IMPORTANTE: Aceitar conexão ANTES de acessar channel_layer
         # Isso evita erro 1006 se channel_layer falhar
         await self.accept()
-        print(f"[WebSocket] Cliente conectado ao painel de compras: {self.channel_name}")
+        print(f"[WebSocket] Cliente conectado ao group '{self.group_name}': {self.channel_name}")
 
         # Adicionar ao group (com error handling)
         try:
@@ -262,25 +374,28 @@ class PainelComprasConsumer(AsyncWebsocketConsumer):
                 self.group_name,
                 self.channel_name
             )
-            print(f"[WebSocket] Cliente adicionado ao group '{self.group_name}'")
         except Exception as e:
-            print(f"[WebSocket] ERRO ao adicionar ao group: {e}")
+            print(f"[WebSocket] ERRO ao adicionar ao group '{self.group_name}': {e}")
             # Conexão já foi aceita, continuar sem group (funciona localmente)
 
+        await self.iniciar_controle()
+
     async def disconnect(self, close_code):
         """Remove do group ao desconectar"""
+        await self.encerrar_controle()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
 
-        print(f"[WebSocket] Cliente desconectado do painel de compras: {self.channel_name}")
+        print(f"[WebSocket] Cliente desconectado do group '{self.group_name}': {self.channel_name}")
 
     async def receive(self, text_data):
         """
         Recebe mensagens do cliente WebSocket.
         Responde a ping com pong para keep-alive.
         """
+        self.registrar_atividade()
         try:
             data = json.loads(text_data)
             message_type = data.get('type', 'unknown')
@@ -294,55 +409,16 @@ class PainelComprasConsumer(AsyncWebsocketConsumer):
         except json.JSONDecodeError:
             print(f"[WebSocket] Mensagem inválida recebida: {text_data}")
 
-    # Handlers para eventos do channel layer
 
-    async def item_marcado_compra(self, event):
-        """
-        Handler chamado quando um novo item é marcado para compra.
-        Envia os dados do item para o cliente.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'item_marcado_compra',
-            'item': event['item']
-        }))
+class PedidoDetalheConsumer(GrupoFixoConsumer):
+    """Atualizações dos itens de um pedido (group 'pedido_<id>')"""
 
-    async def compra_confirmada(self, event):
-        """
-        Handler chamado quando uma compra é confirmada.
-        Envia os dados do produto para o cliente.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'compra_confirmada',
-            'produto': event['produto']
-        }))
+    def grupo(self):
+        return f"pedido_{self.scope['url_route']['kwargs']['pedido_id']}"
 
-    async def item_separado_direto(self, event):
-        """
-        Handler chamado quando um item é separado direto do estoque.
-        Remove o item da lista de compras.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'item_separado_direto',
-            'item': event['item']
-        }))
 
-    async def item_comprado(self, event):
-        """
-        Handler chamado quando um item é marcado/desmarcado como comprado.
-        Atualiza o status de compra do item no painel.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'item_comprado',
-            'item': event['item']
-        }))
+class PainelComprasConsumer(GrupoFixoConsumer):
+    """Atualizações do painel de compras (group 'painel_compras')"""
 
-    async def item_removido_compras(self, event):
-        """
-        Handler chamado quando um item é removido do painel de compras (unseparate).
-        Remove o item da lista de compras.
-        """
-        await self.send(text_data=json.dumps({
-            'type': 'item_removido_compras',
-            'item_id': event['item_id'],
-            'pedido_id': event['pedido_id']
-        }))
+    def grupo(self):
+        return 'painel_compras'
@@ -0,0 +1,28 @@
+"""
+Remove registros antigos do log de alterações do dashboard (delta sync).
+Clientes com sequência anterior ao log restante recebem o snapshot completo.
+Uso: python manage.py limpar_alteracoes_pedido [--horas 24]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.core.models import AlteracaoPedido
+
+
+class Command(BaseCommand):
+    help = 'Remove registros antigos do log de alterações de pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas',
+            type=int,
+            default=24,
+            help='Manter registros das últimas N horas (padrão: 24)',
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(hours=options['horas'])
+        removidos = AlteracaoPedido.limpar_antigas(limite)
+        self.stdout.write(self.style.SUCCESS(f'{removidos} registro(s) removido(s).'))
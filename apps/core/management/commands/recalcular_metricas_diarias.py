@@ -0,0 +1,43 @@
+"""
+Recalcula o rollup MetricaDiaria a partir do histórico de pedidos.
+Uso: python manage.py recalcular_metricas_diarias [--dias N]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.core.models import Pedido, MetricaDiaria
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as métricas diárias do dashboard a partir do histórico'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=None,
+            help='Recalcular apenas os últimos N dias (padrão: desde o primeiro pedido)',
+        )
+
+    def handle(self, *args, **options):
+        hoje = timezone.localdate()
+
+        if options['dias'] is not None:
+            inicio = hoje - timedelta(days=max(options['dias'] - 1, 0))
+        else:
+            primeiro = Pedido.objects.aggregate(primeiro=Min('data_criacao'))['primeiro']
+            inicio = timezone.localdate(primeiro) if primeiro else hoje
+
+        dias = 0
+        with transaction.atomic():
+            data = inicio
+            while data <= hoje:
+                MetricaDiaria.recalcular(data)
+                data += timedelta(days=1)
+                dias += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{dias} dia(s) recalculado(s).'))
@@ -0,0 +1,32 @@
+"""
+Recalcula os contadores desnormalizados de Pedido a partir dos itens.
+Uso: python manage.py reconciliar_contadores [--ativos]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.models import Pedido
+
+
+class Command(BaseCommand):
+    help = 'Corrige divergências entre os contadores de Pedido e seus itens'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ativos',
+            action='store_true',
+            help='Reconciliar apenas pedidos ativos (não finalizados/cancelados/deletados)',
+        )
+
+    def handle(self, *args, **options):
+        pedidos = Pedido.objects.all()
+        if options['ativos']:
+            pedidos = pedidos.filter(deletado=False).exclude(status__in=['FINALIZADO', 'CANCELADO'])
+
+        with transaction.atomic():
+            corrigidos = Pedido.reconciliar_contadores(pedidos)
+
+        if corrigidos:
+            self.stdout.write(self.style.WARNING(f'{corrigidos} pedido(s) com contadores corrigidos.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
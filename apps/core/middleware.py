@@ -1,8 +1,55 @@
+from django.urls import Resolver404, resolve
 from django.utils.deprecation import MiddlewareMixin
 from .models import LogAuditoria
+from .services import idempotencia
 import json
 
 
+class IdempotenciaMiddleware(MiddlewareMixin):
+    """
+    Idempotency-Key nas views marcadas com @idempotente: repetições recebem
+    a resposta da primeira requisição sem carregar a sessão nem chegar à
+    auditoria ou à view. Deve vir antes do SessionMiddleware (ver
+    apps.core.services.idempotencia).
+    """
+
+    def process_request(self, request):
+        if request.method != 'POST':
+            return None
+        try:
+            view_func = resolve(request.path_info).func
+        except Resolver404:
+            return None
+        if not getattr(view_func, 'idempotente', False):
+            return None
+        if idempotencia.chave_invalida(request):
+            return idempotencia.conflito('Idempotency-Key muito longa.', 400)
+
+        chave = idempotencia.chave_cache(request)
+        if chave is None:
+            return None
+
+        assinatura = idempotencia.impressao(request)
+        registro = idempotencia.reservar(chave, assinatura)
+        if registro is None:
+            request._idempotencia = (chave, assinatura)
+            return None
+
+        if registro['impressao'] != assinatura:
+            return idempotencia.conflito('Idempotency-Key já usada em outra requisição.', 422)
+        if 'status' not in registro:
+            registro = idempotencia.aguardar(chave)
+            if registro is None:
+                return idempotencia.conflito('Requisição em andamento. Tente novamente.', 409)
+        return idempotencia.repetir(registro)
+
+    def process_response(self, request, response):
+        reserva = getattr(request, '_idempotencia', None)
+        if reserva is not None:
+            idempotencia.guardar(*reserva, response)
+        return response
+
+
 class AuditoriaMiddleware(MiddlewareMixin):
     """
     Middleware para registrar todas as ações dos usuários autenticados.
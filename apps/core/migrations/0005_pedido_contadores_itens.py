@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:28
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def preencher_contadores(apps, schema_editor):
+    """Preenche os contadores desnormalizados dos pedidos existentes"""
+    Pedido = apps.get_model('core', 'Pedido')
+    ItemPedido = apps.get_model('core', 'ItemPedido')
+
+    separadores_por_pedido = {}
+    for pedido_id, nome in ItemPedido.objects.filter(
+        separado=True,
+        separado_por__isnull=False
+    ).values_list('pedido_id', 'separado_por__nome').distinct():
+        separadores_por_pedido.setdefault(pedido_id, set()).add(nome)
+
+    pedidos = Pedido.objects.annotate(
+        real_total=Count('itens'),
+        real_separados=Count('itens', filter=Q(itens__separado=True)),
+        real_substituidos=Count('itens', filter=Q(itens__substituido=True)),
+        real_em_compra=Count('itens', filter=Q(itens__em_compra=True)),
+        real_comprados=Count('itens', filter=Q(itens__compra_realizada=True)),
+        real_concluidos=Count('itens', filter=(
+            Q(itens__separado=True) | Q(itens__substituido=True) | Q(itens__compra_realizada=True)
+        )),
+    )
+
+    atualizados = []
+    for pedido in pedidos:
+        pedido.total_itens = pedido.real_total
+        pedido.itens_separados = pedido.real_separados
+        pedido.itens_substituidos = pedido.real_substituidos
+        pedido.itens_em_compra = pedido.real_em_compra
+        pedido.itens_comprados = pedido.real_comprados
+        pedido.itens_concluidos = pedido.real_concluidos
+        pedido.separadores = sorted(separadores_por_pedido.get(pedido.id, ()))
+        atualizados.append(pedido)
+
+    Pedido.objects.bulk_update(atualizados, [
+        'total_itens', 'itens_separados', 'itens_substituidos', 'itens_em_compra',
+        'itens_comprados', 'itens_concluidos', 'separadores'
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_sistemaconfig'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='itens_comprados',
+            field=models.PositiveIntegerField(default=0, verbose_name='Itens Comprados'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='itens_concluidos',
+            field=models.PositiveIntegerField(default=0, verbose_name='Itens Concluídos'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='itens_em_compra',
+            field=models.PositiveIntegerField(default=0, verbose_name='Itens em Compra'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='itens_separados',
+            field=models.PositiveIntegerField(default=0, verbose_name='Itens Separados'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='itens_substituidos',
+            field=models.PositiveIntegerField(default=0, verbose_name='Itens Substituídos'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='separadores',
+            field=models.JSONField(blank=True, default=list, verbose_name='Separadores'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='total_itens',
+            field=models.PositiveIntegerField(default=0, verbose_name='Total de Itens'),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_pedido_contadores_itens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pedido_id', models.BigIntegerField(db_index=True, verbose_name='ID do Pedido')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Alteração de Pedido',
+                'verbose_name_plural': 'Alterações de Pedidos',
+                'ordering': ['id'],
+            },
+        ),
+    ]
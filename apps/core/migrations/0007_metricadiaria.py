@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alteracaopedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaDiaria',
+            fields=[
+                ('data', models.DateField(primary_key=True, serialize=False, verbose_name='Data')),
+                ('pedidos_criados', models.IntegerField(default=0, verbose_name='Pedidos Criados')),
+                ('pedidos_em_aberto', models.IntegerField(default=0, verbose_name='Pedidos em Aberto')),
+                ('pedidos_finalizados', models.IntegerField(default=0, verbose_name='Pedidos Finalizados')),
+                ('soma_tempo_util', models.FloatField(default=0, verbose_name='Soma do Tempo Útil (segundos)')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Métrica Diária',
+                'verbose_name_plural': 'Métricas Diárias',
+                'ordering': ['-data'],
+            },
+        ),
+    ]
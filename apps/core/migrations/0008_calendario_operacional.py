@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:43
+
+import datetime
+
+from django.db import migrations, models
+
+
+def criar_expediente_padrao(apps, schema_editor):
+    """Expediente padrão: segunda a sexta, 7:30 - 17:00 (regra anterior)"""
+    CalendarioOperacional = apps.get_model('core', 'CalendarioOperacional')
+    for dia_semana in range(5):
+        CalendarioOperacional.objects.get_or_create(
+            dia_semana=dia_semana,
+            defaults={
+                'hora_inicio': datetime.time(7, 30),
+                'hora_fim': datetime.time(17, 0),
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_metricadiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarioOperacional',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], unique=True, verbose_name='Dia da Semana')),
+                ('hora_inicio', models.TimeField(verbose_name='Início do Expediente')),
+                ('hora_fim', models.TimeField(verbose_name='Fim do Expediente')),
+            ],
+            options={
+                'verbose_name': 'Calendário Operacional',
+                'verbose_name_plural': 'Calendário Operacional',
+                'ordering': ['dia_semana'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Feriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('descricao', models.CharField(blank=True, max_length=200, verbose_name='Descrição')),
+            ],
+            options={
+                'verbose_name': 'Feriado',
+                'verbose_name_plural': 'Feriados',
+                'ordering': ['data'],
+            },
+        ),
+        migrations.RunPython(criar_expediente_padrao, migrations.RunPython.noop),
+    ]
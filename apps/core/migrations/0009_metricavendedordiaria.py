@@ -0,0 +1,126 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:46
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+# Cópia do cálculo de tempo útil de apps.core.utils na data desta migração
+# (o código atual pode mudar; a migração usa só os modelos históricos)
+HORA_INICIO_PADRAO = datetime.time(7, 30)
+HORA_FIM_PADRAO = datetime.time(17, 0)
+DIAS_SEMANA_PADRAO = range(5)  # segunda a sexta
+
+
+def _micro_do_dia(hora):
+    """Microssegundos desde a meia-noite"""
+    return ((hora.hour * 60 + hora.minute) * 60 + hora.second) * 10**6 + hora.microsecond
+
+
+def _carregar_calendario(apps):
+    """Janelas de expediente por dia da semana e feriados (modelos históricos)"""
+    CalendarioOperacional = apps.get_model('core', 'CalendarioOperacional')
+    Feriado = apps.get_model('core', 'Feriado')
+
+    dias = list(CalendarioOperacional.objects.all())
+    if dias:
+        janelas = {
+            dia.dia_semana: (_micro_do_dia(dia.hora_inicio), _micro_do_dia(dia.hora_fim))
+            for dia in dias
+            if dia.hora_fim > dia.hora_inicio
+        }
+    else:
+        janela = (_micro_do_dia(HORA_INICIO_PADRAO), _micro_do_dia(HORA_FIM_PADRAO))
+        janelas = {dia_semana: janela for dia_semana in DIAS_SEMANA_PADRAO}
+
+    return janelas, set(Feriado.objects.values_list('data', flat=True))
+
+
+def _tempo_util(inicio, fim, janelas, feriados):
+    """
+    Tempo útil (segundos) entre dois momentos, dia a dia, pelo horário de
+    parede dos próprios datetimes (mesma regra de apps.core.utils.calendario)
+    """
+    if timezone.is_naive(inicio):
+        inicio = timezone.make_aware(inicio)
+    if timezone.is_naive(fim):
+        fim = timezone.make_aware(fim)
+    if fim < inicio:
+        return 0.0
+
+    total = 0
+    dia = inicio.date()
+    while dia <= fim.date():
+        janela = None if dia in feriados else janelas.get(dia.weekday())
+        if janela:
+            de = _micro_do_dia(inicio.time()) if dia == inicio.date() else 0
+            ate = _micro_do_dia(fim.time()) if dia == fim.date() else janela[1]
+            total += max(min(ate, janela[1]) - max(de, janela[0]), 0)
+        dia += datetime.timedelta(days=1)
+    return total / 10**6
+
+
+def preencher_metricas(apps, schema_editor):
+    """Preenche o rollup por dia/vendedor/status com os pedidos existentes"""
+    Pedido = apps.get_model('core', 'Pedido')
+    MetricaVendedorDiaria = apps.get_model('core', 'MetricaVendedorDiaria')
+
+    pedidos = Pedido.objects.filter(deletado=False).annotate(dia=TruncDate('data_criacao'))
+
+    linhas = {}
+    for valores in pedidos.values('dia', 'vendedor_id', 'status').annotate(total=Count('id')).order_by():
+        linhas[(valores['dia'], valores['vendedor_id'], valores['status'])] = MetricaVendedorDiaria(
+            data=valores['dia'],
+            vendedor_id=valores['vendedor_id'],
+            status=valores['status'],
+            pedidos=valores['total']
+        )
+
+    finalizados = list(pedidos.filter(
+        status='FINALIZADO',
+        data_finalizacao__isnull=False
+    ).values_list('dia', 'vendedor_id', 'data_criacao', 'data_finalizacao'))
+    janelas, feriados = _carregar_calendario(apps)
+    for dia, vendedor_id, criacao, finalizacao in finalizados:
+        linha = linhas[(dia, vendedor_id, 'FINALIZADO')]
+        linha.finalizados_com_tempo += 1
+        linha.soma_tempo_util += _tempo_util(criacao, finalizacao, janelas, feriados)
+
+    MetricaVendedorDiaria.objects.bulk_create(linhas.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_calendario_operacional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaVendedorDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data de Criação')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EM_SEPARACAO', 'Em Separação'), ('AGUARDANDO_COMPRA', 'Aguardando Compra'), ('FINALIZADO', 'Finalizado'), ('CANCELADO', 'Cancelado')], max_length=20, verbose_name='Status')),
+                ('pedidos', models.IntegerField(default=0, verbose_name='Pedidos')),
+                ('finalizados_com_tempo', models.IntegerField(default=0, verbose_name='Finalizados com Tempo')),
+                ('soma_tempo_util', models.FloatField(default=0, verbose_name='Soma do Tempo Útil (segundos)')),
+                ('vendedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metricas_diarias', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Métrica Diária por Vendedor',
+                'verbose_name_plural': 'Métricas Diárias por Vendedor',
+                'ordering': ['-data', 'vendedor', 'status'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='metricavendedordiaria',
+            constraint=models.UniqueConstraint(fields=('data', 'vendedor', 'status'), name='metrica_vendedor_dia_status_unica'),
+        ),
+        migrations.RunPython(preencher_metricas, migrations.RunPython.noop),
+    ]
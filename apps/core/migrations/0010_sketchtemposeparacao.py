@@ -0,0 +1,164 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:49
+
+import datetime
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+# Cópias do cálculo de tempo útil (apps.core.utils) e do formato do sketch
+# (apps.core.utils.quantis) na data desta migração: o código atual pode
+# mudar; a migração usa só os modelos históricos
+HORA_INICIO_PADRAO = datetime.time(7, 30)
+HORA_FIM_PADRAO = datetime.time(17, 0)
+DIAS_SEMANA_PADRAO = range(5)  # segunda a sexta
+
+ALFA = 0.01
+MAX_BUCKETS = 2048
+VALOR_MINIMO = 1e-3
+
+
+def _micro_do_dia(hora):
+    """Microssegundos desde a meia-noite"""
+    return ((hora.hour * 60 + hora.minute) * 60 + hora.second) * 10**6 + hora.microsecond
+
+
+def _carregar_calendario(apps):
+    """Janelas de expediente por dia da semana e feriados (modelos históricos)"""
+    CalendarioOperacional = apps.get_model('core', 'CalendarioOperacional')
+    Feriado = apps.get_model('core', 'Feriado')
+
+    dias = list(CalendarioOperacional.objects.all())
+    if dias:
+        janelas = {
+            dia.dia_semana: (_micro_do_dia(dia.hora_inicio), _micro_do_dia(dia.hora_fim))
+            for dia in dias
+            if dia.hora_fim > dia.hora_inicio
+        }
+    else:
+        janela = (_micro_do_dia(HORA_INICIO_PADRAO), _micro_do_dia(HORA_FIM_PADRAO))
+        janelas = {dia_semana: janela for dia_semana in DIAS_SEMANA_PADRAO}
+
+    return janelas, set(Feriado.objects.values_list('data', flat=True))
+
+
+def _tempo_util(inicio, fim, janelas, feriados):
+    """
+    Tempo útil (segundos) entre dois momentos, dia a dia, pelo horário de
+    parede dos próprios datetimes (mesma regra de apps.core.utils.calendario)
+    """
+    if timezone.is_naive(inicio):
+        inicio = timezone.make_aware(inicio)
+    if timezone.is_naive(fim):
+        fim = timezone.make_aware(fim)
+    if fim < inicio:
+        return 0.0
+
+    total = 0
+    dia = inicio.date()
+    while dia <= fim.date():
+        janela = None if dia in feriados else janelas.get(dia.weekday())
+        if janela:
+            de = _micro_do_dia(inicio.time()) if dia == inicio.date() else 0
+            ate = _micro_do_dia(fim.time()) if dia == fim.date() else janela[1]
+            total += max(min(ate, janela[1]) - max(de, janela[0]), 0)
+        dia += datetime.timedelta(days=1)
+    return total / 10**6
+
+
+def _sketch(valores):
+    """Sketch dos valores no formato de DDSketch.para_dict (alfa de 1%)"""
+    log_gama = math.log((1 + ALFA) / (1 - ALFA))
+    buckets = {}
+    zeros = 0
+    for valor in valores:
+        if valor <= VALOR_MINIMO:
+            zeros += 1
+            continue
+        indice = math.ceil(math.log(valor) / log_gama)
+        buckets[indice] = buckets.get(indice, 0) + 1
+        if len(buckets) > MAX_BUCKETS:
+            # Agrupa os menores buckets
+            indices = sorted(buckets)
+            excesso = len(indices) - MAX_BUCKETS
+            for menor in indices[:excesso]:
+                buckets[indices[excesso]] += buckets.pop(menor)
+
+    return {
+        'alfa': ALFA,
+        'zeros': zeros,
+        'contagem': len(valores),
+        'minimo': min(valores),
+        'maximo': max(valores),
+        'buckets': {str(indice): quantidade for indice, quantidade in buckets.items()},
+    }
+
+
+def preencher_sketches(apps, schema_editor):
+    """Preenche os sketches de tempo de separação com os pedidos finalizados existentes"""
+    Pedido = apps.get_model('core', 'Pedido')
+    ItemPedido = apps.get_model('core', 'ItemPedido')
+    SketchTempoSeparacao = apps.get_model('core', 'SketchTempoSeparacao')
+
+    finalizados = list(Pedido.objects.filter(
+        status='FINALIZADO',
+        data_finalizacao__isnull=False,
+        deletado=False
+    ).values_list('id', 'data_criacao', 'data_finalizacao'))
+    janelas, feriados = _carregar_calendario(apps)
+
+    separadores = {}
+    for pedido_id, separador_id in ItemPedido.objects.filter(
+        pedido__status='FINALIZADO',
+        separado_por__isnull=False
+    ).values_list('pedido_id', 'separado_por_id').distinct().order_by():
+        separadores.setdefault(pedido_id, []).append(separador_id)
+
+    tempos = {}
+    for pedido_id, criacao, finalizacao in finalizados:
+        segundos = _tempo_util(criacao, finalizacao, janelas, feriados)
+        data = timezone.localdate(finalizacao)
+        for separador_id in [None] + separadores.get(pedido_id, []):
+            tempos.setdefault((data, separador_id), []).append(segundos)
+
+    SketchTempoSeparacao.objects.bulk_create([
+        SketchTempoSeparacao(data=data, separador_id=separador_id, contagem=len(valores), sketch=_sketch(valores))
+        for (data, separador_id), valores in tempos.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_metricavendedordiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SketchTempoSeparacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data de Finalização')),
+                ('contagem', models.IntegerField(default=0, verbose_name='Pedidos')),
+                ('sketch', models.JSONField(default=dict, verbose_name='Sketch')),
+                ('separador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sketches_tempo_separacao', to=settings.AUTH_USER_MODEL, verbose_name='Separador')),
+            ],
+            options={
+                'verbose_name': 'Sketch de Tempo de Separação',
+                'verbose_name_plural': 'Sketches de Tempo de Separação',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sketchtemposeparacao',
+            constraint=models.UniqueConstraint(fields=('data', 'separador'), name='sketch_tempo_dia_separador_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='sketchtemposeparacao',
+            constraint=models.UniqueConstraint(condition=models.Q(('separador__isnull', True)), fields=('data',), name='sketch_tempo_dia_geral_unico'),
+        ),
+        migrations.RunPython(preencher_sketches, migrations.RunPython.noop),
+    ]
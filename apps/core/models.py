@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F, Q, Count
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -207,6 +208,17 @@ class Pedido(models.Model):
     )
     deletado_em = models.DateTimeField(null=True, blank=True, verbose_name='Deletado Em')
 
+    # Contadores desnormalizados dos itens
+    # Mantidos na mesma transação pelas ações de item (separar, comprar, etc).
+    # Divergências são corrigidas com: python manage.py reconciliar_contadores
+    total_itens = models.PositiveIntegerField(default=0, verbose_name='Total de Itens')
+    itens_separados = models.PositiveIntegerField(default=0, verbose_name='Itens Separados')
+    itens_substituidos = models.PositiveIntegerField(default=0, verbose_name='Itens Substituídos')
+    itens_em_compra = models.PositiveIntegerField(default=0, verbose_name='Itens em Compra')
+    itens_comprados = models.PositiveIntegerField(default=0, verbose_name='Itens Comprados')
+    itens_concluidos = models.PositiveIntegerField(default=0, verbose_name='Itens Concluídos')
+    separadores = models.JSONField(default=list, blank=True, verbose_name='Separadores')
+
     class Meta:
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
@@ -215,28 +227,135 @@ class Pedido(models.Model):
     def __str__(self):
         return f"Pedido {self.numero_orcamento} - {self.nome_cliente}"
 
-    def pode_ser_finalizado(self):
+    @property
+    def porcentagem_separacao(self):
+        """Porcentagem de itens separados (substituídos já contam como separados)"""
+        if not self.total_itens:
+            return 0
+        return round(self.itens_separados / self.total_itens * 100, 1)
+
+    def get_card_status_contadores(self):
         """
-        Verifica se o pedido pode ser finalizado.
-        Regra: Todos os itens devem estar (separado=True OU substituido=True)
-        E nenhum item pode estar em_compra=True
+        Mesmo resultado de get_card_status(), mas calculado a partir dos
+        contadores desnormalizados (sem consultar os itens).
+
+        Returns:
+            tuple: (status_code, status_display)
         """
-        itens = self.itens.all()
+        return ItemStateSummary.de_contadores(self).card_status
 
-        if not itens.exists():
-            return False, 'Pedido não possui itens'
+    def resumo_itens(self):
+        """
+        Resumo do estado dos itens (ItemStateSummary).
+        Usa os itens pré-carregados (prefetch_related('itens')) quando
+        disponíveis; caso contrário, uma única consulta agregada.
+        """
+        if 'itens' in getattr(self, '_prefetched_objects_cache', {}):
+            return ItemStateSummary.de_itens(self.itens.all())
+        return ItemStateSummary.de_consulta(self)
 
-        # Verifica se algum item está em compra
-        itens_em_compra = itens.filter(em_compra=True)
-        if itens_em_compra.exists():
-            return False, f'{itens_em_compra.count()} item(ns) ainda está(ão) em compra'
+    def aplicar_delta_contadores(self, delta, recalcular_separadores=False):
+        """
+        Aplica variações aos contadores do pedido com um único UPDATE atômico.
+        Deve ser chamado dentro da mesma transação que alterou os itens.
 
-        # Verifica se todos os itens estão separados ou substituídos
-        itens_pendentes = itens.filter(separado=False, substituido=False)
-        if itens_pendentes.exists():
-            return False, f'{itens_pendentes.count()} item(ns) não foi(ram) separado(s) ou substituído(s)'
+        Args:
+            delta: dict {campo_contador: variação} (ver delta_contadores)
+            recalcular_separadores: se True, recalcula a lista de separadores
+                (necessário quando o flag 'separado' de algum item mudou)
+        """
+        delta = {campo: valor for campo, valor in delta.items() if valor}
+        campos = {campo: F(campo) + valor for campo, valor in delta.items()}
 
-        return True, 'OK'
+        if recalcular_separadores:
+            self.separadores = self.calcular_separadores()
+            campos['separadores'] = self.separadores
+
+        if not campos:
+            return
+
+        Pedido.objects.filter(pk=self.pk).update(**campos)
+
+        # Manter a instância em memória coerente com o banco
+        for campo, valor in delta.items():
+            setattr(self, campo, getattr(self, campo) + valor)
+
+    def calcular_separadores(self):
+        """Nomes únicos (ordenados) dos usuários que separaram itens deste pedido"""
+        return sorted(set(
+            self.itens.filter(separado=True, separado_por__isnull=False)
+            .values_list('separado_por__nome', flat=True)
+        ))
+
+    @classmethod
+    def reconciliar_contadores(cls, queryset=None):
+        """
+        Recalcula os contadores a partir dos itens e corrige os pedidos divergentes.
+        Usa uma agregação condicional para todos os pedidos e uma consulta
+        para os separadores, independente da quantidade de pedidos.
+
+        Returns:
+            int - Quantidade de pedidos corrigidos
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+
+        reais = queryset.annotate(
+            real_total=Count('itens'),
+            real_separados=Count('itens', filter=Q(itens__separado=True)),
+            real_substituidos=Count('itens', filter=Q(itens__substituido=True)),
+            real_em_compra=Count('itens', filter=Q(itens__em_compra=True)),
+            real_comprados=Count('itens', filter=Q(itens__compra_realizada=True)),
+            real_concluidos=Count('itens', filter=(
+                Q(itens__separado=True) | Q(itens__substituido=True) | Q(itens__compra_realizada=True)
+            )),
+        )
+
+        separadores_por_pedido = {}
+        for pedido_id, nome in ItemPedido.objects.filter(
+            pedido__in=queryset,
+            separado=True,
+            separado_por__isnull=False
+        ).values_list('pedido_id', 'separado_por__nome').distinct():
+            separadores_por_pedido.setdefault(pedido_id, set()).add(nome)
+
+        campos = ['total_itens'] + list(CAMPOS_CONTADORES) + ['separadores']
+        corrigidos = []
+        for pedido in reais:
+            valores = {
+                'total_itens': pedido.real_total,
+                'itens_separados': pedido.real_separados,
+                'itens_substituidos': pedido.real_substituidos,
+                'itens_em_compra': pedido.real_em_compra,
+                'itens_comprados': pedido.real_comprados,
+                'itens_concluidos': pedido.real_concluidos,
+                'separadores': sorted(separadores_por_pedido.get(pedido.id, ())),
+            }
+            if any(getattr(pedido, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(pedido, campo, valor)
+                corrigidos.append(pedido)
+
+        if corrigidos:
+            cls.objects.bulk_update(corrigidos, campos, batch_size=500)
+
+            # bulk_update não dispara post_save: registrar alteração e invalidar
+            # o snapshot do dashboard manualmente
+            from apps.core.services.dashboard import registrar_alteracao
+            registrar_alteracao(*[pedido.id for pedido in corrigidos])
+
+        return len(corrigidos)
+
+    def pode_ser_finalizado(self):
+        """
+        Verifica se o pedido pode ser finalizado.
+        Regra: Todos os itens devem estar (separado=True OU substituido=True)
+        E nenhum item pode estar em_compra=True
+
+        Returns:
+            tuple: (pode_finalizar, motivo)
+        """
+        return self.resumo_itens().pode_ser_finalizado
 
     def get_card_status(self):
         """
@@ -250,42 +369,14 @@ class Pedido(models.Model):
         Returns:
             tuple: (status_code, status_display)
         """
-        itens = self.itens.all()
-
-        if not itens.exists():
-            return 'NAO_INICIADO', 'Não Iniciado'
-
-        total_itens = itens.count()
-
-        # Prioridade 1: Verifica se algum item está em compra
-        if itens.filter(em_compra=True).exists():
-            return 'AGUARDANDO_COMPRA', 'Aguardando Compra'
-
-        # Conta itens concluídos: separado OU substituído OU compra_realizada
-        from django.db.models import Q
-        itens_concluidos = itens.filter(
-            Q(separado=True) | Q(substituido=True) | Q(compra_realizada=True)
-        ).count()
-
-        # Prioridade 2: Verifica se está 100% concluído
-        if itens_concluidos == total_itens:
-            return 'CONCLUIDO', 'Concluído'
-
-        # Prioridade 3: Verifica se há algum progresso
-        if itens_concluidos > 0:
-            return 'EM_SEPARACAO', 'Em Separação'
-
-        # Prioridade 4: Nenhum progresso
-        return 'NAO_INICIADO', 'Não Iniciado'
-
+        return self.resumo_itens().card_status
 
     def get_card_status_css(self):
         """
         Retorna o card_status formatado para uso em classes CSS.
         Converte NAO_INICIADO -> nao-iniciado, EM_SEPARACAO -> em-separacao, etc.
         """
-        card_status_code, _ = self.get_card_status()
-        return card_status_code.lower().replace('_', '-')
+        return self.resumo_itens().card_status_css
 
 
 class Produto(models.Model):
@@ -385,6 +476,176 @@ class ItemPedido(models.Model):
         """Calcula o valor total do item"""
         return self.quantidade_solicitada * self.preco_unitario
 
+    def contribuicao_contadores(self):
+        """Quanto este item soma em cada contador desnormalizado do pedido"""
+        return {
+            'itens_separados': int(self.separado),
+            'itens_substituidos': int(self.substituido),
+            'itens_em_compra': int(self.em_compra),
+            'itens_comprados': int(self.compra_realizada),
+            'itens_concluidos': int(self.separado or self.substituido or self.compra_realizada),
+        }
+
+
+# Contadores de Pedido que dependem do estado de cada item
+CAMPOS_CONTADORES = (
+    'itens_separados',
+    'itens_substituidos',
+    'itens_em_compra',
+    'itens_comprados',
+    'itens_concluidos',
+)
+
+
+def delta_contadores(antes, depois):
+    """
+    Calcula a variação dos contadores entre dois estados de item.
+
+    Args:
+        antes: dict retornado por ItemPedido.contribuicao_contadores() antes da mudança
+        depois: dict retornado por ItemPedido.contribuicao_contadores() depois da mudança
+
+    Returns:
+        dict - {campo_contador: variação}
+    """
+    return {campo: depois[campo] - antes[campo] for campo in CAMPOS_CONTADORES}
+
+
+class ItemStateSummary:
+    """
+    Resumo do estado dos itens de um pedido: contagens, separadores,
+    card_status e se o pedido pode ser finalizado.
+
+    Construído em uma passada sobre itens já carregados (prefetch), com uma
+    única consulta agregada, ou a partir dos contadores desnormalizados.
+    Regras (mesmas de get_card_status/pode_ser_finalizado):
+    - concluído: separado OU substituído OU compra realizada
+    - pendente para finalizar: nem separado nem substituído
+    """
+
+    def __init__(self, total=0, separados=0, substituidos=0, em_compra=0,
+                 comprados=0, concluidos=0, pendentes=0, separadores=None):
+        self.total = total
+        self.separados = separados
+        self.substituidos = substituidos
+        self.em_compra = em_compra
+        self.comprados = comprados
+        self.concluidos = concluidos
+        self.pendentes = pendentes
+        self.separadores = separadores if separadores is not None else []
+
+    @classmethod
+    def de_itens(cls, itens):
+        """
+        Resumo em uma passada sobre itens já carregados (sem consultas extras
+        se separado_por tiver sido carregado via select_related/prefetch).
+        """
+        resumo = cls()
+        separadores = set()
+        for item in itens:
+            resumo.total += 1
+            resumo.separados += item.separado
+            resumo.substituidos += item.substituido
+            resumo.em_compra += item.em_compra
+            resumo.comprados += item.compra_realizada
+            if item.separado or item.substituido or item.compra_realizada:
+                resumo.concluidos += 1
+            if not (item.separado or item.substituido):
+                resumo.pendentes += 1
+            if item.separado and item.separado_por_id:
+                separadores.add(item.separado_por.nome)
+        resumo.separadores = sorted(separadores)
+        return resumo
+
+    @classmethod
+    def de_consulta(cls, pedido):
+        """Resumo com uma consulta agregada (separadores lidos da linha do pedido)"""
+        totais = ItemPedido.objects.filter(pedido_id=pedido.pk).aggregate(
+            total=Count('id'),
+            separados=Count('id', filter=Q(separado=True)),
+            substituidos=Count('id', filter=Q(substituido=True)),
+            em_compra=Count('id', filter=Q(em_compra=True)),
+            comprados=Count('id', filter=Q(compra_realizada=True)),
+            concluidos=Count('id', filter=Q(separado=True) | Q(substituido=True) | Q(compra_realizada=True)),
+            pendentes=Count('id', filter=Q(separado=False, substituido=False)),
+        )
+        return cls(separadores=list(pedido.separadores), **totais)
+
+    @classmethod
+    def de_contadores(cls, pedido):
+        """
+        Resumo a partir dos contadores desnormalizados (sem consultas).
+        Substituídos também são marcados como separados, então os pendentes
+        são total - separados.
+        """
+        return cls(
+            total=pedido.total_itens,
+            separados=pedido.itens_separados,
+            substituidos=pedido.itens_substituidos,
+            em_compra=pedido.itens_em_compra,
+            comprados=pedido.itens_comprados,
+            concluidos=pedido.itens_concluidos,
+            pendentes=pedido.total_itens - pedido.itens_separados,
+            separadores=list(pedido.separadores),
+        )
+
+    @property
+    def card_status(self):
+        """
+        Status do card. Prioridade:
+        1. AGUARDANDO_COMPRA - Se qualquer item está em compra
+        2. CONCLUIDO - Se 100% dos itens estão concluídos
+        3. EM_SEPARACAO - Se algum item foi concluído
+        4. NAO_INICIADO - Nenhum progresso ainda
+
+        Returns:
+            tuple: (status_code, status_display)
+        """
+        if not self.total:
+            return 'NAO_INICIADO', 'Não Iniciado'
+
+        if self.em_compra > 0:
+            return 'AGUARDANDO_COMPRA', 'Aguardando Compra'
+
+        if self.concluidos == self.total:
+            return 'CONCLUIDO', 'Concluído'
+
+        if self.concluidos > 0:
+            return 'EM_SEPARACAO', 'Em Separação'
+
+        return 'NAO_INICIADO', 'Não Iniciado'
+
+    @property
+    def card_status_css(self):
+        """card_status para classes CSS (NAO_INICIADO -> nao-iniciado)"""
+        return self.card_status[0].lower().replace('_', '-')
+
+    @property
+    def porcentagem_separacao(self):
+        """Porcentagem de itens separados (substituídos já contam como separados)"""
+        if not self.total:
+            return 0
+        return round(self.separados / self.total * 100, 1)
+
+    @property
+    def pode_ser_finalizado(self):
+        """
+        Regra: todos os itens separados ou substituídos e nenhum em compra.
+
+        Returns:
+            tuple: (pode_finalizar, motivo)
+        """
+        if not self.total:
+            return False, 'Pedido não possui itens'
+
+        if self.em_compra:
+            return False, f'{self.em_compra} item(ns) ainda está(ão) em compra'
+
+        if self.pendentes:
+            return False, f'{self.pendentes} item(ns) não foi(ram) separado(s) ou substituído(s)'
+
+        return True, 'OK'
+
 
 class LogAuditoria(models.Model):
     """Modelo de Log de Auditoria"""
@@ -452,3 +713,486 @@ class SistemaConfig(models.Model):
         """Carrega ou cria a configuração singleton"""
         obj, created = cls.objects.get_or_create(pk=1)
         return obj
+
+
+class AlteracaoPedido(models.Model):
+    """
+    Log de alterações dos cards do dashboard.
+    O id é a sequência monotônica usada pelo delta sync (/dashboard/refresh/?since=<seq>).
+    Gravado na mesma transação da alteração (ver apps.core.signals).
+    """
+
+    # Sem ForeignKey: o registro deve sobreviver à exclusão física do pedido
+    pedido_id = models.BigIntegerField(db_index=True, verbose_name='ID do Pedido')
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Criado em')
+
+    class Meta:
+        verbose_name = 'Alteração de Pedido'
+        verbose_name_plural = 'Alterações de Pedidos'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} - Pedido {self.pedido_id}"
+
+    @classmethod
+    def registrar(cls, *pedido_ids):
+        """Registra alteração dos pedidos informados (uma linha por pedido)"""
+        cls.objects.bulk_create([cls(pedido_id=pedido_id) for pedido_id in pedido_ids])
+
+    @classmethod
+    def limpar_antigas(cls, antes_de):
+        """
+        Remove registros anteriores a uma data, preservando sempre o mais recente
+        (mantém a sequência monotônica mesmo em bancos que reutilizam ids).
+
+        Returns:
+            int - Quantidade de registros removidos
+        """
+        ultimo_id = cls.objects.aggregate(ultimo=models.Max('id'))['ultimo']
+        if ultimo_id is None:
+            return 0
+        removidos, _ = cls.objects.filter(criado_em__lt=antes_de, id__lt=ultimo_id).delete()
+        return removidos
+
+
+class MetricaDiaria(models.Model):
+    """
+    Rollup diário das métricas do dashboard (uma linha por dia).
+    Atualizado de forma atômica (UPDATE com F()) ao confirmar, finalizar e
+    deletar pedidos; recalculado a partir do histórico pelo comando
+    recalcular_metricas_diarias.
+    """
+
+    data = models.DateField(primary_key=True, verbose_name='Data')
+    pedidos_criados = models.IntegerField(default=0, verbose_name='Pedidos Criados')
+    pedidos_em_aberto = models.IntegerField(default=0, verbose_name='Pedidos em Aberto')
+    pedidos_finalizados = models.IntegerField(default=0, verbose_name='Pedidos Finalizados')
+    soma_tempo_util = models.FloatField(default=0, verbose_name='Soma do Tempo Útil (segundos)')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Métrica Diária'
+        verbose_name_plural = 'Métricas Diárias'
+        ordering = ['-data']
+
+    def __str__(self):
+        return f"Métricas de {self.data:%d/%m/%Y}"
+
+    @property
+    def tempo_medio_separacao(self):
+        """Tempo útil médio dos pedidos finalizados no dia (timedelta ou None)"""
+        if not self.pedidos_finalizados:
+            return None
+        return timezone.timedelta(seconds=self.soma_tempo_util / self.pedidos_finalizados)
+
+    @staticmethod
+    def calcular(data):
+        """
+        Recalcula as métricas de um dia a partir do histórico de pedidos.
+        Pedidos em aberto = situação ao fim do dia (para hoje, a situação atual).
+
+        Returns:
+            dict - Valores dos campos do rollup
+        """
+        from apps.core.utils import calcular_tempo_util_lote
+
+        finalizados = calcular_tempo_util_lote(Pedido.objects.filter(
+            status='FINALIZADO',
+            data_finalizacao__date=data,
+            deletado=False
+        ).values_list('data_criacao', 'data_finalizacao'))
+        soma_tempo_util = sum(finalizados)
+
+        if data >= timezone.localdate():
+            em_aberto = Pedido.objects.filter(deletado=False).exclude(status__in=['FINALIZADO', 'CANCELADO'])
+        else:
+            # Criados até o dia e ainda não finalizados/deletados ao fim dele
+            em_aberto = Pedido.objects.filter(
+                data_criacao__date__lte=data
+            ).exclude(
+                status='CANCELADO'
+            ).exclude(
+                status='FINALIZADO', data_finalizacao__date__lte=data
+            ).exclude(
+                deletado=True, deletado_em__date__lte=data
+            )
+
+        return {
+            'pedidos_criados': Pedido.objects.filter(data_criacao__date=data, deletado=False).count(),
+            'pedidos_em_aberto': em_aberto.count(),
+            'pedidos_finalizados': len(finalizados),
+            'soma_tempo_util': soma_tempo_util,
+        }
+
+    @classmethod
+    def recalcular(cls, data):
+        """Recalcula e grava o rollup de um dia"""
+        metrica, _ = cls.objects.update_or_create(data=data, defaults=cls.calcular(data))
+        return metrica
+
+    @classmethod
+    def obter(cls, data=None):
+        """
+        Rollup do dia (consulta por chave primária).
+        Criado a partir do histórico na primeira leitura do dia.
+        """
+        data = data or timezone.localdate()
+        metrica = cls.objects.filter(data=data).first()
+        if metrica is None:
+            metrica, _ = cls._criar(data)
+        return metrica
+
+    @classmethod
+    def registrar(cls, data, **deltas):
+        """
+        Aplica variações ao rollup de um dia com um único UPDATE atômico.
+        Deve ser chamado após salvar a alteração do pedido, na mesma transação:
+        se a linha do dia ainda não existir, ela é criada a partir do histórico
+        (que já inclui a alteração) e as variações não são aplicadas.
+
+        Args:
+            data: date - Dia do rollup
+            **deltas: {campo: variação}
+        """
+        campos = {campo: F(campo) + valor for campo, valor in deltas.items() if valor}
+        if not campos:
+            return
+
+        if cls.objects.filter(data=data).update(**campos):
+            return
+
+        _, criado = cls._criar(data)
+        if not criado:
+            # Outra transação criou a linha ao mesmo tempo
+            cls.objects.filter(data=data).update(**campos)
+
+    @classmethod
+    def _criar(cls, data):
+        """
+        Cria a linha do dia a partir do histórico.
+
+        Returns:
+            tuple - (metrica, criado)
+        """
+        from django.db import IntegrityError, transaction
+
+        try:
+            with transaction.atomic():
+                return cls.objects.create(data=data, **cls.calcular(data)), True
+        except IntegrityError:
+            return cls.objects.get(data=data), False
+
+
+class CalendarioOperacional(models.Model):
+    """
+    Horário de expediente de um dia da semana (usado no cálculo de tempo útil).
+    Dias da semana sem registro não têm expediente.
+    Alterações recompilam o índice de tempo útil (ver apps.core.utils.calendario).
+    """
+
+    DIA_SEMANA_CHOICES = [
+        (0, 'Segunda-feira'),
+        (1, 'Terça-feira'),
+        (2, 'Quarta-feira'),
+        (3, 'Quinta-feira'),
+        (4, 'Sexta-feira'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+
+    dia_semana = models.PositiveSmallIntegerField(
+        choices=DIA_SEMANA_CHOICES,
+        unique=True,
+        verbose_name='Dia da Semana'
+    )
+    hora_inicio = models.TimeField(verbose_name='Início do Expediente')
+    hora_fim = models.TimeField(verbose_name='Fim do Expediente')
+
+    class Meta:
+        verbose_name = 'Calendário Operacional'
+        verbose_name_plural = 'Calendário Operacional'
+        ordering = ['dia_semana']
+
+    def __str__(self):
+        return f"{self.get_dia_semana_display()}: {self.hora_inicio:%H:%M} - {self.hora_fim:%H:%M}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.hora_inicio and self.hora_fim and self.hora_fim <= self.hora_inicio:
+            raise ValidationError('O fim do expediente deve ser depois do início.')
+
+
+class Feriado(models.Model):
+    """Dia sem expediente (não conta no tempo útil)"""
+
+    data = models.DateField(unique=True, verbose_name='Data')
+    descricao = models.CharField(max_length=200, blank=True, verbose_name='Descrição')
+
+    class Meta:
+        verbose_name = 'Feriado'
+        verbose_name_plural = 'Feriados'
+        ordering = ['data']
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} - {self.descricao}" if self.descricao else f"{self.data:%d/%m/%Y}"
+
+
+class MetricaVendedorDiaria(models.Model):
+    """
+    Rollup de pedidos por dia de criação, vendedor e status (pedidos não deletados).
+    Base de calcular_metricas_periodo: qualquer período é respondido somando
+    no máximo uma linha por (dia, vendedor, status).
+
+    Mantido pelos sinais de Pedido (recalcula o par dia/vendedor afetado) e
+    reconstruído pelo comando preencher_metricas_periodo.
+    """
+
+    data = models.DateField(verbose_name='Data de Criação')
+    vendedor = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='metricas_diarias',
+        verbose_name='Vendedor'
+    )
+    status = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES, verbose_name='Status')
+    pedidos = models.IntegerField(default=0, verbose_name='Pedidos')
+    finalizados_com_tempo = models.IntegerField(default=0, verbose_name='Finalizados com Tempo')
+    soma_tempo_util = models.FloatField(default=0, verbose_name='Soma do Tempo Útil (segundos)')
+
+    class Meta:
+        verbose_name = 'Métrica Diária por Vendedor'
+        verbose_name_plural = 'Métricas Diárias por Vendedor'
+        ordering = ['-data', 'vendedor', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'vendedor', 'status'], name='metrica_vendedor_dia_status_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} - {self.vendedor_id} - {self.status}: {self.pedidos}"
+
+    @classmethod
+    def montar(cls, pedidos):
+        """
+        Monta as linhas (não salvas) a partir de um queryset de pedidos.
+        Uma consulta para as contagens e uma para os tempos dos finalizados.
+        """
+        from django.db.models.functions import TruncDate
+        from apps.core.utils import calcular_tempo_util_lote
+
+        pedidos = pedidos.filter(deletado=False).annotate(dia=TruncDate('data_criacao'))
+
+        linhas = {}
+        for valores in pedidos.values('dia', 'vendedor_id', 'status').annotate(total=Count('id')).order_by():
+            chave = (valores['dia'], valores['vendedor_id'], valores['status'])
+            linhas[chave] = cls(
+                data=valores['dia'],
+                vendedor_id=valores['vendedor_id'],
+                status=valores['status'],
+                pedidos=valores['total']
+            )
+
+        finalizados = list(pedidos.filter(
+            status='FINALIZADO',
+            data_finalizacao__isnull=False
+        ).values_list('dia', 'vendedor_id', 'data_criacao', 'data_finalizacao'))
+        tempos = calcular_tempo_util_lote((criacao, finalizacao) for _, _, criacao, finalizacao in finalizados)
+        for (dia, vendedor_id, _, _), segundos in zip(finalizados, tempos):
+            linha = linhas[(dia, vendedor_id, 'FINALIZADO')]
+            linha.finalizados_com_tempo += 1
+            linha.soma_tempo_util += segundos
+
+        return list(linhas.values())
+
+    @classmethod
+    def recalcular(cls, data, vendedor_id):
+        """Recalcula as linhas de um dia/vendedor (chamado na transação que alterou o pedido)"""
+        cls.objects.filter(data=data, vendedor_id=vendedor_id).delete()
+        cls.objects.bulk_create(cls.montar(
+            Pedido.objects.filter(data_criacao__date=data, vendedor_id=vendedor_id)
+        ))
+
+    @classmethod
+    def reconstruir(cls, data_inicio=None, data_fim=None):
+        """
+        Reconstrói o rollup a partir do histórico (todo o período por padrão).
+
+        Returns:
+            int - Quantidade de linhas gravadas
+        """
+        pedidos = Pedido.objects.all()
+        existentes = cls.objects.all()
+        if data_inicio:
+            pedidos = pedidos.filter(data_criacao__date__gte=data_inicio)
+            existentes = existentes.filter(data__gte=data_inicio)
+        if data_fim:
+            pedidos = pedidos.filter(data_criacao__date__lte=data_fim)
+            existentes = existentes.filter(data__lte=data_fim)
+
+        existentes.delete()
+        return len(cls.objects.bulk_create(cls.montar(pedidos), batch_size=500))
+
+
+class SketchTempoSeparacao(models.Model):
+    """
+    Distribuição do tempo útil de separação dos pedidos finalizados em um dia,
+    guardada como sketch de quantis (apps.core.utils.quantis.DDSketch).
+    Uma linha geral por dia (separador nulo) e uma por separador que separou
+    itens do pedido. Percentis de qualquer período são obtidos mesclando as
+    linhas dos dias, com memória limitada pela quantidade de buckets.
+
+    Atualizado ao finalizar/deletar pedidos e reconstruído pelo comando
+    preencher_metricas_periodo.
+    """
+
+    data = models.DateField(verbose_name='Data de Finalização')
+    separador = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='sketches_tempo_separacao',
+        verbose_name='Separador'
+    )
+    contagem = models.IntegerField(default=0, verbose_name='Pedidos')
+    sketch = models.JSONField(default=dict, verbose_name='Sketch')
+
+    class Meta:
+        verbose_name = 'Sketch de Tempo de Separação'
+        verbose_name_plural = 'Sketches de Tempo de Separação'
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'separador'], name='sketch_tempo_dia_separador_unico'),
+            models.UniqueConstraint(
+                fields=['data'],
+                condition=Q(separador__isnull=True),
+                name='sketch_tempo_dia_geral_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} - {self.separador_id or 'geral'}: {self.contagem}"
+
+    def obter_sketch(self):
+        from apps.core.utils.quantis import DDSketch
+        return DDSketch.de_dict(self.sketch)
+
+    @classmethod
+    def registrar(cls, pedido, segundos, remover=False):
+        """
+        Adiciona (ou remove, ao deletar) o tempo de um pedido finalizado nos
+        sketches do dia da finalização: linha geral e uma por separador.
+        Linhas bloqueadas com SELECT FOR UPDATE na transação corrente.
+
+        Args:
+            pedido: Pedido finalizado
+            segundos: float - Tempo útil de separação
+            remover: bool - Remove o valor em vez de adicionar
+        """
+        from django.db import transaction
+
+        data = timezone.localdate(pedido.data_finalizacao)
+        separador_ids = list(
+            ItemPedido.objects.filter(
+                pedido=pedido,
+                separado_por__isnull=False
+            ).values_list('separado_por_id', flat=True).distinct().order_by('separado_por_id')
+        )
+
+        with transaction.atomic():
+            for separador_id in [None] + separador_ids:
+                linha, _ = cls.objects.select_for_update().get_or_create(data=data, separador_id=separador_id)
+                sketch = linha.obter_sketch()
+                if remover:
+                    sketch.remover(segundos)
+                else:
+                    sketch.adicionar(segundos)
+                linha.contagem = sketch.contagem
+                linha.sketch = sketch.para_dict()
+                linha.save(update_fields=['contagem', 'sketch'])
+
+    @classmethod
+    def mesclar_periodo(cls, data_inicio, data_fim):
+        """Sketch geral do período (uma consulta)"""
+        from apps.core.utils.quantis import DDSketch
+
+        mesclado = DDSketch()
+        for dados in cls.objects.filter(
+            data__gte=data_inicio,
+            data__lte=data_fim,
+            separador__isnull=True
+        ).values_list('sketch', flat=True):
+            mesclado.mesclar(DDSketch.de_dict(dados))
+        return mesclado
+
+    @classmethod
+    def mesclar_por_separador(cls, data_inicio, data_fim):
+        """
+        Sketch de cada separador no período (uma consulta).
+
+        Returns:
+            dict - {Usuario: DDSketch}
+        """
+        from apps.core.utils.quantis import DDSketch
+
+        sketches = {}
+        for linha in cls.objects.filter(
+            data__gte=data_inicio,
+            data__lte=data_fim,
+            separador__isnull=False
+        ).select_related('separador'):
+            sketches.setdefault(linha.separador, DDSketch()).mesclar(linha.obter_sketch())
+        return sketches
+
+    @classmethod
+    def montar(cls, pedidos):
+        """
+        Monta as linhas (não salvas) a partir de um queryset de pedidos.
+        Uma consulta para os finalizados e uma para os separadores.
+        """
+        from apps.core.utils import calcular_tempo_util_lote
+        from apps.core.utils.quantis import DDSketch
+
+        finalizados = list(pedidos.filter(
+            status='FINALIZADO',
+            data_finalizacao__isnull=False,
+            deletado=False
+        ).values_list('id', 'data_criacao', 'data_finalizacao'))
+        tempos = calcular_tempo_util_lote((criacao, finalizacao) for _, criacao, finalizacao in finalizados)
+
+        separadores = {}
+        for pedido_id, separador_id in ItemPedido.objects.filter(
+            pedido_id__in=[pedido_id for pedido_id, _, _ in finalizados],
+            separado_por__isnull=False
+        ).values_list('pedido_id', 'separado_por_id').distinct().order_by():
+            separadores.setdefault(pedido_id, []).append(separador_id)
+
+        sketches = {}
+        for (pedido_id, _, finalizacao), segundos in zip(finalizados, tempos):
+            data = timezone.localdate(finalizacao)
+            for separador_id in [None] + separadores.get(pedido_id, []):
+                sketches.setdefault((data, separador_id), DDSketch()).adicionar(segundos)
+
+        return [
+            cls(data=data, separador_id=separador_id, contagem=sketch.contagem, sketch=sketch.para_dict())
+            for (data, separador_id), sketch in sketches.items()
+        ]
+
+    @classmethod
+    def reconstruir(cls, data_inicio=None, data_fim=None):
+        """
+        Reconstrói os sketches a partir do histórico (todo o período por padrão).
+
+        Returns:
+            int - Quantidade de linhas gravadas
+        """
+        pedidos = Pedido.objects.all()
+        existentes = cls.objects.all()
+        if data_inicio:
+            pedidos = pedidos.filter(data_finalizacao__date__gte=data_inicio)
+            existentes = existentes.filter(data__gte=data_inicio)
+        if data_fim:
+            pedidos = pedidos.filter(data_finalizacao__date__lte=data_fim)
+            existentes = existentes.filter(data__lte=data_fim)
+
+        existentes.delete()
+        return len(cls.objects.bulk_create(cls.montar(pedidos), batch_size=500))
@@ -5,7 +5,10 @@ from django.urls import path
 from apps.core import consumers
 
 websocket_urlpatterns = [
-    path('ws/dashboard/', consumers.DashboardConsumer.as_asgi()),
+    # Conexão única com assinatura de tópicos
+    path('ws/', consumers.TopicosConsumer.as_asgi()),
+    # URLs por tela (abas abertas antes do /ws/). O dashboard usa só o /ws/,
+    # onde as assinaturas aceitam filtros.
     path('ws/pedido/<int:pedido_id>/', consumers.PedidoDetalheConsumer.as_asgi()),
     path('ws/painel-compras/', consumers.PainelComprasConsumer.as_asgi()),
 ]
@@ -0,0 +1,3 @@
+"""
+Serviços de domínio do app core
+"""
@@ -0,0 +1,198 @@
+"""
+Envio de eventos WebSocket pelo channel layer.
+
+enviar (corrotina) e broadcast_to_websocket (versão síncrona) enviam um
+evento para um group. O frame enviado aos clientes é codificado uma única
+vez, aqui, e viaja pronto na mensagem do channel layer (type 'evento'): os
+consumers só o repassam, então o custo de CPU do fan-out não cresce com o
+número de conexões. Cada frame leva o número de sequência do group e fica
+no histórico para retomada (apps.core.services.retomada). Mensagens do
+dashboard levam também um índice dos pedidos de cada evento, usado pelas
+assinaturas filtradas sem decodificar o frame. agrupar_eventos reduz
+os eventos de uma operação a no máximo uma mensagem por group: eventos do
+mesmo group são agregados em um 'eventos_lote', que consumers e páginas
+desmontam e processam um a um. As views publicam pelo outbox
+(apps.core.services.outbox), que envia após o commit.
+"""
+import json
+import logging
+import re
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from apps.core.services import retomada
+
+
+logger = logging.getLogger(__name__)
+
+TIPO_LOTE = 'eventos_lote'
+
+# Mensagem do channel layer com o frame pronto (handler 'evento' dos consumers)
+TIPO_EVENTO = 'evento'
+
+# Tópicos do WebSocket multiplexado (/ws/) e os groups do channel layer
+TOPICOS_FIXOS = {
+    'dashboard': 'dashboard',
+    'painel_compras': 'painel_compras',
+}
+PADRAO_TOPICO_PEDIDO = re.compile(r'^pedido:(\d+)$')
+PADRAO_GRUPO_PEDIDO = re.compile(r'^pedido_(\d+)$')
+
+# Groups com assinaturas filtradas (FiltroDashboard)
+GRUPOS_FILTRAVEIS = ('dashboard',)
+
+
+def grupo_do_topico(topico):
+    """
+    Returns:
+        str - group do channel layer do tópico ('pedido:12' -> 'pedido_12'),
+        ou None se o tópico não existir
+    """
+    if topico in TOPICOS_FIXOS:
+        return TOPICOS_FIXOS[topico]
+    encontrado = PADRAO_TOPICO_PEDIDO.match(str(topico))
+    if encontrado:
+        return f'pedido_{int(encontrado.group(1))}'
+    return None
+
+
+def topico_do_grupo(grupo):
+    """Inverso de grupo_do_topico"""
+    for topico, nome in TOPICOS_FIXOS.items():
+        if nome == grupo:
+            return topico
+    encontrado = PADRAO_GRUPO_PEDIDO.match(str(grupo))
+    if encontrado:
+        return f'pedido:{encontrado.group(1)}'
+    return None
+
+
+def codificar(group_name, message_type, data, seq=None):
+    """
+    Returns:
+        str - Frame JSON do evento como o cliente recebe: type, dados, o
+        tópico de origem e o número de sequência no group
+    """
+    frame = {"type": message_type}
+    frame.update(data)
+    frame["topic"] = topico_do_grupo(group_name)
+    if seq is not None:
+        frame["seq"] = seq
+    return json.dumps(frame)
+
+
+def resumo_pedido(evento):
+    """
+    Returns:
+        dict - Campos do pedido de um evento usados pelos filtros: o card
+        resumido ({'id', 'vendedor_id', 'status', 'logistica'}), só
+        {'id'} para eventos com pedido_id, ou None se não for de um pedido
+    """
+    pedido = evento.get('pedido')
+    if isinstance(pedido, dict) and 'id' in pedido:
+        return {
+            'id': pedido['id'],
+            'vendedor_id': pedido.get('vendedor_id'),
+            'status': pedido.get('status'),
+            'logistica': pedido.get('logistica'),
+        }
+    if 'pedido_id' in evento:
+        return {'id': evento['pedido_id']}
+    return None
+
+
+def indice_pedidos(message_type, data):
+    """
+    Returns:
+        list - resumo_pedido de cada evento da mensagem (um por evento de um
+        'eventos_lote')
+    """
+    if message_type == TIPO_LOTE:
+        return [resumo_pedido(evento) for evento in data['eventos']]
+    return [resumo_pedido(data)]
+
+
+async def enviar(group_name, message_type, data):
+    """
+    Envia um evento para um group aguardando o channel layer diretamente,
+    sem passar por async_to_sync (usado pelo despachante do outbox, que
+    mantém um event loop próprio).
+
+    Args:
+        group_name: The channel group name to broadcast to
+        message_type: The type of message (e.g., 'item_separado', 'item_em_compra')
+        data: Dictionary with data to send
+
+    Returns:
+        True if broadcast was successful, False otherwise
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer:
+        indice = indice_pedidos(message_type, data) if group_name in GRUPOS_FILTRAVEIS else None
+        try:
+            seq, frame = retomada.registrar(group_name, partial(codificar, group_name, message_type, data), indice)
+        except Exception as e:
+            # Sem cache o evento segue sem número (não pode ser retomado)
+            logger.warning(f"[WebSocket] Histórico indisponível: {e} (group: {group_name})")
+            seq, frame = None, codificar(group_name, message_type, data)
+        try:
+            # 'group' e 'seq' permitem ao consumer multiplexado (/ws/)
+            # descartar mensagens de um tópico cancelado ou já retomadas
+            message = {
+                "type": TIPO_EVENTO,
+                "group": group_name,
+                "seq": seq,
+                "frame": frame,
+                "pedidos": indice,
+            }
+            await channel_layer.group_send(group_name, message)
+            logger.debug(f"[WebSocket] Broadcast sent: {message_type} to {group_name}")
+            return True
+        except Exception as e:
+            logger.error(f"[WebSocket] Broadcast failed: {e} (type: {message_type}, group: {group_name})")
+            if seq is not None:
+                retomada.descartar(group_name, seq)
+            return False
+    else:
+        logger.warning(f"[WebSocket] channel_layer is None - broadcast failed for {group_name}")
+        return False
+
+
+def broadcast_to_websocket(group_name, message_type, data):
+    """
+    Helper function for WebSocket broadcasts with error handling (versão
+    síncrona de enviar)
+
+    Returns:
+        True if broadcast was successful, False otherwise
+    """
+    return async_to_sync(enviar)(group_name, message_type, data)
+
+
+def agrupar_eventos(eventos):
+    """
+    Agrupa eventos por group, mantendo a ordem, removendo duplicados e
+    agregando os eventos de um mesmo group em um único 'eventos_lote'.
+
+    Args:
+        eventos: iterável de (group, dict com 'type' e dados)
+
+    Returns:
+        list - [(group, mensagem)], uma mensagem por group
+    """
+    por_grupo = {}
+    for grupo, evento in eventos:
+        lista = por_grupo.setdefault(grupo, [])
+        if evento not in lista:
+            lista.append(evento)
+
+    mensagens = []
+    for grupo, lista in por_grupo.items():
+        if len(lista) == 1:
+            mensagens.append((grupo, lista[0]))
+        else:
+            mensagens.append((grupo, {'type': TIPO_LOTE, 'eventos': lista}))
+    return mensagens
+
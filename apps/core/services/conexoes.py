@@ -0,0 +1,63 @@
+"""
+Conexões WebSocket abertas por usuário.
+
+Cada usuário pode manter até WEBSOCKET_CONEXOES_POR_USUARIO conexões (abas);
+ao abrir mais uma, a mais antiga é encerrada pelo consumer. A lista fica no
+cache do Django (Redis em produção) para valer entre os workers, na ordem
+em que as conexões foram abertas.
+
+O controle é de melhor esforço: duas abas abertas no mesmo instante podem
+exceder o limite por uma conexão até a próxima abertura, e conexões de um
+worker que caiu sem desconectar saem da lista ao serem as mais antigas.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+PREFIXO = 'ws:conexoes:'
+TTL = 60 * 60 * 24
+
+
+def limite():
+    return getattr(settings, 'WEBSOCKET_CONEXOES_POR_USUARIO', 5)
+
+
+def _chave(usuario_id):
+    return f'{PREFIXO}{usuario_id}'
+
+
+def registrar(usuario_id, canal):
+    """
+    Registra uma conexão do usuário.
+
+    Args:
+        usuario_id: id do Usuario
+        canal: channel_name da conexão
+
+    Returns:
+        list - channel_names excedentes (mais antigos primeiro), a encerrar
+    """
+    chave = _chave(usuario_id)
+    canais = [existente for existente in cache.get(chave, []) if existente != canal]
+    canais.append(canal)
+    maximo = max(limite(), 1)
+    excedentes, canais = canais[:-maximo], canais[-maximo:]
+    cache.set(chave, canais, TTL)
+    return excedentes
+
+
+def remover(usuario_id, canal):
+    """Remove uma conexão encerrada"""
+    chave = _chave(usuario_id)
+    canais = cache.get(chave, [])
+    if canal in canais:
+        canais.remove(canal)
+        if canais:
+            cache.set(chave, canais, TTL)
+        else:
+            cache.delete(chave)
+
+
+def abertas(usuario_id):
+    """Conexões registradas do usuário (mais antigas primeiro)"""
+    return cache.get(_chave(usuario_id), [])
@@ -0,0 +1,376 @@
+"""
+Snapshot dos cards do dashboard.
+
+Fonte única dos dados de card usados pela página do dashboard, pelo
+refresh AJAX (/dashboard/refresh/) e pelos payloads WebSocket.
+Todos os campos vêm da linha do Pedido (contadores desnormalizados) e do
+vendedor via JOIN, então o snapshot custa uma consulta independente da
+quantidade de pedidos abertos.
+
+Versionamento: qualquer alteração em Pedido/ItemPedido incrementa uma
+versão global no cache (ver apps.core.signals). O snapshot serializado é
+guardado sob essa versão, então em períodos sem alterações o refresh custa
+apenas a leitura da versão.
+
+Delta sync: cada transação que altera um pedido grava uma linha em
+AlteracaoPedido por pedido, cujo id é uma sequência monotônica. Com
+?since=<seq> o refresh devolve apenas os cards alterados e os ids removidos
+desde aquela sequência.
+
+Assinaturas filtradas: FiltroDashboard (vendedor, status, logística) decide
+no servidor quais eventos do tópico 'dashboard' chegam a cada conexão.
+"""
+import json
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from apps.core.models import Pedido, AlteracaoPedido, ItemStateSummary
+
+
+STATUS_INATIVOS = ['FINALIZADO', 'CANCELADO']
+
+CHAVE_VERSAO = 'dashboard:versao'
+CHAVE_SNAPSHOT = 'dashboard:snapshot:{versao}'
+SNAPSHOT_TIMEOUT = 300  # segundos; versões antigas simplesmente expiram
+
+# Sequências são alocadas no INSERT, mas confirmadas na ordem de commit: uma
+# transação pode confirmar um id menor que o 'since' que o cliente já recebeu.
+# O delta reenvia as alterações gravadas até JANELA_REENVIO antes da
+# alteração 'since' (maior que a duração de qualquer transação), em vez de um
+# número fixo de ids. Reenviar um card é inofensivo.
+JANELA_REENVIO = timedelta(minutes=5)
+
+LOGISTICA_NAO_DEFINIDA = "Não definida"
+
+
+def pedidos_ativos():
+    """
+    Queryset dos pedidos exibidos no dashboard (não finalizados e não deletados).
+
+    Returns:
+        QuerySet - Pedidos com vendedor carregado via select_related
+    """
+    return Pedido.objects.filter(
+        deletado=False
+    ).exclude(
+        status__in=STATUS_INATIVOS
+    ).select_related('vendedor')
+
+
+def montar_card(pedido):
+    """
+    Monta o dicionário de um card do dashboard.
+    Não executa consultas se pedido.vendedor já estiver carregado.
+
+    Args:
+        pedido: Pedido
+
+    Returns:
+        dict - Campos do card (mesmas chaves para template, AJAX e WebSocket)
+    """
+    resumo = ItemStateSummary.de_contadores(pedido)
+    card_status_code, card_status_display = resumo.card_status
+    data_criacao = timezone.localtime(pedido.data_criacao)
+
+    return {
+        'id': pedido.id,
+        'numero_orcamento': pedido.numero_orcamento,
+        'cliente': pedido.nome_cliente,
+        'vendedor': pedido.vendedor.nome,
+        'vendedor_id': pedido.vendedor_id,
+        'status': pedido.status,
+        'status_display': pedido.get_status_display(),
+        'card_status': card_status_code,
+        'card_status_display': card_status_display,
+        'card_status_css': resumo.card_status_css,
+        'data': pedido.data.strftime('%d/%m/%Y'),
+        'data_criacao': data_criacao.strftime('%d/%m/%Y %H:%M'),
+        'data_criacao_timestamp': pedido.data_criacao.timestamp(),
+        'criado_em': pedido.data_criacao.isoformat(),
+        'logistica': pedido.get_logistica_display() if pedido.logistica else LOGISTICA_NAO_DEFINIDA,
+        'embalagem': pedido.get_embalagem_display() if pedido.embalagem else "Embalagem padrão",
+        'total_itens': pedido.total_itens,
+        'itens_separados': pedido.itens_separados,
+        'porcentagem_separacao': resumo.porcentagem_separacao,
+        'separadores': pedido.separadores,
+    }
+
+
+def montar_snapshot(pedidos=None):
+    """
+    Monta os cards de todos os pedidos ativos em uma única consulta.
+
+    Args:
+        pedidos: QuerySet opcional (padrão: pedidos_ativos())
+
+    Returns:
+        list - Cards ordenados por data de criação (mais recentes primeiro)
+    """
+    if pedidos is None:
+        pedidos = pedidos_ativos()
+
+    return [montar_card(pedido) for pedido in pedidos.order_by('-data_criacao')]
+
+
+def _versao_inicial():
+    """
+    Valor inicial da versão (milissegundos atuais).
+    Evita reutilizar um ETag antigo se o cache for reiniciado.
+    """
+    return int(time.time() * 1000)
+
+
+def versao_atual():
+    """
+    Versão global do dashboard.
+
+    Returns:
+        int - Versão atual (criada se ainda não existir no cache)
+    """
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, _versao_inicial(), timeout=None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def incrementar_versao():
+    """
+    Incrementa a versão global, invalidando o snapshot em cache.
+    Chamar somente após o commit (transaction.on_commit), para que nenhum
+    leitor guarde dados antigos sob a versão nova.
+
+    Returns:
+        int - Nova versão
+    """
+    try:
+        return cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        # Chave ausente (cache reiniciado ou expirado)
+        cache.add(CHAVE_VERSAO, _versao_inicial(), timeout=None)
+        return cache.incr(CHAVE_VERSAO)
+
+
+def _registrados_na_transacao():
+    """
+    Pedidos já registrados no bloco atômico atual (None fora de transação).
+
+    O conjunto fica na conexão junto com o callback on_commit de incremento
+    da versão, registrado uma vez por bloco: se o callback já executou ou não
+    está mais pendente no mesmo savepoint (commit, rollback ou outro bloco),
+    começa um conjunto novo.
+    """
+    conexao = transaction.get_connection()
+    if not conexao.in_atomic_block:
+        return None
+
+    savepoints = set(conexao.savepoint_ids)
+    estado = getattr(conexao, 'alteracoes_dashboard', None)
+    if estado is not None and any(
+        callback is estado[0] and sids == savepoints for sids, callback, *_ in conexao.run_on_commit
+    ):
+        return estado[1]
+
+    def incrementar():
+        if getattr(conexao, 'alteracoes_dashboard', None) is estado_novo:
+            conexao.alteracoes_dashboard = None
+        incrementar_versao()
+
+    estado_novo = conexao.alteracoes_dashboard = (incrementar, set())
+    transaction.on_commit(incrementar)
+    return conexao.alteracoes_dashboard[1]
+
+
+def registrar_alteracao(*pedido_ids):
+    """
+    Registra alteração dos cards no log (mesma transação) e incrementa a
+    versão do dashboard após o commit. Usado pelos sinais e por quem altera
+    pedidos/itens com UPDATE (que não dispara sinais).
+
+    Grava uma linha por pedido por transação: salvar um pedido e todos os
+    seus itens na mesma transação aloca uma única sequência.
+    """
+    registrados = _registrados_na_transacao()
+    if registrados is None:
+        AlteracaoPedido.registrar(*pedido_ids)
+        incrementar_versao()
+        return
+
+    novos = [pedido_id for pedido_id in dict.fromkeys(pedido_ids) if pedido_id not in registrados]
+    if novos:
+        AlteracaoPedido.registrar(*novos)
+        registrados.update(novos)
+
+
+def obter_snapshot_serializado():
+    """
+    Snapshot em JSON para a versão atual, montado no máximo uma vez por versão.
+    A versão é lida antes de montar: se houver alteração durante a montagem,
+    o conteúdo guardado é no mínimo tão novo quanto a versão.
+
+    Returns:
+        tuple - (versao, corpo JSON em str)
+    """
+    versao = versao_atual()
+    chave = CHAVE_SNAPSHOT.format(versao=versao)
+
+    corpo = cache.get(chave)
+    if corpo is None:
+        # Sequência lida antes dos cards: o cliente pode receber de novo uma
+        # alteração já incluída, mas nunca perde uma
+        seq = limites_sequencia()[1]
+        corpo = json.dumps(
+            {'versao': versao, 'seq': seq, 'completo': True, 'pedidos': montar_snapshot()},
+            cls=DjangoJSONEncoder
+        )
+        cache.set(chave, corpo, SNAPSHOT_TIMEOUT)
+
+    return versao, corpo
+
+
+def etag_snapshot(versao):
+    """ETag (forte) correspondente a uma versão do snapshot"""
+    return f'"dashboard-{versao}"'
+
+
+def limites_sequencia():
+    """
+    Menor e maior sequência disponíveis no log de alterações.
+
+    Returns:
+        tuple - (menor, maior); (None, 0) se o log estiver vazio
+    """
+    limites = AlteracaoPedido.objects.aggregate(menor=Min('id'), maior=Max('id'))
+    return limites['menor'], limites['maior'] or 0
+
+
+def montar_delta(desde):
+    """
+    Cards alterados e pedidos removidos do dashboard desde uma sequência.
+
+    Args:
+        desde: int - Última sequência conhecida pelo cliente
+
+    Returns:
+        dict - {'seq', 'completo': False, 'pedidos', 'removidos'}, ou None se
+        a sequência for antiga demais (log já limpo) ou desconhecida, caso em
+        que o cliente deve receber o snapshot completo
+    """
+    menor, seq = limites_sequencia()
+
+    if desde > seq:
+        # Cliente à frente do servidor (banco recriado)
+        return None
+    if menor is not None and desde < menor - 1:
+        # Parte do intervalo já foi removida do log
+        return None
+
+    # Momento da alteração 'since' (ou da última anterior ainda no log)
+    referencia = AlteracaoPedido.objects.filter(id__lte=desde).order_by('-id').values_list('criado_em', flat=True).first()
+    intervalo = Q(id__gt=desde)
+    if referencia is not None:
+        intervalo |= Q(criado_em__gt=referencia - JANELA_REENVIO)
+
+    alterados = set(
+        AlteracaoPedido.objects.filter(
+            intervalo,
+            id__lte=seq
+        ).values_list('pedido_id', flat=True).distinct()
+    )
+
+    pedidos = []
+    if alterados:
+        pedidos = montar_snapshot(pedidos_ativos().filter(id__in=alterados))
+
+    ativos = {card['id'] for card in pedidos}
+
+    return {
+        'seq': seq,
+        'completo': False,
+        'pedidos': pedidos,
+        'removidos': sorted(alterados - ativos),
+    }
+
+
+class FiltroDashboard:
+    """
+    Filtro de uma assinatura do dashboard. Cada critério é opcional.
+
+    Args:
+        vendedor_id: int - só pedidos deste vendedor
+        status: set - códigos de status aceitos (Pedido.STATUS_CHOICES)
+        logistica: set - códigos de logística aceitos ('' = não definida)
+    """
+
+    def __init__(self, vendedor_id=None, status=None, logistica=None):
+        self.vendedor_id = vendedor_id
+        self.status = status
+        self.logistica = logistica
+        # Cards trazem o rótulo da logística, não o código
+        rotulos = dict(Pedido.LOGISTICA_CHOICES)
+        self.rotulos_logistica = None if logistica is None else {
+            rotulos.get(codigo, LOGISTICA_NAO_DEFINIDA) for codigo in logistica
+        }
+
+    @classmethod
+    def de_dados(cls, dados):
+        """
+        Constrói o filtro a partir do JSON do subscribe
+        ({"vendedor_id": 3, "status": [...], "logistica": [...]}).
+
+        Raises:
+            ValueError - critério desconhecido ou valor inválido
+        """
+        if not isinstance(dados, dict):
+            raise ValueError('Filtro inválido.')
+        desconhecidos = set(dados) - {'vendedor_id', 'status', 'logistica'}
+        if desconhecidos:
+            raise ValueError(f'Critério desconhecido: {", ".join(sorted(desconhecidos))}.')
+
+        vendedor_id = dados.get('vendedor_id')
+        if vendedor_id is not None and (not isinstance(vendedor_id, int) or isinstance(vendedor_id, bool)):
+            raise ValueError('vendedor_id inválido.')
+
+        def conjunto(nome, validos):
+            valores = dados.get(nome)
+            if valores is None:
+                return None
+            if not isinstance(valores, list) or any(valor not in validos for valor in valores):
+                raise ValueError(f'{nome} inválido.')
+            return set(valores)
+
+        return cls(
+            vendedor_id=vendedor_id,
+            status=conjunto('status', {codigo for codigo, _ in Pedido.STATUS_CHOICES}),
+            logistica=conjunto('logistica', {codigo for codigo, _ in Pedido.LOGISTICA_CHOICES} | {''}),
+        )
+
+    def aceita(self, card):
+        """Se o card (ou o resumo dele) passa pelo filtro"""
+        if self.vendedor_id is not None and card.get('vendedor_id') != self.vendedor_id:
+            return False
+        if self.status is not None and card.get('status') not in self.status:
+            return False
+        if self.rotulos_logistica is not None and card.get('logistica') not in self.rotulos_logistica:
+            return False
+        return True
+
+    def pedidos_visiveis(self):
+        """
+        Returns:
+            set - ids dos pedidos ativos que passam pelo filtro (uma consulta)
+        """
+        pedidos = pedidos_ativos()
+        if self.vendedor_id is not None:
+            pedidos = pedidos.filter(vendedor_id=self.vendedor_id)
+        if self.status is not None:
+            pedidos = pedidos.filter(status__in=self.status)
+        if self.logistica is not None:
+            pedidos = pedidos.filter(logistica__in=self.logistica)
+        return set(pedidos.values_list('id', flat=True))
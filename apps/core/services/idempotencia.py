@@ -0,0 +1,133 @@
+"""
+Idempotency-Key para as ações de item.
+
+Uma requisição repetida com a mesma chave (retry em Wi-Fi instável, toque
+duplo) recebe a resposta guardada da primeira, sem consultar o banco (nem
+a sessão), sem auditoria e sem novos eventos WebSocket. A verificação é
+feita pelo IdempotenciaMiddleware (apps.core.middleware) antes da sessão,
+da auditoria e da view, só para views marcadas com @idempotente.
+
+As respostas ficam no cache do Django (Redis em produção, compartilhado
+entre os workers) por IDEMPOTENCIA_TTL_S segundos: o tamanho é limitado
+pelo TTL e pela política de descarte do cache. A chave é escopada pela
+sessão do cliente (cookie, sem consulta ao banco) e presa à requisição
+original: a mesma chave com outro método, caminho ou corpo é recusada.
+
+Enquanto a primeira requisição está em andamento, as repetições esperam
+pelo resultado (até ESPERA_MAXIMA segundos) em vez de executar a ação de
+novo.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+CABECALHO = 'HTTP_IDEMPOTENCY_KEY'
+CABECALHO_REPETICAO = 'Idempotent-Replay'
+TAMANHO_MAXIMO_CHAVE = 255
+
+PREFIXO = 'idempotencia:'
+ESPERA_MAXIMA = 10  # segundos; também é o TTL da reserva de uma chave em andamento
+INTERVALO_ESPERA = 0.05
+STATUS_NAO_GUARDADOS = (301, 302, 403)
+
+
+def idempotente(view):
+    """
+    Marca uma view para aceitar o cabeçalho Idempotency-Key (POST).
+    Aplicar por fora dos demais decorators.
+    """
+    view.idempotente = True
+    return view
+
+
+def ttl():
+    return getattr(settings, 'IDEMPOTENCIA_TTL_S', 600)
+
+
+def chave_cache(request):
+    """
+    Returns:
+        str - Chave no cache para a Idempotency-Key desta sessão, ou None se
+        a requisição não tiver chave ou sessão
+    """
+    chave = request.META.get(CABECALHO, '').strip()
+    sessao = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not chave or not sessao:
+        return None
+    return PREFIXO + hashlib.sha256(f'{sessao}\0{chave}'.encode()).hexdigest()
+
+
+def impressao(request):
+    """Identifica a requisição original (método, caminho e corpo)"""
+    digest = hashlib.sha256(f'{request.method}\0{request.get_full_path()}\0'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def chave_invalida(request):
+    return len(request.META.get(CABECALHO, '')) > TAMANHO_MAXIMO_CHAVE
+
+
+def reservar(chave, assinatura):
+    """
+    Reserva a chave para a requisição atual.
+
+    Returns:
+        dict - None se a reserva foi feita (executar a view), ou o registro
+        encontrado: resposta guardada ou outra requisição em andamento
+    """
+    if cache.add(chave, {'impressao': assinatura}, ESPERA_MAXIMA):
+        return None
+    return cache.get(chave) or reservar(chave, assinatura)
+
+
+def aguardar(chave):
+    """
+    Espera a requisição em andamento com a mesma chave terminar.
+
+    Returns:
+        dict - Registro com a resposta, ou None se ela não terminou a tempo
+        (ou falhou e liberou a chave)
+    """
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        registro = cache.get(chave)
+        if registro is None or 'status' in registro:
+            return registro
+    return None
+
+
+def guardar(chave, assinatura, response):
+    """
+    Guarda a resposta da view. Erros do servidor, redirecionamentos (login,
+    permissão) e recusas de CSRF liberam a chave para uma nova tentativa.
+    """
+    if response.streaming or response.status_code >= 500 or response.status_code in STATUS_NAO_GUARDADOS:
+        cache.delete(chave)
+        return
+    cache.set(chave, {
+        'impressao': assinatura,
+        'status': response.status_code,
+        'conteudo': response.content,
+        'content_type': response.get('Content-Type'),
+    }, ttl())
+
+
+def repetir(registro):
+    """Resposta guardada, marcada como repetição"""
+    response = HttpResponse(
+        registro['conteudo'],
+        status=registro['status'],
+        content_type=registro['content_type']
+    )
+    response[CABECALHO_REPETICAO] = 'true'
+    return response
+
+
+def conflito(mensagem, status):
+    return JsonResponse({'success': False, 'error': mensagem}, status=status)
@@ -0,0 +1,243 @@
+"""
+Outbox dos eventos WebSocket.
+
+Os eventos de uma operação são registrados dentro da transação (publicar)
+e só entram na fila depois do commit (transaction.on_commit): se a
+transação for desfeita, nenhum cliente fica sabendo de uma alteração que não
+aconteceu. A fila é esvaziada por um despachante em segundo plano (uma
+thread do processo do servidor), então a resposta HTTP não espera pelo
+channel layer (Redis em produção) e nenhuma linha fica bloqueada durante o
+envio.
+
+O despachante junta os eventos que chegam dentro de uma janela curta
+(WEBSOCKET_JANELA_COALESCENCIA_MS) e mescla as atualizações do mesmo pedido
+para o mesmo group: só o estado mais recente é enviado. Leituras rápidas
+por scanner viram uma mensagem por group por janela, e não dezenas.
+
+O despachante mantém um event loop próprio durante toda a vida do processo
+e aguarda channel_layer.group_send diretamente (broadcast.enviar): nada de
+async_to_sync por mensagem, que criaria um loop novo (e, com Redis, uma
+conexão nova) a cada envio. As mensagens de um lote vão para os groups em
+paralelo.
+
+Envios que falham são repetidos com espera exponencial; contadores de
+eventos, mesclados, enviados, repetições e descartados ficam em metricas().
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.services import broadcast
+
+
+logger = logging.getLogger(__name__)
+
+# Tentativas de envio de cada mensagem e espera (segundos) antes da segunda
+TENTATIVAS_ENVIO = 4
+ESPERA_INICIAL = 0.05
+
+# Eventos que carregam o estado completo de um pedido: o mais recente
+# substitui os anteriores do mesmo pedido no mesmo group
+TIPOS_COALESCIVEIS = ('pedido_atualizado', 'card_status_updated')
+
+
+def chave_coalescencia(grupo, evento):
+    """
+    Returns:
+        tuple - (group, tipo, pedido_id) para eventos mescláveis, ou None
+    """
+    if evento.get('type') not in TIPOS_COALESCIVEIS:
+        return None
+    pedido_id = evento.get('pedido_id')
+    if pedido_id is None:
+        pedido_id = (evento.get('pedido') or {}).get('id')
+    if pedido_id is None:
+        return None
+    return grupo, evento['type'], pedido_id
+
+
+def coalescer(eventos):
+    """
+    Mantém só a atualização mais recente de cada (group, tipo, pedido),
+    na posição da última ocorrência; os demais eventos mantêm a ordem.
+
+    Args:
+        eventos: list - [(group, evento)] na ordem de chegada
+
+    Returns:
+        tuple - (eventos restantes, quantidade de eventos mesclados)
+    """
+    ultima = {}
+    for posicao, (grupo, evento) in enumerate(eventos):
+        chave = chave_coalescencia(grupo, evento)
+        if chave is not None:
+            ultima[chave] = posicao
+
+    restantes = [
+        (grupo, evento) for posicao, (grupo, evento) in enumerate(eventos)
+        if ultima.get(chave_coalescencia(grupo, evento), posicao) == posicao
+    ]
+    return restantes, len(eventos) - len(restantes)
+
+
+class Despachante:
+    """
+    Envia os eventos da fila pelo channel layer em uma thread própria, com
+    um event loop próprio, iniciada no primeiro uso.
+
+    Args:
+        tentativas: int - Tentativas de envio de cada mensagem
+        espera_inicial: float - Espera (s) antes da primeira repetição
+        janela: float - Janela de coalescência em segundos (None: setting;
+            0: envia o que já estiver na fila, sem esperar)
+    """
+
+    def __init__(self, tentativas=TENTATIVAS_ENVIO, espera_inicial=ESPERA_INICIAL, janela=None):
+        if janela is None:
+            janela = getattr(settings, 'WEBSOCKET_JANELA_COALESCENCIA_MS', 150) / 1000
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.janela = janela
+        self.fila = queue.Queue()
+        self._thread = None
+        self._trava = threading.Lock()
+        self._metricas = {
+            'eventos': 0,
+            'mesclados': 0,
+            'enviados': 0,
+            'repeticoes': 0,
+            'descartados': 0,
+            'atraso_maximo_ms': 0.0,
+            'atraso_total_ms': 0.0,
+        }
+
+    def _contar(self, **valores):
+        with self._trava:
+            for chave, valor in valores.items():
+                self._metricas[chave] += valor
+
+    def _iniciar(self):
+        with self._trava:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._executar, name='despachante-websocket', daemon=True
+                )
+                self._thread.start()
+
+    def enfileirar(self, eventos):
+        """
+        Coloca eventos na fila de envio.
+
+        Args:
+            eventos: list - [(group, dict com 'type' e dados)]
+        """
+        if not eventos:
+            return
+        agora = time.monotonic()
+        for grupo, evento in eventos:
+            self.fila.put((grupo, evento, agora))
+        self._contar(eventos=len(eventos))
+        self._iniciar()
+
+    def _coletar(self):
+        """Primeiro evento da fila e os que chegarem até o fim da janela"""
+        lote = [self.fila.get()]
+        limite = time.monotonic() + self.janela
+        while True:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self.fila.get(timeout=restante) if restante > 0 else self.fila.get_nowait())
+            except queue.Empty:
+                return lote
+
+    async def _enviar(self, grupo, mensagem):
+        """Envia uma mensagem, repetindo em caso de falha; retorna se foi enviada"""
+        espera = self.espera_inicial
+        for tentativa in range(self.tentativas):
+            if tentativa:
+                self._contar(repeticoes=1)
+                await asyncio.sleep(espera)
+                espera *= 2
+            dados = dict(mensagem)
+            if await broadcast.enviar(grupo, dados.pop('type'), dados):
+                return True
+        return False
+
+    async def _entregar(self, grupo, mensagem, enfileirado_em):
+        if await self._enviar(grupo, mensagem):
+            atraso = (time.monotonic() - enfileirado_em) * 1000
+            with self._trava:
+                self._metricas['enviados'] += 1
+                self._metricas['atraso_total_ms'] += atraso
+                self._metricas['atraso_maximo_ms'] = max(self._metricas['atraso_maximo_ms'], atraso)
+        else:
+            self._contar(descartados=1)
+            logger.error(
+                f"[Outbox] Mensagem descartada após {self.tentativas} tentativas "
+                f"(type: {mensagem.get('type')}, group: {grupo})"
+            )
+
+    async def _despachar(self, lote):
+        eventos, mesclados = coalescer([(grupo, evento) for grupo, evento, _ in lote])
+        self._contar(mesclados=mesclados)
+        enfileirado_em = min(momento for _, _, momento in lote)
+
+        # Uma mensagem por group: a ordem dentro de cada group é preservada
+        await asyncio.gather(*(
+            self._entregar(grupo, mensagem, enfileirado_em)
+            for grupo, mensagem in broadcast.agrupar_eventos(eventos)
+        ))
+
+    def _executar(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            lote = self._coletar()
+            try:
+                loop.run_until_complete(self._despachar(lote))
+            except Exception as e:
+                self._contar(descartados=len(lote))
+                logger.error(f"[Outbox] Erro inesperado no despachante: {e}", exc_info=True)
+            finally:
+                for _ in lote:
+                    self.fila.task_done()
+
+    def aguardar(self):
+        """Bloqueia até a fila ser esvaziada (testes e encerramento)"""
+        self.fila.join()
+
+    def metricas(self):
+        """
+        Returns:
+            dict - Contadores do despachante (eventos recebidos, mesclados,
+            mensagens enviadas...), pendentes e atraso médio (ms)
+        """
+        with self._trava:
+            metricas = dict(self._metricas)
+        metricas['pendentes'] = self.fila.qsize()
+        metricas['atraso_medio_ms'] = (
+            metricas['atraso_total_ms'] / metricas['enviados'] if metricas['enviados'] else 0.0
+        )
+        return metricas
+
+
+despachante = Despachante()
+
+
+def publicar(eventos):
+    """
+    Registra os eventos de uma operação para envio após o commit. Fora de
+    uma transação, entram na fila imediatamente.
+
+    Args:
+        eventos: iterável de (group, dict com 'type' e dados)
+    """
+    eventos = list(eventos)
+    if eventos:
+        transaction.on_commit(partial(despachante.enfileirar, eventos))
@@ -0,0 +1,110 @@
+"""
+Numeração e histórico dos eventos WebSocket, para retomar uma conexão.
+
+Cada frame enviado por broadcast.enviar recebe um número de sequência por
+group (crescente, 'seq' no frame) e fica guardado em um buffer circular
+de WEBSOCKET_HISTORICO_EVENTOS posições. Ao reconectar (queda do Wi-Fi,
+deploy), a página envia {"type": "resume", "topic": ..., "seq": <último>}
+e recebe só os eventos perdidos; se a lacuna for maior que o buffer (ou
+algum evento não estiver mais guardado), recebe 'snapshot_required' e
+recarrega o estado completo.
+
+Contador e buffer ficam no cache do Django (Redis em produção,
+compartilhado entre os workers): a posição seq % tamanho é sobrescrita a
+cada volta, então a memória usada por group é limitada. Se o contador
+sumir do cache (reinício, flush ou descarte por falta de espaço), ele
+recomeça dos milissegundos atuais, acima de qualquer seq já enviado: as
+conexões abertas continuam aceitando os eventos novos e quem retoma de um
+seq antigo recebe 'snapshot_required'.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+PREFIXO = 'ws:eventos:'
+
+# Tempo (s) que um evento fica disponível para retomada
+TTL_EVENTO = 60 * 60
+
+
+def tamanho():
+    return getattr(settings, 'WEBSOCKET_HISTORICO_EVENTOS', 200)
+
+
+def _chave_sequencia(grupo):
+    return f'{PREFIXO}{grupo}:seq'
+
+
+def _chave_posicao(grupo, seq):
+    return f'{PREFIXO}{grupo}:{seq % tamanho()}'
+
+
+def _sequencia_inicial():
+    """Valor inicial do contador (milissegundos atuais)"""
+    return int(time.time() * 1000)
+
+
+def sequencia_atual(grupo):
+    """Último número de sequência usado no group (0 se nenhum)"""
+    return cache.get(_chave_sequencia(grupo)) or 0
+
+
+def registrar(grupo, frame_para, indice=None):
+    """
+    Numera um evento do group e o guarda no buffer.
+
+    Args:
+        grupo: group do channel layer
+        frame_para: função seq -> frame codificado (str)
+        indice: pedidos do evento para os filtros (broadcast.indice_pedidos)
+
+    Returns:
+        tuple - (seq, frame)
+    """
+    chave = _chave_sequencia(grupo)
+    try:
+        seq = cache.incr(chave)
+    except ValueError:
+        # Primeiro evento do group (ou cache reiniciado)
+        cache.add(chave, _sequencia_inicial(), None)
+        seq = cache.incr(chave)
+    frame = frame_para(seq)
+    cache.set(_chave_posicao(grupo, seq), (seq, frame, indice), TTL_EVENTO)
+    return seq, frame
+
+
+def descartar(grupo, seq):
+    """Remove do buffer um evento que não chegou a ser enviado"""
+    chave = _chave_posicao(grupo, seq)
+    registro = cache.get(chave)
+    if registro is not None and registro[0] == seq:
+        cache.delete(chave)
+
+
+def eventos_desde(grupo, desde):
+    """
+    Eventos do group posteriores a uma sequência.
+
+    Args:
+        grupo: group do channel layer
+        desde: último seq recebido pelo cliente
+
+    Returns:
+        tuple - ([(seq, frame, indice)] em ordem, ou None se for preciso
+        recarregar o estado completo; seq atual do group)
+    """
+    atual = sequencia_atual(grupo)
+    if desde > atual or atual - desde > tamanho():
+        return None, atual
+
+    posicoes = {_chave_posicao(grupo, seq): seq for seq in range(desde + 1, atual + 1)}
+    guardados = cache.get_many(list(posicoes))
+    eventos = []
+    for chave, seq in posicoes.items():
+        registro = guardados.get(chave)
+        if registro is None or registro[0] != seq:
+            return None, atual
+        eventos.append(registro)
+    return eventos, atual
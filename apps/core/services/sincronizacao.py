@@ -0,0 +1,214 @@
+"""
+Sincronização das ações registradas offline pelos coletores.
+
+Fora do alcance do Wi-Fi o coletor guarda as ações (separar, desseparar,
+substituir, marcar para compra) com o momento em que foram feitas. Na volta,
+POST /sync/acoes/ envia a fila inteira, na ordem: todas são aplicadas em uma
+transação pelo motor de transições (apps.core.services.transitions), com o
+momento original em separado_em / marcado_compra_em, e cada ação recebe um
+resultado.
+
+Conflitos são resolvidos contra o estado atual do item:
+- ação cujo efeito já está no item (outro usuário fez o mesmo, ou a ação já
+  foi sincronizada) é 'ja_aplicada', sem nova gravação;
+- ação impossível no estado atual, ou desseparar um item separado depois do
+  momento da ação, é 'conflito' (o estado do servidor prevalece);
+- ações seguintes do mesmo item partem do estado deixado pelas anteriores.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.services import transitions
+
+
+# Ações por sincronização
+MAXIMO_ACOES = 500
+
+# Relógio do coletor adiantado: momentos no futuro viram o momento atual
+TOLERANCIA_RELOGIO = timedelta(minutes=5)
+
+APLICADA = 'aplicada'
+JA_APLICADA = 'ja_aplicada'
+CONFLITO = 'conflito'
+NAO_ENCONTRADO = 'nao_encontrado'
+NEGADA = 'negada'
+INVALIDA = 'invalida'
+
+
+class AcaoInvalida(Exception):
+    """Ação malformada (mensagem para o coletor)"""
+
+
+class AcaoOffline(transitions.Transicao):
+    """
+    Transição registrada offline: aplica a transição original com o momento
+    informado pelo coletor e guarda a situação da última verificação.
+
+    Args:
+        transicao: Transicao original
+        momento: datetime em que a ação foi feita no coletor
+        ja_aplicada: função item -> bool, se o efeito da ação já está no item
+        obsoleta: função item -> bool, se o item mudou depois do momento da ação
+    """
+
+    def __init__(self, transicao, momento, ja_aplicada, obsoleta=None):
+        self.transicao = transicao
+        self.nome = transicao.nome
+        self.momento = momento
+        self.ja_aplicada = ja_aplicada
+        self.obsoleta = obsoleta
+        self.situacao = None
+        self.erro = None
+
+    def verificar(self, item):
+        self.situacao, self.erro = None, None
+        if self.ja_aplicada(item):
+            self.situacao = JA_APLICADA
+            raise transitions.TransicaoNegada('Ação já aplicada.')
+        if self.obsoleta is not None and self.obsoleta(item):
+            self.situacao, self.erro = CONFLITO, 'Item alterado depois desta ação.'
+            raise transitions.TransicaoNegada(self.erro)
+        try:
+            self.transicao.verificar(item)
+        except transitions.TransicaoNegada as e:
+            self.situacao, self.erro = CONFLITO, str(e)
+            raise
+
+    def valores(self, item, usuario, agora):
+        return self.transicao.valores(item, usuario, self.momento)
+
+    def auditoria(self, anterior, item, usuario):
+        acao, dados = self.transicao.auditoria(anterior, item, usuario)
+        dados['offline_em'] = self.momento.isoformat()
+        return acao, dados
+
+    def eventos(self, anterior, item, usuario):
+        return self.transicao.eventos(anterior, item, usuario)
+
+
+def _separar(dados, momento):
+    return AcaoOffline(
+        transitions.Separar(), momento,
+        ja_aplicada=lambda item: item.separado and not item.substituido
+    )
+
+
+def _desseparar(dados, momento):
+    return AcaoOffline(
+        transitions.Desseparar(), momento,
+        ja_aplicada=lambda item: not item.separado,
+        # Separado de novo (por outro usuário) depois do momento da ação
+        obsoleta=lambda item: item.separado_em is not None and item.separado_em > momento
+    )
+
+
+def _substituir(dados, momento):
+    produto_substituto = str(dados.get('produto_substituto') or '').strip()[:200]
+    if not produto_substituto:
+        raise AcaoInvalida('Informe o produto substituto.')
+    return AcaoOffline(
+        transitions.Substituir(produto_substituto), momento,
+        ja_aplicada=lambda item: item.substituido and item.produto_substituto == produto_substituto
+    )
+
+
+def _marcar_compra(dados, momento):
+    return AcaoOffline(
+        transitions.MarcarCompra(), momento,
+        ja_aplicada=lambda item: item.em_compra
+    )
+
+
+# acao: (construtor, tipos de usuário permitidos ou None para qualquer um)
+ACOES = {
+    'separar': (_separar, None),
+    'unseparar': (_desseparar, None),
+    'substituir': (_substituir, ('ADMINISTRADOR', 'SEPARADOR')),
+    'marcar_compra': (_marcar_compra, ('ADMINISTRADOR', 'COMPRADORA')),
+}
+
+
+def ler_momento(valor, agora):
+    """
+    Returns:
+        datetime - Momento com fuso (sem fuso: horário local), limitado ao
+        momento atual quando o relógio do coletor está adiantado
+    """
+    momento = parse_datetime(str(valor or ''))
+    if momento is None:
+        raise AcaoInvalida('Momento inválido.')
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    if momento > agora + TOLERANCIA_RELOGIO:
+        return agora
+    return min(momento, agora)
+
+
+def sincronizar(acoes, usuario, ip=None, user_agent=''):
+    """
+    Aplica as ações offline em ordem, em um único lote do motor de transições
+    (deve rodar dentro de uma transação).
+
+    Args:
+        acoes: list - [{'id', 'acao', 'item_id', 'momento', ...}] na ordem
+            em que foram feitas
+        usuario: Usuario do coletor
+        ip, user_agent: origem da requisição (auditoria)
+
+    Returns:
+        tuple - (resultados por ação na ordem recebida, ResultadoLote)
+    """
+    agora = timezone.now()
+    resultados = []
+    transicoes = []
+
+    for dados in acoes:
+        if not isinstance(dados, dict):
+            dados = {}
+        resultado = {'id': dados.get('id'), 'acao': dados.get('acao'), 'item_id': dados.get('item_id')}
+        resultados.append(resultado)
+
+        try:
+            construtor, tipos = ACOES.get(dados.get('acao'), (None, None))
+            if construtor is None:
+                raise AcaoInvalida('Ação desconhecida.')
+            try:
+                item_id = int(dados.get('item_id'))
+            except (TypeError, ValueError):
+                raise AcaoInvalida('Item inválido.')
+            transicao = construtor(dados, ler_momento(dados.get('momento'), agora))
+        except AcaoInvalida as e:
+            resultado.update(status=INVALIDA, erro=str(e))
+            continue
+
+        if tipos is not None and usuario.tipo not in tipos:
+            resultado.update(status=NEGADA, erro='Ação não permitida para este usuário.')
+            continue
+
+        resultado['item_id'] = item_id
+        resultado['_transicao'] = transicao
+        transicoes.append((item_id, transicao))
+
+    lote = transitions.executar(transicoes, usuario, ip=ip, user_agent=user_agent)
+    aplicadas = {id(aplicada.transicao) for aplicada in lote.aplicadas}
+    nao_encontrados = set(lote.nao_encontrados)
+
+    for resultado in resultados:
+        transicao = resultado.pop('_transicao', None)
+        if transicao is None:
+            continue
+        if id(transicao) in aplicadas:
+            resultado['status'] = APLICADA
+        elif resultado['item_id'] in nao_encontrados:
+            resultado.update(status=NAO_ENCONTRADO, erro='Item não encontrado.')
+        elif transicao.situacao is not None:
+            resultado['status'] = transicao.situacao
+            if transicao.erro:
+                resultado['erro'] = transicao.erro
+        else:
+            # Pedido deletado ou disputa contínua pelo item
+            resultado.update(status=CONFLITO, erro=lote.negadas.get(resultado['item_id'], 'Ação não aplicada.'))
+
+    return resultados, lote
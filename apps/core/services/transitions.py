@@ -0,0 +1,784 @@
+"""
+Motor de transições de estado de ItemPedido.
+
+Recebe uma ou várias transições (item + Transicao) e grava tudo de uma vez:
+
+1. lê os itens (com pedido, vendedor e produto) em uma consulta;
+2. grava os itens com UPDATEs condicionais, um por grupo de itens com o
+   mesmo estado lido e os mesmos valores novos. O WHERE repete o estado lido
+   (flags de separação/substituição/compra e pedido não deletado) e o número
+   de linhas afetadas é o sinal de sucesso: se outra requisição alterou algum
+   item entre a leitura e a escrita, as escritas do lote são desfeitas
+   (savepoint), os itens são relidos e as transições reavaliadas no estado
+   novo. Assim duas requisições concorrentes nunca aplicam a mesma
+   transição duas vezes;
+3. aplica nos pedidos a variação exata dos contadores e os separadores
+   recalculados (um UPDATE para todos os pedidos) e ajusta o status com UPDATEs
+   condicionais (PENDENTE <-> EM_SEPARACAO <-> AGUARDANDO_COMPRA);
+4. registra as alterações no log do dashboard e as auditorias com
+   bulk_create;
+5. publica os eventos deduplicados, no máximo uma mensagem por group,
+   enviados depois do commit (ver apps.core.services.outbox).
+
+Operações com vários itens custam o mesmo número de idas ao banco que uma
+operação com um item. Como UPDATEs não disparam sinais, o log de alterações
+do dashboard e o rollup de métricas são atualizados aqui.
+"""
+import copy
+import json
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, JSONField, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from apps.core.models import (
+    Pedido,
+    ItemPedido,
+    LogAuditoria,
+    MetricaVendedorDiaria,
+    CAMPOS_CONTADORES,
+    delta_contadores,
+)
+from apps.core.services.outbox import publicar
+from apps.core.services.dashboard import montar_card, registrar_alteracao
+
+
+# Campos que definem o estado do item (repetidos no WHERE do UPDATE)
+CAMPOS_ESTADO = ('separado', 'substituido', 'em_compra', 'compra_realizada')
+
+# Releituras após perder a corrida para outra requisição
+TENTATIVAS = 3
+
+FORMATO_DATA = '%d/%m/%Y %H:%M'
+
+
+def _formatar(momento):
+    return timezone.localtime(momento).strftime(FORMATO_DATA) if momento else None
+
+
+class TransicaoNegada(Exception):
+    """Transição não permitida no estado atual do item (mensagem para o usuário)"""
+
+
+class _Conflito(Exception):
+    """Algum item mudou entre a leitura e o UPDATE condicional"""
+
+
+class Transicao:
+    """
+    Base das transições de item.
+
+    Subclasses validam o estado lido (verificar), informam os novos valores
+    e descrevem auditoria e eventos. 'anterior' é o item como foi lido e
+    'item' o item com os valores gravados.
+    """
+
+    nome = ''
+
+    def verificar(self, item):
+        """Levanta TransicaoNegada se a transição não se aplica ao item"""
+
+    def valores(self, item, usuario, agora):
+        """Campos gravados pelo UPDATE (dict)"""
+        raise NotImplementedError
+
+    def auditoria(self, anterior, item, usuario):
+        """
+        Returns:
+            tuple - (acao, dados_novos) da entrada de auditoria do item
+        """
+        return self.nome, {
+            'item_id': item.id,
+            'pedido_id': item.pedido_id,
+            'produto': item.produto.descricao,
+        }
+
+    def eventos(self, anterior, item, usuario):
+        """
+        Returns:
+            list - [(group, evento)] para a tela do pedido e o painel de compras
+        """
+        return []
+
+
+class Separar(Transicao):
+    """Marca o item como separado (e o remove da lista de compras)"""
+
+    nome = 'separar_item'
+
+    def verificar(self, item):
+        if item.separado:
+            raise TransicaoNegada('Item já está separado.')
+        if item.substituido:
+            raise TransicaoNegada('Item foi substituído.')
+
+    def valores(self, item, usuario, agora):
+        return {
+            'separado': True,
+            'em_compra': False,
+            'separado_por': usuario,
+            'separado_em': agora,
+        }
+
+    def auditoria(self, anterior, item, usuario):
+        return ('separar_item_direto' if anterior.em_compra else 'separar_item'), {
+            'item_id': item.id,
+            'pedido_id': item.pedido_id,
+            'produto': item.produto.descricao,
+            'quantidade': str(item.quantidade_solicitada),
+            'estava_em_compra': anterior.em_compra,
+        }
+
+    def eventos(self, anterior, item, usuario):
+        eventos = [(f'pedido_{item.pedido_id}', {
+            'type': 'item_separado',
+            'item': {
+                'id': item.id,
+                'separado': True,
+                'separado_por': usuario.nome,
+                'separado_em': _formatar(item.separado_em),
+            },
+        })]
+        if anterior.em_compra:
+            eventos.append(('painel_compras', {
+                'type': 'item_separado_direto',
+                'item': {
+                    'id': item.id,
+                    'produto_codigo': item.produto.codigo,
+                    'produto_descricao': item.produto.descricao,
+                    'pedido_id': item.pedido_id,
+                    'pedido_numero': item.pedido.numero_orcamento,
+                },
+            }))
+        return eventos
+
+
+class Desseparar(Transicao):
+    """Volta o item para pendente, desfazendo substituição e compra"""
+
+    nome = 'unseparar_item'
+
+    def verificar(self, item):
+        if not item.separado:
+            raise TransicaoNegada('Item não está separado.')
+
+    def valores(self, item, usuario, agora):
+        valores = {
+            'separado': False,
+            'separado_por': None,
+            'separado_em': None,
+        }
+        if item.substituido:
+            valores.update(substituido=False, produto_substituto='')
+        if item.em_compra:
+            valores.update(
+                em_compra=False,
+                marcado_compra_por=None,
+                marcado_compra_em=None,
+                compra_realizada=False,
+                compra_realizada_por=None,
+                compra_realizada_em=None,
+            )
+        return valores
+
+    def auditoria(self, anterior, item, usuario):
+        return self.nome, {
+            'item_id': item.id,
+            'pedido_id': item.pedido_id,
+            'produto': item.produto.descricao,
+            'quantidade': str(item.quantidade_solicitada),
+            'separado_por_anterior': anterior.separado_por.nome if anterior.separado_por else 'Desconhecido',
+            'separado_em_anterior': anterior.separado_em.strftime(FORMATO_DATA) if anterior.separado_em else 'N/A',
+        }
+
+    def eventos(self, anterior, item, usuario):
+        eventos = [(f'pedido_{item.pedido_id}', {
+            'type': 'item_unseparado',
+            'item': {
+                'id': item.id,
+                'separado': False,
+                'separado_por': None,
+                'separado_em': None,
+                'substituido': False,
+                'produto_substituto': '',
+                'em_compra': False,
+                'marcado_compra_por': None,
+                'marcado_compra_em': None,
+                'compra_realizada': False,
+                'compra_realizada_por': None,
+                'compra_realizada_em': None,
+                'estava_substituido': anterior.substituido,
+                'estava_em_compra': anterior.em_compra,
+            },
+        })]
+        if anterior.em_compra:
+            eventos.append(('painel_compras', {
+                'type': 'item_removido_compras',
+                'item_id': item.id,
+                'pedido_id': item.pedido_id,
+            }))
+        return eventos
+
+
+class Substituir(Transicao):
+    """Substitui o produto do item (item substituído conta como separado)"""
+
+    nome = 'substituir_item'
+
+    def __init__(self, produto_substituto):
+        self.produto_substituto = produto_substituto
+
+    def verificar(self, item):
+        if item.substituido:
+            raise TransicaoNegada('Item já foi substituído.')
+        if item.separado:
+            raise TransicaoNegada('Item já está separado.')
+
+    def valores(self, item, usuario, agora):
+        return {
+            'substituido': True,
+            'produto_substituto': self.produto_substituto,
+            'separado': True,
+            'separado_por': usuario,
+            'separado_em': agora,
+        }
+
+    def auditoria(self, anterior, item, usuario):
+        return self.nome, {
+            'item_id': item.id,
+            'pedido_id': item.pedido_id,
+            'produto_original': item.produto.descricao,
+            'produto_substituto': item.produto_substituto,
+        }
+
+    def eventos(self, anterior, item, usuario):
+        return [(f'pedido_{item.pedido_id}', {
+            'type': 'item_substituido',
+            'item': {
+                'id': item.id,
+                'substituido': True,
+                'produto_substituto': item.produto_substituto,
+                'separado': True,
+                'separado_por': usuario.nome,
+                'separado_em': _formatar(item.separado_em),
+            },
+        })]
+
+
+class MarcarCompra(Transicao):
+    """Marca o item para compra (entra no painel de compras)"""
+
+    nome = 'marcar_compra'
+
+    def verificar(self, item):
+        if item.em_compra:
+            raise TransicaoNegada('Item já está marcado para compra.')
+        if item.separado or item.substituido:
+            raise TransicaoNegada('Item já foi separado ou substituído.')
+
+    def valores(self, item, usuario, agora):
+        return {'em_compra': True, 'marcado_compra_por': usuario, 'marcado_compra_em': agora}
+
+    def eventos(self, anterior, item, usuario):
+        marcado_em = _formatar(item.marcado_compra_em)
+        return [
+            (f'pedido_{item.pedido_id}', {
+                'type': 'item_em_compra',
+                'item': {
+                    'id': item.id,
+                    'em_compra': True,
+                    'marcado_compra_por': usuario.nome,
+                    'marcado_compra_em': marcado_em,
+                },
+            }),
+            ('painel_compras', {
+                'type': 'item_marcado_compra',
+                'item': {
+                    'id': item.id,
+                    'pedido_id': item.pedido_id,
+                    'pedido_numero': item.pedido.numero_orcamento,
+                    'cliente': item.pedido.nome_cliente,
+                    'produto_codigo': item.produto.codigo,
+                    'produto_descricao': item.produto.descricao,
+                    'quantidade': str(item.quantidade_solicitada),
+                    'marcado_por': usuario.nome,
+                    'marcado_em': marcado_em,
+                    'comprado': item.compra_realizada,
+                },
+            }),
+        ]
+
+
+class AlternarComprado(Transicao):
+    """Marca/desmarca como comprado um item marcado para compra"""
+
+    nome = 'marcar_item_comprado'
+
+    def verificar(self, item):
+        if not item.em_compra:
+            raise TransicaoNegada('Item não está marcado para compra.')
+
+    def valores(self, item, usuario, agora):
+        if item.compra_realizada:
+            return {'compra_realizada': False, 'compra_realizada_por': None, 'compra_realizada_em': None}
+        return {'compra_realizada': True, 'compra_realizada_por': usuario, 'compra_realizada_em': agora}
+
+    def auditoria(self, anterior, item, usuario):
+        return ('marcar_item_comprado' if item.compra_realizada else 'desmarcar_item_comprado'), {
+            'item_id': item.id,
+            'pedido_id': item.pedido_id,
+            'produto': item.produto.descricao,
+            'comprado': item.compra_realizada,
+        }
+
+    def eventos(self, anterior, item, usuario):
+        dados = {
+            'id': item.id,
+            'comprado': item.compra_realizada,
+            'comprado_por': usuario.nome if item.compra_realizada else None,
+            'comprado_em': _formatar(item.compra_realizada_em) if item.compra_realizada else None,
+        }
+        return [
+            ('painel_compras', {'type': 'item_comprado', 'item': dict(dados, pedido_id=item.pedido_id)}),
+            (f'pedido_{item.pedido_id}', {'type': 'item_comprado', 'item': dados}),
+        ]
+
+
+class ConfirmarCompra(Transicao):
+    """Confirma a compra de um item marcado para compra (balcão do fornecedor)"""
+
+    nome = 'confirmar_compra'
+
+    def verificar(self, item):
+        if not item.em_compra:
+            raise TransicaoNegada('Item não está marcado para compra.')
+        if item.compra_realizada:
+            raise TransicaoNegada('Compra do item já foi confirmada.')
+
+    def valores(self, item, usuario, agora):
+        return {'compra_realizada': True, 'compra_realizada_por': usuario, 'compra_realizada_em': agora}
+
+    def eventos(self, anterior, item, usuario):
+        return [(f'pedido_{item.pedido_id}', {
+            'type': 'compra_realizada',
+            'produto_codigo': item.produto.codigo,
+        })]
+
+
+class ResultadoTransicao:
+    """
+    Resultado de uma transição aplicada.
+
+    Attributes:
+        anterior: ItemPedido - Item como estava antes da transição
+        item: ItemPedido - Item com os valores gravados
+        pedido: Pedido - Pedido com contadores e status atualizados em memória
+        transicao: Transicao aplicada
+        status_alterado: bool - Se o status do pedido mudou
+    """
+
+    def __init__(self, anterior, item, pedido, transicao):
+        self.anterior = anterior
+        self.item = item
+        self.pedido = pedido
+        self.transicao = transicao
+        self.status_alterado = False
+
+
+class ResultadoLote:
+    """
+    Resultado de um lote de transições.
+
+    Attributes:
+        aplicadas: list - ResultadoTransicao na ordem recebida
+        negadas: dict - {item_id: mensagem} das transições não aplicadas
+        nao_encontrados: list - ids de itens inexistentes
+        pedidos: dict - {pedido_id: Pedido} afetados (atualizados em memória)
+    """
+
+    def __init__(self):
+        self.aplicadas = []
+        self.negadas = {}
+        self.nao_encontrados = []
+        self.pedidos = {}
+
+
+def _consultar_itens():
+    """Itens com pedido (e vendedor), produto e separador em uma consulta"""
+    return ItemPedido.objects.select_related('pedido__vendedor', 'produto', 'separado_por')
+
+
+def _ler_itens(item_ids):
+    return _consultar_itens().filter(id__in=item_ids)
+
+
+class Selecao:
+    """
+    Itens escolhidos por um filtro, todos com a mesma transição.
+    O filtro é reavaliado a cada tentativa: os itens lidos são os que o
+    satisfazem no momento (uma passada no estilo UPDATE ... RETURNING).
+
+    Args:
+        filtro: Q sobre ItemPedido
+        transicao: Transicao aplicada a cada item selecionado
+    """
+
+    def __init__(self, filtro, transicao):
+        self.filtro = filtro
+        self.transicao = transicao
+
+    def ler(self):
+        itens = list(_consultar_itens().filter(self.filtro).order_by('id'))
+        return itens, [(item.id, self.transicao) for item in itens]
+
+
+def _chave_valores(valores):
+    """Chave hashable de um dict de valores (instâncias viram pk)"""
+    return tuple(sorted(
+        (campo, getattr(valor, 'pk', valor)) for campo, valor in valores.items()
+    ))
+
+
+def _gravar_itens(grupos):
+    """
+    Um UPDATE condicional por grupo (mesmo estado lido e mesmos valores),
+    na ordem das transições de cada item (todas as primeiras, depois as
+    segundas...). Levanta _Conflito se algum grupo não afetar todas as suas
+    linhas.
+    """
+    for chave in sorted(grupos, key=lambda chave: chave[0]):
+        _, estado, _ = chave
+        valores, item_ids = grupos[chave]
+        atualizados = ItemPedido.objects.filter(
+            id__in=item_ids,
+            pedido__deletado=False,
+            **dict(estado)
+        ).update(**valores)
+        if atualizados != len(item_ids):
+            raise _Conflito()
+
+
+def _por_pedido(campo, valores, pedido_ids, expressao):
+    """
+    Expressão de UPDATE com um valor por pedido.
+
+    Args:
+        campo: str - Campo de Pedido
+        valores: dict - {pedido_id: valor} (pedidos ausentes mantêm o campo)
+        pedido_ids: todos os pedidos do UPDATE
+        expressao: função valor -> expressão gravada
+
+    Returns:
+        A expressão do valor quando é o mesmo para todos os pedidos, senão
+        CASE WHEN id = ... THEN ... END
+    """
+    distintos = {json.dumps(valor) for valor in valores.values()}
+    if len(distintos) == 1 and len(valores) == len(pedido_ids):
+        return expressao(next(iter(valores.values())))
+    return Case(
+        *[When(pk=pedido_id, then=expressao(valor)) for pedido_id, valor in valores.items()],
+        default=F(campo),
+        output_field=Pedido._meta.get_field(campo)
+    )
+
+
+def _gravar_pedidos(pedidos, deltas, com_separadores):
+    """
+    Aplica as variações dos contadores e os separadores recalculados de
+    todos os pedidos em um único UPDATE (CASE por pedido quando variam).
+    """
+    separadores = {}
+    if com_separadores:
+        nomes = {}
+        for pedido_id, nome in ItemPedido.objects.filter(
+            pedido_id__in=com_separadores,
+            separado=True,
+            separado_por__isnull=False
+        ).values_list('pedido_id', 'separado_por__nome').distinct().order_by():
+            nomes.setdefault(pedido_id, set()).add(nome)
+        separadores = {pedido_id: sorted(nomes.get(pedido_id, ())) for pedido_id in com_separadores}
+
+    campos = {}
+    for campo in CAMPOS_CONTADORES:
+        variacoes = {pedido_id: delta[campo] for pedido_id, delta in deltas.items() if delta[campo]}
+        if variacoes:
+            campos[campo] = _por_pedido(
+                campo, variacoes, deltas, lambda valor, campo=campo: F(campo) + valor
+            )
+    if separadores:
+        campos['separadores'] = _por_pedido(
+            'separadores', separadores, deltas, lambda lista: Value(lista, output_field=JSONField())
+        )
+
+    if campos:
+        Pedido.objects.filter(pk__in=list(deltas)).update(**campos)
+
+    # Manter as instâncias em memória coerentes com o banco
+    for pedido_id, delta in deltas.items():
+        pedido = pedidos[pedido_id]
+        for campo, valor in delta.items():
+            setattr(pedido, campo, getattr(pedido, campo) + valor)
+        if pedido_id in separadores:
+            pedido.separadores = separadores[pedido_id]
+
+
+# Itens marcados para compra que ainda não foram comprados. Um item comprado
+# e depois separado sai de em_compra mas continua em itens_comprados, então
+# a comparação entre os contadores não diz se ainda falta comprar algo.
+COMPRA_PENDENTE = Exists(ItemPedido.objects.filter(
+    pedido=OuterRef('pk'),
+    em_compra=True,
+    compra_realizada=False,
+))
+
+# Ajustes de status: (contador que variou, sinal da variação, de, para,
+# condição sobre o estado já gravado: (em memória ou None, filtro do UPDATE))
+REGRAS_STATUS = (
+    ('itens_separados', 1, ('PENDENTE',), 'EM_SEPARACAO', None),
+    ('itens_separados', -1, ('EM_SEPARACAO',), 'PENDENTE', (
+        lambda pedido: pedido.itens_separados == 0,
+        Q(itens_separados=0),
+    )),
+    ('itens_em_compra', 1, ('PENDENTE', 'EM_SEPARACAO'), 'AGUARDANDO_COMPRA', None),
+    # Nenhum item falta comprar (comprado ou separado direto): volta para a separação
+    ('itens_comprados', 1, ('AGUARDANDO_COMPRA',), 'EM_SEPARACAO', (None, ~COMPRA_PENDENTE)),
+    ('itens_em_compra', -1, ('AGUARDANDO_COMPRA',), 'EM_SEPARACAO', (None, ~COMPRA_PENDENTE)),
+    # Compra desmarcada: o pedido volta a aguardar a compra
+    ('itens_comprados', -1, ('EM_SEPARACAO',), 'AGUARDANDO_COMPRA', (None, COMPRA_PENDENTE)),
+)
+
+
+def _ajustar_status(pedidos, deltas):
+    """
+    Ajusta o status dos pedidos com um UPDATE condicional por regra. As
+    regras são aplicadas em ordem sobre o status já ajustado pelas
+    anteriores: separar e marcar para compra no mesmo lote leva o pedido a
+    AGUARDANDO_COMPRA, como em duas requisições.
+
+    Returns:
+        set - ids dos pedidos cujo status mudou
+    """
+    alterados = set()
+    for contador, sinal, de, para, condicao in REGRAS_STATUS:
+        candidatos = [
+            pedido_id for pedido_id, delta in deltas.items()
+            if delta[contador] * sinal > 0
+            and pedidos[pedido_id].status in de
+            and (condicao is None or condicao[0] is None or condicao[0](pedidos[pedido_id]))
+        ]
+        if not candidatos:
+            continue
+
+        atualizados = Pedido.objects.filter(
+            condicao[1] if condicao else Q(), pk__in=candidatos, status__in=de
+        ).update(status=para)
+
+        if atualizados == len(candidatos):
+            mudaram = candidatos
+        else:
+            # Algum pedido mudou em paralelo: conferir quais foram atualizados
+            mudaram = list(Pedido.objects.filter(pk__in=candidatos, status=para).values_list('pk', flat=True))
+
+        for pedido_id in mudaram:
+            pedidos[pedido_id].status = para
+            alterados.add(pedido_id)
+
+    # Rollup de métricas: uma vez por (dia, vendedor) afetado
+    for data, vendedor_id in {
+        (timezone.localdate(pedidos[pedido_id].data_criacao), pedidos[pedido_id].vendedor_id)
+        for pedido_id in alterados
+    }:
+        MetricaVendedorDiaria.recalcular(data, vendedor_id)
+
+    return alterados
+
+
+def _aplicar_uma_vez(transicoes, usuario, agora, resultado):
+    """Lê, verifica e grava o lote; levanta _Conflito se perder alguma corrida"""
+    if isinstance(transicoes, Selecao):
+        lidos, transicoes = transicoes.ler()
+    else:
+        lidos = _ler_itens([item_id for item_id, _ in transicoes])
+    itens = {item.id: item for item in lidos}
+
+    resultado.aplicadas = []
+    resultado.negadas = {}
+    resultado.nao_encontrados = []
+    resultado.pedidos = {}
+
+    grupos = {}
+    vezes = {}
+    for item_id, transicao in transicoes:
+        item = itens.get(item_id)
+        if item is None:
+            resultado.nao_encontrados.append(item_id)
+            continue
+
+        # Uma instância de Pedido por pedido (contadores somados em memória)
+        pedido = resultado.pedidos.setdefault(item.pedido_id, item.pedido)
+        item.pedido = pedido
+
+        try:
+            if pedido.deletado:
+                raise TransicaoNegada('Pedido foi deletado.')
+            transicao.verificar(item)
+        except TransicaoNegada as e:
+            resultado.negadas[item_id] = str(e)
+            continue
+
+        valores = transicao.valores(item, usuario, agora)
+        depois = copy.copy(item)
+        for campo, valor in valores.items():
+            setattr(depois, campo, valor)
+        # Próximas transições do mesmo item partem do novo estado
+        itens[item_id] = depois
+
+        # A n-ésima transição de um item fica em um grupo da ordem n
+        ordem = vezes[item_id] = vezes.get(item_id, -1) + 1
+        estado = tuple((campo, getattr(item, campo)) for campo in CAMPOS_ESTADO)
+        grupo = grupos.setdefault((ordem, estado, _chave_valores(valores)), (valores, []))
+        grupo[1].append(item_id)
+
+        resultado.aplicadas.append(ResultadoTransicao(item, depois, pedido, transicao))
+
+    if not resultado.aplicadas:
+        resultado.pedidos = {}
+        return
+
+    if len(resultado.aplicadas) > 1:
+        # Conflito em um dos UPDATEs desfaz os que já foram gravados
+        with transaction.atomic():
+            _gravar_itens(grupos)
+    else:
+        _gravar_itens(grupos)
+
+    deltas = {}
+    com_separadores = set()
+    for aplicada in resultado.aplicadas:
+        delta = deltas.setdefault(aplicada.pedido.pk, dict.fromkeys(CAMPOS_CONTADORES, 0))
+        for campo, valor in delta_contadores(
+            aplicada.anterior.contribuicao_contadores(),
+            aplicada.item.contribuicao_contadores()
+        ).items():
+            delta[campo] += valor
+        if aplicada.anterior.separado != aplicada.item.separado:
+            com_separadores.add(aplicada.pedido.pk)
+
+    _gravar_pedidos(resultado.pedidos, deltas, com_separadores)
+    alterados = _ajustar_status(resultado.pedidos, deltas)
+    for aplicada in resultado.aplicadas:
+        aplicada.status_alterado = aplicada.pedido.pk in alterados
+
+    registrar_alteracao(*deltas)
+
+    # Pedidos sem transição aplicada não fazem parte do resultado
+    afetados = {aplicada.pedido.pk for aplicada in resultado.aplicadas}
+    resultado.pedidos = {pk: pedido for pk, pedido in resultado.pedidos.items() if pk in afetados}
+
+
+def aplicar_lote(transicoes, usuario):
+    """
+    Grava um lote de transições (deve rodar dentro de uma transação).
+    Não grava auditoria nem envia eventos (ver executar).
+
+    Args:
+        transicoes: list - [(item_id, Transicao)], ou Selecao
+        usuario: Usuario que executa a ação
+
+    Returns:
+        ResultadoLote
+    """
+    agora = timezone.now()
+    resultado = ResultadoLote()
+
+    for _ in range(TENTATIVAS):
+        try:
+            _aplicar_uma_vez(transicoes, usuario, agora, resultado)
+            return resultado
+        except _Conflito:
+            continue
+
+    # Disputa contínua pelos mesmos itens: nada foi gravado
+    resultado.negadas.update({
+        aplicada.item.id: 'Item alterado por outro usuário. Tente novamente.'
+        for aplicada in resultado.aplicadas
+    })
+    resultado.aplicadas = []
+    resultado.pedidos = {}
+    return resultado
+
+
+def aplicar(item_id, transicao, usuario):
+    """
+    Grava uma transição de um item (deve rodar dentro de uma transação).
+
+    Returns:
+        ResultadoTransicao
+
+    Raises:
+        ItemPedido.DoesNotExist: item inexistente
+        TransicaoNegada: transição inválida no estado atual (inclusive após
+            perder a corrida para outra requisição)
+    """
+    resultado = aplicar_lote([(item_id, transicao)], usuario)
+    if resultado.nao_encontrados:
+        raise ItemPedido.DoesNotExist(f'Item {item_id} não encontrado.')
+    if resultado.negadas:
+        raise TransicaoNegada(resultado.negadas[item_id])
+    return resultado.aplicadas[0]
+
+
+def executar(transicoes, usuario, ip=None, user_agent='', auditoria=None, eventos=None):
+    """
+    Grava um lote de transições, as auditorias e envia os eventos.
+
+    Args:
+        transicoes: list - [(item_id, Transicao)], ou Selecao
+        usuario: Usuario que executa a ação
+        ip, user_agent: origem da requisição (auditoria)
+        auditoria: função opcional (ResultadoLote) -> (acao, modelo, objeto_id,
+            dados_novos) para uma única entrada agregada; por padrão, uma
+            entrada por item
+        eventos: função opcional (ResultadoLote) -> [(group, evento)] com
+            eventos agregados do lote, enviados junto com os de cada item
+
+    Returns:
+        ResultadoLote
+    """
+    resultado = aplicar_lote(transicoes, usuario)
+    if not resultado.aplicadas:
+        return resultado
+
+    if auditoria is not None:
+        acao, modelo, objeto_id, dados = auditoria(resultado)
+        entradas = [(acao, modelo, objeto_id, dados)]
+    else:
+        entradas = []
+        for aplicada in resultado.aplicadas:
+            acao, dados = aplicada.transicao.auditoria(aplicada.anterior, aplicada.item, usuario)
+            entradas.append((acao, 'ItemPedido', aplicada.item.id, dados))
+
+    LogAuditoria.objects.bulk_create([
+        LogAuditoria(
+            usuario=usuario,
+            acao=acao,
+            modelo=modelo,
+            objeto_id=objeto_id,
+            dados_novos=dados,
+            ip=ip,
+            user_agent=user_agent
+        )
+        for acao, modelo, objeto_id, dados in entradas
+    ])
+
+    mensagens = []
+    for aplicada in resultado.aplicadas:
+        mensagens.extend(aplicada.transicao.eventos(aplicada.anterior, aplicada.item, usuario))
+    if eventos is not None:
+        mensagens.extend(eventos(resultado))
+    # Um card atualizado por pedido afetado (contadores, status e separadores)
+    for pedido in resultado.pedidos.values():
+        mensagens.append(('dashboard', {'type': 'pedido_atualizado', 'pedido': montar_card(pedido)}))
+    publicar(mensagens)
+
+    return resultado
@@ -0,0 +1,116 @@
+"""
+Receivers de sinais do app core.
+
+Alterações em Pedido/ItemPedido são registradas no log de alterações
+(delta sync, na mesma transação) e invalidam o snapshot do dashboard
+(incrementam a versão após o commit da transação).
+
+Alterações de Pedido recalculam o rollup por dia/vendedor/status
+(MetricaVendedorDiaria) na mesma transação.
+
+Alterações no calendário operacional (expediente e feriados) recompilam o
+índice de tempo útil e, depois, recalculam o tempo útil gravado nos rollups
+(MetricaDiaria, MetricaVendedorDiaria e SketchTempoSeparacao) dos pedidos
+finalizados afetados: os que atravessam o feriado, ou todos quando muda o
+expediente de um dia da semana.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from django.utils import timezone
+
+from .models import (
+    Pedido,
+    ItemPedido,
+    CalendarioOperacional,
+    Feriado,
+    MetricaDiaria,
+    MetricaVendedorDiaria,
+    SketchTempoSeparacao,
+)
+from .services.dashboard import registrar_alteracao
+from .utils.calendario import invalidar_calendario
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_save, sender=ItemPedido)
+@receiver(post_delete, sender=ItemPedido)
+def registrar_alteracao_dashboard(sender, instance, **kwargs):
+    """Registra a alteração do card e incrementa a versão após o commit"""
+    registrar_alteracao(instance.pk if sender is Pedido else instance.pedido_id)
+
+
+# Campos de Pedido que afetam o rollup por dia/vendedor/status
+CAMPOS_METRICA_VENDEDOR = {'status', 'deletado', 'data_finalizacao', 'vendedor', 'data_criacao'}
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+def atualizar_metrica_vendedor(sender, instance, update_fields=None, **kwargs):
+    """Recalcula o rollup do dia de criação/vendedor do pedido alterado"""
+    if update_fields is not None and not CAMPOS_METRICA_VENDEDOR.intersection(update_fields):
+        return
+    MetricaVendedorDiaria.recalcular(timezone.localdate(instance.data_criacao), instance.vendedor_id)
+
+
+def recalcular_tempo_util_metricas(*dias):
+    """
+    Recalcula os rollups com tempo útil dos pedidos finalizados cujo período
+    inclui algum dos dias (todos os finalizados se nenhum dia for informado).
+    Chamar com o índice do calendário já invalidado.
+    """
+    finalizados = Pedido.objects.filter(status='FINALIZADO', deletado=False, data_finalizacao__isnull=False)
+    if dias:
+        periodo = Q()
+        for dia in dias:
+            periodo |= Q(data_criacao__date__lte=dia, data_finalizacao__date__gte=dia)
+        finalizados = finalizados.filter(periodo)
+
+    limites = finalizados.aggregate(
+        criacao_min=Min('data_criacao'), criacao_max=Max('data_criacao'),
+        finalizacao_min=Min('data_finalizacao'), finalizacao_max=Max('data_finalizacao'),
+    )
+    if limites['criacao_min'] is None:
+        return
+
+    with transaction.atomic():
+        # Por dia de criação/vendedor
+        MetricaVendedorDiaria.reconstruir(
+            timezone.localdate(limites['criacao_min']), timezone.localdate(limites['criacao_max'])
+        )
+        # Por dia de finalização
+        for data in finalizados.dates('data_finalizacao', 'day'):
+            MetricaDiaria.recalcular(data)
+        SketchTempoSeparacao.reconstruir(
+            timezone.localdate(limites['finalizacao_min']), timezone.localdate(limites['finalizacao_max'])
+        )
+
+
+@receiver(pre_save, sender=Feriado)
+def guardar_data_anterior_feriado(sender, instance, **kwargs):
+    """Data antes da edição: o dia que deixa de ser feriado também muda o tempo útil"""
+    instance._data_anterior = None
+    if instance.pk:
+        instance._data_anterior = sender.objects.filter(pk=instance.pk).values_list('data', flat=True).first()
+
+
+@receiver(post_save, sender=CalendarioOperacional)
+@receiver(post_delete, sender=CalendarioOperacional)
+@receiver(post_save, sender=Feriado)
+@receiver(post_delete, sender=Feriado)
+def recompilar_calendario(sender, instance, **kwargs):
+    """
+    Invalida o índice de tempo útil e recalcula os rollups afetados quando a
+    transação for confirmada (nessa ordem, para o recálculo usar o índice novo)
+    """
+    transaction.on_commit(invalidar_calendario)
+    if sender is Feriado:
+        dias = {instance.data, getattr(instance, '_data_anterior', None)} - {None}
+        transaction.on_commit(partial(recalcular_tempo_util_metricas, *dias))
+    else:
+        transaction.on_commit(recalcular_tempo_util_metricas)
@@ -2,9 +2,12 @@
 Utilities package for core app
 Combines image utilities and metrics/time utilities
 """
-from datetime import datetime, timedelta, time
+from datetime import timedelta
 from django.utils import timezone
 
+# Calendário operacional (from utils/calendario.py)
+from .calendario import obter_indice, invalidar_calendario
+
 # Image utilities (from utils/image_utils.py)
 from .image_utils import (
     validate_image_file,
@@ -18,13 +21,32 @@ from .image_utils import (
 
 
 # Metrics and time utilities
-# (copied from parent utils.py to avoid circular import)
+
+def _normalizar_periodo(data_inicio, data_fim):
+    """Torna as datas timezone aware; retorna None se o período for vazio/inválido"""
+    if not data_inicio or not data_fim:
+        return None
+
+    # Garantir que são timezone aware
+    if timezone.is_naive(data_inicio):
+        data_inicio = timezone.make_aware(data_inicio)
+    if timezone.is_naive(data_fim):
+        data_fim = timezone.make_aware(data_fim)
+
+    # Se fim antes do início, período vazio
+    if data_fim < data_inicio:
+        return None
+
+    return data_inicio, data_fim
+
 
 def calcular_tempo_util(data_inicio, data_fim):
     """
-    Calcula o tempo útil entre duas datas considerando horário comercial.
+    Calcula o tempo útil entre duas datas considerando o calendário operacional
+    (expediente por dia da semana e feriados; padrão 7:30 - 17:00, segunda a sexta).
 
-    Horário comercial: 7:30 - 17:00 (segunda a sexta)
+    Duas consultas ao índice compilado do calendário e uma subtração,
+    independente do tamanho do período.
 
     Args:
         data_inicio: datetime - Data/hora de início
@@ -33,62 +55,47 @@ def calcular_tempo_util(data_inicio, data_fim):
     Returns:
         timedelta - Tempo útil decorrido
     """
-    if not data_inicio or not data_fim:
+    periodo = _normalizar_periodo(data_inicio, data_fim)
+    if periodo is None:
         return timedelta(0)
 
-    # Garantir que são timezone aware
-    if timezone.is_naive(data_inicio):
-        data_inicio = timezone.make_aware(data_inicio)
-    if timezone.is_naive(data_fim):
-        data_fim = timezone.make_aware(data_fim)
+    data_inicio, data_fim = periodo
+    indice = obter_indice(data_inicio.date(), data_fim.date())
+    return timedelta(microseconds=max(indice.acumulado(data_fim) - indice.acumulado(data_inicio), 0))
 
-    # Se fim antes do início, retorna 0
-    if data_fim < data_inicio:
-        return timedelta(0)
 
-    # Horário comercial
-    HORA_INICIO = time(7, 30)  # 7:30
-    HORA_FIM = time(17, 0)     # 17:00
-    HORAS_DIA = 9.5            # 9h30min por dia
-
-    tempo_total = timedelta(0)
-    dia_atual = data_inicio.date()
-
-    while dia_atual <= data_fim.date():
-        # Pular finais de semana (sábado=5, domingo=6)
-        if dia_atual.weekday() < 5:  # Segunda a Sexta
-            # Determinar início do período para este dia
-            if dia_atual == data_inicio.date():
-                inicio_periodo = data_inicio.time()
-            else:
-                inicio_periodo = HORA_INICIO
+def calcular_tempo_util_lote(periodos):
+    """
+    Calcula o tempo útil de vários períodos de uma vez (índice obtido uma vez).
 
-            # Determinar fim do período para este dia
-            if dia_atual == data_fim.date():
-                fim_periodo = data_fim.time()
-            else:
-                fim_periodo = HORA_FIM
+    Args:
+        periodos: iterável de (data_inicio, data_fim)
 
-            # Ajustar para horário comercial
-            if inicio_periodo < HORA_INICIO:
-                inicio_periodo = HORA_INICIO
-            if fim_periodo > HORA_FIM:
-                fim_periodo = HORA_FIM
+    Returns:
+        list - Tempo útil de cada período, em segundos (float)
+    """
+    normalizados = [_normalizar_periodo(inicio, fim) for inicio, fim in periodos]
 
-            # Calcular tempo útil deste dia
-            if inicio_periodo < fim_periodo:
-                inicio_dt = datetime.combine(dia_atual, inicio_periodo)
-                fim_dt = datetime.combine(dia_atual, fim_periodo)
-                tempo_total += fim_dt - inicio_dt
+    validos = [periodo for periodo in normalizados if periodo is not None]
+    if not validos:
+        return [0.0] * len(normalizados)
 
-        dia_atual += timedelta(days=1)
+    indice = obter_indice(
+        min(inicio.date() for inicio, _ in validos),
+        max(fim.date() for _, fim in validos)
+    )
 
-    return tempo_total
+    return [
+        max(indice.acumulado(periodo[1]) - indice.acumulado(periodo[0]), 0) / 10**6
+        if periodo is not None else 0.0
+        for periodo in normalizados
+    ]
 
 
 def calcular_metricas_dia():
     """
     Calcula métricas do dia atual para o dashboard.
+    Lidas do rollup MetricaDiaria (uma consulta por chave primária).
 
     Returns:
         dict - {
@@ -97,47 +104,14 @@ def calcular_metricas_dia():
             'total_pedidos_hoje': int
         }
     """
-    from apps.core.models import Pedido
-
-    hoje = timezone.localdate()
+    from apps.core.models import MetricaDiaria
 
-    # Pedidos finalizados hoje
-    finalizados_hoje = Pedido.objects.filter(
-        status='FINALIZADO',
-        data_finalizacao__date=hoje,
-        deletado=False
-    )
-
-    # Calcular tempo médio de separação
-    tempo_medio = None
-    if finalizados_hoje.exists():
-        tempos = []
-        for pedido in finalizados_hoje:
-            if pedido.data_criacao and pedido.data_finalizacao:
-                tempo = calcular_tempo_util(pedido.data_criacao, pedido.data_finalizacao)
-                tempos.append(tempo.total_seconds())
-
-        if tempos:
-            media_segundos = sum(tempos) / len(tempos)
-            tempo_medio = timedelta(seconds=media_segundos)
-
-    # Pedidos em aberto (não finalizados e não deletados)
-    pedidos_em_aberto = Pedido.objects.filter(
-        deletado=False
-    ).exclude(
-        status__in=['FINALIZADO', 'CANCELADO']
-    ).count()
-
-    # Total de pedidos criados hoje
-    total_pedidos_hoje = Pedido.objects.filter(
-        data_criacao__date=hoje,
-        deletado=False
-    ).count()
+    metrica = MetricaDiaria.obter(timezone.localdate())
 
     return {
-        'tempo_medio_separacao': tempo_medio,
-        'pedidos_em_aberto': pedidos_em_aberto,
-        'total_pedidos_hoje': total_pedidos_hoje
+        'tempo_medio_separacao': metrica.tempo_medio_separacao,
+        'pedidos_em_aberto': metrica.pedidos_em_aberto,
+        'total_pedidos_hoje': metrica.pedidos_criados
     }
 
 
@@ -164,6 +138,47 @@ def formatar_tempo(tempo_delta):
         return f"{minutos}min"
 
 
+PERCENTIS_SEPARACAO = (50, 90, 99)
+
+
+def calcular_percentis(sketch):
+    """
+    Percentis de tempo de separação a partir de um sketch de quantis.
+
+    Args:
+        sketch: DDSketch - Tempos em segundos
+
+    Returns:
+        dict - {'pedidos': int, 'p50': timedelta ou None, 'p50_formatado': str, ...}
+    """
+    percentis = {'pedidos': sketch.contagem}
+    for percentil in PERCENTIS_SEPARACAO:
+        segundos = sketch.quantil(percentil / 100)
+        tempo = timedelta(seconds=segundos) if segundos is not None else None
+        percentis[f'p{percentil}'] = tempo
+        percentis[f'p{percentil}_formatado'] = formatar_tempo(tempo)
+    return percentis
+
+
+def calcular_percentis_por_separador(data_inicio, data_fim):
+    """
+    Percentis de tempo de separação por separador (pedidos finalizados no período).
+    Um pedido conta para cada separador que separou algum item dele.
+
+    Returns:
+        list - [{'separador': str, 'pedidos': int, 'p50': ..., ...}] por nome
+    """
+    from apps.core.models import SketchTempoSeparacao
+
+    return sorted(
+        (
+            dict(calcular_percentis(sketch), separador=separador.nome)
+            for separador, sketch in SketchTempoSeparacao.mesclar_por_separador(data_inicio, data_fim).items()
+        ),
+        key=lambda linha: linha['separador']
+    )
+
+
 def calcular_metricas_periodo(data_inicio=None, data_fim=None):
     """
     Calcula métricas de pedidos para um período específico.
@@ -182,10 +197,12 @@ def calcular_metricas_periodo(data_inicio=None, data_fim=None):
             'tempo_medio_formatado': str,
             'itens_em_compra_total': int,
             'itens_em_compra_percentual': float (0-100),
-            'pedidos_por_status': dict
+            'pedidos_por_status': dict,
+            'percentis_separacao': dict (ver calcular_percentis)
         }
     """
-    from apps.core.models import Pedido, ItemPedido
+    from django.db.models import Count, Q, Sum
+    from apps.core.models import Pedido, ItemPedido, MetricaVendedorDiaria, SketchTempoSeparacao
 
     # Definir período padrão (últimos 30 dias)
     if not data_fim:
@@ -193,19 +210,28 @@ def calcular_metricas_periodo(data_inicio=None, data_fim=None):
     if not data_inicio:
         data_inicio = data_fim - timedelta(days=30)
 
-    # Query base: pedidos não deletados no período
-    pedidos = Pedido.objects.filter(
-        data_criacao__date__gte=data_inicio,
-        data_criacao__date__lte=data_fim,
-        deletado=False
-    )
+    # Rollup por dia/vendedor/status (pedidos não deletados criados no período)
+    pedidos_por_status = {status: 0 for status, _ in Pedido.STATUS_CHOICES}
+    soma_tempo_util = 0
+    finalizados_com_tempo = 0
+    for linha in MetricaVendedorDiaria.objects.filter(
+        data__gte=data_inicio,
+        data__lte=data_fim
+    ).values('status').annotate(
+        total=Sum('pedidos'),
+        com_tempo=Sum('finalizados_com_tempo'),
+        soma_tempo=Sum('soma_tempo_util')
+    ).order_by():
+        pedidos_por_status[linha['status']] = linha['total']
+        finalizados_com_tempo += linha['com_tempo']
+        soma_tempo_util += linha['soma_tempo']
 
     # Total de pedidos
-    total_pedidos = pedidos.count()
+    total_pedidos = sum(pedidos_por_status.values())
 
     # Pedidos por status
-    pedidos_finalizados = pedidos.filter(status='FINALIZADO').count()
-    pedidos_cancelados = pedidos.filter(status='CANCELADO').count()
+    pedidos_finalizados = pedidos_por_status['FINALIZADO']
+    pedidos_cancelados = pedidos_por_status['CANCELADO']
 
     # Taxa de conclusão (considerando apenas finalizados vs total - cancelados)
     pedidos_validos = total_pedidos - pedidos_cancelados
@@ -213,47 +239,21 @@ def calcular_metricas_periodo(data_inicio=None, data_fim=None):
 
     # Tempo médio de separação (apenas pedidos finalizados)
     tempo_medio = None
-    finalizados_com_tempo = pedidos.filter(
-        status='FINALIZADO',
-        data_finalizacao__isnull=False
-    )
+    if finalizados_com_tempo:
+        tempo_medio = timedelta(seconds=soma_tempo_util / finalizados_com_tempo)
 
-    if finalizados_com_tempo.exists():
-        tempos = []
-        for pedido in finalizados_com_tempo:
-            if pedido.data_criacao and pedido.data_finalizacao:
-                tempo = calcular_tempo_util(pedido.data_criacao, pedido.data_finalizacao)
-                tempos.append(tempo.total_seconds())
-
-        if tempos:
-            media_segundos = sum(tempos) / len(tempos)
-            tempo_medio = timedelta(seconds=media_segundos)
-
-    # Itens em compra (considerando todos os pedidos ativos, não apenas do período)
-    itens_em_compra = ItemPedido.objects.filter(
-        em_compra=True,
-        compra_realizada=False,
-        pedido__deletado=False
+    # Itens em compra e itens de pedidos ativos (todos os pedidos, não apenas do período)
+    itens = ItemPedido.objects.filter(pedido__deletado=False).aggregate(
+        em_compra=Count('id', filter=Q(em_compra=True, compra_realizada=False)),
+        ativos=Count('id', filter=~Q(pedido__status__in=['FINALIZADO', 'CANCELADO'])),
     )
-    itens_em_compra_total = itens_em_compra.count()
-
-    # Total de itens de pedidos ativos (não finalizados, não cancelados, não deletados)
-    total_itens_ativos = ItemPedido.objects.filter(
-        pedido__deletado=False
-    ).exclude(
-        pedido__status__in=['FINALIZADO', 'CANCELADO']
-    ).count()
+    itens_em_compra_total = itens['em_compra']
+    total_itens_ativos = itens['ativos']
 
     itens_em_compra_percentual = (itens_em_compra_total / total_itens_ativos * 100) if total_itens_ativos > 0 else 0
 
-    # Pedidos por status (detalhado)
-    pedidos_por_status = {
-        'PENDENTE': pedidos.filter(status='PENDENTE').count(),
-        'EM_SEPARACAO': pedidos.filter(status='EM_SEPARACAO').count(),
-        'AGUARDANDO_COMPRA': pedidos.filter(status='AGUARDANDO_COMPRA').count(),
-        'FINALIZADO': pedidos_finalizados,
-        'CANCELADO': pedidos_cancelados,
-    }
+    # Percentis do tempo de separação (pedidos finalizados no período)
+    percentis_separacao = calcular_percentis(SketchTempoSeparacao.mesclar_periodo(data_inicio, data_fim))
 
     return {
         'total_pedidos': total_pedidos,
@@ -265,6 +265,7 @@ def calcular_metricas_periodo(data_inicio=None, data_fim=None):
         'itens_em_compra_total': itens_em_compra_total,
         'itens_em_compra_percentual': round(itens_em_compra_percentual, 1),
         'pedidos_por_status': pedidos_por_status,
+        'percentis_separacao': percentis_separacao,
         'periodo': {
             'data_inicio': data_inicio,
             'data_fim': data_fim
@@ -283,7 +284,13 @@ __all__ = [
     'ALLOWED_EXTENSIONS',
     # Metrics and time utilities
     'calcular_tempo_util',
+    'calcular_tempo_util_lote',
+    # Business calendar
+    'obter_indice',
+    'invalidar_calendario',
     'calcular_metricas_dia',
     'formatar_tempo',
     'calcular_metricas_periodo',
+    'calcular_percentis',
+    'calcular_percentis_por_separador',
 ]
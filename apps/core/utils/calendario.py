@@ -0,0 +1,174 @@
+"""
+Índice de tempo útil compilado a partir do calendário operacional.
+
+Para cada dia do intervalo coberto guarda o tempo útil acumulado até o
+início do dia e a janela de expediente do dia (vazia em feriados e dias sem
+expediente). O tempo útil entre dois momentos vira duas consultas ao índice
+e uma subtração.
+
+O índice é compilado no primeiro uso do processo e só é recompilado quando o
+calendário muda: a alteração incrementa uma versão no cache (ver
+apps.core.signals) e cada processo confere essa versão no máximo a cada
+INTERVALO_VERIFICACAO segundos.
+"""
+import threading
+import time as _time
+from datetime import date, time, timedelta
+
+from django.core.cache import cache
+
+
+# Expediente usado quando não há nenhum dia cadastrado no calendário
+HORA_INICIO_PADRAO = time(7, 30)
+HORA_FIM_PADRAO = time(17, 0)
+DIAS_SEMANA_PADRAO = range(5)  # segunda a sexta
+
+CHAVE_VERSAO = 'calendario:versao'
+INTERVALO_VERIFICACAO = 30  # segundos
+
+# Intervalo inicial coberto pelo índice (ampliado sob demanda)
+DIAS_ANTES = 3 * 365
+DIAS_DEPOIS = 365
+
+
+def _micro_do_dia(hora):
+    """Microssegundos desde a meia-noite"""
+    return ((hora.hour * 60 + hora.minute) * 60 + hora.second) * 10**6 + hora.microsecond
+
+
+class IndiceTempoUtil:
+    """
+    Tempo útil acumulado por dia entre 'inicio' e 'fim' (inclusive).
+
+    Args:
+        janelas_semana: dict {dia_semana: (micro_inicio, micro_fim)}
+        feriados: conjunto de datas sem expediente
+        inicio, fim: date - Intervalo coberto
+    """
+
+    def __init__(self, janelas_semana, feriados, inicio, fim):
+        self.janelas_semana = dict(janelas_semana)
+        self.feriados = frozenset(feriados)
+        self.inicio = inicio
+        self.fim = fim
+
+        self._acumulado = [0]
+        self._janelas = []
+        dia = inicio
+        while dia <= fim:
+            janela = None if dia in self.feriados else self.janelas_semana.get(dia.weekday())
+            self._janelas.append(janela)
+            self._acumulado.append(self._acumulado[-1] + (janela[1] - janela[0] if janela else 0))
+            dia += timedelta(days=1)
+
+    def cobre(self, dia):
+        return self.inicio <= dia <= self.fim
+
+    def acumulado(self, momento):
+        """
+        Tempo útil (microssegundos) do início do índice até o momento.
+        Usa o horário de parede do próprio datetime (sem conversão de fuso).
+        """
+        indice = (momento.date() - self.inicio).days
+        total = self._acumulado[indice]
+
+        janela = self._janelas[indice]
+        if janela:
+            micro = _micro_do_dia(momento.time())
+            total += min(max(micro, janela[0]), janela[1]) - janela[0]
+
+        return total
+
+    def ampliado(self, inicio, fim):
+        """Novo índice com o mesmo calendário cobrindo também [inicio, fim]"""
+        return IndiceTempoUtil(
+            self.janelas_semana,
+            self.feriados,
+            min(self.inicio, inicio),
+            max(self.fim, fim)
+        )
+
+
+def carregar_calendario():
+    """
+    Lê o calendário operacional do banco.
+
+    Returns:
+        tuple - (janelas por dia da semana, conjunto de feriados)
+    """
+    from apps.core.models import CalendarioOperacional, Feriado
+
+    dias = list(CalendarioOperacional.objects.all())
+    if dias:
+        janelas = {
+            dia.dia_semana: (_micro_do_dia(dia.hora_inicio), _micro_do_dia(dia.hora_fim))
+            for dia in dias
+            if dia.hora_fim > dia.hora_inicio
+        }
+    else:
+        janela = (_micro_do_dia(HORA_INICIO_PADRAO), _micro_do_dia(HORA_FIM_PADRAO))
+        janelas = {dia_semana: janela for dia_semana in DIAS_SEMANA_PADRAO}
+
+    feriados = set(Feriado.objects.values_list('data', flat=True))
+    return janelas, feriados
+
+
+_lock = threading.Lock()
+_estado = {
+    'indice': None,
+    'versao': None,
+    'verificado_em': 0.0,
+}
+
+
+def _versao_cache():
+    return cache.get(CHAVE_VERSAO, 0)
+
+
+def obter_indice(inicio, fim):
+    """
+    Índice compilado cobrindo [inicio, fim].
+    Recompila se o calendário mudou (versão no cache) ou amplia se as datas
+    estiverem fora do intervalo coberto.
+    """
+    with _lock:
+        indice = _estado['indice']
+        agora = _time.monotonic()
+
+        if indice is not None and agora - _estado['verificado_em'] > INTERVALO_VERIFICACAO:
+            _estado['verificado_em'] = agora
+            if _versao_cache() != _estado['versao']:
+                indice = None
+
+        if indice is None:
+            _estado['versao'] = _versao_cache()
+            _estado['verificado_em'] = agora
+            hoje = date.today()
+            janelas, feriados = carregar_calendario()
+            indice = IndiceTempoUtil(
+                janelas,
+                feriados,
+                min(inicio, hoje - timedelta(days=DIAS_ANTES)),
+                max(fim, hoje + timedelta(days=DIAS_DEPOIS))
+            )
+        elif not (indice.cobre(inicio) and indice.cobre(fim)):
+            # Amplia com folga para não recompilar a cada data nova
+            margem = timedelta(days=365)
+            indice = indice.ampliado(inicio - margem, fim + margem)
+
+        _estado['indice'] = indice
+        return indice
+
+
+def invalidar_calendario():
+    """
+    Descarta o índice deste processo e incrementa a versão no cache,
+    para que os demais processos recompilem na próxima verificação.
+    """
+    with _lock:
+        _estado['indice'] = None
+
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 1, timeout=None)
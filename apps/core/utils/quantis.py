@@ -0,0 +1,162 @@
+"""
+Sketch de quantis mesclável (no estilo DDSketch) para distribuições de tempo.
+
+Cada valor positivo cai no bucket de índice ceil(log_gama(valor)), com
+gama = (1 + alfa) / (1 - alfa). O quantil estimado tem erro relativo de no
+máximo 'alfa' e dois sketches com o mesmo alfa são mesclados somando as
+contagens de cada bucket, então um período inteiro é respondido mesclando os
+sketches diários, com memória limitada pela quantidade de buckets (e não
+pela quantidade de valores).
+
+Serializável em JSON (para_dict/de_dict) para ser guardado no banco.
+"""
+import math
+
+
+ALFA_PADRAO = 0.01  # erro relativo de 1%
+MAX_BUCKETS = 2048
+
+# Valores até este limite (segundos) contam como zero
+VALOR_MINIMO = 1e-3
+
+
+class DDSketch:
+    """
+    Sketch de quantis com erro relativo limitado.
+
+    Args:
+        alfa: float - Erro relativo máximo dos quantis
+        max_buckets: int - Limite de buckets (os menores são agrupados)
+    """
+
+    def __init__(self, alfa=ALFA_PADRAO, max_buckets=MAX_BUCKETS):
+        self.alfa = alfa
+        self.gama = (1 + alfa) / (1 - alfa)
+        self.max_buckets = max_buckets
+        self._log_gama = math.log(self.gama)
+
+        self.buckets = {}
+        self.zeros = 0
+        self.contagem = 0
+        self.minimo = None
+        self.maximo = None
+
+    def __len__(self):
+        return self.contagem
+
+    def _indice(self, valor):
+        return math.ceil(math.log(valor) / self._log_gama)
+
+    def _valor(self, indice):
+        """Valor representativo do bucket (erro relativo <= alfa)"""
+        return 2 * self.gama ** indice / (self.gama + 1)
+
+    def adicionar(self, valor, quantidade=1):
+        """Adiciona um valor (>= 0) 'quantidade' vezes"""
+        if valor < 0:
+            raise ValueError('O sketch aceita apenas valores não negativos.')
+
+        if valor <= VALOR_MINIMO:
+            self.zeros += quantidade
+        else:
+            indice = self._indice(valor)
+            self.buckets[indice] = self.buckets.get(indice, 0) + quantidade
+            if len(self.buckets) > self.max_buckets:
+                self._colapsar()
+
+        self.contagem += quantidade
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+
+    def remover(self, valor, quantidade=1):
+        """
+        Remove um valor adicionado anteriormente.
+        Mínimo e máximo continuam sendo limites (não são recalculados).
+        """
+        if valor <= VALOR_MINIMO:
+            removidos = min(quantidade, self.zeros)
+            self.zeros -= removidos
+        else:
+            indice = self._indice(valor)
+            atual = self.buckets.get(indice, 0)
+            removidos = min(quantidade, atual)
+            if atual - removidos > 0:
+                self.buckets[indice] = atual - removidos
+            else:
+                self.buckets.pop(indice, None)
+
+        self.contagem -= removidos
+        if not self.contagem:
+            self.minimo = self.maximo = None
+
+    def mesclar(self, outro):
+        """Soma as contagens de outro sketch (mesmo alfa) neste"""
+        if not math.isclose(self.gama, outro.gama):
+            raise ValueError('Só é possível mesclar sketches com o mesmo alfa.')
+        if not outro.contagem:
+            return self
+
+        for indice, quantidade in outro.buckets.items():
+            self.buckets[indice] = self.buckets.get(indice, 0) + quantidade
+        if len(self.buckets) > self.max_buckets:
+            self._colapsar()
+
+        self.zeros += outro.zeros
+        self.contagem += outro.contagem
+        self.minimo = outro.minimo if self.minimo is None else min(self.minimo, outro.minimo)
+        self.maximo = outro.maximo if self.maximo is None else max(self.maximo, outro.maximo)
+        return self
+
+    def _colapsar(self):
+        """Agrupa os menores buckets até respeitar max_buckets"""
+        indices = sorted(self.buckets)
+        excesso = len(indices) - self.max_buckets
+        destino = indices[excesso]
+        for indice in indices[:excesso]:
+            self.buckets[destino] += self.buckets.pop(indice)
+
+    def quantil(self, q):
+        """
+        Estimativa do quantil q (0 a 1).
+
+        Returns:
+            float - Valor estimado, ou None se o sketch estiver vazio
+        """
+        if not self.contagem:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError('O quantil deve estar entre 0 e 1.')
+
+        posicao = q * (self.contagem - 1)
+        acumulado = self.zeros
+        if acumulado > posicao:
+            return 0.0
+
+        for indice in sorted(self.buckets):
+            acumulado += self.buckets[indice]
+            if acumulado > posicao:
+                return min(max(self._valor(indice), self.minimo), self.maximo)
+
+        return self.maximo
+
+    def para_dict(self):
+        """Representação JSON do sketch"""
+        return {
+            'alfa': self.alfa,
+            'zeros': self.zeros,
+            'contagem': self.contagem,
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'buckets': {str(indice): quantidade for indice, quantidade in self.buckets.items()},
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Reconstrói um sketch salvo com para_dict (dict vazio = sketch vazio)"""
+        sketch = cls(alfa=dados.get('alfa', ALFA_PADRAO))
+        sketch.zeros = dados.get('zeros', 0)
+        sketch.contagem = dados.get('contagem', 0)
+        sketch.minimo = dados.get('minimo')
+        sketch.maximo = dados.get('maximo')
+        sketch.buckets = {int(indice): quantidade for indice, quantidade in dados.get('buckets', {}).items()}
+        return sketch
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.utils import timezone
@@ -6,12 +7,22 @@ from django.views.decorators.http import require_http_methods
 from django.views.decorators.cache import never_cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
+from django.db.models import Q
 from datetime import timedelta, datetime, date
 import copy
+import json
 import logging
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .models import Usuario, LogAuditoria, Pedido, ItemPedido, Produto, SistemaConfig
+from .models import (
+    Usuario,
+    LogAuditoria,
+    Pedido,
+    ItemPedido,
+    Produto,
+    SistemaConfig,
+    MetricaDiaria,
+    SketchTempoSeparacao,
+    ItemStateSummary,
+)
 from .forms import (
     CriarUsuarioForm,
     EditarUsuarioForm,
@@ -19,6 +30,17 @@ from .forms import (
     HistoricoFiltrosForm,
     EmptyStateImageForm,
 )
+from .utils import calcular_tempo_util
+from .services import outbox, sincronizacao, transitions
+from .services.idempotencia import idempotente
+from .services.dashboard import (
+    montar_card,
+    montar_snapshot,
+    versao_atual,
+    etag_snapshot,
+    obter_snapshot_serializado,
+    montar_delta,
+)
 from .permissions import (
     login_required_custom,
     administrador_required,
@@ -43,79 +65,9 @@ def get_client_ip(request):
     return ip
 
 
-# =====================
-# WEBSOCKET HELPER FUNCTIONS
-# =====================
-
 logger = logging.getLogger(__name__)
 
 
-def broadcast_to_websocket(group_name, message_type, data):
-    """
-    Helper function for WebSocket broadcasts with error handling
-
-    Args:
-        group_name: The channel group name to broadcast to
-        message_type: The type of message (e.g., 'item_separado', 'item_em_compra')
-        data: Dictionary with data to send
-
-    Returns:
-        True if broadcast was successful, False otherwise
-    """
-    channel_layer = get_channel_layer()
-    if channel_layer:
-        try:
-            message = {"type": message_type}
-            message.update(data)
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                message
-            )
-            logger.debug(f"[WebSocket] Broadcast sent: {message_type} to {group_name}")
-            return True
-        except Exception as e:
-            logger.error(f"[WebSocket] Broadcast failed: {e} (type: {message_type}, group: {group_name})")
-            return False
-    else:
-        logger.warning(f"[WebSocket] channel_layer is None - broadcast failed for {group_name}")
-        return False
-
-
-def broadcast_card_status_update(pedido):
-    """
-    Broadcasts card_status update to dashboard
-
-    Args:
-        pedido: Pedido instance
-
-    Returns:
-        True if broadcast was successful, False otherwise
-    """
-    try:
-        card_status_code, card_status_display = pedido.get_card_status()
-
-        # Obter nomes únicos dos separadores (para badges no card)
-        # Usar set() para garantir valores únicos
-        separadores = list(set(
-            pedido.itens.filter(separado=True, separado_por__isnull=False)
-            .values_list('separado_por__nome', flat=True)
-        ))
-
-        return broadcast_to_websocket(
-            "dashboard",
-            "card_status_updated",
-            {
-                "pedido_id": pedido.id,
-                "card_status": card_status_code,
-                "card_status_display": card_status_display,
-                "separadores": separadores,
-            }
-        )
-    except Exception as e:
-        logger.error(f"[WebSocket] Failed to broadcast card_status for pedido {pedido.id}: {e}")
-        return False
-
-
 # Cache para rate limiting (em memória)
 # Estrutura: {'numero_login': {'tentativas': int, 'primeiro_timestamp': datetime}}
 RATE_LIMIT_CACHE = {}
@@ -460,13 +412,8 @@ def dashboard(request):
         }
     }
 
-    # Buscar apenas pedidos ativos (não finalizados e não deletados)
-    # Ordenação será feita em Python por data de criação (mais recentes primeiro)
-    pedidos = Pedido.objects.filter(
-        deletado=False
-    ).exclude(
-        status__in=['FINALIZADO', 'CANCELADO']
-    ).select_related('vendedor').prefetch_related('itens')
+    # Cards dos pedidos ativos (uma consulta, mais recentes primeiro)
+    pedidos_data = montar_snapshot()
 
     # Calcular métricas do dia
     metricas = calcular_metricas_dia()
@@ -477,55 +424,6 @@ def dashboard(request):
         ativo=True
     ).order_by('nome')
 
-    # Preparar dados dos pedidos para o template
-    pedidos_data = []
-    for pedido in pedidos:
-        # Calcular itens separados e substituídos para a barra de progresso
-        itens = pedido.itens.all()
-        total_itens = itens.count()
-        itens_separados = itens.filter(separado=True).count()
-        itens_substituidos = itens.filter(substituido=True).count()
-        # Substituídos já são contados como separados, não somar duas vezes
-        itens_completos = itens_separados
-        porcentagem_separacao = (itens_completos / total_itens * 100) if total_itens > 0 else 0
-
-        # Obter nomes únicos dos separadores (para badges no card)
-        # Usar set() para garantir valores únicos
-        separadores = list(set(
-            itens.filter(separado=True, separado_por__isnull=False)
-            .values_list('separado_por__nome', flat=True)
-        ))
-
-        # Obter card_status baseado no estado dos itens
-        card_status_code, card_status_display = pedido.get_card_status()
-        card_status_css = pedido.get_card_status_css()
-
-        pedidos_data.append({
-            'id': pedido.id,
-            'numero_orcamento': pedido.numero_orcamento,
-            'cliente': pedido.nome_cliente,
-            'vendedor': pedido.vendedor.nome,
-            'vendedor_id': pedido.vendedor.id,
-            'status': pedido.status,
-            'status_display': pedido.get_status_display(),
-            'card_status': card_status_code,
-            'card_status_display': card_status_display,
-            'card_status_css': card_status_css,
-            'data': pedido.data.strftime('%d/%m/%Y'),
-            'data_criacao': pedido.data_criacao.strftime('%d/%m/%Y %H:%M'),
-            'data_criacao_timestamp': pedido.data_criacao.timestamp(),
-            'criado_em': pedido.data_criacao.isoformat(),
-            'total_itens': total_itens,
-            'logistica': pedido.get_logistica_display() if pedido.logistica else "Não definida",
-            'embalagem': pedido.get_embalagem_display() if pedido.embalagem else "Embalagem padrão",
-            'itens_separados': itens_completos,
-            'porcentagem_separacao': round(porcentagem_separacao, 1),
-            'separadores': separadores,
-        })
-
-    # Ordenar pedidos por data de criação (mais recentes primeiro)
-    pedidos_data.sort(key=lambda p: -p['data_criacao_timestamp'])
-
     # Calcular estatísticas de compras (para COMPRADORA e ADMIN)
     itens_aguardando_compra = 0
     if request.user.tipo in ['COMPRADORA', 'ADMINISTRADOR']:
@@ -566,56 +464,47 @@ def dashboard_refresh_ajax(request):
     """
     AJAX endpoint to refresh dashboard data without page reload.
     Returns JSON with list of active pedidos data for client-side updates.
+
+    O snapshot é versionado: com If-None-Match igual ao ETag atual,
+    responde 304 sem consultar os pedidos.
+
+    Com ?since=<seq> responde apenas os cards alterados e os ids removidos
+    desde a sequência informada (ou o snapshot completo se ela for antiga demais).
     """
-    from django.http import JsonResponse
-
-    # Buscar apenas pedidos ativos (não finalizados e não deletados)
-    pedidos = Pedido.objects.filter(
-        deletado=False
-    ).exclude(
-        status__in=['FINALIZADO', 'CANCELADO']
-    ).select_related('vendedor').prefetch_related('itens')
-
-    # Preparar dados dos pedidos para JSON (mesma lógica do dashboard)
-    pedidos_data = []
-    for pedido in pedidos:
-        itens = pedido.itens.all()
-        total_itens = itens.count()
-        itens_separados = itens.filter(separado=True).count()
-        itens_completos = itens_separados
-        porcentagem_separacao = (itens_completos / total_itens * 100) if total_itens > 0 else 0
-
-        # Obter nomes únicos dos separadores
-        separadores = list(set(
-            itens.filter(separado=True, separado_por__isnull=False)
-            .values_list('separado_por__nome', flat=True)
-        ))
-
-        # Obter card_status
-        card_status_code, card_status_display = pedido.get_card_status()
-
-        pedidos_data.append({
-            'id': pedido.id,
-            'numero_orcamento': pedido.numero_orcamento,
-            'nome_cliente': pedido.nome_cliente,
-            'vendedor': pedido.vendedor.nome if pedido.vendedor else "Sem vendedor",
-            'status': pedido.status,
-            'card_status': card_status_code,
-            'card_status_display': card_status_display,
-            'data_criacao': pedido.criado_em.isoformat(),
-            'data_criacao_timestamp': int(pedido.criado_em.timestamp()),
-            'logistica': pedido.get_logistica_display() if pedido.logistica else "Logística padrão",
-            'embalagem': pedido.get_embalagem_display() if pedido.embalagem else "Embalagem padrão",
-            'itens_separados': itens_completos,
-            'total_itens': total_itens,
-            'porcentagem_separacao': round(porcentagem_separacao, 1),
-            'separadores': separadores,
-        })
+    from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+    from django.utils.http import parse_etags
 
-    # Ordenar por data de criação (mais recentes primeiro)
-    pedidos_data.sort(key=lambda p: -p['data_criacao_timestamp'])
+    versao = versao_atual()
+    etag = etag_snapshot(versao)
+
+    try:
+        desde = int(request.GET['since'])
+    except (KeyError, ValueError):
+        desde = None
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return _resposta_refresh(HttpResponseNotModified(), etag)
 
-    return JsonResponse({'pedidos': pedidos_data})
+    delta = montar_delta(desde) if desde is not None else None
+    if delta is not None:
+        delta['versao'] = versao
+        response = JsonResponse(delta)
+    else:
+        # Mesmos cards do dashboard (snapshot compartilhado, em cache por versão)
+        versao, corpo = obter_snapshot_serializado()
+        etag = etag_snapshot(versao)
+        response = HttpResponse(corpo, content_type='application/json')
+
+    return _resposta_refresh(response, etag)
+
+
+def _resposta_refresh(response, etag):
+    """Adiciona ETag e exige revalidação (cache privado) na resposta do refresh"""
+    from django.utils.cache import patch_cache_control
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required_custom
@@ -627,22 +516,19 @@ def pedido_detalhe_view(request, pedido_id):
     """
     pedido = get_object_or_404(Pedido, id=pedido_id, deletado=False)
 
-    # Buscar itens do pedido
-    itens = pedido.itens.select_related('produto', 'separado_por', 'marcado_compra_por').all()
+    # Buscar itens do pedido (uma consulta; o resumo é calculado em memória)
+    itens = list(pedido.itens.select_related('produto', 'separado_por', 'marcado_compra_por').all())
+    resumo = ItemStateSummary.de_itens(itens)
 
-    # Calcular estatísticas do pedido
-    total_itens = itens.count()
-    itens_separados = itens.filter(separado=True).count()
-    itens_substituidos = itens.filter(substituido=True).count()
-    itens_em_compra = itens.filter(em_compra=True).count()
     # Substituídos já são contados como separados
+    total_itens = resumo.total
+    itens_separados = resumo.separados
+    itens_substituidos = resumo.substituidos
+    itens_em_compra = resumo.em_compra
     itens_pendentes = total_itens - itens_separados
 
-    # Substituídos já são contados como separados, não somar duas vezes
-    progresso_separacao = (itens_separados / total_itens * 100) if total_itens > 0 else 0
-
     # Verificar se pode finalizar
-    pode_finalizar = pedido.pode_ser_finalizado()
+    pode_finalizar, _ = resumo.pode_ser_finalizado
 
     # Verificar se pode deletar (vendedor que criou ou admin)
     pode_deletar = (
@@ -650,24 +536,10 @@ def pedido_detalhe_view(request, pedido_id):
         (request.user.tipo == 'VENDEDOR' and pedido.vendedor == request.user)
     )
 
-    # Calcular card_status para exibir no header (igual ao dashboard)
-    card_status_code, card_status_display = pedido.get_card_status()
-
-    # Definir CSS class baseado no card_status
-    card_status_css_map = {
-        'NAO_INICIADO': 'nao-iniciado',
-        'EM_SEPARACAO': 'em-separacao',
-        'AGUARDANDO_COMPRA': 'aguardando-compra',
-        'CONCLUIDO': 'concluido',
-    }
-    card_status_css = card_status_css_map.get(card_status_code, 'nao-iniciado')
-
-    # Extrair nomes únicos de separadores (igual ao dashboard)
-    separadores = list(set(
-        item.separado_por.nome
-        for item in itens
-        if item.separado and item.separado_por
-    ))
+    # Card status e separadores para o header (igual ao dashboard)
+    card_status_code, card_status_display = resumo.card_status
+    card_status_css = resumo.card_status_css
+    separadores = resumo.separadores
 
     context = {
         'pedido': pedido,
@@ -677,7 +549,7 @@ def pedido_detalhe_view(request, pedido_id):
         'itens_substituidos': itens_substituidos,
         'itens_em_compra': itens_em_compra,
         'itens_pendentes': itens_pendentes,
-        'progresso_separacao': round(progresso_separacao, 1),
+        'progresso_separacao': resumo.porcentagem_separacao,
         'pode_finalizar': pode_finalizar,
         'pode_deletar': pode_deletar,
         # Novos dados para o header
@@ -685,7 +557,7 @@ def pedido_detalhe_view(request, pedido_id):
         'card_status_display': card_status_display,
         'card_status_css': card_status_css,
         'separadores': separadores,
-        'porcentagem_separacao': round(progresso_separacao, 1),  # Alias para compatibilidade
+        'porcentagem_separacao': resumo.porcentagem_separacao,  # Alias para compatibilidade
     }
 
     return render(request, 'pedido_detalhe.html', context)
@@ -854,6 +726,17 @@ def confirmar_pedido_view(request):
                             preco_unitario=Decimal(produto_data['preco_unitario'])
                         )
 
+                    # Contador desnormalizado (demais contadores começam em zero)
+                    pedido.total_itens = len(dados_pdf['produtos'])
+                    pedido.save(update_fields=['total_itens'])
+
+                    # Rollup diário (criados hoje / em aberto)
+                    MetricaDiaria.registrar(
+                        timezone.localdate(pedido.data_criacao),
+                        pedidos_criados=1,
+                        pedidos_em_aberto=1
+                    )
+
                     # Registrar no log
                     ip = get_client_ip(request)
                     user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
@@ -872,45 +755,9 @@ def confirmar_pedido_view(request):
                         user_agent=user_agent
                     )
 
-                    # Broadcast WebSocket - notificar todos os dashboards
-                    from channels.layers import get_channel_layer
-                    from asgiref.sync import async_to_sync
-
-                    channel_layer = get_channel_layer()
-                    if channel_layer:
-                        # Garantir formatação de data (pedido.data já é date object após save)
-                        data_formatada = pedido.data.strftime('%d/%m/%Y') if hasattr(pedido.data, 'strftime') else str(pedido.data)
-                        data_criacao_formatada = pedido.data_criacao.strftime('%d/%m/%Y %H:%M') if hasattr(pedido.data_criacao, 'strftime') else str(pedido.data_criacao)
-
-                        # Obter card_status
-                        card_status_code, card_status_display = pedido.get_card_status()
-                        card_status_css = pedido.get_card_status_css()
-
-                        async_to_sync(channel_layer.group_send)(
-                            "dashboard",
-                            {
-                                "type": "pedido_criado",
-                                "pedido": {
-                                    "id": pedido.id,
-                                    "numero_orcamento": pedido.numero_orcamento,
-                                    "cliente": pedido.nome_cliente,
-                                    "vendedor": pedido.vendedor.nome,
-                                    "vendedor_id": pedido.vendedor.id,
-                                    "status": pedido.status,
-                                    "status_display": pedido.get_status_display(),
-                                    "card_status": card_status_code,
-                                    "card_status_display": card_status_display,
-                                    "card_status_css": card_status_css,
-                                    "data": data_formatada,
-                                    "data_criacao": data_criacao_formatada,
-                                    "total_itens": pedido.itens.count(),
-                                    "logistica": pedido.logistica or "Não definida",
-                                    "embalagem": pedido.embalagem or "Embalagem padrão",
-                                    "separadores": [],  # Novo pedido não tem separadores ainda
-                                    "porcentagem_separacao": 0,  # Sempre 0 para novos pedidos
-                                }
-                            }
-                        )
+                    # Broadcast WebSocket - notificar todos os dashboards (após o commit)
+                    # Mesmo formato de card do dashboard e do refresh AJAX
+                    outbox.publicar([("dashboard", {"type": "pedido_criado", "pedido": montar_card(pedido)})])
 
                     # Limpar sessão
                     del request.session['dados_pdf']
@@ -942,14 +789,46 @@ def confirmar_pedido_view(request):
 # =====================
 
 from .forms import SubstituirProdutoForm, MarcarCompraForm
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.http import JsonResponse
 
 # Logger para debugging
 logger = logging.getLogger(__name__)
 
 
+def _executar_transicao_item(request, item_id, transicao, rotulo):
+    """
+    Executa a transição de um item pelo motor de transições (UPDATE
+    condicional, auditoria e eventos; ver apps.core.services.transitions).
+
+    Returns:
+        tuple - (ResultadoTransicao, None) ou (None, JsonResponse de erro)
+    """
+    # Safe user access - avoid AttributeError if user is AnonymousUser
+    username = getattr(request.user, 'nome', 'anonymous') if hasattr(request.user, 'is_authenticated') and request.user.is_authenticated else 'anonymous'
+    logger.info(f"[{rotulo}] Requisição recebida - Item ID: {item_id}, User: {username}")
+
+    try:
+        resultado = transitions.executar(
+            [(item_id, transicao)],
+            request.user,
+            ip=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
+        )
+    except Exception as e:
+        logger.error(f"[{rotulo}] ✗ ERRO ao processar item {item_id}: {str(e)}", exc_info=True)
+        return None, JsonResponse({'success': False, 'error': f'Erro ao processar: {str(e)}'}, status=500)
+
+    if resultado.nao_encontrados:
+        raise Http404('Item não encontrado.')
+    if resultado.negadas:
+        erro = resultado.negadas[item_id]
+        logger.warning(f"[{rotulo}] {erro} - Item ID: {item_id}")
+        return None, JsonResponse({'success': False, 'error': erro}, status=400)
+
+    return resultado.aplicadas[0], None
+
+
+@idempotente
 @login_required_custom
 @require_http_methods(["POST"])
 @transaction.atomic()  # Garantir transação atômica
@@ -958,290 +837,146 @@ def separar_item_view(request, item_id):
     View para marcar um item como separado (tudo-ou-nada).
     Disponível para qualquer usuário autenticado.
     """
-    # Safe user access - avoid AttributeError if user is AnonymousUser
-    username = getattr(request.user, 'nome', 'anonymous') if hasattr(request.user, 'is_authenticated') and request.user.is_authenticated else 'anonymous'
-    logger.info(f"[SEPARAR ITEM] Requisição recebida - Item ID: {item_id}, User: {username}")
+    resultado, erro = _executar_transicao_item(request, item_id, transitions.Separar(), 'SEPARAR ITEM')
+    if erro:
+        return erro
 
-    try:
-        item = get_object_or_404(ItemPedido, id=item_id)
-        pedido = item.pedido
+    item = resultado.item
+    pedido = resultado.pedido
+    porcentagem_separacao = pedido.porcentagem_separacao
 
-        logger.info(f"[SEPARAR ITEM] Item encontrado - Produto: {item.produto.descricao[:50]}, Pedido: {pedido.numero_orcamento}")
+    logger.info(f"[SEPARAR ITEM] ✓ PROCESSO COMPLETO - Item {item.id} separado com sucesso, progresso: {porcentagem_separacao}%")
+    return JsonResponse({
+        'success': True,
+        'item_id': item.id,
+        'separado_por': request.user.nome,
+        'separado_em': item.separado_em.strftime('%d/%m/%Y %H:%M'),
+        'pedido_status': pedido.status,
+        'porcentagem_separacao': porcentagem_separacao
+    })
 
-        # Verificar se pedido não está deletado
-        if pedido.deletado:
-            logger.warning(f"[SEPARAR ITEM] Pedido deletado - Item ID: {item_id}")
-            return JsonResponse({'success': False, 'error': 'Pedido foi deletado.'}, status=400)
 
-        # Verificar se já está separado
-        if item.separado:
-            logger.warning(f"[SEPARAR ITEM] Item já separado - Item ID: {item_id}")
-            return JsonResponse({'success': False, 'error': 'Item já está separado.'}, status=400)
+def _ler_lote_separacao(request):
+    """
+    Lê os itens do lote: JSON {"itens": [ids], "codigos": [códigos]} ou
+    formulário com os campos repetidos 'itens' e 'codigos'.
 
-        # Verificar se está substituído
-        if item.substituido:
-            logger.warning(f"[SEPARAR ITEM] Item substituído - Item ID: {item_id}")
-            return JsonResponse({'success': False, 'error': 'Item foi substituído.'}, status=400)
+    Returns:
+        tuple - (ids de item, códigos de produto), ou None se o corpo for inválido
+    """
+    if request.content_type == 'application/json':
+        try:
+            dados = json.loads(request.body or b'{}')
+            ids = [int(item_id) for item_id in dados.get('itens', [])]
+            codigos = [str(codigo).strip() for codigo in dados.get('codigos', [])]
+        except (ValueError, TypeError, AttributeError):
+            return None
+    else:
+        try:
+            ids = [int(item_id) for item_id in request.POST.getlist('itens')]
+        except ValueError:
+            return None
+        codigos = [codigo.strip() for codigo in request.POST.getlist('codigos')]
 
-        # Verificar se item estava marcado para compra
-        estava_em_compra = item.em_compra
+    return ids, [codigo for codigo in codigos if codigo]
 
-        # Marcar como separado (e remover de compra se estava)
-        item.separado = True
-        item.em_compra = False  # Remove da lista de compras
-        item.separado_por = request.user
-        item.separado_em = timezone.now()
 
-        logger.info(f"[SEPARAR ITEM] Salvando item - ID: {item.id}, separado=True, user={username}")
-        item.save(update_fields=['separado', 'em_compra', 'separado_por', 'separado_em'])
-        logger.info(f"[SEPARAR ITEM] ✓ Item salvo com sucesso - ID: {item.id}")
+@idempotente
+@login_required_custom
+@require_http_methods(["POST"])
+@transaction.atomic()
+def separar_lote_view(request, pedido_id):
+    """
+    Separa vários itens de um pedido de uma vez (leitura por scanner).
+    Aceita ids de item e/ou códigos de produto; todos os itens do pedido com
+    o código informado são separados.
+
+    Gravado pelo motor de transições: mesmo número de consultas e uma
+    mensagem WebSocket por group independente do tamanho do lote, e uma
+    única entrada de auditoria para o lote. Itens já separados ou
+    substituídos são ignorados (listados na resposta).
+    Disponível para qualquer usuário autenticado.
+    """
+    lote = _ler_lote_separacao(request)
+    if lote is None:
+        return JsonResponse({'success': False, 'error': 'Lote inválido.'}, status=400)
 
-    except Exception as e:
-        logger.error(f"[SEPARAR ITEM] ✗ ERRO ao salvar item {item_id}: {str(e)}", exc_info=True)
-        return JsonResponse({'success': False, 'error': f'Erro ao processar: {str(e)}'}, status=500)
+    ids, codigos = lote
+    if not ids and not codigos:
+        return JsonResponse({'success': False, 'error': 'Informe itens ou códigos de produto.'}, status=400)
 
-    # Atualizar status do pedido se necessário
-    if pedido.status == 'PENDENTE':
-        pedido.status = 'EM_SEPARACAO'
-        pedido.save()
+    pedido = get_object_or_404(Pedido, id=pedido_id, deletado=False)
 
-    # Auditoria
-    ip = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-    LogAuditoria.objects.create(
-        usuario=request.user,
-        acao='separar_item_direto' if estava_em_compra else 'separar_item',
-        modelo='ItemPedido',
-        objeto_id=item.id,
-        dados_novos={
-            'item_id': item.id,
-            'pedido_id': pedido.id,
-            'produto': item.produto.descricao,
-            'quantidade': str(item.quantidade_solicitada),
-            'estava_em_compra': estava_em_compra
-        },
-        ip=ip,
-        user_agent=user_agent
+    itens = list(
+        pedido.itens.filter(Q(id__in=ids) | Q(produto__codigo__in=codigos)).values_list('id', 'produto__codigo')
     )
-
-    # Broadcast WebSocket para o pedido
-    broadcast_to_websocket(
-        f"pedido_{pedido.id}",
-        "item_separado",
-        {
-            "item": {
-                "id": item.id,
-                "separado": True,
-                "separado_por": request.user.nome,
-                "separado_em": timezone.localtime(item.separado_em).strftime('%d/%m/%Y %H:%M')
-            }
-        }
+    encontrados_ids = {item_id for item_id, _ in itens}
+    encontrados_codigos = {codigo for _, codigo in itens}
+    nao_encontrados = (
+        [item_id for item_id in ids if item_id not in encontrados_ids]
+        + [codigo for codigo in codigos if codigo not in encontrados_codigos]
     )
 
-    # Calcular porcentagem de separação para atualização em tempo real
-    itens_separados_count = pedido.itens.filter(separado=True).count()
-    total_itens_count = pedido.itens.count()
-    porcentagem_separacao = round((itens_separados_count / total_itens_count * 100), 1) if total_itens_count > 0 else 0
-
-    # Broadcast para dashboard (pedido atualizado)
-    broadcast_to_websocket(
-        "dashboard",
-        "pedido_atualizado",
-        {
-            "pedido": {
-                "id": pedido.id,
-                "numero_orcamento": pedido.numero_orcamento,
-                "status": pedido.status,
-                "porcentagem_separacao": porcentagem_separacao
-            }
+    def auditoria_lote(resultado):
+        return 'separar_itens_lote', 'Pedido', pedido.id, {
+            'pedido_id': pedido.id,
+            'itens': [aplicada.item.id for aplicada in resultado.aplicadas],
+            'estavam_em_compra': [aplicada.item.id for aplicada in resultado.aplicadas if aplicada.anterior.em_compra],
+            'quantidade': len(resultado.aplicadas)
         }
+
+    resultado = transitions.executar(
+        [(item_id, transitions.Separar()) for item_id in sorted(encontrados_ids)],
+        request.user,
+        ip=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+        auditoria=auditoria_lote
     )
+    ignorados = sorted(resultado.negadas)
 
-    # Broadcast card_status update
-    broadcast_card_status_update(pedido)
+    if not resultado.aplicadas:
+        return JsonResponse({
+            'success': False,
+            'error': 'Nenhum item a separar.',
+            'ignorados': ignorados,
+            'nao_encontrados': nao_encontrados
+        }, status=400)
 
-    # Se estava em compra, broadcast para painel de compras
-    if estava_em_compra:
-        broadcast_to_websocket(
-            "painel_compras",
-            "item_separado_direto",
-            {
-                "item": {
-                    "id": item.id,
-                    "produto_codigo": item.produto.codigo,
-                    "produto_descricao": item.produto.descricao,
-                    "pedido_id": pedido.id,
-                    "pedido_numero": pedido.numero_orcamento
-                }
-            }
-        )
+    pedido = resultado.pedidos[pedido.id]
+    separados = [aplicada.item.id for aplicada in resultado.aplicadas]
+    separado_em = timezone.localtime(resultado.aplicadas[0].item.separado_em).strftime('%d/%m/%Y %H:%M')
 
-    logger.info(f"[SEPARAR ITEM] ✓ PROCESSO COMPLETO - Item {item.id} separado com sucesso, progresso: {porcentagem_separacao}%")
+    logger.info(f"[SEPARAR LOTE] Pedido {pedido.numero_orcamento}: {len(separados)} item(ns) separado(s)")
     return JsonResponse({
         'success': True,
-        'item_id': item.id,
+        'pedido_id': pedido.id,
+        'separados': separados,
+        'ignorados': ignorados,
+        'nao_encontrados': nao_encontrados,
         'separado_por': request.user.nome,
-        'separado_em': item.separado_em.strftime('%d/%m/%Y %H:%M'),
+        'separado_em': separado_em,
         'pedido_status': pedido.status,
-        'porcentagem_separacao': porcentagem_separacao
+        'porcentagem_separacao': pedido.porcentagem_separacao
     })
 
 
+@idempotente
 @login_required_custom
 @require_http_methods(["POST"])
 @transaction.atomic()
 def unseparar_item_view(request, item_id):
     """
     View para desseparar um item (reverter separação).
-    Remove marcação de separação e retorna item ao estado Pendente.
-    IMPORTANTE: Não permite desseparar itens substituídos.
+    Remove marcação de separação e retorna item ao estado Pendente,
+    limpando também substituição e marcação de compra.
     """
-    # Safe user access - avoid AttributeError if user is AnonymousUser
-    username = getattr(request.user, 'nome', 'anonymous') if hasattr(request.user, 'is_authenticated') and request.user.is_authenticated else 'anonymous'
-    logger.info(f"[UNSEPARAR ITEM] Requisição recebida - Item ID: {item_id}, User: {username}")
-
-    try:
-        item = get_object_or_404(ItemPedido, id=item_id)
-        pedido = item.pedido
-
-        logger.info(f"[UNSEPARAR ITEM] Item encontrado - Produto: {item.produto.descricao[:50]}, Pedido: {pedido.numero_orcamento}")
-
-        # Verificar se pedido não está deletado
-        if pedido.deletado:
-            logger.warning(f"[UNSEPARAR ITEM] Pedido deletado - Item ID: {item_id}")
-            return JsonResponse({'success': False, 'error': 'Pedido foi deletado.'}, status=400)
-
-        # Verificar se está separado
-        if not item.separado:
-            logger.warning(f"[UNSEPARAR ITEM] Item não está separado - Item ID: {item_id}")
-            return JsonResponse({'success': False, 'error': 'Item não está separado.'}, status=400)
-
-        # Detectar se item está substituído para limpar campos adicionais
-        estava_substituido = item.substituido
-        produto_substituto_anterior = item.produto_substituto if estava_substituido else None
-        estava_em_compra = item.em_compra
-
-        # Guardar dados para auditoria
-        separado_por_anterior = item.separado_por.nome if item.separado_por else 'Desconhecido'
-        separado_em_anterior = item.separado_em.strftime('%d/%m/%Y %H:%M') if item.separado_em else 'N/A'
-
-        # Remover marcação de separação
-        item.separado = False
-        item.separado_por = None
-        item.separado_em = None
-
-        # Se estava substituído, limpar campos de substituição
-        fields_to_update = ['separado', 'separado_por', 'separado_em']
-        if estava_substituido:
-            logger.info(f"[UNSEPARAR ITEM] Removendo substituição - Item ID: {item_id}, produto_substituto: {produto_substituto_anterior}")
-            item.substituido = False
-            item.produto_substituto = ''
-            fields_to_update.extend(['substituido', 'produto_substituto'])
-
-        # Se estava em compra, limpar TODOS os campos de compra
-        if estava_em_compra:
-            logger.info(f"[UNSEPARAR ITEM] Removendo marcação de compra - Item ID: {item_id}")
-            item.em_compra = False
-            item.marcado_compra_por = None
-            item.marcado_compra_em = None
-            item.compra_realizada = False
-            item.compra_realizada_por = None
-            item.compra_realizada_em = None
-            fields_to_update.extend(['em_compra', 'marcado_compra_por', 'marcado_compra_em',
-                                    'compra_realizada', 'compra_realizada_por', 'compra_realizada_em'])
-
-        logger.info(f"[UNSEPARAR ITEM] Salvando item - ID: {item.id}, separado=False, substituido=False, em_compra=False")
-        item.save(update_fields=fields_to_update)
-        logger.info(f"[UNSEPARAR ITEM] ✓ Item salvo com sucesso - ID: {item.id}")
-
-    except Exception as e:
-        logger.error(f"[UNSEPARAR ITEM] ✗ ERRO ao desseparar item {item_id}: {str(e)}", exc_info=True)
-        return JsonResponse({'success': False, 'error': f'Erro ao processar: {str(e)}'}, status=500)
-
-    # Atualizar status do pedido se necessário
-    # Verificar se todos os itens não estão mais separados
-    itens_separados = pedido.itens.filter(separado=True).count()
-    if itens_separados == 0 and pedido.status == 'EM_SEPARACAO':
-        pedido.status = 'PENDENTE'
-        pedido.save()
-
-    # Auditoria
-    ip = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-    LogAuditoria.objects.create(
-        usuario=request.user,
-        acao='unseparar_item',
-        modelo='ItemPedido',
-        objeto_id=item.id,
-        dados_novos={
-            'item_id': item.id,
-            'pedido_id': pedido.id,
-            'produto': item.produto.descricao,
-            'quantidade': str(item.quantidade_solicitada),
-            'separado_por_anterior': separado_por_anterior,
-            'separado_em_anterior': separado_em_anterior
-        },
-        ip=ip,
-        user_agent=user_agent
-    )
+    resultado, erro = _executar_transicao_item(request, item_id, transitions.Desseparar(), 'UNSEPARAR ITEM')
+    if erro:
+        return erro
 
-    # Broadcast WebSocket para o pedido
-    broadcast_to_websocket(
-        f"pedido_{pedido.id}",
-        "item_unseparado",
-        {
-            "item": {
-                "id": item.id,
-                "separado": False,
-                "separado_por": None,
-                "separado_em": None,
-                "substituido": False,
-                "produto_substituto": "",
-                "em_compra": False,
-                "marcado_compra_por": None,
-                "marcado_compra_em": None,
-                "compra_realizada": False,
-                "compra_realizada_por": None,
-                "compra_realizada_em": None,
-                "estava_substituido": estava_substituido,
-                "estava_em_compra": estava_em_compra
-            }
-        }
-    )
-
-    # Calcular porcentagem de separação para atualização em tempo real
-    itens_separados_count = pedido.itens.filter(separado=True).count()
-    total_itens_count = pedido.itens.count()
-    porcentagem_separacao = round((itens_separados_count / total_itens_count * 100), 1) if total_itens_count > 0 else 0
-
-    # Broadcast para dashboard (pedido atualizado)
-    broadcast_to_websocket(
-        "dashboard",
-        "pedido_atualizado",
-        {
-            "pedido": {
-                "id": pedido.id,
-                "numero_orcamento": pedido.numero_orcamento,
-                "status": pedido.status,
-                "porcentagem_separacao": porcentagem_separacao
-            }
-        }
-    )
-
-    # Broadcast card_status update
-    broadcast_card_status_update(pedido)
-
-    # Se estava em compra, broadcast para painel de compras (remoção do item)
-    if estava_em_compra:
-        logger.info(f"[UNSEPARAR ITEM] Enviando broadcast para painel_compras - Item ID: {item_id}, Pedido ID: {pedido.id}")
-        broadcast_to_websocket(
-            "painel_compras",
-            "item_removido_compras",
-            {
-                "item_id": item.id,
-                "pedido_id": pedido.id
-            }
-        )
+    item = resultado.item
+    pedido = resultado.pedido
+    porcentagem_separacao = pedido.porcentagem_separacao
 
     logger.info(f"[UNSEPARAR ITEM] ✓ PROCESSO COMPLETO - Item {item.id} desseparado com sucesso, progresso: {porcentagem_separacao}%")
     return JsonResponse({
@@ -1252,16 +987,20 @@ def unseparar_item_view(request, item_id):
     })
 
 
+@idempotente
 @admin_or_compradora
 @require_http_methods(["GET", "POST"])
+@transaction.atomic()
 def marcar_compra_view(request, item_id):
     """
     View para marcar item para compra.
     Se GET: retorna modal com outros pedidos que têm o mesmo produto.
-    Se POST: marca item(s) para compra.
+    Se POST: marca item(s) para compra pelo motor de transições (número
+    constante de consultas e um evento agregado por group, independente de
+    quantos pedidos recebem o produto).
     Disponível para COMPRADORA ou ADMINISTRADOR.
     """
-    item = get_object_or_404(ItemPedido, id=item_id)
+    item = get_object_or_404(ItemPedido.objects.select_related('pedido', 'produto'), id=item_id)
     pedido = item.pedido
 
     # Verificar se pedido não está deletado
@@ -1301,225 +1040,60 @@ def marcar_compra_view(request, item_id):
             ]
         })
 
-    # POST: Marcar para compra
-    outros_pedidos_ids = request.POST.getlist('outros_pedidos')
+    # POST: Marcar para compra (item atual e itens do mesmo produto selecionados)
+    outros_ids = [int(outro_id) for outro_id in request.POST.getlist('outros_pedidos') if outro_id.isdigit()]
 
-    # Marcar item atual
-    item.em_compra = True
-    item.marcado_compra_por = request.user
-    item.marcado_compra_em = timezone.now()
-    item.save()
-
-    itens_marcados = [item]
-
-    # Marcar outros itens se selecionados
-    if outros_pedidos_ids:
-        outros_itens = ItemPedido.objects.filter(
-            id__in=outros_pedidos_ids,
-            produto=item.produto,
-            pedido__deletado=False,
-            separado=False,
-            substituido=False,
-            em_compra=False
-        )
-
-        for outro_item in outros_itens:
-            outro_item.em_compra = True
-            outro_item.marcado_compra_por = request.user
-            outro_item.marcado_compra_em = timezone.now()
-            outro_item.save()
-            itens_marcados.append(outro_item)
-
-    # Atualizar status do pedido se necessário
-    if pedido.status != 'AGUARDANDO_COMPRA':
-        # Verificar se tem itens aguardando compra
-        if pedido.itens.filter(em_compra=True).exists():
-            pedido.status = 'AGUARDANDO_COMPRA'
-            pedido.save()
-
-    # Auditoria
-    ip = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-    LogAuditoria.objects.create(
-        usuario=request.user,
-        acao='marcar_compra',
-        modelo='ItemPedido',
-        objeto_id=item.id,
-        dados_novos={
+    def auditoria_marcacao(resultado):
+        return 'marcar_compra', 'ItemPedido', item.id, {
             'item_id': item.id,
             'pedido_id': pedido.id,
             'produto': item.produto.descricao,
-            'outros_itens': [i.id for i in itens_marcados[1:]]
-        },
-        ip=ip,
-        user_agent=user_agent
-    )
-
-    # Broadcast WebSocket para cada pedido afetado
-    pedidos_afetados = set()
-
-    for i in itens_marcados:
-        pedidos_afetados.add(i.pedido.id)
-        broadcast_to_websocket(
-            f"pedido_{i.pedido.id}",
-            "item_em_compra",
-            {
-                "item": {
-                    "id": i.id,
-                    "em_compra": True,
-                    "marcado_compra_por": request.user.nome,
-                    "marcado_compra_em": timezone.localtime(i.marcado_compra_em).strftime('%d/%m/%Y %H:%M')
-                }
-            }
-        )
-
-    # Broadcast para dashboard
-    for pedido_id in pedidos_afetados:
-        p = Pedido.objects.get(id=pedido_id)
-        # Calcular porcentagem de separação
-        itens_separados_count = p.itens.filter(separado=True).count()
-        total_itens_count = p.itens.count()
-        porcentagem_separacao = round((itens_separados_count / total_itens_count * 100), 1) if total_itens_count > 0 else 0
-
-        broadcast_to_websocket(
-            "dashboard",
-            "pedido_atualizado",
-            {
-                "pedido": {
-                    "id": p.id,
-                    "numero_orcamento": p.numero_orcamento,
-                    "status": p.status,
-                    "porcentagem_separacao": porcentagem_separacao
-                }
-            }
-        )
-
-            # Broadcast card_status update para cada pedido afetado
-        broadcast_card_status_update(p)
-
-    # Broadcast para painel de compras (para adicionar itens em real-time)
-    logger.info(f"[PAINEL_COMPRAS] Iniciando broadcast para {len(itens_marcados)} itens marcados")
-    for i in itens_marcados:
-        marcado_em_formatted = timezone.localtime(i.marcado_compra_em).strftime('%d/%m/%Y %H:%M') if i.marcado_compra_em else None
-        item_data = {
-            "item": {
-                "id": i.id,
-                "pedido_id": i.pedido.id,
-                "pedido_numero": i.pedido.numero_orcamento,
-                "cliente": i.pedido.nome_cliente,
-                "produto_codigo": i.produto.codigo,
-                "produto_descricao": i.produto.descricao,
-                "quantidade": str(i.quantidade_solicitada),
-                "marcado_por": request.user.nome,
-                "marcado_em": marcado_em_formatted,
-                "comprado": i.compra_realizada
-            }
+            'outros_itens': [aplicada.item.id for aplicada in resultado.aplicadas if aplicada.item.id != item.id]
         }
-        logger.info(f"[PAINEL_COMPRAS] Broadcasting item_marcado_compra para item {i.id}, pedido #{i.pedido.numero_orcamento}")
-        logger.debug(f"[PAINEL_COMPRAS] Item data: {item_data}")
 
-        result = broadcast_to_websocket(
-            "painel_compras",
-            "item_marcado_compra",
-            item_data
-        )
+    resultado = transitions.executar(
+        transitions.Selecao(
+            Q(id=item.id) | Q(id__in=outros_ids, produto_id=item.produto_id),
+            transitions.MarcarCompra()
+        ),
+        request.user,
+        ip=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+        auditoria=auditoria_marcacao
+    )
 
-        if result:
-            logger.info(f"[PAINEL_COMPRAS] ✅ Broadcast bem-sucedido para item {i.id}")
-        else:
-            logger.error(f"[PAINEL_COMPRAS] ❌ Broadcast FALHOU para item {i.id}")
+    # Item atual alterado por outra requisição depois da verificação acima
+    if item.id in resultado.negadas:
+        return JsonResponse({'success': False, 'error': resultado.negadas[item.id]}, status=400)
+
+    pedido = resultado.pedidos.get(pedido.id, pedido)
+    logger.info(f"[PAINEL_COMPRAS] {len(resultado.aplicadas)} item(ns) marcado(s) para compra")
 
     return JsonResponse({
         'success': True,
-        'itens_marcados': len(itens_marcados),
+        'itens_marcados': len(resultado.aplicadas),
         'pedido_status': pedido.status
     })
 
 
+@idempotente
 @admin_or_compradora
 @require_http_methods(["POST"])
+@transaction.atomic()
 def marcar_item_comprado_view(request, item_id):
     """
     View para marcar/desmarcar item como comprado no painel de compras.
     Disponível para COMPRADORA ou ADMINISTRADOR.
     """
-    item = get_object_or_404(ItemPedido, id=item_id)
-    pedido = item.pedido
+    resultado, erro = _executar_transicao_item(request, item_id, transitions.AlternarComprado(), 'ITEM COMPRADO')
+    if erro:
+        return erro
 
-    # Verificar se pedido não está deletado
-    if pedido.deletado:
-        return JsonResponse({'success': False, 'error': 'Pedido foi deletado.'}, status=400)
-
-    # Verificar se item está marcado para compra
-    if not item.em_compra:
-        return JsonResponse({'success': False, 'error': 'Item não está marcado para compra.'}, status=400)
-
-    # Toggle compra_realizada
-    item.compra_realizada = not item.compra_realizada
-
-    if item.compra_realizada:
-        item.compra_realizada_por = request.user
-        item.compra_realizada_em = timezone.now()
-    else:
-        item.compra_realizada_por = None
-        item.compra_realizada_em = None
-
-    item.save()
-
-    # Auditoria
-    ip = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-    LogAuditoria.objects.create(
-        usuario=request.user,
-        acao='marcar_item_comprado' if item.compra_realizada else 'desmarcar_item_comprado',
-        modelo='ItemPedido',
-        objeto_id=item.id,
-        dados_novos={
-            'item_id': item.id,
-            'pedido_id': pedido.id,
-            'produto': item.produto.descricao,
-            'comprado': item.compra_realizada
-        },
-        ip=ip,
-        user_agent=user_agent
-    )
-
-    # Broadcast WebSocket para painel de compras
+    item = resultado.item
     comprado_em_formatted = None
     if item.compra_realizada and item.compra_realizada_em:
         comprado_em_formatted = timezone.localtime(item.compra_realizada_em).strftime('%d/%m/%Y %H:%M')
 
-    broadcast_to_websocket(
-        "painel_compras",
-        "item_comprado",
-        {
-            "item": {
-                "id": item.id,
-                "pedido_id": pedido.id,
-                "comprado": item.compra_realizada,
-                "comprado_por": request.user.nome if item.compra_realizada else None,
-                "comprado_em": comprado_em_formatted
-            }
-        }
-    )
-
-    # Broadcast WebSocket para página de detalhes do pedido (badge em tempo real)
-    broadcast_to_websocket(
-        f"pedido_{pedido.id}",
-        "item_comprado",
-        {
-            "item": {
-                "id": item.id,
-                "comprado": item.compra_realizada,
-                "comprado_por": request.user.nome if item.compra_realizada else None,
-                "comprado_em": comprado_em_formatted
-            }
-        }
-    )
-
-    # Se item foi comprado E depois separado, remove do painel de compras
-    # (broadcast para remover do painel será enviado pelo separar_item_view)
-
     return JsonResponse({
         'success': True,
         'comprado': item.compra_realizada,
@@ -1528,126 +1102,75 @@ def marcar_item_comprado_view(request, item_id):
     })
 
 
+@idempotente
 @admin_or_separador
 @require_http_methods(["POST"])
+@transaction.atomic()
 def substituir_item_view(request, item_id):
     """
     View para substituir produto em um item.
     Disponível para SEPARADOR ou ADMINISTRADOR.
     """
-    item = get_object_or_404(ItemPedido, id=item_id)
-    pedido = item.pedido
-
-    # Verificar se pedido não está deletado
-    if pedido.deletado:
-        return JsonResponse({'success': False, 'error': 'Pedido foi deletado.'}, status=400)
-
-    # Verificar se já está substituído
-    if item.substituido:
-        return JsonResponse({'success': False, 'error': 'Item já foi substituído.'}, status=400)
-
-    # Verificar se já está separado
-    if item.separado:
-        return JsonResponse({'success': False, 'error': 'Item já está separado.'}, status=400)
-
     form = SubstituirProdutoForm(request.POST)
 
     if not form.is_valid():
+        # Estado do item verificado antes dos erros do formulário
+        item = get_object_or_404(ItemPedido.objects.select_related('pedido'), id=item_id)
+        try:
+            if item.pedido.deletado:
+                raise transitions.TransicaoNegada('Pedido foi deletado.')
+            transitions.Substituir('').verificar(item)
+        except transitions.TransicaoNegada as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
     # Marcar como substituído E como separado (item substituído conta como separado)
-    item.substituido = True
-    item.produto_substituto = form.cleaned_data['produto_substituto']
-    item.separado = True
-    item.separado_por = request.user
-    item.separado_em = timezone.now()
-    item.save(update_fields=['substituido', 'produto_substituto', 'separado', 'separado_por', 'separado_em'])
-
-    # Atualizar status do pedido se necessário
-    if pedido.status == 'PENDENTE':
-        pedido.status = 'EM_SEPARACAO'
-        pedido.save()
-
-    # Auditoria
-    ip = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-    LogAuditoria.objects.create(
-        usuario=request.user,
-        acao='substituir_item',
-        modelo='ItemPedido',
-        objeto_id=item.id,
-        dados_novos={
-            'item_id': item.id,
-            'pedido_id': pedido.id,
-            'produto_original': item.produto.descricao,
-            'produto_substituto': item.produto_substituto
-        },
-        ip=ip,
-        user_agent=user_agent
-    )
-
-    # Broadcast WebSocket
-    broadcast_to_websocket(
-        f"pedido_{pedido.id}",
-        "item_substituido",
-        {
-            "item": {
-                "id": item.id,
-                "substituido": True,
-                "produto_substituto": item.produto_substituto,
-                "separado": True,
-                "separado_por": request.user.nome,
-                "separado_em": timezone.localtime(item.separado_em).strftime('%d/%m/%Y %H:%M') if item.separado_em else None
-            }
-        }
+    resultado, erro = _executar_transicao_item(
+        request,
+        item_id,
+        transitions.Substituir(form.cleaned_data['produto_substituto']),
+        'SUBSTITUIR ITEM'
     )
+    if erro:
+        return erro
 
-    # Calcular porcentagem de separação para atualização em tempo real
-    itens_separados_count = pedido.itens.filter(separado=True).count()
-    total_itens_count = pedido.itens.count()
-    porcentagem_separacao = round((itens_separados_count / total_itens_count * 100), 1) if total_itens_count > 0 else 0
-
-    # Broadcast para dashboard
-    broadcast_to_websocket(
-        "dashboard",
-        "pedido_atualizado",
-        {
-            "pedido": {
-                "id": pedido.id,
-                "numero_orcamento": pedido.numero_orcamento,
-                "status": pedido.status,
-                "porcentagem_separacao": porcentagem_separacao
-            }
-        }
-    )
-
-    # Broadcast card_status update
-    broadcast_card_status_update(pedido)
+    item = resultado.item
+    pedido = resultado.pedido
 
     return JsonResponse({
         'success': True,
         'item_id': item.id,
         'produto_substituto': item.produto_substituto,
         'pedido_status': pedido.status,
-        'porcentagem_separacao': porcentagem_separacao
+        'porcentagem_separacao': pedido.porcentagem_separacao
     })
 
 
+@idempotente
 @admin_or_separador
 @require_http_methods(["POST"])
+@transaction.atomic()
 def finalizar_pedido_view(request, pedido_id):
     """
     View para finalizar pedido.
     Valida se todos itens foram separados ou substituídos e nenhum está em compra.
     Disponível para SEPARADOR ou ADMINISTRADOR.
     """
-    pedido = get_object_or_404(Pedido, id=pedido_id, deletado=False)
+    # Lock na linha: duas finalizações simultâneas não contam o pedido duas vezes
+    pedido = get_object_or_404(Pedido.objects.select_for_update(), id=pedido_id, deletado=False)
 
-    # Verificar se pode finalizar
-    if not pedido.pode_ser_finalizado():
+    if pedido.status in ('FINALIZADO', 'CANCELADO'):
+        return JsonResponse({
+            'success': False,
+            'error': f'Pedido já está {pedido.get_status_display().lower()}.'
+        }, status=400)
+
+    # Verificar se pode finalizar (retorna tupla: pode, motivo)
+    pode_finalizar, motivo = pedido.pode_ser_finalizado()
+    if not pode_finalizar:
         return JsonResponse({
             'success': False,
-            'error': 'Pedido não pode ser finalizado. Verifique se todos os itens foram separados/substituídos e nenhum está aguardando compra.'
+            'error': f'Pedido não pode ser finalizado: {motivo}.'
         }, status=400)
 
     # Finalizar pedido
@@ -1655,6 +1178,17 @@ def finalizar_pedido_view(request, pedido_id):
     pedido.data_finalizacao = timezone.now()
     pedido.save()
 
+    # Rollup diário (finalizados, tempo útil e em aberto) e distribuição do tempo,
+    # registrados uma vez: só chega aqui quem mudou o pedido para FINALIZADO
+    tempo_util = calcular_tempo_util(pedido.data_criacao, pedido.data_finalizacao).total_seconds()
+    MetricaDiaria.registrar(
+        timezone.localdate(pedido.data_finalizacao),
+        pedidos_finalizados=1,
+        soma_tempo_util=tempo_util,
+        pedidos_em_aberto=-1
+    )
+    SketchTempoSeparacao.registrar(pedido, tempo_util)
+
     # Auditoria
     ip = get_client_ip(request)
     user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
@@ -1672,24 +1206,15 @@ def finalizar_pedido_view(request, pedido_id):
         user_agent=user_agent
     )
 
-    # Broadcast WebSocket
-    broadcast_to_websocket(
-        f"pedido_{pedido.id}",
-        "pedido_finalizado",
-        {
-            "pedido_id": pedido.id
-        }
-    )
-
-    # Broadcast para dashboard
-    broadcast_to_websocket(
-        "dashboard",
-        "pedido_finalizado",
-        {
+    # Broadcast WebSocket (pedido e dashboard, após o commit)
+    outbox.publicar([
+        (f"pedido_{pedido.id}", {"type": "pedido_finalizado", "pedido_id": pedido.id}),
+        ("dashboard", {
+            "type": "pedido_finalizado",
             "pedido_id": pedido.id,
             "numero_orcamento": pedido.numero_orcamento
-        }
-    )
+        }),
+    ])
 
     return JsonResponse({
         'success': True,
@@ -1698,14 +1223,73 @@ def finalizar_pedido_view(request, pedido_id):
     })
 
 
+@idempotente
 @login_required_custom
 @require_http_methods(["POST"])
+@transaction.atomic()
+def sincronizar_acoes_view(request):
+    """
+    Aplica a fila de ações registradas offline por um coletor.
+    Corpo JSON: {"dispositivo": "...", "acoes": [{"id", "acao", "item_id",
+    "momento", "produto_substituto"}]}, na ordem em que foram feitas.
+
+    Tudo em uma transação e em um lote do motor de transições, com o
+    momento original de cada ação; cada ação recebe seu resultado (ver
+    apps.core.services.sincronizacao). Separar e desseparar para qualquer
+    usuário autenticado; substituir para SEPARADOR ou ADMINISTRADOR; marcar
+    compra para COMPRADORA ou ADMINISTRADOR.
+    """
+    try:
+        dados = json.loads(request.body or b'{}')
+        acoes = dados.get('acoes')
+    except (ValueError, AttributeError):
+        acoes = None
+
+    if not isinstance(acoes, list):
+        return JsonResponse({'success': False, 'error': 'Lote inválido.'}, status=400)
+    if len(acoes) > sincronizacao.MAXIMO_ACOES:
+        return JsonResponse({
+            'success': False,
+            'error': f'Envie no máximo {sincronizacao.MAXIMO_ACOES} ações por sincronização.'
+        }, status=400)
+
+    resultados, lote = sincronizacao.sincronizar(
+        acoes,
+        request.user,
+        ip=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
+    )
+
+    logger.info(
+        f"[SYNC] Dispositivo {str(dados.get('dispositivo', ''))[:50]!r}: "
+        f"{len(lote.aplicadas)} de {len(acoes)} ação(ões) aplicada(s)"
+    )
+    return JsonResponse({
+        'success': True,
+        'aplicadas': len(lote.aplicadas),
+        'resultados': resultados,
+        'pedidos': [
+            {
+                'id': pedido.id,
+                'status': pedido.status,
+                'porcentagem_separacao': pedido.porcentagem_separacao
+            }
+            for pedido in lote.pedidos.values()
+        ]
+    })
+
+
+@idempotente
+@login_required_custom
+@require_http_methods(["POST"])
+@transaction.atomic()
 def deletar_pedido_view(request, pedido_id):
     """
     View para fazer soft delete de pedido.
     Disponível para VENDEDOR que criou o pedido ou ADMINISTRADOR.
     """
-    pedido = get_object_or_404(Pedido, id=pedido_id, deletado=False)
+    # Lock na linha: duas exclusões simultâneas não descontam o pedido duas vezes
+    pedido = get_object_or_404(Pedido.objects.select_for_update(), id=pedido_id, deletado=False)
 
     # Verificar permissão
     if request.user.tipo == 'ADMINISTRADOR':
@@ -1727,6 +1311,19 @@ def deletar_pedido_view(request, pedido_id):
     pedido.deletado_em = timezone.now()
     pedido.save()
 
+    # Rollup diário: pedidos deletados saem de todas as métricas
+    MetricaDiaria.registrar(timezone.localdate(pedido.data_criacao), pedidos_criados=-1)
+    if pedido.status == 'FINALIZADO' and pedido.data_finalizacao:
+        tempo_util = calcular_tempo_util(pedido.data_criacao, pedido.data_finalizacao).total_seconds()
+        MetricaDiaria.registrar(
+            timezone.localdate(pedido.data_finalizacao),
+            pedidos_finalizados=-1,
+            soma_tempo_util=-tempo_util
+        )
+        SketchTempoSeparacao.registrar(pedido, tempo_util, remover=True)
+    elif pedido.status != 'CANCELADO':
+        MetricaDiaria.registrar(timezone.localdate(), pedidos_em_aberto=-1)
+
     # Auditoria
     ip = get_client_ip(request)
     user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
@@ -1744,24 +1341,16 @@ def deletar_pedido_view(request, pedido_id):
         user_agent=user_agent
     )
 
-    # Broadcast WebSocket
-    broadcast_to_websocket(
-        f"pedido_{pedido.id}",
-        "pedido_deletado",
-        {
-            "pedido_id": pedido.id
-        }
-    )
-
-    # Broadcast para dashboard (remove da lista)
-    broadcast_to_websocket(
-        "dashboard",
-        "pedido_finalizado",  # Usa o mesmo evento para remover da lista
-        {
+    # Broadcast WebSocket (pedido e dashboard, após o commit)
+    outbox.publicar([
+        (f"pedido_{pedido.id}", {"type": "pedido_deletado", "pedido_id": pedido.id}),
+        # Usa o mesmo evento de finalização para remover da lista
+        ("dashboard", {
+            "type": "pedido_finalizado",
             "pedido_id": pedido.id,
             "numero_orcamento": pedido.numero_orcamento
-        }
-    )
+        }),
+    ])
 
     return JsonResponse({
         'success': True,
@@ -1861,97 +1450,107 @@ def painel_compras_view(request):
     return render(request, 'painel_compras.html', context)
 
 
+def _ler_produtos_compra(request):
+    """
+    Lê os códigos de produto a confirmar: JSON {"produtos": [códigos]} ou
+    formulário com o campo repetido 'produtos'.
+
+    Returns:
+        list - Códigos sem repetição (na ordem recebida), ou None se o corpo for inválido
+    """
+    if request.content_type == 'application/json':
+        try:
+            codigos = [str(codigo).strip() for codigo in json.loads(request.body or b'{}').get('produtos', [])]
+        except (ValueError, TypeError, AttributeError):
+            return None
+    else:
+        codigos = [codigo.strip() for codigo in request.POST.getlist('produtos')]
+
+    return list(dict.fromkeys(codigo for codigo in codigos if codigo))
+
+
+@idempotente
 @admin_or_compradora
 @require_http_methods(["POST"])
-def confirmar_compra_view(request, produto_codigo):
+@transaction.atomic()
+def confirmar_compra_view(request, produto_codigo=None):
     """
-    Confirma compra de todos os itens de um produto específico.
-    Marca compra_realizada=True para todos itens do produto.
+    Confirma compra de todos os itens de um ou mais produtos.
+    Marca compra_realizada=True para todos itens em compra dos produtos
+    (código na URL ou vários códigos no corpo da requisição).
+
+    Gravado pelo motor de transições em uma passada: uma leitura dos itens
+    selecionados, um UPDATE condicional, contadores e status dos pedidos
+    afetados em UPDATEs únicos, uma entrada de auditoria e um evento
+    agregado para o painel de compras e para o dashboard.
     Disponível para COMPRADORA ou ADMINISTRADOR.
     """
-    # Buscar todos os itens do produto que estão em compra
-    itens = ItemPedido.objects.filter(
-        produto__codigo=produto_codigo,
-        em_compra=True,
-        compra_realizada=False,
-        pedido__deletado=False
-    ).select_related('produto', 'pedido')
+    if produto_codigo is not None:
+        codigos = [produto_codigo]
+    else:
+        codigos = _ler_produtos_compra(request)
+        if not codigos:
+            return JsonResponse({'success': False, 'error': 'Informe os produtos a confirmar.'}, status=400)
+
+    def produtos_confirmados(resultado):
+        produtos = {}
+        for aplicada in resultado.aplicadas:
+            produto = aplicada.item.produto
+            resumo = produtos.setdefault(produto.codigo, {
+                'codigo': produto.codigo,
+                'descricao': produto.descricao,
+                'total_itens': 0,
+            })
+            resumo['total_itens'] += 1
+        return list(produtos.values())
+
+    def auditoria_compra(resultado):
+        return 'confirmar_compra', 'ItemPedido', 0, {
+            'produtos': produtos_confirmados(resultado),
+            'total_itens': len(resultado.aplicadas),
+            'pedidos_afetados': sorted(resultado.pedidos)
+        }
+
+    def evento_painel(resultado):
+        produtos = produtos_confirmados(resultado)
+        return [('painel_compras', {
+            'type': 'compra_confirmada',
+            'produto': produtos[0],
+            'produtos': produtos,
+        })]
+
+    resultado = transitions.executar(
+        transitions.Selecao(
+            Q(produto__codigo__in=codigos, em_compra=True, compra_realizada=False, pedido__deletado=False),
+            transitions.ConfirmarCompra()
+        ),
+        request.user,
+        ip=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+        auditoria=auditoria_compra,
+        eventos=evento_painel
+    )
 
-    if not itens.exists():
+    if not resultado.aplicadas:
         return JsonResponse({
             'success': False,
-            'error': 'Nenhum item encontrado para este produto.'
+            'error': 'Nenhum item encontrado para este produto.' if len(codigos) == 1
+            else 'Nenhum item encontrado para os produtos informados.'
         }, status=404)
 
-    # Contar itens antes de atualizar
-    total_itens = itens.count()
-    produto_descricao = itens.first().produto.descricao
-
-    # Atualizar todos os itens
-    now = timezone.now()
-    pedidos_afetados = set()
-
-    for item in itens:
-        item.compra_realizada = True
-        item.compra_realizada_por = request.user
-        item.compra_realizada_em = now
-        item.save()
-        pedidos_afetados.add(item.pedido.id)
-
-    # Auditoria
-    ip = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-    LogAuditoria.objects.create(
-        usuario=request.user,
-        acao='confirmar_compra',
-        modelo='ItemPedido',
-        objeto_id=0,
-        dados_novos={
-            'produto_codigo': produto_codigo,
-            'produto_descricao': produto_descricao,
-            'total_itens': total_itens,
-            'pedidos_afetados': list(pedidos_afetados)
-        },
-        ip=ip,
-        user_agent=user_agent
-    )
-
-    # Broadcast WebSocket para painel de compras
-    broadcast_to_websocket(
-        "painel_compras",
-        "compra_confirmada",
-        {
-            "produto": {
-                "codigo": produto_codigo,
-                "descricao": produto_descricao,
-                "total_itens": total_itens
-            }
-        }
-    )
-
-    # Broadcast para cada pedido afetado
-    for pedido_id in pedidos_afetados:
-        broadcast_to_websocket(
-            f"pedido_{pedido_id}",
-            "compra_realizada",
-            {
-                "produto_codigo": produto_codigo
-            }
-        )
-
-    # Broadcast para dashboard
-    broadcast_to_websocket(
-        "dashboard",
-        "compra_confirmada",
-        {
-            "produto_codigo": produto_codigo
-        }
-    )
+    produtos = produtos_confirmados(resultado)
+    confirmados = {produto['codigo'] for produto in produtos}
 
     return JsonResponse({
         'success': True,
-        'produto_codigo': produto_codigo,
-        'total_itens': total_itens
+        'produto_codigo': produtos[0]['codigo'],
+        'total_itens': len(resultado.aplicadas),
+        'produtos': produtos,
+        'nao_encontrados': [codigo for codigo in codigos if codigo not in confirmados],
+        'pedidos_atualizados': [
+            {'id': pedido.id, 'status': pedido.status}
+            for pedido in resultado.pedidos.values()
+        ]
     })
 
 
@@ -2349,7 +1948,7 @@ def metricas_view(request):
     Acessível por todos os usuários logados.
     Botão 'Atualizar' recalcula via POST.
     """
-    from apps.core.utils import calcular_metricas_periodo
+    from apps.core.utils import calcular_metricas_periodo, calcular_percentis_por_separador
 
     # Definir período padrão (últimos 30 dias)
     data_fim = timezone.localdate()
@@ -2403,6 +2002,7 @@ def metricas_view(request):
 
     context = {
         'metricas': metricas,
+        'percentis_por_separador': calcular_percentis_por_separador(data_inicio, data_fim),
         'data_inicio': data_inicio,
         'data_fim': data_fim,
     }
@@ -2410,6 +2010,21 @@ def metricas_view(request):
     return render(request, 'metricas.html', context)
 
 
+@login_required_custom
+@administrador_required
+@require_http_methods(["GET"])
+def metricas_websocket_view(request):
+    """
+    Contadores do despachante de eventos WebSocket deste processo (eventos
+    recebidos, mesclados na janela de coalescência, mensagens enviadas,
+    repetições, descartes e atraso), para ajustar a janela.
+    Disponível apenas para ADMINISTRADOR.
+    """
+    metricas = outbox.despachante.metricas()
+    metricas['janela_ms'] = round(outbox.despachante.janela * 1000)
+    return JsonResponse(metricas)
+
+
 # =====================
 # FASE 9: Configuração do Sistema
 # =====================
@@ -24,7 +24,7 @@ django_asgi_app = get_asgi_application()
 from apps.core.routing import websocket_urlpatterns
 
 # WebSocket URL routing
-# FASE 4: DashboardConsumer ✅
+# FASE 4: dashboard (hoje pelo /ws/, TopicosConsumer) ✅
 # FASE 5: PedidoDetalheConsumer (futuro)
 # FASE 6: PainelComprasConsumer (futuro)
 
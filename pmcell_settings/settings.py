@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Adiciona WhiteNoise
+    'apps.core.middleware.IdempotenciaMiddleware',  # Idempotency-Key (antes da sessão e da auditoria)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -126,6 +127,48 @@ else:
     }
 
 
+# Cache
+# Versão e snapshot do dashboard (apps.core.services.dashboard) e histórico
+# dos eventos WebSocket (apps.core.services.retomada).
+# Redis compartilha o cache entre workers; LocMem basta para um único processo.
+if 'RAILWAY_ENVIRONMENT' in os.environ and redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': redis_url,
+            'KEY_PREFIX': 'pmcell',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pmcell-default',
+            # Histórico de eventos WebSocket: WEBSOCKET_HISTORICO_EVENTOS por group
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+
+# WebSocket
+# Janela (ms) em que atualizações seguidas do mesmo pedido para o mesmo group
+# são mescladas pelo despachante (apps.core.services.outbox); 0 desliga.
+WEBSOCKET_JANELA_COALESCENCIA_MS = config('WEBSOCKET_JANELA_COALESCENCIA_MS', default=150, cast=int)
+# Eventos guardados por group para a retomada após reconexão
+# (apps.core.services.retomada); lacunas maiores recarregam o estado completo.
+WEBSOCKET_HISTORICO_EVENTOS = config('WEBSOCKET_HISTORICO_EVENTOS', default=200, cast=int)
+# Conexões (abas) por usuário; ao abrir mais uma, a mais antiga é encerrada.
+WEBSOCKET_CONEXOES_POR_USUARIO = config('WEBSOCKET_CONEXOES_POR_USUARIO', default=5, cast=int)
+# Segundos sem mensagens do cliente (ping a cada 30 s) até o servidor
+# encerrar a conexão.
+WEBSOCKET_OCIOSIDADE_S = config('WEBSOCKET_OCIOSIDADE_S', default=120, cast=int)
+
+# Idempotency-Key
+# Tempo (s) em que a resposta de uma ação de item fica guardada para
+# repetições com a mesma chave (apps.core.services.idempotencia).
+IDEMPOTENCIA_TTL_S = config('IDEMPOTENCIA_TTL_S', default=600, cast=int)
+
+
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
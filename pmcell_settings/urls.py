@@ -30,11 +30,13 @@ from apps.core.views import (
     confirmar_pedido_view,
     pedido_detalhe_view,
     separar_item_view,
+    separar_lote_view,
     unseparar_item_view,
     marcar_compra_view,
     marcar_item_comprado_view,
     substituir_item_view,
     finalizar_pedido_view,
+    sincronizar_acoes_view,
     deletar_pedido_view,
     painel_compras_view,
     confirmar_compra_view,
@@ -46,6 +48,7 @@ from apps.core.views import (
     toggle_ativo_usuario_view,
     historico_view,
     metricas_view,
+    metricas_websocket_view,
     configurar_empty_state_view,
 )
 
@@ -68,6 +71,7 @@ urlpatterns = [
 
     # Ações de Separação (FASE 5)
     path('pedidos/item/<int:item_id>/separar/', separar_item_view, name='separar_item'),
+    path('pedidos/<int:pedido_id>/separar-lote/', separar_lote_view, name='separar_lote'),
     path('pedidos/item/<int:item_id>/unseparar/', unseparar_item_view, name='unseparar_item'),
     path('pedidos/item/<int:item_id>/marcar-compra/', marcar_compra_view, name='marcar_compra'),
     path('pedidos/item/<int:item_id>/marcar-comprado/', marcar_item_comprado_view, name='marcar_item_comprado'),
@@ -75,8 +79,12 @@ urlpatterns = [
     path('pedidos/<int:pedido_id>/finalizar/', finalizar_pedido_view, name='finalizar_pedido'),
     path('pedidos/<int:pedido_id>/deletar/', deletar_pedido_view, name='deletar_pedido'),
 
+    # Sincronização das ações offline dos coletores
+    path('sync/acoes/', sincronizar_acoes_view, name='sincronizar_acoes'),
+
     # Painel de Compras (FASE 6)
     path('painel-compras/', painel_compras_view, name='painel_compras'),
+    path('painel-compras/confirmar/', confirmar_compra_view, name='confirmar_compras'),
     path('painel-compras/confirmar/<str:produto_codigo>/', confirmar_compra_view, name='confirmar_compra'),
     path('painel-compras/historico/', historico_compras_view, name='historico_compras'),
 
@@ -93,6 +101,7 @@ urlpatterns = [
     # Histórico e Métricas (FASE 8)
     path('historico/', historico_view, name='historico'),
     path('metricas/', metricas_view, name='metricas'),
+    path('metricas/websocket/', metricas_websocket_view, name='metricas_websocket'),
 
     # Configuração do Sistema (FASE 9)
     path('config/empty-state/', configurar_empty_state_view, name='configurar_empty_state'),
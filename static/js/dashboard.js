@@ -14,7 +14,9 @@ class DashboardWebSocket {
 
         // Detectar protocolo (ws ou wss)
         this.protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        this.wsUrl = `${this.protocol}//${window.location.host}/ws/dashboard/`;
+        this.wsUrl = `${this.protocol}//${window.location.host}/ws/`;
+        this.topic = 'dashboard';
+        this.lastSeq = null; // Último evento recebido (retomada ao reconectar)
 
         this.connect();
     }
@@ -41,6 +43,14 @@ class DashboardWebSocket {
         this.reconnectDelay = 1000;
         this.updateConnectionStatus(true);
 
+        // Conexão única (/ws/): assinar o tópico desta tela; ao reconectar,
+        // retomar a partir do último evento recebido
+        if (this.lastSeq === null) {
+            this.ws.send(JSON.stringify({ type: 'subscribe', topic: this.topic }));
+        } else {
+            this.ws.send(JSON.stringify({ type: 'resume', topic: this.topic, seq: this.lastSeq }));
+        }
+
         // Enviar ping a cada 30 segundos para manter conexão viva
         this.pingInterval = setInterval(() => {
             if (this.ws && this.ws.readyState === WebSocket.OPEN) {
@@ -54,7 +64,16 @@ class DashboardWebSocket {
             const data = JSON.parse(event.data);
             console.log('[WebSocket] Mensagem recebida:', data);
 
+            if (typeof data.seq === 'number' && data.topic === this.topic) {
+                this.lastSeq = Math.max(this.lastSeq || 0, data.seq);
+            }
+
             switch (data.type) {
+                case 'eventos_lote':
+                    // Vários eventos de uma operação em um frame: processar um a um
+                    data.eventos.forEach(evento => this.onMessage({ data: JSON.stringify(evento) }));
+                    break;
+
                 case 'pedido_criado':
                     this.handlePedidoCriado(data.pedido);
                     break;
@@ -75,6 +94,23 @@ class DashboardWebSocket {
                     // Resposta ao ping - conexão está ativa
                     break;
 
+                case 'subscribed':
+                    this.lastSeq = data.seq;
+                    break;
+
+                case 'unsubscribed':
+                    break;
+
+                case 'snapshot_required':
+                    this.lastSeq = data.seq;
+                    // Eventos perdidos não estão mais no histórico: recarregar o estado
+                    refreshDashboard();
+                    break;
+
+                case 'error':
+                    console.error('[WebSocket] Erro no tópico:', data.topic, data.error);
+                    break;
+
                 default:
                     console.warn('[WebSocket] Tipo de mensagem desconhecido:', data.type);
             }
@@ -98,6 +134,13 @@ class DashboardWebSocket {
         }
 
         // Tentar reconectar se não foi fechamento intencional
+        // Recusada (sem login ou permissão) ou substituída por uma aba mais
+        // nova: reconectar só disputaria o limite de conexões do usuário
+        if ([4401, 4403, 4409].includes(event.code)) {
+            this.isIntentionallyClosed = true;
+            this.updateConnectionStatus(false, event.code === 4409 ? 'Aberto em outra aba' : 'Sessão expirada ou sem permissão');
+        }
+
         if (!this.isIntentionallyClosed) {
             this.scheduleReconnect();
         }
@@ -161,6 +204,10 @@ class DashboardWebSocket {
         const card = document.querySelector(`[data-pedido-id="${pedido.id}"]`);
         if (card) {
             this.updatePedidoCard(card, pedido);
+            // Card completo (ex.: separação em lote) já traz status e separadores
+            if (pedido.card_status) {
+                this.handleCardStatusUpdated(pedido.id, pedido.card_status, pedido.card_status_display, pedido.separadores);
+            }
         } else {
             // Se não existir, adicionar
             this.addPedidoCard(pedido);
@@ -502,6 +549,11 @@ window.addEventListener('beforeunload', () => {
     stopAutoRefresh();
 });
 
+// ETag do último snapshot recebido (servidor responde 304 se nada mudou)
+let dashboardETag = null;
+// Última sequência de alterações aplicada (delta sync via ?since=)
+let dashboardSeq = null;
+
 /**
  * Manual Dashboard Refresh (AJAX)
  * Called by refresh button in navbar
@@ -521,22 +573,43 @@ async function refreshDashboard() {
     }
 
     try {
-        const response = await fetch('/dashboard/refresh/', {
+        const headers = {
+            'X-Requested-With': 'XMLHttpRequest',
+        };
+        if (dashboardETag) {
+            headers['If-None-Match'] = dashboardETag;
+        }
+
+        const url = dashboardSeq !== null
+            ? `/dashboard/refresh/?since=${dashboardSeq}`
+            : '/dashboard/refresh/';
+
+        const response = await fetch(url, {
             method: 'GET',
-            headers: {
-                'X-Requested-With': 'XMLHttpRequest',
-            }
+            headers: headers,
+            cache: 'no-store'
         });
 
+        if (response.status === 304) {
+            console.log('[Dashboard] Refresh: nenhuma alteração (304)');
+            return;
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}`);
         }
 
+        dashboardETag = response.headers.get('ETag');
         const data = await response.json();
-        console.log('[Dashboard] Refresh data received:', data.pedidos.length, 'pedidos');
+        console.log('[Dashboard] Refresh data received:', data.pedidos.length, 'pedidos', data.completo ? '(completo)' : '(delta)');
 
         // Update dashboard with received data
-        updateDashboardCards(data.pedidos);
+        if (data.completo) {
+            updateDashboardCards(data.pedidos);
+        } else {
+            applyDashboardDelta(data);
+        }
+        dashboardSeq = data.seq;
 
     } catch (error) {
         console.error('[Dashboard] Refresh failed:', error);
@@ -605,6 +678,36 @@ function updateDashboardCards(pedidos) {
     });
 }
 
+/**
+ * Apply delta sync data: update changed cards, add new ones, remove finished/deleted
+ */
+function applyDashboardDelta(data) {
+    const novos = [];
+
+    data.pedidos.forEach(pedido => {
+        const card = document.querySelector(`[data-pedido-id="${pedido.id}"]`);
+        if (card && dashboardWS) {
+            dashboardWS.updatePedidoCard(card, pedido);
+            dashboardWS.handleCardStatusUpdated(pedido.id, pedido.card_status, pedido.card_status_display, pedido.separadores);
+        } else if (!card) {
+            novos.push(pedido);
+        }
+    });
+
+    // updateDashboardCards insere no topo: inserir do mais antigo para o mais recente
+    updateDashboardCards(novos.reverse());
+
+    data.removidos.forEach(pedidoId => {
+        const card = document.querySelector(`[data-pedido-id="${pedidoId}"]`);
+        if (card) {
+            const cardLink = card.closest('.card-link');
+            (cardLink || card).remove();
+        }
+    });
+
+    console.log(`[Dashboard] Delta aplicado: ${data.pedidos.length} alterado(s), ${data.removidos.length} removido(s)`);
+}
+
 /**
  * Create card HTML from AJAX data
  */
@@ -628,7 +731,7 @@ function createPedidoCardHtmlFromData(pedido) {
                  data-pedido-id="${pedido.id}"
                  data-pedido-status="${pedido.status}"
                  data-card-status="${pedido.card_status}"
-                 data-criado-em="${pedido.data_criacao}"
+                 data-criado-em="${pedido.criado_em}"
                  data-vendedor-id="${pedido.vendedor_id || ''}">
 
                 <!-- Borda superior colorida baseada no card_status -->
@@ -648,7 +751,7 @@ function createPedidoCardHtmlFromData(pedido) {
 
                     <!-- Informações do Pedido -->
                     <div class="card-info">
-                        <p class="card-info-primary">${pedido.nome_cliente}</p>
+                        <p class="card-info-primary">${pedido.cliente}</p>
                         <p class="card-info-item">
                             <span class="card-info-label">Vendedor:</span>
                             <span class="card-info-value">${pedido.vendedor}</span>
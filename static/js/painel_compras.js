@@ -14,7 +14,9 @@ class PainelComprasWebSocket {
 
         // Detectar protocolo (ws ou wss)
         this.protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        this.wsUrl = `${this.protocol}//${window.location.host}/ws/painel-compras/`;
+        this.wsUrl = `${this.protocol}//${window.location.host}/ws/`;
+        this.topic = 'painel_compras';
+        this.lastSeq = null; // Último evento recebido (retomada ao reconectar)
 
         this.connect();
     }
@@ -48,6 +50,14 @@ class PainelComprasWebSocket {
         this.reconnectDelay = 1000;
         this.updateConnectionStatus(true);
 
+        // Conexão única (/ws/): assinar o tópico desta tela; ao reconectar,
+        // retomar a partir do último evento recebido
+        if (this.lastSeq === null) {
+            this.ws.send(JSON.stringify({ type: 'subscribe', topic: this.topic }));
+        } else {
+            this.ws.send(JSON.stringify({ type: 'resume', topic: this.topic, seq: this.lastSeq }));
+        }
+
         // Enviar ping a cada 30 segundos para manter conexão viva
         this.pingInterval = setInterval(() => {
             if (this.ws && this.ws.readyState === WebSocket.OPEN) {
@@ -67,7 +77,16 @@ class PainelComprasWebSocket {
             console.log('[WebSocket] Timestamp:', new Date().toISOString());
             console.log('[WebSocket] ========================================');
 
+            if (typeof data.seq === 'number' && data.topic === this.topic) {
+                this.lastSeq = Math.max(this.lastSeq || 0, data.seq);
+            }
+
             switch (data.type) {
+                case 'eventos_lote':
+                    // Vários eventos de uma operação em um frame: processar um a um
+                    data.eventos.forEach(evento => this.onMessage({ data: JSON.stringify(evento) }));
+                    break;
+
                 case 'item_marcado_compra':
                     console.log('[WebSocket] Roteando para handleItemMarcadoCompra...');
                     this.handleItemMarcadoCompra(data.item);
@@ -78,7 +97,7 @@ class PainelComprasWebSocket {
                     break;
 
                 case 'compra_confirmada':
-                    this.handleCompraConfirmada(data.produto);
+                    this.handleCompraConfirmada(data.produtos || [data.produto]);
                     break;
 
                 case 'item_separado_direto':
@@ -93,6 +112,23 @@ class PainelComprasWebSocket {
                     // Resposta ao ping - conexão está ativa
                     break;
 
+                case 'subscribed':
+                    this.lastSeq = data.seq;
+                    break;
+
+                case 'unsubscribed':
+                    break;
+
+                case 'snapshot_required':
+                    this.lastSeq = data.seq;
+                    // Eventos perdidos não estão mais no histórico: recarregar o estado
+                    window.location.reload();
+                    break;
+
+                case 'error':
+                    console.error('[WebSocket] Erro no tópico:', data.topic, data.error);
+                    break;
+
                 default:
                     console.warn('[WebSocket] Tipo de mensagem desconhecido:', data.type);
             }
@@ -116,6 +152,13 @@ class PainelComprasWebSocket {
         }
 
         // Tentar reconectar se não foi fechamento intencional
+        // Recusada (sem login ou permissão) ou substituída por uma aba mais
+        // nova: reconectar só disputaria o limite de conexões do usuário
+        if ([4401, 4403, 4409].includes(event.code)) {
+            this.isIntentionallyClosed = true;
+            this.updateConnectionStatus(false, event.code === 4409 ? 'Aberto em outra aba' : 'Sessão expirada ou sem permissão');
+        }
+
         if (!this.isIntentionallyClosed) {
             this.scheduleReconnect();
         }
@@ -344,8 +387,8 @@ class PainelComprasWebSocket {
         console.log(`[WebSocket] Item ${itemData.id} atualizado: comprado=${itemData.comprado}`);
     }
 
-    handleCompraConfirmada(produto) {
-        console.log('[WebSocket] Compra confirmada:', produto);
+    handleCompraConfirmada(produtos) {
+        console.log('[WebSocket] Compra confirmada:', produtos);
         // Recarregar a página para atualizar a lista
         window.location.reload();
     }
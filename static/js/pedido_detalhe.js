@@ -16,7 +16,9 @@ class PedidoDetalheWebSocket {
 
         // Detectar protocolo (ws ou wss)
         this.protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        this.wsUrl = `${this.protocol}//${window.location.host}/ws/pedido/${this.pedidoId}/`;
+        this.wsUrl = `${this.protocol}//${window.location.host}/ws/`;
+        this.topic = `pedido:${this.pedidoId}`;
+        this.lastSeq = null; // Último evento recebido (retomada ao reconectar)
 
         this.connect();
     }
@@ -43,6 +45,14 @@ class PedidoDetalheWebSocket {
         this.reconnectDelay = 1000;
         this.updateConnectionStatus(true);
 
+        // Conexão única (/ws/): assinar o tópico desta tela; ao reconectar,
+        // retomar a partir do último evento recebido
+        if (this.lastSeq === null) {
+            this.ws.send(JSON.stringify({ type: 'subscribe', topic: this.topic }));
+        } else {
+            this.ws.send(JSON.stringify({ type: 'resume', topic: this.topic, seq: this.lastSeq }));
+        }
+
         // Enviar ping a cada 30 segundos para manter conexão viva
         this.pingInterval = setInterval(() => {
             if (this.ws && this.ws.readyState === WebSocket.OPEN) {
@@ -56,7 +66,16 @@ class PedidoDetalheWebSocket {
             const data = JSON.parse(event.data);
             console.log('[WebSocket] Mensagem recebida:', data);
 
+            if (typeof data.seq === 'number' && data.topic === this.topic) {
+                this.lastSeq = Math.max(this.lastSeq || 0, data.seq);
+            }
+
             switch (data.type) {
+                case 'eventos_lote':
+                    // Vários eventos de uma operação em um frame: processar um a um
+                    data.eventos.forEach(evento => this.onMessage({ data: JSON.stringify(evento) }));
+                    break;
+
                 case 'item_separado':
                     this.handleItemSeparado(data.item);
                     break;
@@ -93,6 +112,23 @@ class PedidoDetalheWebSocket {
                     // Resposta ao ping - conexão está ativa
                     break;
 
+                case 'subscribed':
+                    this.lastSeq = data.seq;
+                    break;
+
+                case 'unsubscribed':
+                    break;
+
+                case 'snapshot_required':
+                    this.lastSeq = data.seq;
+                    // Eventos perdidos não estão mais no histórico: recarregar o estado
+                    window.location.reload();
+                    break;
+
+                case 'error':
+                    console.error('[WebSocket] Erro no tópico:', data.topic, data.error);
+                    break;
+
                 default:
                     console.warn('[WebSocket] Tipo de mensagem desconhecido:', data.type);
             }
@@ -427,6 +463,13 @@ class PedidoDetalheWebSocket {
 
         this.updateConnectionStatus(false);
 
+        // Recusada (sem login ou permissão) ou substituída por uma aba mais
+        // nova: reconectar só disputaria o limite de conexões do usuário
+        if ([4401, 4403, 4409].includes(event.code)) {
+            this.isIntentionallyClosed = true;
+            this.updateConnectionStatus(false, event.code === 4409 ? 'Aberto em outra aba' : 'Sessão expirada ou sem permissão');
+        }
+
         if (!this.isIntentionallyClosed) {
             this.scheduleReconnect();
         }
@@ -500,6 +543,9 @@ function pedidoDetalheApp(pedidoId) {
             itensSelecionados: []
         },
 
+        // Idempotency-Key da ação em andamento, por URL
+        chavesAcao: {},
+
         init() {
             console.log('Inicializando pedido_detalhe app para pedido:', this.pedidoId);
             this.ws = new PedidoDetalheWebSocket(this.pedidoId, this);
@@ -553,7 +599,7 @@ function pedidoDetalheApp(pedidoId) {
                 try {
                     console.log(`[CHECKBOX] Enviando requisição para separar item ${itemId}...`);
 
-                    const response = await fetch(`/pedidos/item/${itemId}/separar/`, {
+                    const response = await this.enviarAcao(`/pedidos/item/${itemId}/separar/`, {
                         method: 'POST',
                         headers: {
                             'Content-Type': 'application/json',
@@ -671,7 +717,7 @@ function pedidoDetalheApp(pedidoId) {
             try {
                 console.log(`[UNCHECK] Enviando requisição para desseparar item ${itemId}...`);
 
-                const response = await fetch(`/pedidos/item/${itemId}/unseparar/`, {
+                const response = await this.enviarAcao(`/pedidos/item/${itemId}/unseparar/`, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -728,7 +774,7 @@ function pedidoDetalheApp(pedidoId) {
             if (!confirm('Confirma a separação deste item?')) return;
 
             try {
-                const response = await fetch(`/pedidos/item/${itemId}/separar/`, {
+                const response = await this.enviarAcao(`/pedidos/item/${itemId}/separar/`, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -768,7 +814,7 @@ function pedidoDetalheApp(pedidoId) {
                 formData.append('produto_substituto', this.modalSubstituir.produtoSubstituto);
                 formData.append('csrfmiddlewaretoken', this.getCsrfToken());
 
-                const response = await fetch(`/pedidos/item/${this.modalSubstituir.itemId}/substituir/`, {
+                const response = await this.enviarAcao(`/pedidos/item/${this.modalSubstituir.itemId}/substituir/`, {
                     method: 'POST',
                     body: formData
                 });
@@ -825,7 +871,7 @@ function pedidoDetalheApp(pedidoId) {
                     formData.append('outros_pedidos', id);
                 });
 
-                const response = await fetch(`/pedidos/item/${this.modalCompra.itemId}/marcar-compra/`, {
+                const response = await this.enviarAcao(`/pedidos/item/${this.modalCompra.itemId}/marcar-compra/`, {
                     method: 'POST',
                     body: formData
                 });
@@ -850,7 +896,7 @@ function pedidoDetalheApp(pedidoId) {
             if (!confirm('Confirma a finalização deste pedido? Esta ação não pode ser desfeita.')) return;
 
             try {
-                const response = await fetch(`/pedidos/${this.pedidoId}/finalizar/`, {
+                const response = await this.enviarAcao(`/pedidos/${this.pedidoId}/finalizar/`, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -899,6 +945,32 @@ function pedidoDetalheApp(pedidoId) {
             }
         },
 
+        // Helper: POST de ação com Idempotency-Key. Falhas de rede são
+        // repetidas e um toque duplo durante a requisição reaproveita a mesma
+        // chave: o servidor devolve a resposta original em vez de refazer a ação.
+        async enviarAcao(url, options) {
+            if (!this.chavesAcao[url]) {
+                this.chavesAcao[url] = window.crypto && crypto.randomUUID
+                    ? crypto.randomUUID()
+                    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            }
+            options.headers = { ...(options.headers || {}), 'Idempotency-Key': this.chavesAcao[url] };
+
+            try {
+                for (let tentativa = 1; ; tentativa++) {
+                    try {
+                        return await fetch(url, options);
+                    } catch (error) {
+                        if (tentativa >= 3) throw error;
+                        console.warn(`[ACAO] Falha de rede em ${url}, tentativa ${tentativa}:`, error);
+                        await new Promise(resolve => setTimeout(resolve, 500 * tentativa));
+                    }
+                }
+            } finally {
+                delete this.chavesAcao[url];
+            }
+        },
+
         // Helper: Get CSRF Token
         getCsrfToken() {
             const name = 'csrftoken';
@@ -0,0 +1,161 @@
+"""
+Testes para as ações de item (separar, desseparar, marcar compra, marcar
+comprado, substituir e finalizar) pela pilha ASGI
+
+As views são síncronas e os eventos seguem pelo outbox, enviados após o
+commit pelo despachante.
+
+Benchmark de vazão com 50 separadores simultâneos pela pilha ASGI:
+    BENCHMARK_SEPARADORES=1 python -m pytest tests/test_acoes_async.py -k Benchmark -s
+"""
+import os
+import sys
+import time
+import asyncio
+import unittest
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.test import TestCase, TransactionTestCase, AsyncClient
+from django.urls import reverse
+from django.utils import timezone
+from apps.core.models import Usuario, Pedido, ItemPedido, Produto
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+# Repetições de uma requisição do benchmark com o banco bloqueado (SQLite)
+REPETICOES_MAXIMAS = 200
+
+
+class TestAcoesAsgi(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: ações de item pela pilha ASGI com o mesmo comportamento do WSGI"""
+
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.admin)
+        self.cliente_vendedor = AsyncClient()
+        self.cliente_vendedor.force_login(self.vendedor)
+
+    async def test_separar_e_desseparar_pelo_asgi(self):
+        """Teste: separar e desseparar pela pilha ASGI atualizam item e pedido"""
+        item_id = self.itens[0].id
+
+        response = await self.async_client.post(reverse('separar_item', args=[item_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pedido_status'], 'EM_SEPARACAO')
+
+        response = await self.async_client.post(reverse('separar_item', args=[item_id]))
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.post(reverse('unseparar_item', args=[item_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pedido_status'], 'PENDENTE')
+
+        pedido = await Pedido.objects.aget(id=self.pedido.id)
+        self.assertEqual(pedido.itens_separados, 0)
+
+    async def test_permissoes_pelo_asgi(self):
+        """Teste: vendedor não substitui item nem finaliza pedido"""
+        response = await self.cliente_vendedor.post(
+            reverse('substituir_item', args=[self.itens[0].id]), {'produto_substituto': 'Outro'}
+        )
+        self.assertEqual(response.status_code, 302)
+        response = await self.cliente_vendedor.post(reverse('finalizar_pedido', args=[self.pedido.id]))
+        self.assertEqual(response.status_code, 302)
+
+    def test_eventos_apos_o_commit(self):
+        """Teste: ação de item publica os eventos pelo outbox"""
+        with self.capturar_eventos() as broadcast:
+            response = self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {chamada.args[0] for chamada in broadcast.call_args_list},
+            {'dashboard', f'pedido_{self.pedido.id}'}
+        )
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK_SEPARADORES'), 'Benchmark: defina BENCHMARK_SEPARADORES=1')
+class TestBenchmarkSeparadores(TransactionTestCase):
+    """Benchmark: vazão com separadores simultâneos pela pilha ASGI"""
+
+    SEPARADORES = 50
+    ITENS_POR_SEPARADOR = 4
+
+    def setUp(self):
+        vendedor = Usuario.objects.create_user(numero_login=2001, nome='Vendedor', tipo='VENDEDOR', pin='1234')
+        self.clientes = []
+        self.itens = []
+        for i in range(self.SEPARADORES):
+            separador = Usuario.objects.create_user(
+                numero_login=3000 + i, nome=f'Separador {i}', tipo='SEPARADOR', pin='1234'
+            )
+            client = AsyncClient()
+            client.force_login(separador)
+            self.clientes.append(client)
+
+            pedido = Pedido.objects.create(
+                numero_orcamento=f'ORC-B{i:03d}',
+                codigo_cliente='CLI-001',
+                nome_cliente='Cliente',
+                vendedor=vendedor,
+                data=timezone.localdate(),
+                logistica='RETIRADA',
+                embalagem='CAIXA_MEDIA'
+            )
+            self.itens.append([
+                ItemPedido.objects.create(
+                    pedido=pedido,
+                    produto=Produto.objects.get_or_create(codigo=f'B{j:03d}', defaults={'descricao': f'Produto {j}'})[0],
+                    quantidade_solicitada=1,
+                    preco_unitario=10
+                ).id
+                for j in range(self.ITENS_POR_SEPARADOR)
+            ])
+        Pedido.reconciliar_contadores()
+
+    async def separar(self, client, item_ids):
+        """
+        Separa os itens em sequência, repetindo só quando o banco está
+        bloqueado (no máximo REPETICOES_MAXIMAS vezes por item)
+        """
+        repeticoes = 0
+        for item_id in item_ids:
+            for _ in range(REPETICOES_MAXIMAS):
+                response = await client.post(reverse('separar_item', args=[item_id]))
+                if response.status_code == 200:
+                    break
+                self.assertEqual(response.status_code, 500, response.content)
+                self.assertIn('locked', response.json()['error'])
+                repeticoes += 1
+                await asyncio.sleep(0.005)
+            else:
+                self.fail(f'Item {item_id} não separado após {REPETICOES_MAXIMAS} repetições')
+        return repeticoes
+
+    async def test_vazao(self):
+        """Benchmark: requisições por segundo com separadores simultâneos"""
+        inicio = time.perf_counter()
+        repeticoes = await asyncio.gather(*(
+            self.separar(client, itens)
+            for client, itens in zip(self.clientes, self.itens)
+        ))
+        duracao = time.perf_counter() - inicio
+
+        total = self.SEPARADORES * self.ITENS_POR_SEPARADOR
+        print(
+            f"\n[BENCHMARK] {self.SEPARADORES} separadores x {self.ITENS_POR_SEPARADOR} itens: "
+            f"{total / duracao:.0f} req/s ({sum(repeticoes)} repetições)"
+        )
+        separados = await ItemPedido.objects.filter(separado=True).acount()
+        self.assertEqual(separados, total)
+
+
+if __name__ == '__main__':
+    unittest.main()
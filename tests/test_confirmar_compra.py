@@ -0,0 +1,176 @@
+"""
+Testes para a confirmação de compra (um ou vários produtos por requisição)
+"""
+import os
+import sys
+import json
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from apps.core.models import Pedido, ItemPedido, Produto, LogAuditoria
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+class TestConfirmarCompra(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: confirmação de compra em uma passada, com status e eventos agregados"""
+
+    def marcar_em_compra(self, *itens):
+        ItemPedido.objects.filter(id__in=[item.id for item in itens]).update(em_compra=True)
+        Pedido.objects.filter(id__in={item.pedido_id for item in itens}).update(status='AGUARDANDO_COMPRA')
+        Pedido.reconciliar_contadores()
+
+    def confirmar(self, *codigos):
+        return self.client.post(
+            reverse('confirmar_compras'),
+            data=json.dumps({'produtos': list(codigos)}),
+            content_type='application/json'
+        )
+
+    def test_varios_produtos_e_status(self):
+        """Teste: confirma vários produtos e o pedido volta para separação"""
+        self.marcar_em_compra(self.itens[0], self.itens[1])
+
+        response = self.confirmar('PROD000', 'PROD001', 'NAO-EXISTE')
+
+        dados = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dados['total_itens'], 2)
+        self.assertEqual([produto['codigo'] for produto in dados['produtos']], ['PROD000', 'PROD001'])
+        self.assertEqual(dados['nao_encontrados'], ['NAO-EXISTE'])
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+        self.assertEqual(self.pedido.itens_comprados, 2)
+        self.assertEqual(ItemPedido.objects.filter(compra_realizada=True, compra_realizada_por=self.admin).count(), 2)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+        auditoria = LogAuditoria.objects.get(acao='confirmar_compra')
+        self.assertEqual(auditoria.dados_novos['pedidos_afetados'], [self.pedido.id])
+
+    def test_compra_parcial_mantem_aguardando(self):
+        """Teste: pedido com itens ainda não comprados continua aguardando compra"""
+        self.marcar_em_compra(self.itens[0], self.itens[1])
+
+        response = self.client.post(reverse('confirmar_compra', args=['PROD000']))
+
+        self.assertEqual(response.json()['produto_codigo'], 'PROD000')
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'AGUARDANDO_COMPRA')
+        self.assertEqual(self.pedido.itens_comprados, 1)
+
+    def test_item_comprado_e_separado_nao_conta(self):
+        """Teste: item comprado e já separado não libera o pedido com compras pendentes"""
+        self.marcar_em_compra(*self.itens)
+        self.confirmar('PROD000')
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'AGUARDANDO_COMPRA')
+
+        self.confirmar('PROD001')
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'AGUARDANDO_COMPRA')
+
+        self.confirmar('PROD002')
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+
+    def test_desmarcar_comprado_volta_a_aguardar(self):
+        """Teste: desmarcar a compra volta o pedido para AGUARDANDO_COMPRA"""
+        self.marcar_em_compra(self.itens[0])
+        self.client.post(reverse('marcar_item_comprado', args=[self.itens[0].id]))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+
+        self.client.post(reverse('marcar_item_comprado', args=[self.itens[0].id]))
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'AGUARDANDO_COMPRA')
+
+    def test_separar_ultimo_pendente_volta_a_separacao(self):
+        """Teste: separar direto o último item que faltava comprar volta o pedido para a separação"""
+        self.marcar_em_compra(self.itens[0])
+
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+
+    def test_nada_a_confirmar(self):
+        """Teste: produto sem itens em compra retorna 404 e corpo vazio retorna 400"""
+        self.assertEqual(self.client.post(reverse('confirmar_compra', args=['PROD000'])).status_code, 404)
+        self.assertEqual(self.confirmar().status_code, 400)
+
+        self.marcar_em_compra(self.itens[0])
+        self.confirmar('PROD000')
+        # Compra já confirmada não é confirmada de novo
+        self.assertEqual(self.confirmar('PROD000').status_code, 404)
+
+    def test_eventos_agregados(self):
+        """Teste: um evento para o painel de compras e uma mensagem para o dashboard"""
+        self.marcar_em_compra(self.itens[0], self.itens[1])
+
+        with self.capturar_eventos() as broadcast:
+            self.confirmar('PROD000', 'PROD001')
+
+        mensagens = {chamada.args[0]: (chamada.args[1], chamada.args[2]) for chamada in broadcast.call_args_list}
+        self.assertEqual(len(mensagens), len(broadcast.call_args_list))
+
+        tipo, dados = mensagens['painel_compras']
+        self.assertEqual(tipo, 'compra_confirmada')
+        self.assertEqual(len(dados['produtos']), 2)
+
+        tipo, dados = mensagens['dashboard']
+        self.assertEqual(tipo, 'pedido_atualizado')
+        self.assertEqual(dados['pedido']['status'], 'EM_SEPARACAO')
+
+        # Mesmo evento para os dois itens do pedido chega uma vez por produto
+        tipo, dados = mensagens[f'pedido_{self.pedido.id}']
+        self.assertEqual(tipo, 'eventos_lote')
+        self.assertEqual(len(dados['eventos']), 2)
+
+    def test_consultas_constantes(self):
+        """Teste: número de consultas não cresce com produtos e pedidos confirmados"""
+        codigos = []
+        for i in range(6):
+            pedido = Pedido.objects.create(
+                numero_orcamento=f'ORC-C{i}',
+                codigo_cliente='CLI-002',
+                nome_cliente='Cliente 2',
+                vendedor=self.vendedor,
+                data=timezone.localdate(),
+                logistica='RETIRADA',
+                embalagem='CAIXA_MEDIA'
+            )
+            for j in range(3):
+                produto, _ = Produto.objects.get_or_create(codigo=f'COMPRA{j}', defaults={'descricao': f'Compra {j}'})
+                item = ItemPedido.objects.create(pedido=pedido, produto=produto, quantidade_solicitada=1, preco_unitario=10)
+                self.marcar_em_compra(item)
+                codigos.append(produto.codigo)
+        self.marcar_em_compra(*self.itens)
+
+        with CaptureQueriesContext(connection) as pequeno:
+            self.confirmar('PROD000', 'PROD001', 'PROD002')
+        with CaptureQueriesContext(connection) as grande:
+            self.confirmar(*sorted(set(codigos)))
+
+        self.assertEqual(len(pequeno.captured_queries), len(grande.captured_queries))
+        self.assertEqual(Pedido.objects.filter(status='EM_SEPARACAO').count(), 7)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,447 @@
+"""
+Testes para o WebSocket multiplexado (/ws/) com assinatura de tópicos
+"""
+import os
+import sys
+import json
+import asyncio
+import django
+from unittest import mock
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from apps.core import consumers
+from apps.core.models import Usuario
+from apps.core.routing import websocket_urlpatterns
+from apps.core.services import broadcast, conexoes, retomada
+from apps.core.services.dashboard import FiltroDashboard, montar_card
+
+from test_contadores_pedido import ContadoresTestMixin
+
+
+SEQUENCIA_PELO_RELOGIO = retomada._sequencia_inicial
+
+
+def numerar_a_partir_de_um(caso):
+    """Contadores de sequência começam em 0 (seq 1 no primeiro evento)"""
+    patcher = mock.patch.object(retomada, '_sequencia_inicial', return_value=0)
+    patcher.start()
+    caso.addCleanup(patcher.stop)
+
+
+def comunicador(usuario, caminho='/ws/'):
+    """WebsocketCommunicator com o usuário que o AuthMiddlewareStack colocaria no scope"""
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), caminho)
+    communicator.scope['user'] = usuario
+    return communicator
+
+
+class TestTopicos(SimpleTestCase):
+    """Testes: uma conexão, vários tópicos, handlers comuns"""
+
+    def setUp(self):
+        # Sequências, histórico e conexões por usuário ficam no cache
+        cache.clear()
+        numerar_a_partir_de_um(self)
+        self.usuario = Usuario(id=1, numero_login=1000, nome='Admin', tipo='ADMINISTRADOR')
+
+    async def conectar(self, caminho='/ws/'):
+        communicator = comunicador(self.usuario, caminho)
+        conectado, _ = await communicator.connect()
+        self.assertTrue(conectado)
+        return communicator
+
+    async def assinar(self, communicator, topico):
+        await communicator.send_json_to({'type': 'subscribe', 'topic': topico})
+        return await communicator.receive_json_from()
+
+    def test_grupos_dos_topicos(self):
+        """Teste: tópicos e groups do channel layer"""
+        self.assertEqual(consumers.grupo_do_topico('dashboard'), 'dashboard')
+        self.assertEqual(consumers.grupo_do_topico('painel_compras'), 'painel_compras')
+        self.assertEqual(consumers.grupo_do_topico('pedido:12'), 'pedido_12')
+        self.assertIsNone(consumers.grupo_do_topico('pedido:abc'))
+        self.assertIsNone(consumers.grupo_do_topico('pedido_12'))
+        self.assertEqual(consumers.topico_do_grupo('pedido_12'), 'pedido:12')
+
+    async def test_eventos_de_varios_topicos(self):
+        """Teste: eventos de cada tópico assinado chegam na mesma conexão com o tópico"""
+        communicator = await self.conectar()
+        self.assertEqual(await self.assinar(communicator, 'dashboard'), {'type': 'subscribed', 'topic': 'dashboard', 'seq': 0})
+        self.assertEqual(await self.assinar(communicator, 'pedido:7'), {'type': 'subscribed', 'topic': 'pedido:7', 'seq': 0})
+
+        await broadcast.enviar('pedido_7', 'item_separado', {'item': {'id': 1}})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'item_separado', 'item': {'id': 1}, 'topic': 'pedido:7', 'seq': 1}
+        )
+
+        await broadcast.enviar('dashboard', 'pedido_finalizado', {'pedido_id': 7})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'pedido_finalizado', 'pedido_id': 7, 'topic': 'dashboard', 'seq': 1}
+        )
+
+        # Tópico não assinado não chega
+        await broadcast.enviar('painel_compras', 'item_comprado', {'item': {'id': 1}})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_cancelar_assinatura(self):
+        """Teste: depois do unsubscribe os eventos do tópico param"""
+        communicator = await self.conectar()
+        await self.assinar(communicator, 'painel_compras')
+
+        await communicator.send_json_to({'type': 'unsubscribe', 'topic': 'painel_compras'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'unsubscribed', 'topic': 'painel_compras'})
+
+        await broadcast.enviar('painel_compras', 'item_comprado', {'item': {'id': 1}})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_topico_invalido_e_limite(self):
+        """Teste: tópico inexistente e excesso de tópicos retornam erro"""
+        communicator = await self.conectar()
+        resposta = await self.assinar(communicator, 'pedidos')
+        self.assertEqual(resposta['type'], 'error')
+
+        for pedido_id in range(consumers.MAXIMO_TOPICOS):
+            await self.assinar(communicator, f'pedido:{pedido_id}')
+        resposta = await self.assinar(communicator, 'dashboard')
+        self.assertEqual(resposta['type'], 'error')
+
+        # Assinar de novo um tópico já assinado não conta no limite
+        self.assertEqual((await self.assinar(communicator, 'pedido:0'))['type'], 'subscribed')
+        await communicator.disconnect()
+
+    async def test_ping(self):
+        """Teste: ping recebe pong"""
+        communicator = await self.conectar()
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'pong')
+        await communicator.disconnect()
+
+    async def test_urls_por_tela(self):
+        """Teste: URLs antigas continuam recebendo os eventos do seu group; o dashboard só pelo /ws/"""
+        communicator = await self.conectar('/ws/pedido/7/')
+
+        await broadcast.enviar('pedido_7', 'eventos_lote', {'eventos': [{'type': 'item_separado', 'item': {'id': 1}}]})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'eventos_lote', 'eventos': [{'type': 'item_separado', 'item': {'id': 1}}], 'topic': 'pedido:7', 'seq': 1}
+        )
+        await communicator.disconnect()
+
+        # Sem a URL antiga, nenhuma conexão do dashboard escapa dos filtros
+        with self.assertRaises(ValueError):
+            await comunicador(self.usuario, '/ws/dashboard/').connect()
+
+    async def test_frame_codificado_uma_vez(self):
+        """Teste: o frame é codificado no envio e repassado igual a todas as conexões"""
+        conexoes = [await self.conectar() for _ in range(4)]
+        for communicator in conexoes:
+            await self.assinar(communicator, 'dashboard')
+
+        with mock.patch('apps.core.services.broadcast.json.dumps', wraps=json.dumps) as dumps:
+            await broadcast.enviar('dashboard', 'pedido_criado', {'pedido': {'id': 3, 'cliente': 'Á'}})
+            frames = [await communicator.receive_from() for communicator in conexoes]
+
+        self.assertEqual(dumps.call_count, 1)
+        self.assertEqual(frames, [broadcast.codificar('dashboard', 'pedido_criado', {'pedido': {'id': 3, 'cliente': 'Á'}}, 1)] * 4)
+        for communicator in conexoes:
+            await communicator.disconnect()
+
+    async def enviar_varios(self, grupo, quantidade):
+        for i in range(quantidade):
+            await broadcast.enviar(grupo, 'pedido_atualizado', {'pedido': {'id': i}})
+
+    async def test_retomada(self):
+        """Teste: resume reenvia só os eventos perdidos, em ordem, e segue ao vivo"""
+        communicator = await self.conectar()
+        await self.assinar(communicator, 'dashboard')
+        await self.enviar_varios('dashboard', 3)
+        recebidos = [await communicator.receive_json_from() for _ in range(3)]
+        self.assertEqual([frame['seq'] for frame in recebidos], [1, 2, 3])
+        await communicator.disconnect()
+
+        # Eventos durante a queda
+        await self.enviar_varios('dashboard', 2)
+
+        communicator = await self.conectar()
+        await communicator.send_json_to({'type': 'resume', 'topic': 'dashboard', 'seq': 3})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'topic': 'dashboard', 'seq': 5})
+        perdidos = [await communicator.receive_json_from() for _ in range(2)]
+        self.assertEqual([(frame['seq'], frame['pedido']['id']) for frame in perdidos], [(4, 0), (5, 1)])
+
+        await broadcast.enviar('dashboard', 'pedido_finalizado', {'pedido_id': 1})
+        self.assertEqual((await communicator.receive_json_from())['seq'], 6)
+        await communicator.disconnect()
+
+    async def test_retomada_descarta_copia_ao_vivo(self):
+        """Teste: evento já reenviado pela retomada não chega de novo ao vivo"""
+        await self.enviar_varios('dashboard', 1)
+        communicator = await self.conectar()
+        await communicator.send_json_to({'type': 'resume', 'topic': 'dashboard', 'seq': 0})
+        await communicator.receive_json_from()
+        self.assertEqual((await communicator.receive_json_from())['seq'], 1)
+
+        await get_channel_layer().group_send('dashboard', {
+            'type': broadcast.TIPO_EVENTO, 'group': 'dashboard', 'seq': 1, 'frame': '{"seq": 1}'
+        })
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_HISTORICO_EVENTOS=3)
+    async def test_lacuna_maior_que_historico(self):
+        """Teste: lacuna maior que o histórico, ou seq desconhecido, pede o estado completo"""
+        await self.enviar_varios('pedido_7', 5)
+
+        communicator = await self.conectar()
+        for desde in (1, 9):
+            await communicator.send_json_to({'type': 'resume', 'topic': 'pedido:7', 'seq': desde})
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {'type': 'snapshot_required', 'topic': 'pedido:7', 'seq': 5}
+            )
+
+        await communicator.send_json_to({'type': 'resume', 'topic': 'pedido:7', 'seq': 2})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'subscribed')
+        self.assertEqual([(await communicator.receive_json_from())['seq'] for _ in range(3)], [3, 4, 5])
+
+        await communicator.send_json_to({'type': 'resume', 'topic': 'pedido:7', 'seq': 'x'})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        await communicator.disconnect()
+
+    def test_evento_nao_enviado_fora_do_historico(self):
+        """Teste: evento que falhou no channel layer não é reenviado pela retomada"""
+        retomada.registrar('dashboard', lambda seq: f'{{"seq": {seq}}}')
+        seq, _ = retomada.registrar('dashboard', lambda seq: f'{{"seq": {seq}}}')
+        retomada.descartar('dashboard', seq)
+
+        self.assertEqual(retomada.eventos_desde('dashboard', 0), (None, 2))
+        self.assertEqual(retomada.eventos_desde('dashboard', 2), ([], 2))
+
+    async def test_cache_reiniciado_continua_numeracao(self):
+        """Teste: contador perdido recomeça acima dos seqs já enviados, sem descartar eventos"""
+        communicator = await self.conectar()
+        await self.assinar(communicator, 'dashboard')
+        await broadcast.enviar('dashboard', 'pedido_finalizado', {'pedido_id': 1})
+        anterior = (await communicator.receive_json_from())['seq']
+
+        cache.clear()
+        with mock.patch.object(retomada, '_sequencia_inicial', return_value=1000):
+            await broadcast.enviar('dashboard', 'pedido_finalizado', {'pedido_id': 2})
+        evento = await communicator.receive_json_from()
+        self.assertEqual((evento['pedido_id'], evento['seq']), (2, 1001))
+        self.assertGreater(evento['seq'], anterior)
+
+        # Retomada a partir de um seq anterior ao reinício pede o estado completo
+        await communicator.send_json_to({'type': 'resume', 'topic': 'dashboard', 'seq': anterior})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'snapshot_required')
+        await communicator.disconnect()
+
+    def test_sequencia_inicial_pelo_relogio(self):
+        """Teste: sem o patch dos testes, o contador começa dos milissegundos atuais"""
+        with mock.patch.object(retomada, '_sequencia_inicial', SEQUENCIA_PELO_RELOGIO):
+            seq, _ = retomada.registrar('dashboard', str)
+        self.assertGreater(seq, 10 ** 12)
+
+
+class TestFiltroDashboard(ContadoresTestMixin, TestCase):
+    """Testes: assinaturas do dashboard filtradas no servidor"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        numerar_a_partir_de_um(self)
+        self.card = montar_card(self.pedido)
+        self.outro = dict(self.card, id=self.pedido.id + 1000, vendedor_id=self.admin.id)
+
+    async def conectar(self, filtros):
+        communicator = comunicador(self.admin)
+        await communicator.connect()
+        await communicator.send_json_to({'type': 'subscribe', 'topic': 'dashboard', 'filters': filtros})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'subscribed')
+        return communicator
+
+    def test_filtro_de_dados(self):
+        """Teste: critérios validados e comparados com o card"""
+        filtro = FiltroDashboard.de_dados({'vendedor_id': self.vendedor.id, 'status': ['PENDENTE'], 'logistica': ['RETIRADA']})
+        self.assertTrue(filtro.aceita(self.card))
+        self.assertFalse(filtro.aceita(dict(self.card, status='EM_SEPARACAO')))
+        self.assertFalse(filtro.aceita(dict(self.card, logistica='Entrega')))
+        self.assertEqual(filtro.pedidos_visiveis(), {self.pedido.id})
+        self.assertEqual(FiltroDashboard.de_dados({'logistica': ['']}).pedidos_visiveis(), set())
+
+        for dados in ({'cliente': 'x'}, {'status': 'PENDENTE'}, {'status': ['ABERTO']}, {'vendedor_id': '3'}, []):
+            with self.assertRaises(ValueError):
+                FiltroDashboard.de_dados(dados)
+
+    async def test_eventos_do_vendedor(self):
+        """Teste: só eventos dos pedidos do vendedor filtrado chegam"""
+        communicator = await self.conectar({'vendedor_id': self.vendedor.id})
+
+        await broadcast.enviar('dashboard', 'pedido_atualizado', {'pedido': self.outro})
+        await broadcast.enviar('dashboard', 'pedido_finalizado', {'pedido_id': self.outro['id']})
+        self.assertTrue(await communicator.receive_nothing())
+
+        # Pedido visível desde o subscribe (índice lido do banco)
+        await broadcast.enviar('dashboard', 'pedido_finalizado', {'pedido_id': self.pedido.id})
+        self.assertEqual((await communicator.receive_json_from())['pedido_id'], self.pedido.id)
+
+        await broadcast.enviar('dashboard', 'pedido_criado', {'pedido': self.card})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'pedido_criado')
+        await communicator.disconnect()
+
+    async def test_pedido_sai_do_filtro(self):
+        """Teste: pedido que deixa de passar pelo filtro é removido da tela"""
+        communicator = await self.conectar({'status': ['PENDENTE']})
+
+        await broadcast.enviar('dashboard', 'pedido_atualizado', {'pedido': dict(self.card, status='EM_SEPARACAO')})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'pedido_finalizado', 'pedido_id': self.pedido.id, 'topic': 'dashboard', 'seq': 1}
+        )
+
+        # Já removido: próximas atualizações fora do filtro não chegam
+        await broadcast.enviar('dashboard', 'pedido_atualizado', {'pedido': dict(self.card, status='EM_SEPARACAO')})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_lote_reduzido(self):
+        """Teste: lote com pedidos de fora do filtro chega só com os eventos relevantes"""
+        sem_filtro = await self.conectar(None)
+        filtrado = await self.conectar({'vendedor_id': self.vendedor.id})
+
+        eventos = [
+            {'type': 'pedido_atualizado', 'pedido': self.outro},
+            {'type': 'pedido_atualizado', 'pedido': self.card},
+        ]
+        await broadcast.enviar('dashboard', 'eventos_lote', {'eventos': eventos})
+
+        self.assertEqual((await sem_filtro.receive_json_from())['eventos'], eventos)
+        self.assertEqual((await filtrado.receive_json_from())['eventos'], eventos[1:])
+        await sem_filtro.disconnect()
+        await filtrado.disconnect()
+
+    async def test_retomada_filtrada(self):
+        """Teste: eventos reenviados pela retomada também passam pelo filtro"""
+        await broadcast.enviar('dashboard', 'pedido_atualizado', {'pedido': self.outro})
+        await broadcast.enviar('dashboard', 'pedido_atualizado', {'pedido': self.card})
+
+        communicator = comunicador(self.admin)
+        await communicator.connect()
+        await communicator.send_json_to({
+            'type': 'resume', 'topic': 'dashboard', 'seq': 0, 'filters': {'vendedor_id': self.vendedor.id}
+        })
+        self.assertEqual((await communicator.receive_json_from())['seq'], 2)
+        self.assertEqual((await communicator.receive_json_from())['pedido']['id'], self.pedido.id)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_filtro_so_no_dashboard(self):
+        """Teste: filtros em outros tópicos ou inválidos retornam erro"""
+        communicator = comunicador(self.admin)
+        await communicator.connect()
+        for topico, filtros in (('painel_compras', {}), ('dashboard', {'status': ['ABERTO']})):
+            await communicator.send_json_to({'type': 'subscribe', 'topic': topico, 'filters': filtros})
+            self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        await communicator.disconnect()
+
+
+class TestAdmissao(SimpleTestCase):
+    """Testes: handshake autenticado, permissões por tópico, limite por usuário e ociosidade"""
+
+    def setUp(self):
+        cache.clear()
+        self.vendedor = Usuario(id=2, numero_login=2001, nome='Vendedor', tipo='VENDEDOR')
+
+    async def assertRecusada(self, communicator, codigo):
+        """Handshake aceito e fechado em seguida com o código da aplicação"""
+        conectado, _ = await communicator.connect()
+        self.assertTrue(conectado)
+        self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': codigo})
+
+    async def test_recusa_anonimo_e_inativo(self):
+        """Teste: conexão sem usuário autenticado e ativo fecha com 4401"""
+        inativo = Usuario(id=3, numero_login=2002, nome='Inativo', tipo='SEPARADOR', ativo=False)
+        for usuario in (AnonymousUser(), inativo):
+            for caminho in ('/ws/', '/ws/pedido/7/'):
+                await self.assertRecusada(comunicador(usuario, caminho), consumers.FECHAMENTO_NAO_AUTENTICADO)
+
+    async def test_permissao_por_topico(self):
+        """Teste: painel de compras só para COMPRADORA e ADMINISTRADOR"""
+        communicator = comunicador(self.vendedor)
+        await communicator.connect()
+        await communicator.send_json_to({'type': 'subscribe', 'topic': 'painel_compras'})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'error', 'topic': 'painel_compras', 'error': 'Sem permissão para este tópico.'}
+        )
+        await communicator.send_json_to({'type': 'subscribe', 'topic': 'dashboard'})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'subscribed')
+        await communicator.disconnect()
+
+        await self.assertRecusada(comunicador(self.vendedor, '/ws/painel-compras/'), consumers.FECHAMENTO_SEM_PERMISSAO)
+
+        compradora = Usuario(id=4, numero_login=3001, nome='Compradora', tipo='COMPRADORA')
+        communicator = comunicador(compradora, '/ws/painel-compras/')
+        self.assertTrue((await communicator.connect())[0])
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_CONEXOES_POR_USUARIO=2)
+    async def test_limite_encerra_mais_antiga(self):
+        """Teste: ao passar do limite, a conexão mais antiga do usuário é encerrada"""
+        abas = [comunicador(self.vendedor) for _ in range(3)]
+        for aba in abas[:2]:
+            await aba.connect()
+        outro = comunicador(Usuario(id=5, numero_login=2005, nome='Outro', tipo='VENDEDOR'))
+        await outro.connect()
+
+        await abas[2].connect()
+        self.assertEqual(
+            await abas[0].receive_output(),
+            {'type': 'websocket.close', 'code': consumers.FECHAMENTO_SUBSTITUIDA}
+        )
+        self.assertTrue(await abas[1].receive_nothing())
+        self.assertTrue(await outro.receive_nothing())
+        await abas[0].disconnect()
+        self.assertEqual(len(conexoes.abertas(self.vendedor.id)), 2)
+
+        for aba in abas[1:] + [outro]:
+            await aba.disconnect()
+        self.assertEqual(conexoes.abertas(self.vendedor.id), [])
+
+    @override_settings(WEBSOCKET_OCIOSIDADE_S=0.3)
+    async def test_conexao_ociosa_encerrada(self):
+        """Teste: conexão sem mensagens do cliente é encerrada; com ping continua"""
+        ociosa = comunicador(self.vendedor)
+        ativa = comunicador(self.vendedor)
+        await ociosa.connect()
+        await ativa.connect()
+
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            await ativa.send_json_to({'type': 'ping'})
+            self.assertEqual((await ativa.receive_json_from())['type'], 'pong')
+
+        self.assertEqual(
+            await ociosa.receive_output(),
+            {'type': 'websocket.close', 'code': consumers.FECHAMENTO_OCIOSA}
+        )
+        await ociosa.disconnect()
+        await ativa.disconnect()
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Testes para os contadores desnormalizados de Pedido
+"""
+import os
+import sys
+import django
+from io import StringIO
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.utils import timezone
+from django.urls import reverse
+from apps.core.models import Usuario, Pedido, ItemPedido, Produto
+
+
+class ContadoresTestMixin:
+    """Cria admin logado, um pedido com três itens e contadores iniciais"""
+
+    def setUp(self):
+        self.client = Client()
+
+        self.admin, _ = Usuario.objects.get_or_create(
+            numero_login=1000,
+            defaults={
+                'nome': 'Admin',
+                'tipo': 'ADMINISTRADOR'
+            }
+        )
+        if not self.admin.pin_hash:
+            self.admin.set_pin('1234')
+            self.admin.save()
+
+        self.vendedor = Usuario.objects.create_user(
+            numero_login=2001,
+            nome='Vendedor Teste',
+            tipo='VENDEDOR',
+            pin='1234'
+        )
+
+        self.pedido = Pedido.objects.create(
+            numero_orcamento='ORC-001',
+            codigo_cliente='CLI-001',
+            nome_cliente='Cliente 1',
+            vendedor=self.vendedor,
+            data=timezone.localdate(),
+            logistica='RETIRADA',
+            embalagem='CAIXA_MEDIA',
+            status='PENDENTE'
+        )
+
+        self.itens = []
+        for i in range(3):
+            produto = Produto.objects.create(codigo=f'PROD{i:03d}', descricao=f'Produto {i}')
+            self.itens.append(ItemPedido.objects.create(
+                pedido=self.pedido,
+                produto=produto,
+                quantidade_solicitada=1,
+                preco_unitario=10
+            ))
+        Pedido.reconciliar_contadores()
+        self.pedido.refresh_from_db()
+
+        # force_login evita o rate limit de login (compartilhado entre testes)
+        self.client.force_login(self.admin)
+
+
+class TestContadoresAcoesItem(ContadoresTestMixin, TestCase):
+    """Testes: cada ação de item mantém os contadores do pedido"""
+
+    def test_separar_incrementa_contadores(self):
+        """Teste: separar item incrementa separados/concluídos e registra separador"""
+        response = self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total_itens, 3)
+        self.assertEqual(self.pedido.itens_separados, 1)
+        self.assertEqual(self.pedido.itens_concluidos, 1)
+        self.assertEqual(self.pedido.separadores, [self.admin.nome])
+        self.assertEqual(response.json()['porcentagem_separacao'], 33.3)
+
+    def test_unseparar_decrementa_contadores(self):
+        """Teste: desseparar item volta os contadores e limpa separadores"""
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+        self.client.post(reverse('unseparar_item', args=[self.itens[0].id]))
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_separados, 0)
+        self.assertEqual(self.pedido.itens_concluidos, 0)
+        self.assertEqual(self.pedido.separadores, [])
+
+    def test_substituir_conta_como_separado(self):
+        """Teste: substituir incrementa substituídos e separados"""
+        response = self.client.post(
+            reverse('substituir_item', args=[self.itens[1].id]),
+            {'produto_substituto': 'Outro produto'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_substituidos, 1)
+        self.assertEqual(self.pedido.itens_separados, 1)
+
+    def test_marcar_compra_e_comprado(self):
+        """Teste: marcar para compra e marcar comprado atualizam contadores"""
+        self.client.post(reverse('marcar_compra', args=[self.itens[2].id]))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_em_compra, 1)
+        self.assertEqual(self.pedido.get_card_status_contadores()[0], 'AGUARDANDO_COMPRA')
+
+        self.client.post(reverse('marcar_item_comprado', args=[self.itens[2].id]))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_comprados, 1)
+        self.assertEqual(self.pedido.itens_concluidos, 1)
+
+    def test_card_status_contadores_igual_ao_calculado(self):
+        """Teste: card_status pelos contadores bate com o calculado pelos itens"""
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.get_card_status_contadores(), self.pedido.get_card_status())
+
+        for item in self.itens[1:]:
+            self.client.post(reverse('separar_item', args=[item.id]))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.get_card_status_contadores(), ('CONCLUIDO', 'Concluído'))
+        self.assertEqual(self.pedido.get_card_status_contadores(), self.pedido.get_card_status())
+
+
+class TestReconciliarContadores(ContadoresTestMixin, TestCase):
+    """Testes para a reconciliação dos contadores"""
+
+    def test_reconciliar_corrige_divergencia(self):
+        """Teste: reconciliação corrige contadores alterados fora das views"""
+        ItemPedido.objects.filter(id=self.itens[0].id).update(separado=True, separado_por=self.admin)
+
+        corrigidos = Pedido.reconciliar_contadores()
+
+        self.assertEqual(corrigidos, 1)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_separados, 1)
+        self.assertEqual(self.pedido.separadores, [self.admin.nome])
+
+    def test_reconciliar_sem_divergencia(self):
+        """Teste: reconciliação não altera pedidos corretos"""
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+    def test_comando_reconciliar_contadores(self):
+        """Teste: comando de gerenciamento reporta correções"""
+        Pedido.objects.filter(id=self.pedido.id).update(total_itens=0)
+
+        saida = StringIO()
+        call_command('reconciliar_contadores', stdout=saida)
+
+        self.assertIn('1 pedido(s)', saida.getvalue())
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total_itens, 3)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
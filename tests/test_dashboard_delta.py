@@ -0,0 +1,183 @@
+"""
+Testes para o delta sync do dashboard (/dashboard/refresh/?since=<seq>)
+"""
+import os
+import sys
+import django
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from apps.core.models import Pedido, ItemPedido, AlteracaoPedido
+from apps.core.services import dashboard as servico_dashboard
+from apps.core.services.dashboard import limites_sequencia
+
+from test_dashboard_snapshot import DashboardTestMixin
+
+
+class TestDeltaSync(DashboardTestMixin, TestCase):
+    """Testes para o refresh incremental por sequência"""
+
+    def setUp(self):
+        super().setUp()
+        self.criar_pedidos(3)
+        self.seq = limites_sequencia()[1]
+
+        # Sem janela de reenvio, para verificar exatamente o que mudou
+        patcher = mock.patch.object(servico_dashboard, 'JANELA_REENVIO', timedelta(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def refresh(self, since):
+        response = self.client.get(reverse('dashboard_refresh_ajax'), {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sem_alteracoes_retorna_delta_vazio(self):
+        """Teste: since igual à sequência atual retorna delta sem cards"""
+        data = self.refresh(self.seq)
+
+        self.assertFalse(data['completo'])
+        self.assertEqual(data['seq'], self.seq)
+        self.assertEqual(data['pedidos'], [])
+        self.assertEqual(data['removidos'], [])
+
+    def test_alteracao_de_item_retorna_apenas_pedido_alterado(self):
+        """Teste: separar item retorna apenas o card daquele pedido"""
+        item = ItemPedido.objects.filter(pedido__numero_orcamento='ORC-002', separado=False).first()
+        self.client.post(reverse('separar_item', args=[item.id]))
+
+        data = self.refresh(self.seq)
+
+        self.assertFalse(data['completo'])
+        self.assertGreater(data['seq'], self.seq)
+        self.assertEqual([c['numero_orcamento'] for c in data['pedidos']], ['ORC-002'])
+        self.assertEqual(data['pedidos'][0]['itens_separados'], 2)
+
+    def test_finalizado_e_deletado_aparecem_em_removidos(self):
+        """Teste: pedidos finalizados e deletados (soft delete) vêm em removidos"""
+        # Uma transação por alteração, como em requisições separadas
+        with transaction.atomic():
+            finalizado = Pedido.objects.get(numero_orcamento='ORC-001')
+            finalizado.status = 'FINALIZADO'
+            finalizado.save()
+
+        with transaction.atomic():
+            deletado = Pedido.objects.get(numero_orcamento='ORC-003')
+            deletado.deletado = True
+            deletado.save()
+
+        data = self.refresh(self.seq)
+
+        self.assertEqual(data['removidos'], sorted([finalizado.id, deletado.id]))
+        self.assertEqual(data['pedidos'], [])
+
+    def test_pedido_criado_aparece_no_delta(self):
+        """Teste: pedido novo aparece no delta"""
+        self.criar_pedidos(1)
+
+        data = self.refresh(self.seq)
+
+        self.assertIn('ORC-004', [c['numero_orcamento'] for c in data['pedidos']])
+
+    def test_janela_reenvia_alteracoes_anteriores(self):
+        """Teste: janela reenvia alterações gravadas pouco antes de since, mas não as antigas"""
+        with mock.patch.object(servico_dashboard, 'JANELA_REENVIO', timedelta(minutes=5)):
+            data = self.refresh(self.seq)
+            self.assertFalse(data['completo'])
+            self.assertEqual(len(data['pedidos']), 3)
+
+            # Alterações bem anteriores a since ficam fora da janela
+            AlteracaoPedido.objects.filter(id__lt=self.seq).update(criado_em=timezone.now() - timedelta(hours=1))
+            referencia = AlteracaoPedido.objects.get(id=self.seq).pedido_id
+            self.assertEqual([card['id'] for card in self.refresh(self.seq)['pedidos']], [referencia])
+
+    def test_commit_fora_de_ordem(self):
+        """Teste: alteração confirmada depois de mais de 50 sequências posteriores não se perde"""
+        atrasado = Pedido.objects.get(numero_orcamento='ORC-002')
+        outro = Pedido.objects.get(numero_orcamento='ORC-001')
+
+        # A transação atrasada aloca a sequência e ainda não confirmou
+        sequencia_atrasada = AlteracaoPedido.objects.create(pedido_id=atrasado.id).id
+        AlteracaoPedido.objects.filter(id=sequencia_atrasada).delete()
+        # Outras transações confirmam depois dela
+        AlteracaoPedido.registrar(*[outro.id] * 60)
+        seq = self.refresh(self.seq)['seq']
+
+        # A transação atrasada confirma
+        AlteracaoPedido.objects.create(id=sequencia_atrasada, pedido_id=atrasado.id)
+
+        with mock.patch.object(servico_dashboard, 'JANELA_REENVIO', timedelta(minutes=5)):
+            data = self.refresh(seq)
+        self.assertIn(atrasado.id, [card['id'] for card in data['pedidos']])
+
+    def test_uma_alteracao_por_pedido_por_transacao(self):
+        """Teste: salvar o pedido e todos os itens na mesma transação grava uma alteração"""
+        pedido = Pedido.objects.get(numero_orcamento='ORC-001')
+
+        for _ in range(2):
+            with transaction.atomic():
+                pedido.save()
+                for item in pedido.itens.all():
+                    item.save()
+
+        self.assertEqual(AlteracaoPedido.objects.filter(id__gt=self.seq, pedido_id=pedido.id).count(), 2)
+
+    def test_sequencia_antiga_retorna_snapshot_completo(self):
+        """Teste: sequência anterior ao log restante retorna o snapshot completo"""
+        AlteracaoPedido.objects.update(criado_em=timezone.now() - timedelta(days=2))
+        self.criar_pedidos(1)
+        AlteracaoPedido.limpar_antigas(timezone.now() - timedelta(hours=1))
+
+        data = self.refresh(1)
+
+        self.assertTrue(data['completo'])
+        self.assertEqual(len(data['pedidos']), 4)
+        self.assertEqual(data['seq'], limites_sequencia()[1])
+
+    def test_sequencia_futura_ou_invalida_retorna_snapshot_completo(self):
+        """Teste: since desconhecido ou inválido retorna o snapshot completo"""
+        self.assertTrue(self.refresh(self.seq + 1000)['completo'])
+        self.assertTrue(self.refresh('abc')['completo'])
+
+    def test_reconciliar_registra_alteracao(self):
+        """Teste: correção por reconciliar_contadores entra no delta"""
+        pedido = Pedido.objects.get(numero_orcamento='ORC-001')
+        Pedido.objects.filter(id=pedido.id).update(total_itens=0)
+        with transaction.atomic():
+            Pedido.reconciliar_contadores()
+
+        data = self.refresh(self.seq)
+        self.assertEqual([c['id'] for c in data['pedidos']], [pedido.id])
+        self.assertEqual(data['pedidos'][0]['total_itens'], 3)
+
+
+class TestLimparAlteracoes(DashboardTestMixin, TestCase):
+    """Testes para a limpeza do log de alterações"""
+
+    def test_comando_preserva_registro_mais_recente(self):
+        """Teste: limpeza remove registros antigos mas mantém o último (sequência)"""
+        self.criar_pedidos(2, itens_por_pedido=1)
+        ultimo = limites_sequencia()[1]
+        AlteracaoPedido.objects.update(criado_em=timezone.now() - timedelta(days=2))
+
+        saida = StringIO()
+        call_command('limpar_alteracoes_pedido', '--horas', '1', stdout=saida)
+
+        self.assertEqual(list(AlteracaoPedido.objects.values_list('id', flat=True)), [ultimo])
+        self.assertIn('removido(s)', saida.getvalue())
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
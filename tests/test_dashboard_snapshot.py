@@ -0,0 +1,246 @@
+"""
+Testes para o snapshot do dashboard (cards em número constante de consultas)
+"""
+import os
+import sys
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from apps.core.models import Usuario, Pedido, ItemPedido, Produto
+from apps.core.services.dashboard import (
+    montar_snapshot,
+    montar_card,
+    versao_atual,
+    etag_snapshot,
+)
+
+
+class DashboardTestMixin:
+    """Cria admin logado, vendedor e um produto para os pedidos"""
+
+    def setUp(self):
+        self.client = Client()
+        # Versão/snapshot do dashboard ficam no cache (compartilhado entre testes)
+        cache.clear()
+
+        self.admin, _ = Usuario.objects.get_or_create(
+            numero_login=1000,
+            defaults={
+                'nome': 'Admin',
+                'tipo': 'ADMINISTRADOR'
+            }
+        )
+
+        self.vendedor = Usuario.objects.create_user(
+            numero_login=2001,
+            nome='Vendedor Teste',
+            tipo='VENDEDOR',
+            pin='1234'
+        )
+
+        self.produto = Produto.objects.create(codigo='PROD001', descricao='Produto Teste')
+        self.total_pedidos = 0
+
+        self.client.force_login(self.admin)
+
+    def criar_pedidos(self, quantidade, itens_por_pedido=3):
+        """Cria pedidos ativos com itens (um separado por pedido)"""
+        # Executa os on_commit (incremento da versão do dashboard)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._criar_pedidos(quantidade, itens_por_pedido)
+
+    def _criar_pedidos(self, quantidade, itens_por_pedido):
+        for _ in range(quantidade):
+            self.total_pedidos += 1
+            pedido = Pedido.objects.create(
+                numero_orcamento=f'ORC-{self.total_pedidos:03d}',
+                codigo_cliente='CLI-001',
+                nome_cliente=f'Cliente {self.total_pedidos}',
+                vendedor=self.vendedor,
+                data=timezone.localdate(),
+                logistica='RETIRADA',
+                embalagem='CAIXA_MEDIA',
+                status='EM_SEPARACAO'
+            )
+            for i in range(itens_por_pedido):
+                ItemPedido.objects.create(
+                    pedido=pedido,
+                    produto=self.produto,
+                    quantidade_solicitada=1,
+                    preco_unitario=10,
+                    separado=(i == 0),
+                    separado_por=self.admin if i == 0 else None
+                )
+        Pedido.reconciliar_contadores()
+
+    def contar_consultas(self, url):
+        """Executa GET e retorna (response, número de consultas)"""
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        return response, len(contexto.captured_queries)
+
+    def consultou_pedidos(self, contexto):
+        """Verifica se alguma consulta capturada leu a tabela de pedidos"""
+        return any('FROM "core_pedido"' in q['sql'] for q in contexto.captured_queries)
+
+
+class TestMontarSnapshot(DashboardTestMixin, TestCase):
+    """Testes para o construtor de snapshot"""
+
+    def test_snapshot_uma_consulta(self):
+        """Teste: snapshot usa uma consulta, independente da quantidade de pedidos"""
+        self.criar_pedidos(1)
+        with self.assertNumQueries(1):
+            montar_snapshot()
+
+        self.criar_pedidos(30)
+        with self.assertNumQueries(1):
+            cards = montar_snapshot()
+
+        self.assertEqual(len(cards), 31)
+
+    def test_snapshot_ignora_inativos(self):
+        """Teste: pedidos finalizados e deletados não aparecem"""
+        self.criar_pedidos(3)
+        Pedido.objects.filter(numero_orcamento='ORC-001').update(status='FINALIZADO')
+        Pedido.objects.filter(numero_orcamento='ORC-002').update(deletado=True)
+
+        cards = montar_snapshot()
+
+        self.assertEqual([c['numero_orcamento'] for c in cards], ['ORC-003'])
+
+    def test_campos_do_card(self):
+        """Teste: card contém progresso, separadores e card_status"""
+        self.criar_pedidos(1)
+        pedido = Pedido.objects.select_related('vendedor').get()
+
+        card = montar_card(pedido)
+
+        self.assertEqual(card['cliente'], 'Cliente 1')
+        self.assertEqual(card['total_itens'], 3)
+        self.assertEqual(card['itens_separados'], 1)
+        self.assertEqual(card['porcentagem_separacao'], 33.3)
+        self.assertEqual(card['separadores'], [self.admin.nome])
+        self.assertEqual(card['card_status'], 'EM_SEPARACAO')
+        self.assertEqual(card['card_status_css'], 'em-separacao')
+        self.assertEqual(card['logistica'], 'Retirada')
+
+
+class TestDashboardConsultas(DashboardTestMixin, TestCase):
+    """Testes de regressão: dashboard e refresh em O(1) consultas"""
+
+    def test_refresh_retorna_cards(self):
+        """Teste: refresh AJAX retorna os cards (sem erro de campo inexistente)"""
+        self.criar_pedidos(2)
+
+        response = self.client.get(reverse('dashboard_refresh_ajax'))
+
+        self.assertEqual(response.status_code, 200)
+        pedidos = response.json()['pedidos']
+        self.assertEqual(len(pedidos), 2)
+        self.assertEqual(pedidos[0]['numero_orcamento'], 'ORC-002')
+        self.assertIn('criado_em', pedidos[0])
+
+    def test_refresh_consultas_constantes(self):
+        """Teste: número de consultas do refresh não cresce com os pedidos"""
+        self.criar_pedidos(1)
+        _, consultas_poucos = self.contar_consultas(reverse('dashboard_refresh_ajax'))
+
+        self.criar_pedidos(25)
+        _, consultas_muitos = self.contar_consultas(reverse('dashboard_refresh_ajax'))
+
+        self.assertEqual(consultas_poucos, consultas_muitos)
+
+    def test_dashboard_consultas_constantes(self):
+        """Teste: número de consultas da página do dashboard não cresce com os pedidos"""
+        self.criar_pedidos(1)
+        # Primeira visita cria a configuração singleton (SistemaConfig.load)
+        self.client.get(reverse('dashboard'))
+        response, consultas_poucos = self.contar_consultas(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+        self.criar_pedidos(25)
+        response, consultas_muitos = self.contar_consultas(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(consultas_poucos, consultas_muitos)
+
+
+class TestDashboardRefreshETag(DashboardTestMixin, TestCase):
+    """Testes para o cache versionado e ETag/304 do refresh"""
+
+    def test_refresh_envia_etag(self):
+        """Teste: resposta inclui ETag da versão atual e a versão no corpo"""
+        self.criar_pedidos(1)
+
+        response = self.client.get(reverse('dashboard_refresh_ajax'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag_snapshot(versao_atual()))
+        self.assertEqual(response.json()['versao'], versao_atual())
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_if_none_match_retorna_304_sem_consultar_pedidos(self):
+        """Teste: If-None-Match com ETag atual retorna 304 sem ler pedidos"""
+        self.criar_pedidos(2)
+        etag = self.client.get(reverse('dashboard_refresh_ajax'))['ETag']
+
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('dashboard_refresh_ajax'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(self.consultou_pedidos(contexto))
+
+    def test_snapshot_em_cache_por_versao(self):
+        """Teste: sem alterações, o segundo refresh usa o snapshot em cache"""
+        self.criar_pedidos(2)
+        primeira = self.client.get(reverse('dashboard_refresh_ajax'))
+
+        with CaptureQueriesContext(connection) as contexto:
+            segunda = self.client.get(reverse('dashboard_refresh_ajax'))
+
+        self.assertEqual(primeira.content, segunda.content)
+        self.assertFalse(self.consultou_pedidos(contexto))
+
+    def test_alteracao_de_item_invalida_snapshot(self):
+        """Teste: separar item muda o ETag e o refresh devolve os dados novos"""
+        self.criar_pedidos(1)
+        etag = self.client.get(reverse('dashboard_refresh_ajax'))['ETag']
+        item = ItemPedido.objects.filter(separado=False).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('separar_item', args=[item.id]))
+
+        response = self.client.get(reverse('dashboard_refresh_ajax'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['pedidos'][0]['itens_separados'], 2)
+
+    def test_versao_so_muda_apos_commit(self):
+        """Teste: versão não muda enquanto a transação não for confirmada"""
+        versao = versao_atual()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self._criar_pedidos(1, 1)
+
+        self.assertEqual(versao_atual(), versao)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(versao_atual(), versao)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
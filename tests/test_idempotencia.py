@@ -0,0 +1,152 @@
+"""
+Testes para o Idempotency-Key das ações de item
+"""
+import os
+import sys
+import uuid
+import threading
+import django
+from unittest import mock
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from apps.core.models import ItemPedido, LogAuditoria
+from apps.core.services import idempotencia
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+class TestIdempotencia(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: repetições com a mesma chave recebem a resposta original"""
+
+    def setUp(self):
+        super().setUp()
+        self.chave = str(uuid.uuid4())
+
+    def post(self, nome_url, *args, chave=None, client=None, **dados):
+        return (client or self.client).post(
+            reverse(nome_url, args=args), dados, HTTP_IDEMPOTENCY_KEY=chave or self.chave
+        )
+
+    def test_repeticao_devolve_resposta_original(self):
+        """Teste: separar repetido devolve o 200 original em vez de 'já separado'"""
+        primeira = self.post('separar_item', self.itens[0].id)
+        segunda = self.post('separar_item', self.itens[0].id)
+
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(segunda[idempotencia.CABECALHO_REPETICAO], 'true')
+        self.assertFalse(primeira.has_header(idempotencia.CABECALHO_REPETICAO))
+
+        # Sem chave a ação é executada de novo
+        self.assertEqual(self.client.post(reverse('separar_item', args=[self.itens[0].id])).status_code, 400)
+
+    def test_repeticao_sem_banco_nem_eventos(self):
+        """Teste: repetição não consulta o banco, não audita e não publica eventos"""
+        self.post('separar_item', self.itens[0].id)
+        logs = LogAuditoria.objects.count()
+
+        with self.capturar_eventos() as broadcast:
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.post('separar_item', self.itens[0].id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(consultas.captured_queries), 0)
+        broadcast.assert_not_called()
+        self.assertEqual(LogAuditoria.objects.count(), logs)
+
+    def test_alternancia_nao_desfeita(self):
+        """Teste: marcar comprado repetido não desmarca o item"""
+        ItemPedido.objects.filter(id=self.itens[0].id).update(em_compra=True)
+
+        for _ in range(2):
+            response = self.post('marcar_item_comprado', self.itens[0].id)
+            self.assertTrue(response.json()['comprado'])
+
+        self.assertTrue(ItemPedido.objects.get(id=self.itens[0].id).compra_realizada)
+
+    def test_exclusao_repetida(self):
+        """Teste: excluir pedido repetido devolve o 200 original"""
+        primeira = self.post('deletar_pedido', self.pedido.id)
+        segunda = self.post('deletar_pedido', self.pedido.id)
+
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(segunda[idempotencia.CABECALHO_REPETICAO], 'true')
+        self.assertEqual(LogAuditoria.objects.filter(acao='deletar_pedido').count(), 1)
+
+    def test_chave_em_outra_requisicao(self):
+        """Teste: mesma chave com outro item ou outro corpo é recusada"""
+        self.post('separar_item', self.itens[0].id)
+
+        self.assertEqual(self.post('separar_item', self.itens[1].id).status_code, 422)
+        self.assertFalse(ItemPedido.objects.get(id=self.itens[1].id).separado)
+
+        self.post('substituir_item', self.itens[2].id, chave='substituir', produto_substituto='A')
+        response = self.post('substituir_item', self.itens[2].id, chave='substituir', produto_substituto='B')
+        self.assertEqual(response.status_code, 422)
+
+    def test_chave_por_sessao(self):
+        """Teste: a mesma chave em outra sessão é independente"""
+        outro = Client()
+        outro.force_login(self.vendedor)
+
+        self.post('separar_item', self.itens[0].id)
+        response = self.post('separar_item', self.itens[1].id, client=outro)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header(idempotencia.CABECALHO_REPETICAO))
+
+    def test_erro_do_servidor_nao_guardado(self):
+        """Teste: resposta 500 libera a chave para uma nova tentativa"""
+        with mock.patch('apps.core.services.transitions.executar', side_effect=RuntimeError('banco fora')):
+            self.assertEqual(self.post('separar_item', self.itens[0].id).status_code, 500)
+
+        response = self.post('separar_item', self.itens[0].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header(idempotencia.CABECALHO_REPETICAO))
+
+    def test_repeticao_espera_requisicao_em_andamento(self):
+        """Teste: repetição durante a primeira requisição espera a resposta dela"""
+        requisicao = RequestFactory().post(
+            reverse('separar_item', args=[self.itens[0].id]), {}, HTTP_IDEMPOTENCY_KEY=self.chave
+        )
+        requisicao.COOKIES = {settings.SESSION_COOKIE_NAME: self.client.cookies[settings.SESSION_COOKIE_NAME].value}
+        chave = idempotencia.chave_cache(requisicao)
+        assinatura = idempotencia.impressao(requisicao)
+        self.assertIsNone(idempotencia.reservar(chave, assinatura))
+
+        concluir = threading.Timer(
+            0.2, idempotencia.guardar, args=(chave, assinatura, JsonResponse({'success': True, 'original': True}))
+        )
+        concluir.start()
+        response = self.post('separar_item', self.itens[0].id)
+        concluir.join()
+
+        self.assertEqual(response.json(), {'success': True, 'original': True})
+        self.assertFalse(ItemPedido.objects.get(id=self.itens[0].id).separado)
+
+    def test_recusa_de_permissao_nao_guardada(self):
+        """Teste: redirecionamento por permissão não prende a chave"""
+        vendedor = Client()
+        vendedor.force_login(self.vendedor)
+        for _ in range(2):
+            response = self.post('substituir_item', self.itens[0].id, client=vendedor, produto_substituto='A')
+            self.assertEqual(response.status_code, 302)
+            self.assertFalse(response.has_header(idempotencia.CABECALHO_REPETICAO))
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Testes para a marcação de compra em vários pedidos (POST /pedidos/item/<id>/marcar-compra/)
+"""
+import os
+import sys
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from apps.core.models import Pedido, ItemPedido, LogAuditoria
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+class TestMarcarCompra(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: marcação em lote com contadores, status e eventos agregados"""
+
+    def criar_pedidos_com_produto(self, quantidade, produto=None):
+        """Pedidos abertos com o produto (padrão: o do primeiro item); retorna os ids dos itens"""
+        produto = produto or self.itens[0].produto
+        ids = []
+        for i in range(quantidade):
+            pedido = Pedido.objects.create(
+                numero_orcamento=f'ORC-{produto.codigo}-{i:03d}',
+                codigo_cliente='CLI-002',
+                nome_cliente=f'Cliente {i}',
+                vendedor=self.vendedor,
+                data=timezone.localdate(),
+                logistica='RETIRADA',
+                embalagem='CAIXA_MEDIA',
+                status='EM_SEPARACAO' if i % 2 else 'PENDENTE'
+            )
+            ids.append(ItemPedido.objects.create(
+                pedido=pedido, produto=produto, quantidade_solicitada=2, preco_unitario=10
+            ).id)
+        Pedido.reconciliar_contadores()
+        return ids
+
+    def marcar(self, item_id, outros):
+        return self.client.post(reverse('marcar_compra', args=[item_id]), {'outros_pedidos': outros})
+
+    def test_marca_outros_pedidos(self):
+        """Teste: marca o item e os dos outros pedidos, com contadores e status de todos"""
+        outros = self.criar_pedidos_com_produto(3)
+
+        response = self.marcar(self.itens[0].id, outros)
+
+        self.assertEqual(response.json()['itens_marcados'], 4)
+        self.assertEqual(response.json()['pedido_status'], 'AGUARDANDO_COMPRA')
+        self.assertEqual(
+            ItemPedido.objects.filter(em_compra=True, marcado_compra_por=self.admin).count(), 4
+        )
+        self.assertEqual(Pedido.objects.filter(status='AGUARDANDO_COMPRA').count(), 4)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+        auditoria = LogAuditoria.objects.get(acao='marcar_compra')
+        self.assertEqual(sorted(auditoria.dados_novos['outros_itens']), sorted(outros))
+
+    def test_ignora_itens_invalidos(self):
+        """Teste: outros itens já separados ou de outro produto não são marcados"""
+        outros = self.criar_pedidos_com_produto(2)
+        self.client.post(reverse('separar_item', args=[outros[0]]))
+
+        response = self.marcar(self.itens[0].id, outros + [self.itens[1].id, 'abc'])
+
+        self.assertEqual(response.json()['itens_marcados'], 2)
+        self.assertFalse(ItemPedido.objects.get(id=outros[0]).em_compra)
+        self.assertFalse(ItemPedido.objects.get(id=self.itens[1].id).em_compra)
+
+    def test_um_evento_para_o_painel(self):
+        """Teste: uma mensagem para o painel de compras com todos os itens marcados"""
+        outros = self.criar_pedidos_com_produto(3)
+
+        with self.capturar_eventos() as broadcast:
+            self.marcar(self.itens[0].id, outros)
+
+        painel = [chamada for chamada in broadcast.call_args_list if chamada.args[0] == 'painel_compras']
+        self.assertEqual(len(painel), 1)
+        self.assertEqual(painel[0].args[1], 'eventos_lote')
+        itens = [evento['item'] for evento in painel[0].args[2]['eventos']]
+        self.assertEqual(sorted(item['id'] for item in itens), sorted([self.itens[0].id] + outros))
+        self.assertTrue(all(item['produto_codigo'] == 'PROD000' for item in itens))
+
+        dashboard = [chamada for chamada in broadcast.call_args_list if chamada.args[0] == 'dashboard']
+        self.assertEqual(len(dashboard), 1)
+        self.assertEqual(len(dashboard[0].args[2]['eventos']), 4)
+
+    def test_consultas_constantes(self):
+        """Teste: marcar o produto em 30 pedidos custa o mesmo que em 2"""
+        poucos = self.criar_pedidos_com_produto(2, produto=self.itens[1].produto)
+        muitos = self.criar_pedidos_com_produto(30)
+
+        with CaptureQueriesContext(connection) as pequeno:
+            self.marcar(self.itens[1].id, poucos)
+        with CaptureQueriesContext(connection) as grande:
+            self.marcar(self.itens[0].id, muitos)
+
+        self.assertEqual(len(pequeno.captured_queries), len(grande.captured_queries))
+        self.assertEqual(ItemPedido.objects.filter(em_compra=True).count(), 34)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
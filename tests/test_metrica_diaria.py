@@ -0,0 +1,140 @@
+"""
+Testes para o rollup diário de métricas (MetricaDiaria)
+"""
+import os
+import sys
+import django
+from io import StringIO
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from apps.core.models import MetricaDiaria, Pedido
+from apps.core.utils import calcular_metricas_dia
+
+from test_contadores_pedido import ContadoresTestMixin
+
+
+class MetricaDiariaTestMixin(ContadoresTestMixin):
+    """Pedido aberto hoje e rollup do dia já criado"""
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.localdate()
+        MetricaDiaria.obter(self.hoje)
+
+    def assertRollupIgualHistorico(self):
+        """Rollup mantido incrementalmente deve bater com o recálculo"""
+        metrica = MetricaDiaria.objects.get(data=self.hoje)
+        esperado = MetricaDiaria.calcular(self.hoje)
+        for campo, valor in esperado.items():
+            self.assertAlmostEqual(getattr(metrica, campo), valor, places=3, msg=campo)
+        return metrica
+
+    def finalizar(self):
+        for item in self.itens:
+            self.client.post(reverse('separar_item', args=[item.id]))
+        response = self.client.post(reverse('finalizar_pedido', args=[self.pedido.id]))
+        self.assertEqual(response.status_code, 200)
+
+
+class TestMetricaDiaria(MetricaDiariaTestMixin, TestCase):
+    """Testes: views mantêm o rollup coerente com o histórico"""
+
+    def test_criado_a_partir_do_historico(self):
+        """Teste: primeira leitura do dia cria o rollup pelo histórico"""
+        metrica = self.assertRollupIgualHistorico()
+
+        self.assertEqual(metrica.pedidos_criados, 1)
+        self.assertEqual(metrica.pedidos_em_aberto, 1)
+        self.assertIsNone(metrica.tempo_medio_separacao)
+
+    def test_finalizar_atualiza_rollup(self):
+        """Teste: finalizar incrementa finalizados e tempo, decrementa em aberto"""
+        self.finalizar()
+
+        metrica = self.assertRollupIgualHistorico()
+        self.assertEqual(metrica.pedidos_finalizados, 1)
+        self.assertEqual(metrica.pedidos_em_aberto, 0)
+
+    def test_finalizar_duas_vezes_conta_uma(self):
+        """Teste: finalizar de novo é recusado e não altera o rollup"""
+        self.finalizar()
+        finalizado_em = Pedido.objects.get(id=self.pedido.id).data_finalizacao
+
+        response = self.client.post(reverse('finalizar_pedido', args=[self.pedido.id]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Pedido.objects.get(id=self.pedido.id).data_finalizacao, finalizado_em)
+        metrica = self.assertRollupIgualHistorico()
+        self.assertEqual(metrica.pedidos_finalizados, 1)
+        self.assertEqual(metrica.pedidos_em_aberto, 0)
+
+    def test_deletar_aberto_atualiza_rollup(self):
+        """Teste: deletar pedido aberto remove de criados e em aberto"""
+        response = self.client.post(reverse('deletar_pedido', args=[self.pedido.id]))
+        self.assertEqual(response.status_code, 200)
+
+        metrica = self.assertRollupIgualHistorico()
+        self.assertEqual(metrica.pedidos_criados, 0)
+        self.assertEqual(metrica.pedidos_em_aberto, 0)
+
+    def test_deletar_duas_vezes_desconta_uma(self):
+        """Teste: excluir de novo retorna 404 e não altera o rollup"""
+        self.finalizar()
+        response = self.client.post(reverse('deletar_pedido', args=[self.pedido.id]))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(reverse('deletar_pedido', args=[self.pedido.id]))
+
+        self.assertEqual(response.status_code, 404)
+        metrica = self.assertRollupIgualHistorico()
+        self.assertEqual(metrica.pedidos_criados, 0)
+        self.assertEqual(metrica.pedidos_finalizados, 0)
+
+    def test_deletar_finalizado_atualiza_rollup(self):
+        """Teste: deletar pedido finalizado remove de finalizados"""
+        self.finalizar()
+        self.client.post(reverse('deletar_pedido', args=[self.pedido.id]))
+
+        metrica = self.assertRollupIgualHistorico()
+        self.assertEqual(metrica.pedidos_finalizados, 0)
+        self.assertEqual(metrica.soma_tempo_util, 0)
+
+    def test_registrar_sem_linha_nao_duplica(self):
+        """Teste: registrar sem rollup do dia cria pelo histórico sem somar de novo"""
+        MetricaDiaria.objects.all().delete()
+
+        MetricaDiaria.registrar(self.hoje, pedidos_criados=1, pedidos_em_aberto=1)
+
+        metrica = self.assertRollupIgualHistorico()
+        self.assertEqual(metrica.pedidos_criados, 1)
+
+    def test_metricas_dia_uma_consulta(self):
+        """Teste: métricas do dashboard custam uma consulta por chave primária"""
+        with self.assertNumQueries(1):
+            metricas = calcular_metricas_dia()
+
+        self.assertEqual(metricas['pedidos_em_aberto'], 1)
+        self.assertEqual(metricas['total_pedidos_hoje'], 1)
+
+    def test_comando_recalcula(self):
+        """Teste: comando corrige rollup divergente"""
+        MetricaDiaria.objects.filter(data=self.hoje).update(pedidos_criados=99, pedidos_em_aberto=-5)
+
+        saida = StringIO()
+        call_command('recalcular_metricas_diarias', '--dias', '1', stdout=saida)
+
+        self.assertIn('1 dia(s)', saida.getvalue())
+        self.assertRollupIgualHistorico()
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Testes para o rollup de métricas por período (MetricaVendedorDiaria)
+"""
+import os
+import sys
+import django
+from datetime import timedelta
+from io import StringIO
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from apps.core.models import Usuario, Pedido, MetricaVendedorDiaria
+from apps.core.utils import calcular_metricas_periodo, calcular_tempo_util
+
+
+class MetricasPeriodoTestMixin:
+    """Dois vendedores com pedidos em dias e status variados"""
+
+    STATUS = ['PENDENTE', 'EM_SEPARACAO', 'AGUARDANDO_COMPRA', 'FINALIZADO', 'CANCELADO']
+
+    def setUp(self):
+        self.vendedores = [
+            Usuario.objects.create_user(numero_login=2001 + i, nome=f'Vendedor {i}', tipo='VENDEDOR', pin='1234')
+            for i in range(2)
+        ]
+        self.total_pedidos = 0
+
+    def criar_pedido(self, vendedor, status, dias_atras=0, **campos):
+        self.total_pedidos += 1
+        if status == 'FINALIZADO':
+            campos.setdefault('data_finalizacao', timezone.now())
+        pedido = Pedido.objects.create(
+            numero_orcamento=f'ORC-{self.total_pedidos:03d}',
+            codigo_cliente='CLI-001',
+            nome_cliente='Cliente',
+            vendedor=vendedor,
+            data=timezone.localdate(),
+            logistica='RETIRADA',
+            embalagem='CAIXA_MEDIA',
+            status=status,
+            **campos
+        )
+        if dias_atras:
+            # data_criacao é auto_now_add: ajustar direto no banco (sem sinais)
+            criacao = timezone.now() - timedelta(days=dias_atras)
+            Pedido.objects.filter(id=pedido.id).update(
+                data_criacao=criacao,
+                data_finalizacao=criacao + timedelta(hours=5) if status == 'FINALIZADO' else None
+            )
+        return pedido
+
+    def popular(self):
+        for dias_atras in (0, 3, 10, 45):
+            for i, status in enumerate(self.STATUS):
+                self.criar_pedido(self.vendedores[i % 2], status, dias_atras)
+        self.criar_pedido(self.vendedores[0], 'FINALIZADO', 3, deletado=True)
+        MetricaVendedorDiaria.reconstruir()
+
+    def metricas_direto(self, data_inicio, data_fim):
+        """Cálculo de referência direto nos pedidos"""
+        pedidos = Pedido.objects.filter(
+            data_criacao__date__gte=data_inicio,
+            data_criacao__date__lte=data_fim,
+            deletado=False
+        )
+        tempos = [
+            calcular_tempo_util(p.data_criacao, p.data_finalizacao).total_seconds()
+            for p in pedidos.filter(status='FINALIZADO', data_finalizacao__isnull=False)
+        ]
+        return {
+            'por_status': {status: pedidos.filter(status=status).count() for status in self.STATUS},
+            'tempo_medio': timedelta(seconds=sum(tempos) / len(tempos)) if tempos else None,
+        }
+
+
+class TestMetricasPeriodo(MetricasPeriodoTestMixin, TestCase):
+    """Testes: métricas do período lidas do rollup"""
+
+    def test_igual_ao_calculo_direto(self):
+        """Teste: rollup produz as mesmas métricas que o cálculo direto"""
+        self.popular()
+        hoje = timezone.localdate()
+
+        for dias in (0, 7, 30, 90):
+            with self.subTest(dias=dias):
+                metricas = calcular_metricas_periodo(hoje - timedelta(days=dias), hoje)
+                esperado = self.metricas_direto(hoje - timedelta(days=dias), hoje)
+
+                self.assertEqual(metricas['pedidos_por_status'], esperado['por_status'])
+                self.assertEqual(metricas['total_pedidos'], sum(esperado['por_status'].values()))
+                if esperado['tempo_medio'] is None:
+                    self.assertIsNone(metricas['tempo_medio_separacao'])
+                else:
+                    self.assertAlmostEqual(
+                        metricas['tempo_medio_separacao'].total_seconds(),
+                        esperado['tempo_medio'].total_seconds(),
+                        places=3
+                    )
+
+    def test_consultas_constantes(self):
+        """Teste: consultas constantes, independente do período e da quantidade de pedidos"""
+        self.popular()
+
+        # Rollup, agregado dos itens e sketches de tempo de separação
+        with self.assertNumQueries(3):
+            calcular_metricas_periodo(timezone.localdate() - timedelta(days=365), timezone.localdate())
+
+    def test_sinais_mantem_rollup(self):
+        """Teste: criar, finalizar e deletar atualizam o rollup sem reconstrução"""
+        pedido = self.criar_pedido(self.vendedores[0], 'PENDENTE')
+        self.assertEqual(calcular_metricas_periodo()['pedidos_por_status']['PENDENTE'], 1)
+
+        pedido.status = 'FINALIZADO'
+        pedido.data_finalizacao = timezone.now()
+        pedido.save()
+        metricas = calcular_metricas_periodo()
+        self.assertEqual(metricas['pedidos_por_status']['PENDENTE'], 0)
+        self.assertEqual(metricas['pedidos_finalizados'], 1)
+
+        pedido.deletado = True
+        pedido.save()
+        self.assertEqual(calcular_metricas_periodo()['total_pedidos'], 0)
+        self.assertFalse(MetricaVendedorDiaria.objects.exists())
+
+    def test_save_sem_campos_relevantes_nao_recalcula(self):
+        """Teste: save com update_fields fora do rollup não recalcula"""
+        pedido = self.criar_pedido(self.vendedores[0], 'PENDENTE')
+        pedido.total_itens = 3
+
+        # UPDATE do pedido + registro no log de alterações do dashboard (um por transação)
+        with transaction.atomic(), self.assertNumQueries(2):
+            pedido.save(update_fields=['total_itens'])
+
+    def test_comando_reconstroi(self):
+        """Teste: comando reconstrói o rollup divergente"""
+        self.popular()
+        MetricaVendedorDiaria.objects.update(pedidos=99)
+
+        saida = StringIO()
+        call_command('preencher_metricas_periodo', stdout=saida)
+
+        self.assertIn('linha(s)', saida.getvalue())
+        hoje = timezone.localdate()
+        self.assertEqual(
+            calcular_metricas_periodo(hoje - timedelta(days=90), hoje)['pedidos_por_status'],
+            self.metricas_direto(hoje - timedelta(days=90), hoje)['por_status']
+        )
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Testes para o outbox dos eventos WebSocket (envio após o commit)
+"""
+import os
+import sys
+import threading
+import django
+from contextlib import contextmanager
+from unittest import mock
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.db import transaction
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from apps.core.services import outbox
+
+from test_contadores_pedido import ContadoresTestMixin
+
+
+class EventosTestMixin:
+    """Captura os eventos enviados pelo despachante (commits executados no teste)"""
+
+    @contextmanager
+    def capturar_eventos(self):
+        with mock.patch('apps.core.services.broadcast.enviar', return_value=True) as broadcast:
+            with self.captureOnCommitCallbacks(execute=True):
+                yield broadcast
+            outbox.despachante.aguardar()
+
+
+class TestDespachante(SimpleTestCase):
+    """Testes: repetição e métricas do despachante"""
+
+    def setUp(self):
+        self.despachante = outbox.Despachante(tentativas=3, espera_inicial=0, janela=0)
+
+    def enviar(self, *retornos):
+        with mock.patch('apps.core.services.broadcast.enviar', side_effect=retornos) as broadcast:
+            self.despachante.enfileirar([('dashboard', {'type': 'pedido_atualizado', 'pedido': {'id': 1}})])
+            self.despachante.aguardar()
+        return broadcast
+
+    def test_repete_ate_enviar(self):
+        """Teste: falhas são repetidas e a mensagem é enviada uma vez"""
+        broadcast = self.enviar(False, False, True)
+
+        self.assertEqual(broadcast.call_count, 3)
+        broadcast.assert_called_with('dashboard', 'pedido_atualizado', {'pedido': {'id': 1}})
+        metricas = self.despachante.metricas()
+        self.assertEqual(metricas['eventos'], 1)
+        self.assertEqual(metricas['enviados'], 1)
+        self.assertEqual(metricas['repeticoes'], 2)
+        self.assertEqual(metricas['pendentes'], 0)
+
+    def test_descarta_apos_tentativas(self):
+        """Teste: mensagem que sempre falha é descartada depois das tentativas"""
+        broadcast = self.enviar(False, False, False)
+
+        self.assertEqual(broadcast.call_count, 3)
+        self.assertEqual(self.despachante.metricas()['descartados'], 1)
+        self.assertEqual(self.despachante.metricas()['enviados'], 0)
+
+    def test_mescla_atualizacoes_do_mesmo_pedido(self):
+        """Teste: atualizações do mesmo pedido dentro da janela viram o estado mais recente"""
+        despachante = outbox.Despachante(janela=0.2)
+
+        with mock.patch('apps.core.services.broadcast.enviar', return_value=True) as broadcast:
+            for progresso in (10, 20, 30):
+                despachante.enfileirar([
+                    ('dashboard', {'type': 'pedido_atualizado', 'pedido': {'id': 1, 'porcentagem_separacao': progresso}}),
+                    ('pedido_1', {'type': 'item_separado', 'item': {'id': progresso}}),
+                ])
+            despachante.enfileirar([('dashboard', {'type': 'pedido_finalizado', 'pedido_id': 2})])
+            despachante.aguardar()
+
+        mensagens = {chamada.args[0]: chamada.args[2] for chamada in broadcast.call_args_list}
+        self.assertEqual(broadcast.call_count, 2)
+        self.assertEqual(
+            [evento['type'] for evento in mensagens['dashboard']['eventos']],
+            ['pedido_atualizado', 'pedido_finalizado']
+        )
+        self.assertEqual(mensagens['dashboard']['eventos'][0]['pedido']['porcentagem_separacao'], 30)
+        # Eventos de item não são mesclados
+        self.assertEqual(len(mensagens['pedido_1']['eventos']), 3)
+
+        metricas = despachante.metricas()
+        self.assertEqual(metricas['eventos'], 7)
+        self.assertEqual(metricas['mesclados'], 2)
+        self.assertEqual(metricas['enviados'], 2)
+
+    def test_coalescer_mantem_ordem(self):
+        """Teste: atualização mantida na posição da última ocorrência"""
+        eventos = [
+            ('dashboard', {'type': 'pedido_atualizado', 'pedido': {'id': 1, 'status': 'PENDENTE'}}),
+            ('dashboard', {'type': 'pedido_atualizado', 'pedido': {'id': 2}}),
+            ('dashboard', {'type': 'card_status_updated', 'pedido_id': 1}),
+            ('dashboard', {'type': 'pedido_atualizado', 'pedido': {'id': 1, 'status': 'EM_SEPARACAO'}}),
+        ]
+
+        restantes, mesclados = outbox.coalescer(eventos)
+
+        self.assertEqual(mesclados, 1)
+        self.assertEqual(restantes, eventos[1:])
+
+
+class TestOutbox(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: eventos publicados só depois do commit e fora da requisição"""
+
+    def test_rollback_nao_publica(self):
+        """Teste: eventos de uma transação desfeita nunca entram na fila"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    outbox.publicar([('dashboard', {'type': 'pedido_criado', 'pedido': {}})])
+                    raise ValueError('falha depois de publicar')
+            except ValueError:
+                pass
+
+        self.assertEqual(callbacks, [])
+
+    def test_nada_enviado_antes_do_commit(self):
+        """Teste: a view grava os eventos, mas o envio acontece depois do commit"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            with mock.patch('apps.core.services.broadcast.enviar') as broadcast:
+                self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+                outbox.despachante.aguardar()
+
+        broadcast.assert_not_called()
+
+        # Commit: os eventos entram na fila e são enviados
+        with mock.patch('apps.core.services.broadcast.enviar') as broadcast:
+            for callback in callbacks:
+                callback()
+            outbox.despachante.aguardar()
+        self.assertEqual(broadcast.call_count, 2)
+
+    def test_resposta_nao_espera_o_channel_layer(self):
+        """Teste: resposta HTTP volta com o channel layer ainda bloqueado"""
+        liberar = threading.Event()
+
+        def channel_layer_lento(*args):
+            liberar.wait(5)
+            return True
+
+        with mock.patch('apps.core.services.broadcast.enviar', side_effect=channel_layer_lento) as broadcast:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(liberar.is_set())
+            liberar.set()
+            outbox.despachante.aguardar()
+
+        self.assertEqual({chamada.args[0] for chamada in broadcast.call_args_list}, {'dashboard', f'pedido_{self.pedido.id}'})
+
+    def test_metricas_para_administrador(self):
+        """Teste: contadores do despachante expostos para administradores"""
+        response = self.client.get(reverse('metricas_websocket'))
+
+        self.assertEqual(response.status_code, 200)
+        for chave in ('eventos', 'mesclados', 'enviados', 'descartados', 'janela_ms'):
+            self.assertIn(chave, response.json())
+
+        self.client.force_login(self.vendedor)
+        self.assertNotEqual(self.client.get(reverse('metricas_websocket')).status_code, 200)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
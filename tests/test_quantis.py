@@ -0,0 +1,262 @@
+"""
+Testes para os sketches de quantis do tempo de separação
+"""
+import os
+import sys
+import random
+import django
+from datetime import timedelta
+from io import StringIO
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase, Client
+from django.utils import timezone
+from django.urls import reverse
+from apps.core.models import Usuario, Pedido, ItemPedido, Produto, SketchTempoSeparacao
+from apps.core.utils import calcular_metricas_periodo, calcular_tempo_util
+from apps.core.utils.quantis import DDSketch, ALFA_PADRAO
+
+
+def quantil_exato(valores, q):
+    """Quantil de referência (mesma definição de posição do sketch)"""
+    ordenados = sorted(valores)
+    return ordenados[int(q * (len(ordenados) - 1))]
+
+
+class TestDDSketch(SimpleTestCase):
+    """Testes para o sketch de quantis"""
+
+    def setUp(self):
+        gerador = random.Random(42)
+        # Tempos de separação: maioria em minutos, cauda longa em horas/dias
+        self.valores = [gerador.lognormvariate(8, 1.5) for _ in range(5000)]
+
+    def assertProximo(self, estimado, exato):
+        self.assertLessEqual(abs(estimado - exato), ALFA_PADRAO * exato + 1e-9)
+
+    def test_erro_relativo_limitado(self):
+        """Teste: quantis estimados dentro do erro relativo alfa"""
+        sketch = DDSketch()
+        for valor in self.valores:
+            sketch.adicionar(valor)
+
+        for q in (0, 0.1, 0.5, 0.9, 0.99, 1):
+            with self.subTest(q=q):
+                self.assertProximo(sketch.quantil(q), quantil_exato(self.valores, q))
+
+    def test_mesclar_igual_a_sketch_unico(self):
+        """Teste: mesclar sketches parciais equivale a um sketch com todos os valores"""
+        unico = DDSketch()
+        for valor in self.valores:
+            unico.adicionar(valor)
+
+        mesclado = DDSketch()
+        for inicio in range(0, len(self.valores), 700):
+            parcial = DDSketch()
+            for valor in self.valores[inicio:inicio + 700]:
+                parcial.adicionar(valor)
+            mesclado.mesclar(DDSketch.de_dict(parcial.para_dict()))
+
+        self.assertEqual(mesclado.buckets, unico.buckets)
+        self.assertEqual(mesclado.contagem, unico.contagem)
+        for q in (0.5, 0.9, 0.99):
+            self.assertEqual(mesclado.quantil(q), unico.quantil(q))
+
+    def test_memoria_limitada(self):
+        """Teste: quantidade de buckets limitada independente da quantidade de valores"""
+        sketch = DDSketch(max_buckets=100)
+        for valor in self.valores * 4:
+            sketch.adicionar(valor)
+
+        self.assertLessEqual(len(sketch.buckets), 100)
+        self.assertEqual(sketch.contagem, len(self.valores) * 4)
+        # Os buckets agrupados são os menores: quantis altos continuam precisos
+        self.assertProximo(sketch.quantil(0.99), quantil_exato(self.valores, 0.99))
+
+    def test_zeros_e_remocao(self):
+        """Teste: zeros contam no quantil e remover desfaz adicionar"""
+        sketch = DDSketch()
+        for valor in (0, 0, 0, 3600):
+            sketch.adicionar(valor)
+        self.assertEqual(sketch.quantil(0.5), 0.0)
+
+        sketch.remover(0)
+        sketch.remover(0)
+        sketch.remover(0)
+        self.assertAlmostEqual(sketch.quantil(0.5), 3600, delta=36)
+
+        sketch.remover(3600)
+        self.assertEqual(sketch.contagem, 0)
+        self.assertIsNone(sketch.quantil(0.5))
+
+    def test_valores_invalidos(self):
+        """Teste: valores negativos, quantil fora de [0, 1] e alfa diferente são rejeitados"""
+        sketch = DDSketch()
+        with self.assertRaises(ValueError):
+            sketch.adicionar(-1)
+        sketch.adicionar(1)
+        with self.assertRaises(ValueError):
+            sketch.quantil(1.5)
+        with self.assertRaises(ValueError):
+            sketch.mesclar(DDSketch(alfa=0.05))
+
+
+class TestSketchTempoSeparacao(TestCase):
+    """Testes: sketches atualizados ao finalizar e lidos nas métricas do período"""
+
+    def setUp(self):
+        self.client = Client()
+
+        self.admin, _ = Usuario.objects.get_or_create(
+            numero_login=1000,
+            defaults={
+                'nome': 'Admin',
+                'tipo': 'ADMINISTRADOR'
+            }
+        )
+        self.vendedor = Usuario.objects.create_user(
+            numero_login=2001,
+            nome='Vendedor Teste',
+            tipo='VENDEDOR',
+            pin='1234'
+        )
+        self.separador = Usuario.objects.create_user(
+            numero_login=3001,
+            nome='Separador Teste',
+            tipo='SEPARADOR',
+            pin='1234'
+        )
+        self.produto = Produto.objects.create(codigo='PROD001', descricao='Produto Teste')
+        self.total_pedidos = 0
+
+        self.client.force_login(self.admin)
+
+    def criar_pedido_separado(self, horas_atras):
+        """Pedido com um item separado pelo separador, criado há N horas"""
+        self.total_pedidos += 1
+        pedido = Pedido.objects.create(
+            numero_orcamento=f'ORC-{self.total_pedidos:03d}',
+            codigo_cliente='CLI-001',
+            nome_cliente='Cliente',
+            vendedor=self.vendedor,
+            data=timezone.localdate(),
+            logistica='RETIRADA',
+            embalagem='CAIXA_MEDIA',
+            status='EM_SEPARACAO'
+        )
+        Pedido.objects.filter(id=pedido.id).update(data_criacao=timezone.now() - timedelta(hours=horas_atras))
+        ItemPedido.objects.create(
+            pedido=pedido,
+            produto=self.produto,
+            quantidade_solicitada=1,
+            preco_unitario=10,
+            separado=True,
+            separado_por=self.separador,
+            separado_em=timezone.now()
+        )
+        Pedido.reconciliar_contadores()
+        return pedido
+
+    def finalizar_pedidos(self, horas):
+        for horas_atras in horas:
+            pedido = self.criar_pedido_separado(horas_atras)
+            response = self.client.post(reverse('finalizar_pedido', args=[pedido.id]))
+            self.assertEqual(response.status_code, 200)
+
+    def tempos_finalizados(self):
+        return [
+            calcular_tempo_util(pedido.data_criacao, pedido.data_finalizacao).total_seconds()
+            for pedido in Pedido.objects.filter(status='FINALIZADO', deletado=False)
+        ]
+
+    def test_finalizar_atualiza_sketches(self):
+        """Teste: finalizar adiciona o tempo na linha geral e na do separador"""
+        self.finalizar_pedidos([2, 30, 80])
+
+        geral = SketchTempoSeparacao.objects.get(separador__isnull=True)
+        do_separador = SketchTempoSeparacao.objects.get(separador=self.separador)
+        self.assertEqual(geral.contagem, 3)
+        self.assertEqual(do_separador.contagem, 3)
+
+        tempos = self.tempos_finalizados()
+        mediana = geral.obter_sketch().quantil(0.5)
+        self.assertLessEqual(abs(mediana - quantil_exato(tempos, 0.5)), ALFA_PADRAO * quantil_exato(tempos, 0.5) + 1e-3)
+
+    def test_finalizar_duas_vezes_registra_uma(self):
+        """Teste: finalização repetida não adiciona outra amostra aos sketches"""
+        self.finalizar_pedidos([2])
+        pedido = Pedido.objects.get(status='FINALIZADO')
+
+        response = self.client.post(reverse('finalizar_pedido', args=[pedido.id]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SketchTempoSeparacao.objects.get(separador__isnull=True).contagem, 1)
+        self.assertEqual(SketchTempoSeparacao.objects.get(separador=self.separador).contagem, 1)
+
+    def test_deletar_remove_do_sketch(self):
+        """Teste: deletar pedido finalizado remove o tempo dos sketches"""
+        self.finalizar_pedidos([2, 30])
+        pedido = Pedido.objects.filter(status='FINALIZADO').first()
+
+        self.client.post(reverse('deletar_pedido', args=[pedido.id]))
+
+        self.assertEqual(SketchTempoSeparacao.objects.get(separador__isnull=True).contagem, 1)
+        self.assertEqual(SketchTempoSeparacao.objects.get(separador=self.separador).contagem, 1)
+
+    def test_metricas_periodo_com_percentis(self):
+        """Teste: métricas do período trazem p50/p90/p99 mesclando os dias"""
+        self.finalizar_pedidos([2, 5, 30, 80, 200])
+        hoje = timezone.localdate()
+
+        percentis = calcular_metricas_periodo(hoje - timedelta(days=30), hoje)['percentis_separacao']
+
+        tempos = self.tempos_finalizados()
+        self.assertEqual(percentis['pedidos'], 5)
+        for percentil in (50, 90, 99):
+            exato = quantil_exato(tempos, percentil / 100)
+            self.assertAlmostEqual(
+                percentis[f'p{percentil}'].total_seconds(),
+                exato,
+                delta=ALFA_PADRAO * exato + 1e-3
+            )
+
+    def test_metricas_view_exibe_percentis(self):
+        """Teste: página de métricas exibe percentis gerais e por separador"""
+        self.finalizar_pedidos([2, 30])
+
+        response = self.client.get(reverse('metricas'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Distribuição do Tempo de Separação')
+        self.assertEqual(response.context['percentis_por_separador'][0]['separador'], self.separador.nome)
+        self.assertEqual(response.context['percentis_por_separador'][0]['pedidos'], 2)
+
+    def test_comando_reconstroi_sketches(self):
+        """Teste: reconstrução pelo histórico equivale aos sketches incrementais"""
+        self.finalizar_pedidos([2, 30, 80])
+        incrementais = {
+            linha.separador_id: linha.sketch for linha in SketchTempoSeparacao.objects.all()
+        }
+        SketchTempoSeparacao.objects.all().delete()
+
+        saida = StringIO()
+        call_command('preencher_metricas_periodo', stdout=saida)
+
+        self.assertIn('sketch(es)', saida.getvalue())
+        reconstruidos = {
+            linha.separador_id: linha.sketch for linha in SketchTempoSeparacao.objects.all()
+        }
+        self.assertEqual(
+            {chave: sketch['buckets'] for chave, sketch in reconstruidos.items()},
+            {chave: sketch['buckets'] for chave, sketch in incrementais.items()}
+        )
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
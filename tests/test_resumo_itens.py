@@ -0,0 +1,136 @@
+"""
+Testes para ItemStateSummary (resumo do estado dos itens do pedido)
+"""
+import os
+import sys
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.test import TestCase
+from django.urls import reverse
+from apps.core.models import Pedido, ItemStateSummary
+
+from test_contadores_pedido import ContadoresTestMixin
+
+
+class TestItemStateSummary(ContadoresTestMixin, TestCase):
+    """Testes: resumo calculado por prefetch, agregação e contadores"""
+
+    def marcar(self, item, **campos):
+        for campo, valor in campos.items():
+            setattr(item, campo, valor)
+        item.save()
+
+    def resumos(self):
+        """Resumos pelas três fontes, com contadores reconciliados"""
+        Pedido.reconciliar_contadores()
+        pedido = Pedido.objects.prefetch_related('itens__separado_por').get(id=self.pedido.id)
+        return [
+            pedido.resumo_itens(),
+            ItemStateSummary.de_consulta(pedido),
+            ItemStateSummary.de_contadores(pedido),
+        ]
+
+    def test_fontes_equivalentes(self):
+        """Teste: prefetch, agregação e contadores produzem o mesmo resumo"""
+        estados = [
+            {},
+            {'separado': True, 'separado_por': self.admin},
+            {'em_compra': True},
+            {'substituido': True, 'separado': True, 'separado_por': self.admin},
+        ]
+        for i, campos in enumerate(estados):
+            if campos:
+                self.marcar(self.itens[(i - 1) % 3], **campos)
+            esperado, *outros = self.resumos()
+            for resumo in outros:
+                with self.subTest(estado=i):
+                    self.assertEqual(resumo.card_status, esperado.card_status)
+                    self.assertEqual(resumo.pode_ser_finalizado, esperado.pode_ser_finalizado)
+                    self.assertEqual(resumo.separados, esperado.separados)
+                    self.assertEqual(resumo.separadores, esperado.separadores)
+
+    def test_prefetch_sem_consultas_por_pedido(self):
+        """Teste: com prefetch, card status e finalização não consultam o banco"""
+        pedidos = list(Pedido.objects.prefetch_related('itens__separado_por'))
+
+        with self.assertNumQueries(0):
+            for pedido in pedidos:
+                pedido.get_card_status()
+                pedido.pode_ser_finalizado()
+                pedido.get_card_status_css()
+
+    def test_sem_prefetch_uma_consulta(self):
+        """Teste: sem prefetch, o resumo usa uma consulta agregada"""
+        pedido = Pedido.objects.get(id=self.pedido.id)
+
+        with self.assertNumQueries(1):
+            resumo = pedido.resumo_itens()
+
+        self.assertEqual(resumo.total, 3)
+        self.assertEqual(resumo.pendentes, 3)
+
+    def test_pode_ser_finalizado_retorna_tupla(self):
+        """Teste: pode_ser_finalizado retorna (bool, motivo)"""
+        self.assertEqual(self.pedido.pode_ser_finalizado(), (False, '3 item(ns) não foi(ram) separado(s) ou substituído(s)'))
+
+        for item in self.itens:
+            self.marcar(item, separado=True, separado_por=self.admin)
+        self.assertEqual(self.pedido.pode_ser_finalizado(), (True, 'OK'))
+
+
+class TestFinalizarPedido(ContadoresTestMixin, TestCase):
+    """Testes de regressão: finalização respeita o resultado de pode_ser_finalizado"""
+
+    def test_nao_finaliza_com_itens_pendentes(self):
+        """Teste: pedido com itens pendentes não é finalizado"""
+        response = self.client.post(reverse('finalizar_pedido', args=[self.pedido.id]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('não foi(ram) separado(s)', response.json()['error'])
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'PENDENTE')
+
+    def test_nao_finaliza_com_item_em_compra(self):
+        """Teste: pedido com item em compra não é finalizado"""
+        for item in self.itens[:2]:
+            self.client.post(reverse('separar_item', args=[item.id]))
+        self.client.post(reverse('marcar_compra', args=[self.itens[2].id]))
+
+        response = self.client.post(reverse('finalizar_pedido', args=[self.pedido.id]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('em compra', response.json()['error'])
+
+    def test_finaliza_com_todos_separados(self):
+        """Teste: pedido com todos os itens separados é finalizado"""
+        for item in self.itens:
+            self.client.post(reverse('separar_item', args=[item.id]))
+
+        response = self.client.post(reverse('finalizar_pedido', args=[self.pedido.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'FINALIZADO')
+
+    def test_detalhe_usa_resumo(self):
+        """Teste: página de detalhe expõe contagens e pode_finalizar como bool"""
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+
+        response = self.client.get(reverse('pedido_detalhe', args=[self.pedido.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['itens_separados'], 1)
+        self.assertEqual(response.context['itens_pendentes'], 2)
+        self.assertIs(response.context['pode_finalizar'], False)
+        self.assertEqual(response.context['card_status'], 'EM_SEPARACAO')
+        self.assertEqual(response.context['separadores'], [self.admin.nome])
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
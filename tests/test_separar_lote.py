@@ -0,0 +1,135 @@
+"""
+Testes para a separação de itens em lote (POST /pedidos/<id>/separar-lote/)
+"""
+import os
+import sys
+import json
+import django
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from apps.core.models import Pedido, ItemPedido, Produto, LogAuditoria
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+class TestSepararLote(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: lote aplicado em uma transação, uma auditoria e eventos agregados"""
+
+    def separar_lote(self, **dados):
+        return self.client.post(
+            reverse('separar_lote', args=[self.pedido.id]),
+            data=json.dumps(dados),
+            content_type='application/json'
+        )
+
+    def test_separa_por_ids(self):
+        """Teste: separa os itens informados e atualiza contadores e status"""
+        ids = [self.itens[0].id, self.itens[1].id]
+
+        response = self.separar_lote(itens=ids)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()['separados']), sorted(ids))
+        self.assertEqual(response.json()['porcentagem_separacao'], 66.7)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+        self.assertEqual(self.pedido.itens_separados, 2)
+        self.assertEqual(self.pedido.itens_concluidos, 2)
+        self.assertEqual(self.pedido.separadores, [self.admin.nome])
+        self.assertEqual(
+            ItemPedido.objects.filter(separado=True, separado_por=self.admin).count(), 2
+        )
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+    def test_separa_por_codigo_de_produto(self):
+        """Teste: códigos de produto (formulário) separam os itens correspondentes"""
+        response = self.client.post(
+            reverse('separar_lote', args=[self.pedido.id]),
+            {'codigos': ['PROD000', 'PROD002']}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(response.json()['separados']),
+            sorted([self.itens[0].id, self.itens[2].id])
+        )
+
+    def test_ignorados_e_nao_encontrados(self):
+        """Teste: itens já separados são ignorados e desconhecidos são listados"""
+        self.separar_lote(itens=[self.itens[0].id])
+
+        response = self.separar_lote(itens=[self.itens[0].id, self.itens[1].id, 999999], codigos=['NAO-EXISTE'])
+
+        dados = response.json()
+        self.assertEqual(dados['separados'], [self.itens[1].id])
+        self.assertEqual(dados['ignorados'], [self.itens[0].id])
+        self.assertEqual(dados['nao_encontrados'], [999999, 'NAO-EXISTE'])
+
+    def test_nada_a_separar(self):
+        """Teste: lote vazio, inválido ou só com itens já separados retorna 400"""
+        self.assertEqual(self.separar_lote().status_code, 400)
+        self.assertEqual(self.separar_lote(itens=['abc']).status_code, 400)
+
+        self.separar_lote(itens=[self.itens[0].id])
+        self.assertEqual(self.separar_lote(itens=[self.itens[0].id]).status_code, 400)
+
+    def test_uma_auditoria_e_eventos_agregados(self):
+        """Teste: uma entrada de auditoria, um evento do pedido e um do dashboard"""
+        ItemPedido.objects.filter(id=self.itens[2].id).update(em_compra=True)
+        Pedido.reconciliar_contadores()
+
+        with self.capturar_eventos() as broadcast:
+            self.separar_lote(itens=[item.id for item in self.itens])
+
+        self.assertEqual(LogAuditoria.objects.filter(acao='separar_itens_lote').count(), 1)
+
+        # Uma mensagem por group
+        mensagens = {chamada.args[0]: (chamada.args[1], chamada.args[2]) for chamada in broadcast.call_args_list}
+        self.assertEqual(len(mensagens), len(broadcast.call_args_list))
+
+        tipo, dados = mensagens[f'pedido_{self.pedido.id}']
+        self.assertEqual(tipo, 'eventos_lote')
+        self.assertEqual([evento['type'] for evento in dados['eventos']], ['item_separado'] * 3)
+
+        self.assertEqual(mensagens['painel_compras'][0], 'item_separado_direto')
+
+        tipo, dados = mensagens['dashboard']
+        self.assertEqual(tipo, 'pedido_atualizado')
+        self.assertEqual(dados['pedido']['card_status'], 'CONCLUIDO')
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_em_compra, 0)
+        self.assertEqual(self.pedido.itens_separados, 3)
+
+    def test_consultas_constantes(self):
+        """Teste: número de consultas não cresce com o tamanho do lote"""
+        for i in range(3, 40):
+            produto = Produto.objects.create(codigo=f'PROD{i:03d}', descricao=f'Produto {i}')
+            ItemPedido.objects.create(pedido=self.pedido, produto=produto, quantidade_solicitada=1, preco_unitario=10)
+        Pedido.reconciliar_contadores()
+        itens = list(self.pedido.itens.order_by('id').values_list('id', flat=True))
+
+        # Primeiro lote muda o status do pedido (PENDENTE -> EM_SEPARACAO)
+        self.separar_lote(itens=itens[:1])
+
+        with CaptureQueriesContext(connection) as pequeno:
+            self.separar_lote(itens=itens[1:3])
+        with CaptureQueriesContext(connection) as grande:
+            self.separar_lote(itens=itens[3:])
+
+        self.assertEqual(len(pequeno.captured_queries), len(grande.captured_queries))
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
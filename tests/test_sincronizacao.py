@@ -0,0 +1,157 @@
+"""
+Testes para a sincronização das ações offline (POST /sync/acoes/)
+"""
+import os
+import sys
+import json
+import django
+from datetime import timedelta
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from apps.core.models import Pedido, ItemPedido, LogAuditoria
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+class TestSincronizacao(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: fila offline aplicada em ordem, com momentos originais e conflitos resolvidos"""
+
+    def setUp(self):
+        super().setUp()
+        self.inicio = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def momento(self, minutos):
+        return (self.inicio + timedelta(minutes=minutos)).isoformat()
+
+    def sincronizar(self, *acoes, client=None):
+        response = (client or self.client).post(
+            reverse('sincronizar_acoes'),
+            data=json.dumps({'dispositivo': 'coletor-1', 'acoes': list(acoes)}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def acao(self, acao, item, minutos, **extra):
+        return {'id': f'{acao}-{item.id}-{minutos}', 'acao': acao, 'item_id': item.id, 'momento': self.momento(minutos), **extra}
+
+    def status(self, dados):
+        return [resultado['status'] for resultado in dados['resultados']]
+
+    def test_aplica_com_momentos_originais(self):
+        """Teste: ações aplicadas em um lote com os momentos do coletor"""
+        dados = self.sincronizar(
+            self.acao('separar', self.itens[0], 1),
+            self.acao('marcar_compra', self.itens[1], 2),
+            self.acao('substituir', self.itens[2], 3, produto_substituto='Produto B'),
+        )
+
+        self.assertEqual(self.status(dados), ['aplicada'] * 3)
+        self.assertEqual(dados['resultados'][0]['id'], f'separar-{self.itens[0].id}-1')
+        self.assertEqual(dados['aplicadas'], 3)
+
+        separado = ItemPedido.objects.get(id=self.itens[0].id)
+        self.assertEqual(separado.separado_em, self.inicio + timedelta(minutes=1))
+        self.assertEqual(separado.separado_por, self.admin)
+        marcado = ItemPedido.objects.get(id=self.itens[1].id)
+        self.assertEqual(marcado.marcado_compra_em, self.inicio + timedelta(minutes=2))
+        self.assertEqual(ItemPedido.objects.get(id=self.itens[2].id).produto_substituto, 'Produto B')
+
+        self.assertEqual([pedido['id'] for pedido in dados['pedidos']], [self.pedido.id])
+        self.assertEqual(dados['pedidos'][0]['status'], 'AGUARDANDO_COMPRA')
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+        auditoria = LogAuditoria.objects.get(acao='separar_item', objeto_id=self.itens[0].id, modelo='ItemPedido')
+        self.assertEqual(auditoria.dados_novos['offline_em'], self.momento(1))
+
+    def test_sequencia_do_mesmo_item(self):
+        """Teste: separar, desseparar e separar o mesmo item no mesmo momento"""
+        dados = self.sincronizar(
+            self.acao('separar', self.itens[0], 1),
+            self.acao('unseparar', self.itens[0], 1),
+            self.acao('separar', self.itens[0], 1),
+            self.acao('unseparar', self.itens[1], 1),
+            self.acao('separar', self.itens[1], 1),
+        )
+
+        self.assertEqual(self.status(dados), ['aplicada', 'aplicada', 'aplicada', 'ja_aplicada', 'aplicada'])
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_separados, 2)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+    def test_conflitos_com_estado_atual(self):
+        """Teste: efeito já presente é ja_aplicada; estado incompatível ou mais novo é conflito"""
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+
+        dados = self.sincronizar(
+            self.acao('separar', self.itens[0], 1),
+            # Item foi separado (online) depois deste momento: desseparar não vale
+            self.acao('unseparar', self.itens[0], 2),
+            self.acao('substituir', self.itens[0], 3, produto_substituto='Outro'),
+        )
+
+        self.assertEqual(self.status(dados), ['ja_aplicada', 'conflito', 'conflito'])
+        self.assertEqual(dados['resultados'][1]['erro'], 'Item alterado depois desta ação.')
+        self.assertEqual(dados['resultados'][2]['erro'], 'Item já está separado.')
+        self.assertEqual(dados['aplicadas'], 0)
+        self.assertTrue(ItemPedido.objects.get(id=self.itens[0].id).separado)
+
+    def test_acoes_invalidas_e_permissoes(self):
+        """Teste: ações malformadas, itens inexistentes e ações não permitidas"""
+        vendedor = Client()
+        vendedor.force_login(self.vendedor)
+
+        dados = self.sincronizar(
+            {'id': 'a', 'acao': 'apagar', 'item_id': self.itens[0].id, 'momento': self.momento(1)},
+            {'id': 'b', 'acao': 'separar', 'item_id': 'x', 'momento': self.momento(1)},
+            {'id': 'c', 'acao': 'separar', 'item_id': self.itens[0].id, 'momento': 'ontem'},
+            {'id': 'd', 'acao': 'separar', 'item_id': 999999, 'momento': self.momento(1)},
+            self.acao('substituir', self.itens[1], 1),
+            self.acao('marcar_compra', self.itens[1], 2),
+            self.acao('separar', self.itens[2], 3),
+            client=vendedor
+        )
+
+        self.assertEqual(
+            self.status(dados),
+            ['invalida', 'invalida', 'invalida', 'nao_encontrado', 'invalida', 'negada', 'aplicada']
+        )
+        self.assertEqual(dados['aplicadas'], 1)
+
+    def test_momento_no_futuro(self):
+        """Teste: relógio adiantado do coletor não grava momento no futuro"""
+        antes = timezone.now()
+        self.sincronizar({
+            'acao': 'separar', 'item_id': self.itens[0].id, 'momento': '2100-01-01T10:00:00'
+        })
+
+        separado_em = ItemPedido.objects.get(id=self.itens[0].id).separado_em
+        self.assertGreaterEqual(separado_em, antes)
+        self.assertLessEqual(separado_em, timezone.now())
+
+    def test_eventos_agregados(self):
+        """Teste: uma mensagem por group para a sincronização inteira"""
+        with self.capturar_eventos() as broadcast:
+            self.sincronizar(*[self.acao('separar', item, i) for i, item in enumerate(self.itens)])
+
+        grupos = [chamada.args[0] for chamada in broadcast.call_args_list]
+        self.assertEqual(sorted(grupos), sorted(['dashboard', f'pedido_{self.pedido.id}']))
+
+    def test_lote_invalido(self):
+        """Teste: corpo sem lista de ações retorna 400"""
+        for corpo in ('{}', '{"acoes": {}}', 'nao e json'):
+            response = self.client.post(reverse('sincronizar_acoes'), data=corpo, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,297 @@
+"""
+Testes para o cálculo de tempo útil (fórmula fechada e versão em lote)
+"""
+import os
+import sys
+import random
+import timeit
+import unittest
+import django
+from datetime import datetime, timedelta, time, timezone as dt_timezone
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from apps.core.models import (
+    CalendarioOperacional, Feriado, Pedido, MetricaDiaria, MetricaVendedorDiaria, SketchTempoSeparacao
+)
+from apps.core.utils import calcular_tempo_util, calcular_tempo_util_lote, invalidar_calendario
+from apps.core.utils import calendario
+
+from test_contadores_pedido import ContadoresTestMixin
+
+
+def tempo_util_referencia(data_inicio, data_fim):
+    """Implementação original (laço dia a dia), usada como oráculo"""
+    if not data_inicio or not data_fim:
+        return timedelta(0)
+    if timezone.is_naive(data_inicio):
+        data_inicio = timezone.make_aware(data_inicio)
+    if timezone.is_naive(data_fim):
+        data_fim = timezone.make_aware(data_fim)
+    if data_fim < data_inicio:
+        return timedelta(0)
+
+    HORA_INICIO = time(7, 30)
+    HORA_FIM = time(17, 0)
+    tempo_total = timedelta(0)
+    dia_atual = data_inicio.date()
+
+    while dia_atual <= data_fim.date():
+        if dia_atual.weekday() < 5:
+            inicio_periodo = data_inicio.time() if dia_atual == data_inicio.date() else HORA_INICIO
+            fim_periodo = data_fim.time() if dia_atual == data_fim.date() else HORA_FIM
+            if inicio_periodo < HORA_INICIO:
+                inicio_periodo = HORA_INICIO
+            if fim_periodo > HORA_FIM:
+                fim_periodo = HORA_FIM
+            if inicio_periodo < fim_periodo:
+                tempo_total += datetime.combine(dia_atual, fim_periodo) - datetime.combine(dia_atual, inicio_periodo)
+        dia_atual += timedelta(days=1)
+
+    return tempo_total
+
+
+def momento_aleatorio(rng, base):
+    """Momento aleatório até ~1 ano após a base, com horários nas bordas do expediente"""
+    dia = base + timedelta(days=rng.randint(0, 400))
+    hora = rng.choice([
+        time(rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59), rng.randint(0, 999999)),
+        time(7, 30), time(17, 0), time(0, 0), time(7, 29, 59), time(17, 0, 1),
+    ])
+    return datetime.combine(dia, hora)
+
+
+class TestTempoUtilEquivalencia(TestCase):
+    """Propriedade: índice do calendário padrão == laço dia a dia (entradas aleatórias)"""
+
+    def setUp(self):
+        self.rng = random.Random(20241016)
+        self.base = datetime(2024, 1, 1).date()
+
+    def test_equivalencia_naive(self):
+        """Teste: datas naive em períodos de 0 a ~400 dias"""
+        for _ in range(2000):
+            inicio = momento_aleatorio(self.rng, self.base)
+            fim = momento_aleatorio(self.rng, self.base)
+            with self.subTest(inicio=inicio, fim=fim):
+                self.assertEqual(calcular_tempo_util(inicio, fim), tempo_util_referencia(inicio, fim))
+
+    def test_equivalencia_aware_fusos_diferentes(self):
+        """Teste: datas aware em UTC e no fuso local (horário de parede de cada uma)"""
+        for _ in range(1000):
+            inicio = timezone.make_aware(momento_aleatorio(self.rng, self.base))
+            fim = momento_aleatorio(self.rng, self.base).replace(tzinfo=dt_timezone.utc)
+            with self.subTest(inicio=inicio, fim=fim):
+                self.assertEqual(calcular_tempo_util(inicio, fim), tempo_util_referencia(inicio, fim))
+
+    def test_mesmo_dia_e_bordas(self):
+        """Teste: períodos curtos dentro de um dia e ao redor do expediente"""
+        dia = datetime(2024, 10, 16)  # quarta-feira
+        for _ in range(1000):
+            inicio = dia + timedelta(minutes=self.rng.randint(0, 24 * 60))
+            fim = inicio + timedelta(minutes=self.rng.randint(0, 36 * 60))
+            with self.subTest(inicio=inicio, fim=fim):
+                self.assertEqual(calcular_tempo_util(inicio, fim), tempo_util_referencia(inicio, fim))
+
+    def test_lote_igual_individual(self):
+        """Teste: versão em lote retorna os mesmos segundos que a individual"""
+        periodos = [
+            (momento_aleatorio(self.rng, self.base), momento_aleatorio(self.rng, self.base))
+            for _ in range(500)
+        ] + [(None, datetime(2024, 1, 1)), (datetime(2024, 1, 1), None)]
+
+        self.assertEqual(
+            calcular_tempo_util_lote(periodos),
+            [calcular_tempo_util(inicio, fim).total_seconds() for inicio, fim in periodos]
+        )
+
+
+class TestTempoUtilCasos(TestCase):
+    """Casos fixos do horário comercial"""
+
+    def test_semana_completa(self):
+        """Teste: segunda 7:30 até a segunda seguinte 7:30 = 47h30min"""
+        inicio = datetime(2024, 10, 14, 7, 30)
+        self.assertEqual(calcular_tempo_util(inicio, inicio + timedelta(days=7)), timedelta(hours=47, minutes=30))
+
+    def test_fim_de_semana(self):
+        """Teste: sábado e domingo não contam"""
+        self.assertEqual(
+            calcular_tempo_util(datetime(2024, 10, 19, 8, 0), datetime(2024, 10, 20, 16, 0)),
+            timedelta(0)
+        )
+
+    def test_sexta_para_segunda(self):
+        """Teste: sexta 16:00 até segunda 8:00 = 1h30min"""
+        self.assertEqual(
+            calcular_tempo_util(datetime(2024, 10, 18, 16, 0), datetime(2024, 10, 21, 8, 0)),
+            timedelta(hours=1, minutes=30)
+        )
+
+    def test_periodo_invertido_ou_vazio(self):
+        """Teste: fim antes do início ou datas ausentes retornam zero"""
+        self.assertEqual(calcular_tempo_util(datetime(2024, 10, 18), datetime(2024, 10, 17)), timedelta(0))
+        self.assertEqual(calcular_tempo_util(None, datetime(2024, 10, 17)), timedelta(0))
+
+
+class TestCalendarioOperacional(TestCase):
+    """Testes: expediente configurável, feriados e recompilação do índice"""
+
+    def setUp(self):
+        invalidar_calendario()
+
+    def tearDown(self):
+        # O rollback do TestCase não dispara sinais: descartar o índice do teste
+        invalidar_calendario()
+
+    def alterar(self, funcao):
+        """Executa a alteração e os on_commit (recompilação do índice)"""
+        with self.captureOnCommitCallbacks(execute=True):
+            funcao()
+
+    def test_feriado_nao_conta(self):
+        """Teste: feriado em dia útil zera o expediente daquele dia"""
+        inicio, fim = datetime(2024, 11, 14, 12, 0), datetime(2024, 11, 18, 8, 30)  # qui -> seg
+        # quinta 5h + sexta 9h30 + segunda 1h
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=15, minutes=30))
+
+        self.alterar(lambda: Feriado.objects.create(data=datetime(2024, 11, 15).date(), descricao='Proclamação da República'))
+
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=6))
+
+    def test_expediente_de_sabado(self):
+        """Teste: sábado com expediente passa a contar"""
+        inicio, fim = datetime(2024, 10, 19, 0, 0), datetime(2024, 10, 20, 0, 0)
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(0))
+
+        self.alterar(lambda: CalendarioOperacional.objects.create(
+            dia_semana=5, hora_inicio=time(8, 0), hora_fim=time(12, 0)
+        ))
+
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=4))
+
+    def test_alterar_horario_recompila(self):
+        """Teste: alteração do horário de um dia recompila o índice"""
+        inicio, fim = datetime(2024, 10, 16, 0, 0), datetime(2024, 10, 17, 0, 0)  # quarta
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=9, minutes=30))
+
+        def alterar_quarta():
+            quarta = CalendarioOperacional.objects.get(dia_semana=2)
+            quarta.hora_fim = time(12, 0)
+            quarta.save()
+        self.alterar(alterar_quarta)
+
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=4, minutes=30))
+
+    def test_indice_sem_consultas_apos_compilar(self):
+        """Teste: após compilado, o cálculo não consulta o banco (inclusive períodos longos)"""
+        calcular_tempo_util(datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+        with self.assertNumQueries(0):
+            calcular_tempo_util(datetime(2024, 1, 1), datetime(2024, 12, 31))
+            calcular_tempo_util_lote([(datetime(2023, 1, 1), datetime(2024, 6, 1))] * 100)
+
+    def test_amplia_para_datas_fora_do_indice(self):
+        """Teste: datas fora do intervalo compilado ampliam o índice"""
+        inicio, fim = datetime(1990, 1, 1, 7, 30), datetime(1990, 1, 8, 7, 30)  # seg -> seg
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=47, minutes=30))
+
+    def test_versao_de_outro_processo_recompila(self):
+        """Teste: versão incrementada por outro processo é detectada na verificação"""
+        inicio, fim = datetime(2024, 11, 15, 0, 0), datetime(2024, 11, 16, 0, 0)
+        calcular_tempo_util(inicio, fim)
+
+        # Outro processo grava o feriado e incrementa a versão (sem invalidar este processo)
+        Feriado.objects.create(data=datetime(2024, 11, 15).date())
+        cache.set(calendario.CHAVE_VERSAO, cache.get(calendario.CHAVE_VERSAO, 0) + 1)
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(hours=9, minutes=30))
+
+        calendario._estado['verificado_em'] = 0.0
+        self.assertEqual(calcular_tempo_util(inicio, fim), timedelta(0))
+
+
+class TestCalendarioRecalculaMetricas(ContadoresTestMixin, TestCase):
+    """Testes: alterações no calendário recalculam o tempo útil gravado nos rollups"""
+
+    CRIACAO = datetime(2024, 11, 14, 12, 0, tzinfo=dt_timezone.utc)  # quinta
+    FINALIZACAO = datetime(2024, 11, 18, 8, 30, tzinfo=dt_timezone.utc)  # segunda
+
+    def setUp(self):
+        super().setUp()
+        invalidar_calendario()
+        Pedido.objects.filter(id=self.pedido.id).update(
+            status='FINALIZADO', data_criacao=self.CRIACAO, data_finalizacao=self.FINALIZACAO
+        )
+        MetricaVendedorDiaria.reconstruir()
+        SketchTempoSeparacao.reconstruir()
+        MetricaDiaria.recalcular(timezone.localdate(self.FINALIZACAO))
+
+    def tearDown(self):
+        invalidar_calendario()
+
+    def assertTempoGravado(self, esperado):
+        segundos = esperado.total_seconds()
+        self.assertAlmostEqual(
+            MetricaDiaria.objects.get(data=timezone.localdate(self.FINALIZACAO)).soma_tempo_util, segundos, places=3
+        )
+        self.assertAlmostEqual(
+            MetricaVendedorDiaria.objects.get(vendedor=self.vendedor, status='FINALIZADO').soma_tempo_util, segundos, places=3
+        )
+        sketch = SketchTempoSeparacao.objects.get(separador__isnull=True)
+        self.assertEqual(sketch.contagem, 1)
+        self.assertAlmostEqual(sketch.obter_sketch().quantil(0.5), segundos, delta=segundos * 0.02)
+
+    def test_feriado_recalcula_pedidos_do_periodo(self):
+        """Teste: criar, mover e excluir feriado recalcula os pedidos que atravessam o dia"""
+        self.assertTempoGravado(timedelta(hours=15, minutes=30))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feriado = Feriado.objects.create(data=datetime(2024, 11, 15).date())
+        self.assertTempoGravado(timedelta(hours=6))
+
+        # Movido para fora do período: o dia antigo volta a contar
+        with self.captureOnCommitCallbacks(execute=True):
+            feriado.data = datetime(2024, 11, 20).date()
+            feriado.save()
+        self.assertTempoGravado(timedelta(hours=15, minutes=30))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feriado.data = datetime(2024, 11, 14).date()
+            feriado.save()
+        self.assertTempoGravado(timedelta(hours=10, minutes=30))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feriado.delete()
+        self.assertTempoGravado(timedelta(hours=15, minutes=30))
+
+    def test_expediente_recalcula_historico(self):
+        """Teste: alterar o expediente de um dia da semana recalcula todos os finalizados"""
+        with self.captureOnCommitCallbacks(execute=True):
+            CalendarioOperacional.objects.filter(dia_semana=4).delete()  # sexta sem expediente
+        self.assertTempoGravado(timedelta(hours=6))
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Defina BENCHMARK=1 para rodar o micro-benchmark')
+class TestTempoUtilBenchmark(TestCase):
+    """Micro-benchmark: índice do calendário vs laço dia a dia (BENCHMARK=1 pytest -s)"""
+
+    def test_benchmark_periodos(self):
+        inicio = datetime(2024, 1, 1, 9, 0)
+        print('\nDias   laço (µs)   índice (µs)')
+        for dias in (1, 7, 30, 90, 365):
+            fim = inicio + timedelta(days=dias, hours=3)
+            laco = min(timeit.repeat(lambda: tempo_util_referencia(inicio, fim), number=200, repeat=3)) / 200
+            indice = min(timeit.repeat(lambda: calcular_tempo_util(inicio, fim), number=200, repeat=3)) / 200
+            print(f'{dias:>4}   {laco * 1e6:>9.1f}   {indice * 1e6:>11.1f}')
+            if dias >= 30:
+                self.assertLess(indice, laco)
+
+
+if __name__ == '__main__':
+    unittest.main()
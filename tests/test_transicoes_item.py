@@ -0,0 +1,251 @@
+"""
+Testes para as transições de item com UPDATE condicional
+"""
+import os
+import sys
+import time
+import threading
+import django
+from unittest import mock
+
+# Setup Django
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pmcell_settings.settings')
+django.setup()
+
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from apps.core.models import Pedido, ItemPedido, LogAuditoria, AlteracaoPedido
+from apps.core.services import transitions
+
+from test_contadores_pedido import ContadoresTestMixin
+from test_outbox import EventosTestMixin
+
+
+class TestTransicoes(EventosTestMixin, ContadoresTestMixin, TestCase):
+    """Testes: transições gravadas com UPDATE condicional"""
+
+    def test_perde_corrida_e_reavalia(self):
+        """Teste: item alterado entre a leitura e o UPDATE não é separado duas vezes"""
+        ler_itens = transitions._ler_itens
+        leituras = []
+
+        def ler_e_concorrer(item_ids):
+            itens = list(ler_itens(item_ids))
+            if not leituras:
+                # Outra requisição separa o item depois da nossa leitura
+                ItemPedido.objects.filter(id__in=item_ids).update(separado=True, separado_por=self.vendedor)
+            leituras.append(item_ids)
+            return itens
+
+        with mock.patch.object(transitions, '_ler_itens', side_effect=ler_e_concorrer):
+            with self.assertRaisesMessage(transitions.TransicaoNegada, 'Item já está separado.'):
+                transitions.aplicar(self.itens[0].id, transitions.Separar(), self.admin)
+
+        self.assertEqual(len(leituras), 2)
+        self.assertEqual(ItemPedido.objects.get(id=self.itens[0].id).separado_por, self.vendedor)
+        # Contadores não receberam a variação da transição perdida
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_separados, 0)
+
+    def test_separar_ajusta_status_e_registra_alteracao(self):
+        """Teste: separar muda o status para EM_SEPARACAO e registra no log do dashboard"""
+        alteracoes = AlteracaoPedido.objects.count()
+
+        with transaction.atomic():
+            resultado = transitions.aplicar(self.itens[0].id, transitions.Separar(), self.admin)
+
+        self.assertTrue(resultado.status_alterado)
+        self.assertFalse(resultado.anterior.separado)
+        self.assertTrue(resultado.item.separado)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+        self.assertEqual(self.pedido.separadores, [self.admin.nome])
+        self.assertEqual(AlteracaoPedido.objects.count(), alteracoes + 1)
+
+    def test_consultas_por_transicao(self):
+        """Teste: leitura, UPDATE do item, separadores, contadores e log"""
+        transitions.aplicar(self.itens[0].id, transitions.Separar(), self.admin)
+
+        # Uma transação por transição, como nas views (o log grava uma linha por transação)
+        with transaction.atomic(), self.assertNumQueries(5):
+            transitions.aplicar(self.itens[1].id, transitions.Separar(), self.admin)
+        with transaction.atomic(), self.assertNumQueries(5):
+            transitions.aplicar(self.itens[1].id, transitions.Desseparar(), self.admin)
+
+    def test_lote_com_consultas_constantes(self):
+        """Teste: lote com vários itens e pedidos custa o mesmo que um lote de dois itens"""
+        outro = Pedido.objects.create(
+            numero_orcamento='ORC-OUTRO',
+            codigo_cliente='CLI-002',
+            nome_cliente='Outro Cliente',
+            vendedor=self.vendedor,
+            data=self.pedido.data,
+            logistica='RETIRADA',
+            embalagem='CAIXA_MEDIA',
+            status='EM_SEPARACAO'
+        )
+        for item in self.itens:
+            ItemPedido.objects.create(pedido=outro, produto=item.produto, quantidade_solicitada=1, preco_unitario=10)
+        Pedido.reconciliar_contadores()
+        self.pedido.status = 'EM_SEPARACAO'
+        self.pedido.save()
+        ids = list(ItemPedido.objects.order_by('id').values_list('id', flat=True))
+
+        with transaction.atomic(), self.assertNumQueries(7):
+            transitions.aplicar_lote([(item_id, transitions.Separar()) for item_id in ids[:2]], self.vendedor)
+        with transaction.atomic(), self.assertNumQueries(7):
+            resultado = transitions.aplicar_lote([(item_id, transitions.Separar()) for item_id in ids[2:]], self.admin)
+
+        self.assertEqual(len(resultado.aplicadas), 4)
+        self.assertEqual(set(resultado.pedidos), {self.pedido.id, outro.id})
+        self.pedido.refresh_from_db()
+        outro.refresh_from_db()
+        self.assertEqual(self.pedido.separadores, sorted([self.admin.nome, self.vendedor.nome]))
+        self.assertEqual(outro.separadores, [self.admin.nome])
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+    def test_transicoes_do_mesmo_item_em_sequencia(self):
+        """Teste: segunda transição do mesmo item no lote parte do estado da primeira"""
+        item_id = self.itens[0].id
+
+        resultado = transitions.aplicar_lote(
+            [(item_id, transitions.Separar()), (item_id, transitions.Separar()), (999999, transitions.Separar())],
+            self.admin
+        )
+
+        self.assertEqual(len(resultado.aplicadas), 1)
+        self.assertEqual(resultado.negadas, {item_id: 'Item já está separado.'})
+        self.assertEqual(resultado.nao_encontrados, [999999])
+
+    def test_eventos_agrupados_por_group(self):
+        """Teste: executar envia uma mensagem por group, agregando eventos em eventos_lote"""
+        with self.capturar_eventos() as broadcast:
+            transitions.executar([(item.id, transitions.Separar()) for item in self.itens], self.admin)
+
+        grupos = [chamada.args[0] for chamada in broadcast.call_args_list]
+        self.assertEqual(sorted(grupos), sorted(['dashboard', f'pedido_{self.pedido.id}']))
+        chamada = next(chamada for chamada in broadcast.call_args_list if chamada.args[0] != 'dashboard')
+        self.assertEqual(chamada.args[1], 'eventos_lote')
+        self.assertEqual(len(chamada.args[2]['eventos']), 3)
+        self.assertEqual(LogAuditoria.objects.filter(acao='separar_item').count(), 3)
+
+    def test_marcar_item_comprado(self):
+        """Teste: alternar comprado exige item em compra e atualiza o contador"""
+        response = self.client.post(reverse('marcar_item_comprado', args=[self.itens[0].id]))
+        self.assertEqual(response.json()['error'], 'Item não está marcado para compra.')
+
+        ItemPedido.objects.filter(id=self.itens[0].id).update(em_compra=True)
+        Pedido.reconciliar_contadores()
+
+        response = self.client.post(reverse('marcar_item_comprado', args=[self.itens[0].id]))
+        self.assertTrue(response.json()['comprado'])
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_comprados, 1)
+
+        response = self.client.post(reverse('marcar_item_comprado', args=[self.itens[0].id]))
+        self.assertFalse(response.json()['comprado'])
+        self.assertEqual(LogAuditoria.objects.filter(acao='desmarcar_item_comprado').count(), 1)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+    def test_desseparar_substituido_volta_a_pendente(self):
+        """Teste: desseparar item substituído limpa a substituição e volta o pedido a PENDENTE"""
+        self.client.post(reverse('substituir_item', args=[self.itens[0].id]), {'produto_substituto': 'Outro'})
+
+        response = self.client.post(reverse('unseparar_item', args=[self.itens[0].id]))
+
+        self.assertEqual(response.status_code, 200)
+        item = ItemPedido.objects.get(id=self.itens[0].id)
+        self.assertFalse(item.substituido)
+        self.assertEqual(item.produto_substituto, '')
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'PENDENTE')
+        self.assertEqual(self.pedido.itens_substituidos, 0)
+
+        auditoria = LogAuditoria.objects.filter(acao='unseparar_item').get()
+        self.assertEqual(auditoria.dados_novos['separado_por_anterior'], self.admin.nome)
+
+    def test_views_mantem_mensagens(self):
+        """Teste: views retornam 400 com a mensagem da transição negada e 404 para item inexistente"""
+        self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+
+        response = self.client.post(reverse('separar_item', args=[self.itens[0].id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Item já está separado.')
+
+        response = self.client.post(reverse('substituir_item', args=[self.itens[0].id]), {'produto_substituto': 'X'})
+        self.assertEqual(response.json()['error'], 'Item já está separado.')
+
+        response = self.client.post(reverse('unseparar_item', args=[self.itens[1].id]))
+        self.assertEqual(response.json()['error'], 'Item não está separado.')
+
+        self.assertEqual(self.client.post(reverse('separar_item', args=[999999])).status_code, 404)
+
+
+class TestContencao(ContadoresTestMixin, TransactionTestCase):
+    """Testes: várias threads disputando o mesmo item"""
+
+    THREADS = 8
+
+    def disputar(self, transicoes):
+        """Executa cada transição em uma thread, todas liberadas ao mesmo tempo"""
+        barreira = threading.Barrier(len(transicoes))
+        resultados = []
+
+        def executar(transicao):
+            try:
+                barreira.wait()
+                for _ in range(500):
+                    try:
+                        with transaction.atomic():
+                            transitions.aplicar(self.itens[0].id, transicao, self.admin)
+                        resultados.append('ok')
+                        return
+                    except transitions.TransicaoNegada:
+                        resultados.append('negada')
+                        return
+                    except OperationalError:
+                        # SQLite serializa escritas (tabela bloqueada): tentar de novo
+                        time.sleep(0.002)
+                resultados.append('bloqueada')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=executar, args=(transicao,)) for transicao in transicoes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return resultados
+
+    def test_separacao_concorrente_aplicada_uma_vez(self):
+        """Teste: só uma de várias separações concorrentes do mesmo item é aplicada"""
+        resultados = self.disputar([transitions.Separar() for _ in range(self.THREADS)])
+
+        self.assertEqual(resultados.count('ok'), 1)
+        self.assertEqual(resultados.count('negada'), self.THREADS - 1)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_separados, 1)
+        self.assertEqual(self.pedido.status, 'EM_SEPARACAO')
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+    def test_separar_e_substituir_concorrentes(self):
+        """Teste: separar e substituir o mesmo item ao mesmo tempo: apenas um vence"""
+        resultados = self.disputar([
+            transitions.Separar() if i % 2 else transitions.Substituir('Outro')
+            for i in range(self.THREADS)
+        ])
+
+        self.assertEqual(resultados.count('ok'), 1)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.itens_separados, 1)
+        self.assertLessEqual(self.pedido.itens_substituidos, 1)
+        self.assertEqual(Pedido.reconciliar_contadores(), 0)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()